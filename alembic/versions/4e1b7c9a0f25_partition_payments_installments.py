@@ -0,0 +1,209 @@
+"""partition payments / installments by month (Postgres)
+
+Revision ID: 4e1b7c9a0f25
+Revises: 2c8e4a6f9d13
+Create Date: 2026-03-16 10:05:31.772904
+
+Convierte `payments` (payment_date) e `installments` (due_date) en tablas
+particionadas por rango mensual. Requiere Postgres >= 11. En otros motores no
+hace nada.
+
+Por tabla: se renombra a *_legacy, se crea la particionada con las mismas
+columnas/defaults/checks, PK (id, columna), particiones mensuales desde el
+primer dato hasta hoy + PARTITION_MONTHS_AHEAD (+ default), se copian las filas,
+se recrean FKs salientes e índices y se borra la legacy. Las FKs entrantes
+(payment_allocations) se reemplazan por triggers de borrado en cascada.
+
+La copia reescribe las tablas completas: correrla en una ventana de mantenimiento.
+"""
+import os
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e1b7c9a0f25'
+down_revision: Union[str, None] = '2c8e4a6f9d13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# copia congelada de app/services/partitions.py al momento de la migración
+PARTITIONED_TABLES = {
+    "payments": "payment_date",
+    "installments": "due_date",
+}
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+
+
+def _month_start(d) -> date:
+    return date(d.year, d.month, 1)
+
+
+def _add_months(month: date, n: int) -> date:
+    idx = month.year * 12 + (month.month - 1) + n
+    return date(idx // 12, idx % 12 + 1, 1)
+
+
+def _iter_months(first: date, last: date):
+    month = _month_start(first)
+    last = _month_start(last)
+    while month <= last:
+        yield month
+        month = _add_months(month, 1)
+
+
+def _create_month_partition(table: str, month: date) -> None:
+    start = datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+    nxt = _add_months(month, 1)
+    end = datetime(nxt.year, nxt.month, 1, tzinfo=timezone.utc)
+    op.execute(
+        f"CREATE TABLE {table}_p{month:%Y_%m} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{start.isoformat(sep=' ')}') TO ('{end.isoformat(sep=' ')}')"
+    )
+
+
+# FKs entrantes que se reemplazan por triggers (tabla referenciada -> columna en payment_allocations)
+ALLOCATION_COLUMNS = {
+    "payments": "payment_id",
+    "installments": "installment_id",
+}
+
+
+def _table_meta(bind, table: str) -> dict:
+    q = lambda sql: bind.execute(sa.text(sql), {"t": table}).all()  # noqa: E731
+    return {
+        "fks_out": q(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(:t) AND contype = 'f'"
+        ),
+        "fks_in": q(
+            "SELECT conname, conrelid::regclass::text FROM pg_constraint "
+            "WHERE confrelid = to_regclass(:t) AND contype = 'f'"
+        ),
+        "indexes": q(
+            "SELECT i.indexname, i.indexdef FROM pg_indexes i "
+            "JOIN pg_class c ON c.relname = i.indexname "
+            "JOIN pg_index x ON x.indexrelid = c.oid "
+            "WHERE i.schemaname = current_schema() AND i.tablename = :t AND NOT x.indisprimary"
+        ),
+        "pkey": bind.execute(
+            sa.text("SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:t) AND contype = 'p'"),
+            {"t": table},
+        ).scalar(),
+        "sequence": bind.execute(sa.text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": table}).scalar(),
+    }
+
+
+def _partition_table(bind, table: str) -> None:
+    column = PARTITIONED_TABLES[table]
+    legacy = f"{table}_legacy"
+    meta = _table_meta(bind, table)
+
+    for conname, relname in meta["fks_in"]:
+        op.execute(f'ALTER TABLE {relname} DROP CONSTRAINT "{conname}"')
+    # índices y PK se recrean sobre la particionada (los nombres quedan libres)
+    for indexname, _ in meta["indexes"]:
+        op.execute(f'DROP INDEX "{indexname}"')
+    op.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+    if meta["pkey"]:
+        op.execute(f'ALTER TABLE {legacy} RENAME CONSTRAINT "{meta["pkey"]}" TO "{legacy}_pkey"')
+
+    op.execute(
+        f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        f"PARTITION BY RANGE ({column})"
+    )
+    op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, {column})")
+    if meta["sequence"]:
+        op.execute(f"ALTER SEQUENCE {meta['sequence']} OWNED BY {table}.id")
+
+    lo, hi = bind.execute(sa.text(f"SELECT min({column}), max({column}) FROM {legacy}")).one()
+    now = datetime.now(timezone.utc)
+    first = _month_start(lo) if lo else _month_start(now)
+    last = _add_months(_month_start(now), PARTITION_MONTHS_AHEAD)
+    if hi and _month_start(hi) > last:
+        last = _month_start(hi)
+    for month in _iter_months(first, last):
+        _create_month_partition(table, month)
+    op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+    op.execute(f"INSERT INTO {table} SELECT * FROM {legacy}")
+
+    for conname, definition in meta["fks_out"]:
+        op.execute(f'ALTER TABLE {table} ADD CONSTRAINT "{conname}" {definition}')
+    op.execute(f"DROP TABLE {legacy}")
+
+    for _, indexdef in meta["indexes"]:
+        op.execute(indexdef)  # se crea en la particionada y se propaga a cada partición
+    op.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_{column} ON {table} ({column})")
+
+
+def _cascade_trigger(table: str) -> None:
+    column = ALLOCATION_COLUMNS[table]
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION {table}_delete_allocations() RETURNS trigger AS $$
+        BEGIN
+            -- un UPDATE que cambia de mes mueve la fila (DELETE + INSERT): no es un borrado real
+            IF EXISTS (SELECT 1 FROM {table} WHERE id = OLD.id) THEN
+                RETURN OLD;
+            END IF;
+            DELETE FROM payment_allocations WHERE {column} = OLD.id;
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute(f"""
+        CREATE TRIGGER trg_{table}_delete_allocations
+        AFTER DELETE ON {table}
+        FOR EACH ROW EXECUTE FUNCTION {table}_delete_allocations()
+    """)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+    for table in PARTITIONED_TABLES:
+        _partition_table(bind, table)
+        _cascade_trigger(table)
+
+
+def _unpartition_table(bind, table: str) -> None:
+    column = PARTITIONED_TABLES[table]
+    legacy = f"{table}_partitioned"
+    meta = _table_meta(bind, table)
+
+    op.execute(f"DROP TRIGGER IF EXISTS trg_{table}_delete_allocations ON {table}")
+    op.execute(f"DROP FUNCTION IF EXISTS {table}_delete_allocations()")
+    for indexname, _ in meta["indexes"]:
+        op.execute(f'DROP INDEX "{indexname}"')
+    op.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+    op.execute(f'ALTER TABLE {legacy} RENAME CONSTRAINT "{table}_pkey" TO "{legacy}_pkey"')
+
+    op.execute(f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id)")
+    if meta["sequence"]:
+        op.execute(f"ALTER SEQUENCE {meta['sequence']} OWNED BY {table}.id")
+    op.execute(f"INSERT INTO {table} SELECT * FROM {legacy}")
+    for conname, definition in meta["fks_out"]:
+        op.execute(f'ALTER TABLE {table} ADD CONSTRAINT "{conname}" {definition}')
+    op.execute(f"DROP TABLE {legacy} CASCADE")  # arrastra las particiones
+
+    for indexname, indexdef in meta["indexes"]:
+        if indexname != f"ix_{table}_{column}":
+            op.execute(indexdef)
+    op.execute(
+        f"ALTER TABLE payment_allocations ADD CONSTRAINT payment_allocations_{ALLOCATION_COLUMNS[table]}_fkey "
+        f"FOREIGN KEY ({ALLOCATION_COLUMNS[table]}) REFERENCES {table}(id) ON DELETE CASCADE"
+    )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+    for table in PARTITIONED_TABLES:
+        _unpartition_table(bind, table)
@@ -0,0 +1,62 @@
+"""money columns: Float -> NUMERIC(14,2)
+
+Revision ID: 5d7a1e9c0b34
+Revises: c3d82e5f41a7
+Create Date: 2026-03-06 10:21:09.512880
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d7a1e9c0b34'
+down_revision: Union[str, None] = 'c3d82e5f41a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+MONEY_COLUMNS = {
+    "loans": ["amount", "total_due", "installment_amount"],
+    "purchases": ["amount", "total_due", "installment_amount"],
+    "payments": ["amount"],
+    "installments": ["amount", "paid_amount"],
+    "payment_allocations": ["amount_applied"],
+    "onboarding_staging_loans": ["amount", "total_due", "installment_amount"],
+    "onboarding_staging_payments": ["amount"],
+    "daily_rollups": [
+        "collected_amount",
+        "voided_amount",
+        "applied_to_due_amount",
+        "expected_amount",
+        "loans_issued_amount",
+        "loans_effective_amount",
+    ],
+}
+
+
+def upgrade() -> None:
+    # round(...) al centavo: los residuos de float (99.99999997) quedan en 100.00
+    for table, columns in MONEY_COLUMNS.items():
+        for col in columns:
+            op.alter_column(
+                table,
+                col,
+                type_=sa.Numeric(14, 2),
+                existing_type=sa.Float(),
+                postgresql_using=f"round({col}::numeric, 2)",
+            )
+
+
+def downgrade() -> None:
+    for table, columns in MONEY_COLUMNS.items():
+        for col in columns:
+            op.alter_column(
+                table,
+                col,
+                type_=sa.Float(),
+                existing_type=sa.Numeric(14, 2),
+                postgresql_using=f"{col}::double precision",
+            )
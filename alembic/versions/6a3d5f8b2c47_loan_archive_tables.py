@@ -0,0 +1,96 @@
+"""loan archive: loan_archives + archived_installments / payments / payment_allocations
+
+Revision ID: 6a3d5f8b2c47
+Revises: 4e1b7c9a0f25
+Create Date: 2026-03-19 15:40:12.086431
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a3d5f8b2c47'
+down_revision: Union[str, None] = '4e1b7c9a0f25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "loan_archives",
+        sa.Column("loan_id", sa.Integer(), sa.ForeignKey("loans.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("company_id", sa.Integer(), nullable=False),
+        sa.Column("customer_id", sa.Integer(), nullable=True),
+        sa.Column("status", sa.String(), nullable=True),
+        sa.Column("closed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("archived_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.Column("installments_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("payments_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("allocations_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("paid_total", sa.Numeric(14, 2), nullable=False, server_default="0"),
+        sa.Column("voided_total", sa.Numeric(14, 2), nullable=False, server_default="0"),
+        sa.Column("first_payment_date", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_payment_date", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("ix_loan_archives_company_id", "loan_archives", ["company_id"])
+    op.create_index("ix_loan_archives_customer_id", "loan_archives", ["customer_id"])
+
+    op.create_table(
+        "archived_installments",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("loan_id", sa.Integer(), nullable=True),
+        sa.Column("purchase_id", sa.Integer(), nullable=True),
+        sa.Column("number", sa.Integer(), nullable=False),
+        sa.Column("due_date", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("amount", sa.Numeric(14, 2), nullable=False),
+        sa.Column("paid_amount", sa.Numeric(14, 2), nullable=True),
+        sa.Column("is_paid", sa.Boolean(), nullable=True),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("is_overdue", sa.Boolean(), nullable=True),
+        sa.Column("archived_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_archived_installments_loan_id", "archived_installments", ["loan_id"])
+
+    op.create_table(
+        "archived_payments",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("loan_id", sa.Integer(), nullable=True),
+        sa.Column("purchase_id", sa.Integer(), nullable=True),
+        sa.Column("amount", sa.Numeric(14, 2), nullable=False),
+        sa.Column("payment_date", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("is_voided", sa.Boolean(), nullable=True),
+        sa.Column("voided_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("void_reason", sa.String(), nullable=True),
+        sa.Column("voided_by_employee_id", sa.Integer(), nullable=True),
+        sa.Column("payment_type", sa.String(), nullable=True),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("collector_id", sa.Integer(), nullable=False),
+        sa.Column("archived_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_archived_payments_loan_id", "archived_payments", ["loan_id"])
+
+    op.create_table(
+        "archived_payment_allocations",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("payment_id", sa.Integer(), nullable=False),
+        sa.Column("installment_id", sa.Integer(), nullable=False),
+        sa.Column("amount_applied", sa.Numeric(14, 2), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("archived_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_archived_payment_allocations_payment_id", "archived_payment_allocations", ["payment_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_archived_payment_allocations_payment_id", table_name="archived_payment_allocations")
+    op.drop_table("archived_payment_allocations")
+    op.drop_index("ix_archived_payments_loan_id", table_name="archived_payments")
+    op.drop_table("archived_payments")
+    op.drop_index("ix_archived_installments_loan_id", table_name="archived_installments")
+    op.drop_table("archived_installments")
+    op.drop_index("ix_loan_archives_customer_id", table_name="loan_archives")
+    op.drop_index("ix_loan_archives_company_id", table_name="loan_archives")
+    op.drop_table("loan_archives")
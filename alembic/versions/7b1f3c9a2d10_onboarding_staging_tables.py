@@ -0,0 +1,101 @@
+"""onboarding staging tables (replace payload_json)
+
+Revision ID: 7b1f3c9a2d10
+Revises: e6c24eb714eb
+Create Date: 2026-03-04 10:21:07.512930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b1f3c9a2d10'
+down_revision: Union[str, None] = 'e6c24eb714eb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _session_fk() -> sa.Column:
+    return sa.Column(
+        "session_id",
+        postgresql.UUID(as_uuid=True),
+        sa.ForeignKey("onboarding_import_sessions.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+
+
+def upgrade() -> None:
+    op.create_table(
+        "onboarding_staging_customers",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        _session_fk(),
+        sa.Column("rownum", sa.Integer(), nullable=False),
+        sa.Column("customer_ref", sa.String(), nullable=True),
+        sa.Column("first_name", sa.String(), nullable=True),
+        sa.Column("last_name", sa.String(), nullable=True),
+        sa.Column("dni", sa.String(), nullable=True),
+        sa.Column("phone", sa.String(), nullable=True),
+        sa.Column("email", sa.String(), nullable=True),
+        sa.Column("address", sa.String(), nullable=True),
+        sa.Column("province", sa.String(), nullable=True),
+    )
+    op.create_index("ix_onb_stg_customers_session_row", "onboarding_staging_customers", ["session_id", "rownum"])
+
+    op.create_table(
+        "onboarding_staging_loans",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        _session_fk(),
+        sa.Column("rownum", sa.Integer(), nullable=False),
+        sa.Column("loan_ref", sa.String(), nullable=True),
+        sa.Column("customer_ref", sa.String(), nullable=True),
+        sa.Column("employee_email", sa.String(), nullable=True),
+        sa.Column("amount", sa.Float(), nullable=True),
+        sa.Column("total_due", sa.Float(), nullable=True),
+        sa.Column("installments_count", sa.Integer(), nullable=True),
+        sa.Column("installment_amount", sa.Float(), nullable=True),
+        sa.Column("installment_interval_days", sa.Integer(), nullable=True),
+        sa.Column("start_date", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("status", sa.String(), nullable=True),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("collection_day", sa.Integer(), nullable=True),
+    )
+    op.create_index("ix_onb_stg_loans_session_row", "onboarding_staging_loans", ["session_id", "rownum"])
+
+    op.create_table(
+        "onboarding_staging_payments",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        _session_fk(),
+        sa.Column("rownum", sa.Integer(), nullable=False),
+        sa.Column("payment_ref", sa.String(), nullable=True),
+        sa.Column("loan_ref", sa.String(), nullable=True),
+        sa.Column("amount", sa.Float(), nullable=True),
+        sa.Column("payment_date", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("payment_type", sa.String(), nullable=True),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("collector_email", sa.String(), nullable=True),
+    )
+    op.create_index(
+        "ix_onb_stg_payments_session_loan",
+        "onboarding_staging_payments",
+        ["session_id", "loan_ref", "rownum"],
+    )
+
+    op.drop_column("onboarding_import_sessions", "payload_json")
+
+
+def downgrade() -> None:
+    op.add_column(
+        "onboarding_import_sessions",
+        sa.Column("payload_json", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    )
+
+    op.drop_index("ix_onb_stg_payments_session_loan", table_name="onboarding_staging_payments")
+    op.drop_table("onboarding_staging_payments")
+    op.drop_index("ix_onb_stg_loans_session_row", table_name="onboarding_staging_loans")
+    op.drop_table("onboarding_staging_loans")
+    op.drop_index("ix_onb_stg_customers_session_row", table_name="onboarding_staging_customers")
+    op.drop_table("onboarding_staging_customers")
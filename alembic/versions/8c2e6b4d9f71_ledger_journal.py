@@ -0,0 +1,59 @@
+"""ledger journal: ledger_events (append-only) + ledger_snapshots
+
+Revision ID: 8c2e6b4d9f71
+Revises: 6a3d5f8b2c47
+Create Date: 2026-03-23 11:12:47.530219
+
+Las deudas existentes no tienen eventos: armarlos con
+`python -m app.cli.ledger_journal backfill`.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c2e6b4d9f71'
+down_revision: Union[str, None] = '6a3d5f8b2c47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+_JSON = sa.JSON().with_variant(postgresql.JSONB(), "postgresql")
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ledger_events",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("company_id", sa.Integer(), nullable=False),
+        sa.Column("debt_kind", sa.String(16), nullable=False),
+        sa.Column("debt_id", sa.Integer(), nullable=False),
+        sa.Column("seq", sa.Integer(), nullable=False),
+        sa.Column("event_type", sa.String(32), nullable=False),
+        sa.Column("occurred_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("recorded_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.Column("employee_id", sa.Integer(), nullable=True),
+        sa.Column("payload", _JSON, nullable=False),
+        sa.UniqueConstraint("debt_kind", "debt_id", "seq", name="ux_ledger_events_debt_seq"),
+    )
+    op.create_index("ix_ledger_events_company_recorded", "ledger_events", ["company_id", "recorded_at"])
+
+    op.create_table(
+        "ledger_snapshots",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("debt_kind", sa.String(16), nullable=False),
+        sa.Column("debt_id", sa.Integer(), nullable=False),
+        sa.Column("seq", sa.Integer(), nullable=False),
+        sa.Column("recorded_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.Column("state", _JSON, nullable=False),
+        sa.UniqueConstraint("debt_kind", "debt_id", "seq", name="ux_ledger_snapshots_debt_seq"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("ledger_snapshots")
+    op.drop_index("ix_ledger_events_company_recorded", table_name="ledger_events")
+    op.drop_table("ledger_events")
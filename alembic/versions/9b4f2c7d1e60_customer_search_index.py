@@ -0,0 +1,134 @@
+"""customer search: search_text / phone_norm / dni_norm + pg_trgm index
+
+Revision ID: 9b4f2c7d1e60
+Revises: 5d7a1e9c0b34
+Create Date: 2026-03-09 11:42:17.208114
+
+"""
+import re
+import unicodedata
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b4f2c7d1e60'
+down_revision: Union[str, None] = '5d7a1e9c0b34'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BACKFILL_CHUNK = 2000
+
+# copia congelada de la normalización de app/utils/search.py al momento de la migración
+_WS_RE = re.compile(r"\s+")
+_NON_DIGIT_RE = re.compile(r"\D")
+
+
+def _normalize_text(value) -> str:
+    if not value:
+        return ""
+    s = unicodedata.normalize("NFKD", str(value))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return _WS_RE.sub(" ", s).strip().lower()
+
+
+def _normalize_phone(phone):
+    if not phone:
+        return None
+    digits = _NON_DIGIT_RE.sub("", phone)
+    if digits.startswith("0"):
+        digits = digits[1:]
+    if digits.startswith("54") and len(digits) > 10:
+        digits = digits[2:]
+    return digits
+
+
+def _normalize_dni(dni):
+    if not dni:
+        return None
+    return _NON_DIGIT_RE.sub("", str(dni)) or None
+
+
+def _search_fields(
+    first_name=None, last_name=None, phone=None, dni=None, address=None, province=None, **_ignored
+) -> dict:
+    phone_norm = _normalize_phone(phone) or None
+    dni_norm = _normalize_dni(dni)
+    parts = [first_name, last_name, address, province, phone_norm, dni_norm]
+    return {
+        "search_text": _normalize_text(" ".join(p for p in parts if p)) or None,
+        "phone_norm": phone_norm,
+        "dni_norm": dni_norm,
+    }
+
+
+def _backfill(bind) -> None:
+    # misma normalización que el ORM (app/utils/search.py), por eso en Python
+    customers = sa.table(
+        "customers",
+        sa.column("id", sa.Integer),
+        sa.column("first_name", sa.String),
+        sa.column("last_name", sa.String),
+        sa.column("phone", sa.String),
+        sa.column("dni", sa.String),
+        sa.column("address", sa.String),
+        sa.column("province", sa.String),
+        sa.column("search_text", sa.String),
+        sa.column("phone_norm", sa.String),
+        sa.column("dni_norm", sa.String),
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(
+                customers.c.id,
+                customers.c.first_name,
+                customers.c.last_name,
+                customers.c.phone,
+                customers.c.dni,
+                customers.c.address,
+                customers.c.province,
+            )
+            .where(customers.c.id > last_id)
+            .order_by(customers.c.id)
+            .limit(BACKFILL_CHUNK)
+        ).mappings().all()
+        if not rows:
+            break
+        bind.execute(
+            customers.update().where(customers.c.id == sa.bindparam("_id")),
+            [{"_id": r["id"], **_search_fields(**r)} for r in rows],
+        )
+        last_id = rows[-1]["id"]
+
+
+def upgrade() -> None:
+    op.add_column('customers', sa.Column('search_text', sa.String(), nullable=True))
+    op.add_column('customers', sa.Column('phone_norm', sa.String(), nullable=True))
+    op.add_column('customers', sa.Column('dni_norm', sa.String(), nullable=True))
+
+    bind = op.get_bind()
+    _backfill(bind)
+
+    op.create_index('ix_customers_company_phone_norm', 'customers', ['company_id', 'phone_norm'])
+    op.create_index('ix_customers_company_dni_norm', 'customers', ['company_id', 'dni_norm'])
+
+    if bind.dialect.name == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_customers_search_trgm "
+            "ON customers USING gin (search_text gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_customers_search_trgm")
+    op.drop_index('ix_customers_company_dni_norm', table_name='customers')
+    op.drop_index('ix_customers_company_phone_norm', table_name='customers')
+    op.drop_column('customers', 'dni_norm')
+    op.drop_column('customers', 'phone_norm')
+    op.drop_column('customers', 'search_text')
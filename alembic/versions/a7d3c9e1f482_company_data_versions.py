@@ -0,0 +1,30 @@
+"""company_data_versions: versión de datos por empresa compartida entre workers
+
+Revision ID: a7d3c9e1f482
+Revises: 8c2e6b4d9f71
+Create Date: 2026-03-24 09:31:05.118342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3c9e1f482'
+down_revision: Union[str, None] = '8c2e6b4d9f71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "company_data_versions",
+        sa.Column("company_id", sa.Integer(), sa.ForeignKey("companies.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("version", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("company_data_versions")
@@ -0,0 +1,85 @@
+"""onboarding commit checkpoints (resumable commit by customer group)
+
+Revision ID: c3d82e5f41a7
+Revises: 7b1f3c9a2d10
+Create Date: 2026-03-05 09:47:31.204118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d82e5f41a7'
+down_revision: Union[str, None] = '7b1f3c9a2d10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("onboarding_import_sessions", sa.Column("commit_started_at", sa.DateTime(timezone=True), nullable=True))
+    op.add_column("onboarding_import_sessions", sa.Column("commit_finished_at", sa.DateTime(timezone=True), nullable=True))
+    op.add_column("onboarding_import_sessions", sa.Column("commit_error", sa.String(), nullable=True))
+
+    op.create_table(
+        "onboarding_commit_checkpoints",
+        sa.Column(
+            "session_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("onboarding_import_sessions.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("group_no", sa.Integer(), primary_key=True),
+        sa.Column("phase", sa.String(length=16), nullable=False, server_default="customers"),
+        sa.Column("last_rownum", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("customers_created", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("loans_created", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("installments_created", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("payments_created", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("payment_allocations_created", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+    )
+
+    # staging particionado por grupo de clientes + id creado (para reanudar)
+    for table in ("onboarding_staging_customers", "onboarding_staging_loans"):
+        op.add_column(table, sa.Column("group_no", sa.Integer(), nullable=False, server_default="0"))
+        op.add_column(table, sa.Column("created_id", sa.Integer(), nullable=True))
+
+    op.drop_index("ix_onb_stg_customers_session_row", table_name="onboarding_staging_customers")
+    op.create_index(
+        "ix_onb_stg_customers_session_group_row",
+        "onboarding_staging_customers",
+        ["session_id", "group_no", "rownum"],
+    )
+    op.create_index(
+        "ix_onb_stg_customers_session_ref",
+        "onboarding_staging_customers",
+        ["session_id", "customer_ref"],
+    )
+    op.drop_index("ix_onb_stg_loans_session_row", table_name="onboarding_staging_loans")
+    op.create_index(
+        "ix_onb_stg_loans_session_group_row",
+        "onboarding_staging_loans",
+        ["session_id", "group_no", "rownum"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_onb_stg_loans_session_group_row", table_name="onboarding_staging_loans")
+    op.create_index("ix_onb_stg_loans_session_row", "onboarding_staging_loans", ["session_id", "rownum"])
+    op.drop_index("ix_onb_stg_customers_session_ref", table_name="onboarding_staging_customers")
+    op.drop_index("ix_onb_stg_customers_session_group_row", table_name="onboarding_staging_customers")
+    op.create_index("ix_onb_stg_customers_session_row", "onboarding_staging_customers", ["session_id", "rownum"])
+
+    for table in ("onboarding_staging_loans", "onboarding_staging_customers"):
+        op.drop_column(table, "created_id")
+        op.drop_column(table, "group_no")
+
+    op.drop_table("onboarding_commit_checkpoints")
+
+    op.drop_column("onboarding_import_sessions", "commit_error")
+    op.drop_column("onboarding_import_sessions", "commit_finished_at")
+    op.drop_column("onboarding_import_sessions", "commit_started_at")
@@ -0,0 +1,27 @@
+"""archived_installments / archived_payments: índices por fecha para los agregados por período
+
+Revision ID: d4b81f0c6e2a
+Revises: a7d3c9e1f482
+Create Date: 2026-04-02 10:12:44.903127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4b81f0c6e2a'
+down_revision: Union[str, None] = 'a7d3c9e1f482'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_archived_installments_due_date", "archived_installments", ["due_date"])
+    op.create_index("ix_archived_payments_payment_date", "archived_payments", ["payment_date"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_archived_payments_payment_date", table_name="archived_payments")
+    op.drop_index("ix_archived_installments_due_date", table_name="archived_installments")
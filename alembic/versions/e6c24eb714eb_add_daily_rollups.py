@@ -0,0 +1,47 @@
+"""add daily_rollups
+
+Revision ID: e6c24eb714eb
+Revises: 4828dfc7fbf4
+Create Date: 2026-03-02 11:12:40.183512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6c24eb714eb'
+down_revision: Union[str, None] = '4828dfc7fbf4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "daily_rollups",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("company_id", sa.Integer(), sa.ForeignKey("companies.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("local_day", sa.Date(), nullable=False),
+        sa.Column("collector_id", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("collected_amount", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("collected_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("voided_amount", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("applied_to_due_amount", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("expected_amount", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("loans_issued_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("loans_issued_amount", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("loans_effective_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("loans_effective_amount", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.UniqueConstraint("company_id", "local_day", "collector_id", name="ux_daily_rollups_company_day_collector"),
+    )
+    op.create_index("ix_daily_rollups_id", "daily_rollups", ["id"])
+    op.create_index("ix_daily_rollups_company_day", "daily_rollups", ["company_id", "local_day"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_daily_rollups_company_day", table_name="daily_rollups")
+    op.drop_index("ix_daily_rollups_id", table_name="daily_rollups")
+    op.drop_table("daily_rollups")
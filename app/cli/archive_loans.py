@@ -0,0 +1,35 @@
+# app/cli/archive_loans.py
+# python -m app.cli.archive_loans [--months 12] [--company-id 3] [--batch-size 200] [--max-batches 10]
+import argparse
+
+from dotenv import load_dotenv  # opcional si usás .env
+load_dotenv()
+
+from app.database.db import SessionLocal
+from app.services.loan_archive import ARCHIVE_AFTER_MONTHS, ARCHIVE_BATCH, archive_closed_loans
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Archiva préstamos cerrados (cuotas, pagos e imputaciones)")
+    parser.add_argument("--months", type=int, default=ARCHIVE_AFTER_MONTHS, help="Cerrados hace más de N meses")
+    parser.add_argument("--company-id", type=int, default=None, help="Sólo esta empresa (default: todas)")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH)
+    parser.add_argument("--max-batches", type=int, default=None)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        n = archive_closed_loans(
+            db,
+            older_than_months=args.months,
+            batch_size=args.batch_size,
+            company_id=args.company_id,
+            max_batches=args.max_batches,
+        )
+        print(f"[archive_loans] archivados={n}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
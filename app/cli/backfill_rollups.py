@@ -0,0 +1,36 @@
+# app/cli/backfill_rollups.py
+# python -m app.cli.backfill_rollups [--company-id 3] [--from 2025-01-01] [--to 2025-12-31]
+import argparse
+from datetime import date
+
+from dotenv import load_dotenv  # opcional si usás .env
+load_dotenv()
+
+from app.database.db import SessionLocal
+from app.models.models import Company
+from app.services.daily_rollups import backfill_company
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reconstruye daily_rollups desde pagos/cuotas/préstamos")
+    parser.add_argument("--company-id", type=int, default=None, help="Sólo esta empresa (default: todas)")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, default=None, help="Día local inicial (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, default=None, help="Día local final (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        q = db.query(Company.id).order_by(Company.id)
+        if args.company_id is not None:
+            q = q.filter(Company.id == args.company_id)
+        company_ids = [r[0] for r in q.all()]
+
+        for cid in company_ids:
+            n = backfill_company(db, cid, args.date_from, args.date_to)
+            print(f"[backfill_rollups] company_id={cid} rows={n}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
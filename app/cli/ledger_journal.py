@@ -0,0 +1,59 @@
+# app/cli/ledger_journal.py
+# python -m app.cli.ledger_journal backfill [--kind loan|purchase] [--company-id 3]
+# python -m app.cli.ledger_journal verify   [--kind loan|purchase] [--company-id 3]
+# backfill: completa ledger_events de cada deuda con lo que falte (cronograma,
+#           pagos, anulaciones, cierre); una transacción por deuda, idempotente.
+# verify:   compara el diario contra paid_amount de las cuotas y lista diferencias.
+import argparse
+
+from dotenv import load_dotenv  # opcional si usás .env
+load_dotenv()
+
+from app.database.db import SessionLocal
+from app.models.models import LoanArchive
+from app.services.ledger_journal import backfill_debt, verify_debt
+from app.utils.ledger import DEBT_LOAN, DEBT_MODELS, DEBT_PURCHASE
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Diario del ledger (ledger_events)")
+    parser.add_argument("command", choices=["backfill", "verify"])
+    parser.add_argument("--kind", choices=[DEBT_LOAN, DEBT_PURCHASE], default=DEBT_LOAN)
+    parser.add_argument("--company-id", type=int, default=None, help="Sólo esta empresa (default: todas)")
+    args = parser.parse_args()
+
+    model = DEBT_MODELS[args.kind]
+    db = SessionLocal()
+    try:
+        q = db.query(model.id).order_by(model.id)
+        if args.company_id is not None:
+            q = q.filter(model.company_id == args.company_id)
+        if args.kind == DEBT_LOAN:
+            # los archivados ya no tienen cuotas/pagos en las tablas calientes
+            q = q.outerjoin(LoanArchive, LoanArchive.loan_id == model.id).filter(LoanArchive.loan_id.is_(None))
+        debt_ids = [r[0] for r in q.all()]
+
+        if args.command == "backfill":
+            debts = events = 0
+            for debt_id in debt_ids:
+                n = backfill_debt(db, args.kind, debt_id)
+                db.commit()
+                if n:
+                    debts += 1
+                    events += n
+            print(f"[ledger_journal] backfill kind={args.kind} debts={debts} events={events}")
+        else:
+            bad = 0
+            for debt_id in debt_ids:
+                problems = verify_debt(db, args.kind, debt_id)
+                if problems:
+                    bad += 1
+                    for p in problems:
+                        print(f"[ledger_journal] {args.kind} {debt_id}: {p}")
+            print(f"[ledger_journal] verify kind={args.kind} debts={len(debt_ids)} mismatched={bad}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+# app/cli/partitions.py
+# python -m app.cli.partitions ensure [--months-ahead 6]
+# python -m app.cli.partitions detach --table payments --before 2024-01-01
+import argparse
+from datetime import date
+
+from dotenv import load_dotenv  # opcional si usás .env
+load_dotenv()
+
+from app.database.db import engine
+from app.services.partitions import PARTITION_MONTHS_AHEAD, PARTITIONED_TABLES, detach_partitions_before, ensure_partitions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Particiones mensuales de payments / installments (Postgres)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_ensure = sub.add_parser("ensure", help="Crea las particiones que falten")
+    p_ensure.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD)
+
+    p_detach = sub.add_parser("detach", help="Saca de la tabla las particiones anteriores a --before")
+    p_detach.add_argument("--table", choices=sorted(PARTITIONED_TABLES), required=True)
+    p_detach.add_argument("--before", type=date.fromisoformat, required=True, help="Primer mes que se conserva (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        if args.cmd == "ensure":
+            names = ensure_partitions(conn, months_ahead=args.months_ahead)
+            print(f"[partitions] creadas={len(names)} {' '.join(names)}")
+        else:
+            names = detach_partitions_before(conn, args.table, args.before)
+            print(f"[partitions] desadjuntadas={len(names)} {' '.join(names)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# app/cli/recompute_ledgers.py
+# python -m app.cli.recompute_ledgers [--kind purchase|loan] [--company-id 3]
+# Reimputa pagos → cuotas + payment_allocations (replay completo por deuda).
+# Necesario una vez para las ventas cobradas antes de que tuvieran allocations;
+# después conviene correr app.cli.backfill_rollups para esas empresas.
+import argparse
+
+from dotenv import load_dotenv  # opcional si usás .env
+load_dotenv()
+
+from app.database.db import SessionLocal
+from app.utils.ledger import DEBT_LOAN, DEBT_MODELS, DEBT_PURCHASE, recompute_ledger
+from app.utils.status import update_status_if_fully_paid
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recalcula cuotas y payment_allocations de préstamos/ventas")
+    parser.add_argument("--kind", choices=[DEBT_PURCHASE, DEBT_LOAN], default=DEBT_PURCHASE)
+    parser.add_argument("--company-id", type=int, default=None, help="Sólo esta empresa (default: todas)")
+    args = parser.parse_args()
+
+    model = DEBT_MODELS[args.kind]
+    db = SessionLocal()
+    try:
+        q = db.query(model.id).order_by(model.id)
+        if args.company_id is not None:
+            q = q.filter(model.company_id == args.company_id)
+        debt_ids = [r[0] for r in q.all()]
+
+        for debt_id in debt_ids:
+            recompute_ledger(db, args.kind, debt_id)
+            # commitea (una transacción por deuda)
+            update_status_if_fully_paid(
+                db,
+                loan_id=debt_id if args.kind == DEBT_LOAN else None,
+                purchase_id=debt_id if args.kind == DEBT_PURCHASE else None,
+            )
+        print(f"[recompute_ledgers] kind={args.kind} debts={len(debt_ids)}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -14,8 +14,15 @@ if DATABASE_URL.startswith("postgres://"):
 # connect_args solo para SQLite
 connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
 
+# pool por proceso: con gunicorn son WEB_CONCURRENCY * (pool + overflow) conexiones
+pool_args = {} if DATABASE_URL.startswith("sqlite") else {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+}
+
 # 👇 pool_pre_ping ayuda en servidores free que “duermen”
-engine = create_engine(DATABASE_URL, connect_args=connect_args, pool_pre_ping=True)
+engine = create_engine(DATABASE_URL, connect_args=connect_args, pool_pre_ping=True, **pool_args)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -25,9 +32,15 @@ metadata = MetaData()
 # Importa modelos para registrar tablas
 from app.models import models  # noqa: E402,F401
 
-# En producción lo ideal es Alembic, pero si no lo usás, esto está bien:
-if os.getenv("ENV", "dev").lower() == "dev":
-    Base.metadata.create_all(bind=engine)
+
+def init_db() -> None:
+    """
+    Crea las tablas que falten (sólo ENV=dev; en producción manda Alembic).
+    Se llama al arrancar la app (lifespan), no al importar este módulo: importar
+    db.py no abre conexiones y el arranque en frío no paga el create_all.
+    """
+    if os.getenv("ENV", "dev").lower() == "dev":
+        Base.metadata.create_all(bind=engine)
 
 def get_db():
     db = SessionLocal()
@@ -0,0 +1,12 @@
+# app/jobs/archive.py
+from app.database.db import SessionLocal
+from app.services.loan_archive import archive_closed_loans
+
+
+def archive_closed_loans_job() -> int:
+    """Archiva préstamos cerrados viejos (scheduler, sólo el líder; LOAN_ARCHIVE_ENABLED=true)."""
+    db = SessionLocal()
+    try:
+        return archive_closed_loans(db)
+    finally:
+        db.close()
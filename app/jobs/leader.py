@@ -0,0 +1,146 @@
+# app/jobs/leader.py
+"""
+Elección de líder para los jobs programados (APScheduler) con varios workers.
+
+Con gunicorn + N workers uvicorn cada worker corre el lifespan y levanta su
+propio scheduler: sin coordinación el job diario corre N veces. Acá cada
+worker compite por un lease en la tabla `scheduler_leases` (funciona igual en
+Postgres y SQLite, y entre máquinas distintas, no sólo entre procesos):
+
+- `try_acquire()` es un UPDATE condicional atómico: toma el lease si está
+  vencido o ya es suyo (renovación). Si la fila no existe, la inserta; si otro
+  la insertó primero, pierde (IntegrityError).
+- Un job de heartbeat renueva cada SCHEDULER_LEASE_RENEW_SECONDS. Si el líder
+  muere, otro worker lo toma cuando vence el lease (SCHEDULER_LEASE_TTL_SECONDS).
+- `leader_only(job)` vuelve a renovar justo antes de correr: sólo corre si este
+  worker sigue siendo el líder.
+- Al apagar, `release()` vence el lease para que el relevo sea inmediato.
+
+El TTL tiene que ser bastante mayor que el intervalo de renovación (default
+60s / 20s) y que la diferencia de reloj entre máquinas.
+"""
+from __future__ import annotations
+
+import functools
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.database.db import SessionLocal
+from app.models.models import SchedulerLease
+
+logger = logging.getLogger("uvicorn.error")
+
+LEASE_NAME = os.getenv("SCHEDULER_LEASE_NAME", "scheduler")
+LEASE_TTL_SECONDS = int(os.getenv("SCHEDULER_LEASE_TTL_SECONDS", "60"))
+LEASE_RENEW_SECONDS = int(os.getenv("SCHEDULER_LEASE_RENEW_SECONDS", "20"))
+
+
+def _holder_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaderElector:
+    def __init__(
+        self,
+        name: str = LEASE_NAME,
+        ttl_seconds: int = LEASE_TTL_SECONDS,
+        session_factory: Optional[sessionmaker] = None,
+        holder: Optional[str] = None,
+    ):
+        self.name = name
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.session_factory = session_factory or SessionLocal
+        self.holder = holder or _holder_id()
+        self.is_leader = False
+
+    def _try_acquire(self, db: Session, now: datetime) -> bool:
+        expires = now + self.ttl
+        result = db.execute(
+            update(SchedulerLease)
+            .where(
+                SchedulerLease.name == self.name,
+                (SchedulerLease.holder == self.holder) | (SchedulerLease.expires_at < now),
+            )
+            .values(holder=self.holder, expires_at=expires)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            db.commit()
+            return True
+        db.rollback()
+
+        if db.get(SchedulerLease, self.name) is not None:
+            return False  # vigente y de otro worker
+        try:
+            db.execute(
+                insert(SchedulerLease).values(
+                    name=self.name, holder=self.holder, expires_at=expires, acquired_at=now,
+                )
+            )
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()
+            return False
+
+    def try_acquire(self, now: Optional[datetime] = None) -> bool:
+        """Toma o renueva el lease. Devuelve True si este worker es el líder."""
+        now = now or datetime.now(timezone.utc)
+        db = self.session_factory()
+        try:
+            leader = self._try_acquire(db, now)
+        except Exception:
+            # sin DB no hay forma de saber: mejor no correr jobs que correrlos dos veces
+            logger.exception("⚠️ No se pudo renovar el lease del scheduler (%s)", self.name)
+            leader = False
+        finally:
+            db.close()
+
+        if leader != self.is_leader:
+            logger.info(
+                "👑 Scheduler: %s el lease '%s' (%s)",
+                "tomó" if leader else "perdió", self.name, self.holder,
+            )
+        self.is_leader = leader
+        return leader
+
+    def heartbeat(self) -> None:
+        self.try_acquire()
+
+    def release(self) -> None:
+        """Vence el lease si es propio (al apagar), para que otro worker lo tome ya."""
+        db = self.session_factory()
+        try:
+            db.execute(
+                update(SchedulerLease)
+                .where(SchedulerLease.name == self.name, SchedulerLease.holder == self.holder)
+                .values(expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception("⚠️ No se pudo liberar el lease del scheduler (%s)", self.name)
+        finally:
+            db.close()
+            self.is_leader = False
+
+    def leader_only(self, job: Callable) -> Callable:
+        """Envuelve un job: corre sólo si este worker tiene (y renueva) el lease."""
+
+        @functools.wraps(job)
+        def wrapper(*args, **kwargs):
+            if not self.try_acquire():
+                logger.info("⏭️ Job %s omitido: otro worker es el líder", job.__name__)
+                return None
+            return job(*args, **kwargs)
+
+        return wrapper
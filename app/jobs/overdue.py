@@ -7,6 +7,7 @@ from sqlalchemy import func
 from app.constants import InstallmentStatus
 from app.database.db import SessionLocal
 from app.models.models import Installment
+from app.utils.response_cache import bump_all_company_versions
 
 LOCAL_TZ = ZoneInfo("America/Argentina/Tucuman")
 
@@ -35,6 +36,8 @@ def mark_overdue_installments(db: Session) -> int:
           )
     )
     db.commit()
+    if updated:
+        bump_all_company_versions()
     return int(updated or 0)
 
 
@@ -0,0 +1,19 @@
+# app/jobs/partitions.py
+import logging
+
+from app.database.db import engine
+from app.services.partitions import ensure_partitions
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def ensure_partitions_job() -> list[str]:
+    """
+    Crea las particiones mensuales que falten de payments / installments.
+    Lo corre el scheduler (sólo el líder) todos los días; es idempotente.
+    """
+    with engine.begin() as conn:
+        created = ensure_partitions(conn)
+    if created:
+        logger.info("🗂️ Particiones creadas: %s", ", ".join(created))
+    return created
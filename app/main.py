@@ -12,6 +12,8 @@ from app.routes import admin_license, customers, employees, loans, installments,
 from app.routes.dashboard import router as dashboard_router
 from app.utils.auth import router as auth_router  # Router de autenticación
 from app.api.debug import router as debug_router  # Router con endpoints de debug (solo para dev/testing)
+from app.utils.compression import CompressionMiddleware
+from app.utils.conditional_get import ETagMiddleware
 
 # -----------------------------------------------------------------------------
 # Logging base
@@ -27,23 +29,59 @@ async def lifespan(app: FastAPI):
     """
     Maneja inicio y cierre de la app. Si ENABLE_SCHEDULER=true,
     inicia APScheduler al levantar y lo detiene al apagar.
+
+    Con varios workers (gunicorn.conf.py) cada uno levanta su scheduler, pero
+    los jobs corren sólo en el que tiene el lease (app/jobs/leader.py).
     """
     scheduler = None
+    elector = None
+
+    # hilos para endpoints sync (por worker); 0 = default de anyio (40)
+    threadpool_size = int(os.getenv("THREADPOOL_SIZE", "0"))
+    if threadpool_size > 0:
+        import anyio.to_thread
+        anyio.to_thread.current_default_thread_limiter().total_tokens = threadpool_size
+
+    # esquema en dev (antes corría al importar app/database/db.py)
+    from app.database.db import init_db
+    init_db()
+
+    # ranking de búsqueda: avisa (y cachea) si el Postgres no tiene pg_trgm
+    try:
+        from app.database.db import engine
+        from app.utils.search import trigram_available
+        trigram_available(engine)
+    except Exception as e:
+        logger.exception("⚠️ No se pudo verificar pg_trgm: %s", e)
 
     if os.getenv("ENABLE_SCHEDULER", "false").lower() == "true":
         try:
             from apscheduler.schedulers.asyncio import AsyncIOScheduler
             from apscheduler.triggers.cron import CronTrigger
             from zoneinfo import ZoneInfo
+            from app.jobs.leader import LEASE_RENEW_SECONDS, LeaderElector
             from app.jobs.overdue import mark_overdue_installments_job
+            from app.jobs.partitions import ensure_partitions_job
 
             tz = ZoneInfo("America/Argentina/Tucuman")
             hour = int(os.getenv("SCHED_HOUR", "2"))
             minute = int(os.getenv("SCHED_MINUTE", "0"))
 
+            elector = LeaderElector()
+            elector.try_acquire()
+
             scheduler = AsyncIOScheduler(timezone=tz)
             scheduler.add_job(
-                mark_overdue_installments_job,
+                elector.heartbeat,
+                "interval",
+                seconds=LEASE_RENEW_SECONDS,
+                id="scheduler-lease-heartbeat",
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True,
+            )
+            scheduler.add_job(
+                elector.leader_only(mark_overdue_installments_job),
                 CronTrigger(hour=hour, minute=minute, timezone=tz),
                 id="mark-overdue-daily",
                 replace_existing=True,
@@ -51,8 +89,32 @@ async def lifespan(app: FastAPI):
                 coalesce=True,       # si se salteó por caída, ejecuta una sola
                 misfire_grace_time=3600,  # tolera hasta 1h de “missed run”
             )
+            # particiones mensuales de payments/installments (no-op si no están particionadas)
+            scheduler.add_job(
+                elector.leader_only(ensure_partitions_job),
+                CronTrigger(hour=int(os.getenv("PARTITIONS_SCHED_HOUR", "3")), minute=30, timezone=tz),
+                id="ensure-partitions-daily",
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True,
+                misfire_grace_time=6 * 3600,
+            )
+            if os.getenv("LOAN_ARCHIVE_ENABLED", "false").lower() == "true":
+                from app.jobs.archive import archive_closed_loans_job
+                scheduler.add_job(
+                    elector.leader_only(archive_closed_loans_job),
+                    CronTrigger(day_of_week="sun", hour=4, minute=0, timezone=tz),
+                    id="archive-closed-loans-weekly",
+                    replace_existing=True,
+                    max_instances=1,
+                    coalesce=True,
+                    misfire_grace_time=6 * 3600,
+                )
             scheduler.start()
-            logger.info("✅ Scheduler iniciado: %02d:%02d TZ=%s", hour, minute, tz.key)
+            logger.info(
+                "✅ Scheduler iniciado: %02d:%02d TZ=%s (líder=%s)",
+                hour, minute, tz.key, elector.is_leader,
+            )
         except Exception as e:
             logger.exception("❌ Error iniciando scheduler: %s", e)
 
@@ -66,6 +128,8 @@ async def lifespan(app: FastAPI):
                 logger.info("🛑 Scheduler detenido correctamente")
             except Exception as e:
                 logger.exception("⚠️ Error al detener scheduler: %s", e)
+        if elector:
+            elector.release()
 
 # -----------------------------------------------------------------------------
 # App
@@ -114,6 +178,14 @@ app.add_middleware(
     max_age=600,  # cachea el preflight 10 min
 )
 
+# -----------------------------------------------------------------------------
+# ETag de listados + compresión (gzip/brotli)
+# -----------------------------------------------------------------------------
+# El orden importa: la compresión queda por fuera para ver el ETag y agregarle
+# el encoding ("abc" → "abc-gzip").
+app.add_middleware(ETagMiddleware)
+app.add_middleware(CompressionMiddleware)
+
 # -----------------------------------------------------------------------------
 # Handlers y health
 # -----------------------------------------------------------------------------
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Index, Integer, String, Float, ForeignKey, DateTime, Boolean, text
+from sqlalchemy import BigInteger, Column, Date, Index, Integer, String, ForeignKey, DateTime, Boolean, JSON, event, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database.db import Base
@@ -9,6 +9,8 @@ from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 
 from app.constants import InstallmentStatus, LoanStatus
+from app.utils.money import Money
+from app.utils.search import customer_search_fields
 
 class Customer(Base):
     __tablename__ = "customers"
@@ -26,6 +28,11 @@ class Customer(Base):
     address = Column(String, nullable=True)
     province = Column(String, nullable=True)
 
+    # 🔎 búsqueda: desnormalizado, lo mantienen los eventos de abajo (ver app/utils/search.py)
+    search_text = Column(String, nullable=True)
+    phone_norm = Column(String, nullable=True)
+    dni_norm = Column(String, nullable=True)
+
     created_at = Column(
         DateTime(timezone=True),
         default=lambda: datetime.now(timezone.utc),
@@ -54,8 +61,25 @@ class Customer(Base):
         Index('ux_customers_employee_dni', 'employee_id', 'dni', unique=True),
         Index('ux_customers_employee_phone', 'employee_id', 'phone', unique=True),
         Index('ux_customers_employee_email', 'employee_id', 'email', unique=True),
+        Index('ix_customers_company_phone_norm', 'company_id', 'phone_norm'),
+        Index('ix_customers_company_dni_norm', 'company_id', 'dni_norm'),
+        # + GIN pg_trgm sobre search_text (sólo Postgres, en la migración)
     )
 
+
+@event.listens_for(Customer, "before_insert")
+@event.listens_for(Customer, "before_update")
+def _customer_search_fields(mapper, connection, target: Customer) -> None:
+    for key, value in customer_search_fields(
+        first_name=target.first_name,
+        last_name=target.last_name,
+        phone=target.phone,
+        dni=target.dni,
+        address=target.address,
+        province=target.province,
+    ).items():
+        setattr(target, key, value)
+
    
 
 class Employee(Base):
@@ -97,10 +121,10 @@ class Loan(Base):
     company_id = Column(Integer, ForeignKey('companies.id'))
     employee_id = Column(Integer, ForeignKey("employees.id"), nullable=True, index=True)
 
-    amount = Column(Float, nullable=False)
-    total_due = Column(Float, nullable=False)  # Amount + interest
+    amount = Column(Money, nullable=False)
+    total_due = Column(Money, nullable=False)  # Amount + interest
     installments_count = Column(Integer, nullable=False)
-    installment_amount = Column(Float, nullable=False)
+    installment_amount = Column(Money, nullable=False)
     frequency = Column(String, nullable=True)  # "weekly" or "monthly"
     installment_interval_days = Column(Integer, nullable=True)  # nuevo: ej 1, 7, 15, 28
     start_date = Column(
@@ -158,13 +182,13 @@ class Purchase(Base):
     employee_id = Column(Integer, ForeignKey("employees.id"), nullable=True, index=True)
 
     # Monto base de la venta (equivalente a Loan.amount)
-    amount = Column(Float, nullable=False)
+    amount = Column(Money, nullable=False)
 
     # Total a pagar (puede ser = amount si no hay recargo/financiación)
-    total_due = Column(Float, nullable=False)
+    total_due = Column(Money, nullable=False)
 
     installments_count  = Column(Integer, nullable=False)
-    installment_amount  = Column(Float, nullable=False)
+    installment_amount  = Column(Money, nullable=False)
     frequency           = Column(String, nullable=True)  # "weekly" | "monthly"
     installment_interval_days = Column(Integer, nullable=True)  # nuevo
 
@@ -204,7 +228,7 @@ class Payment(Base):
     id = Column(Integer, primary_key=True, index=True)
     loan_id = Column(Integer, ForeignKey("loans.id"), nullable=True)
     purchase_id = Column(Integer, ForeignKey("purchases.id"), nullable=True)
-    amount = Column(Float, nullable=False)
+    amount = Column(Money, nullable=False)
     payment_date = Column(
         DateTime(timezone=True),
         default=lambda: datetime.now(timezone.utc),
@@ -237,8 +261,8 @@ class Installment(Base):
 
     number = Column(Integer, nullable=False)  # Cuota 1, 2, 3...
     due_date = Column(DateTime(timezone=True), nullable=False)
-    amount = Column(Float, nullable=False)
-    paid_amount = Column(Float, default=0)
+    amount = Column(Money, nullable=False)
+    paid_amount = Column(Money, default=0)
     is_paid = Column(Boolean, default=False)
     # campo status (agregá/ajustá el default)
     status = Column(String, nullable=False, default=InstallmentStatus.PENDING.value)
@@ -302,7 +326,9 @@ class PaymentAllocation(Base):
 
     id = Column(Integer, primary_key=True, index=True)
 
-    # vínculo al pago y a la cuota
+    # vínculo al pago y a la cuota. En Postgres payments/installments están
+    # particionadas (migración 4e1b7c9a0f25): las FKs quedan sólo en el ORM y el
+    # borrado en cascada lo hacen triggers.
     payment_id = Column(
         Integer,
         ForeignKey("payments.id", ondelete="CASCADE"),
@@ -317,7 +343,7 @@ class PaymentAllocation(Base):
     )
 
     # monto de este pago aplicado a ESA cuota
-    amount_applied = Column(Float, nullable=False)
+    amount_applied = Column(Money, nullable=False)
 
     created_at = Column(
         DateTime(timezone=True),
@@ -348,10 +374,305 @@ class OnboardingImportSession(Base):
     original_filename = Column(String(255), nullable=True)
     status = Column(String(32), nullable=False, default="validated")
 
-    payload_json = Column(JSONB, nullable=False)   # rows normalizados (customers/loans/payments)
+    # rows normalizados => tablas onboarding_staging_* (ver abajo)
     summary_json = Column(JSONB, nullable=False)
     errors_json = Column(JSONB, nullable=False)
     warnings_json = Column(JSONB, nullable=False)
 
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
     expires_at = Column(DateTime(timezone=True), nullable=False)
+
+    # commit por fases/chunks (status: validated -> committing -> committed | failed)
+    commit_started_at = Column(DateTime(timezone=True), nullable=True)
+    commit_finished_at = Column(DateTime(timezone=True), nullable=True)
+    commit_error = Column(String, nullable=True)
+
+    checkpoints = relationship(
+        "OnboardingCommitCheckpoint",
+        cascade="all, delete-orphan",
+        order_by="OnboardingCommitCheckpoint.group_no",
+    )
+
+
+class OnboardingCommitCheckpoint(Base):
+    """
+    Progreso del commit por grupo de clientes (group_no = crc32(customer_ref) % N).
+    Cada chunk se commitea junto con su checkpoint => /resume sigue desde acá.
+    phase: customers -> loans -> payments -> balances -> done
+    """
+    __tablename__ = "onboarding_commit_checkpoints"
+
+    session_id = Column(UUID(as_uuid=True), ForeignKey("onboarding_import_sessions.id", ondelete="CASCADE"), primary_key=True)
+    group_no = Column(Integer, primary_key=True)
+
+    phase = Column(String(16), nullable=False, default="customers")
+    last_rownum = Column(Integer, nullable=False, default=0)
+
+    customers_created = Column(Integer, nullable=False, default=0)
+    loans_created = Column(Integer, nullable=False, default=0)
+    installments_created = Column(Integer, nullable=False, default=0)
+    payments_created = Column(Integer, nullable=False, default=0)
+    payment_allocations_created = Column(Integer, nullable=False, default=0)
+
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+# -----------------------------
+# Staging del onboarding: una fila por fila del Excel ya normalizada.
+# Reemplaza al payload_json (un único JSONB con todo el archivo) para poder
+# validar en streaming y commitear por chunks sin cargar todo en memoria.
+# -----------------------------
+class OnboardingStagingCustomer(Base):
+    __tablename__ = "onboarding_staging_customers"
+    __table_args__ = (
+        Index("ix_onb_stg_customers_session_group_row", "session_id", "group_no", "rownum"),
+        Index("ix_onb_stg_customers_session_ref", "session_id", "customer_ref"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    session_id = Column(UUID(as_uuid=True), ForeignKey("onboarding_import_sessions.id", ondelete="CASCADE"), nullable=False)
+    rownum = Column(Integer, nullable=False)
+    group_no = Column(Integer, nullable=False, default=0)
+    created_id = Column(Integer, nullable=True)  # customers.id una vez commiteado
+
+    customer_ref = Column(String, nullable=True)
+    first_name = Column(String, nullable=True)
+    last_name = Column(String, nullable=True)
+    dni = Column(String, nullable=True)
+    phone = Column(String, nullable=True)
+    email = Column(String, nullable=True)
+    address = Column(String, nullable=True)
+    province = Column(String, nullable=True)
+
+
+class OnboardingStagingLoan(Base):
+    __tablename__ = "onboarding_staging_loans"
+    __table_args__ = (
+        Index("ix_onb_stg_loans_session_group_row", "session_id", "group_no", "rownum"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    session_id = Column(UUID(as_uuid=True), ForeignKey("onboarding_import_sessions.id", ondelete="CASCADE"), nullable=False)
+    rownum = Column(Integer, nullable=False)
+    group_no = Column(Integer, nullable=False, default=0)
+    created_id = Column(Integer, nullable=True)  # loans.id una vez commiteado
+
+    loan_ref = Column(String, nullable=True)
+    customer_ref = Column(String, nullable=True)
+    employee_email = Column(String, nullable=True)
+    amount = Column(Money, nullable=True)
+    total_due = Column(Money, nullable=True)
+    installments_count = Column(Integer, nullable=True)
+    installment_amount = Column(Money, nullable=True)
+    installment_interval_days = Column(Integer, nullable=True)
+    start_date = Column(DateTime(timezone=True), nullable=True)
+    status = Column(String, nullable=True)
+    description = Column(String, nullable=True)
+    collection_day = Column(Integer, nullable=True)
+
+
+class OnboardingStagingPayment(Base):
+    __tablename__ = "onboarding_staging_payments"
+    __table_args__ = (
+        Index("ix_onb_stg_payments_session_loan", "session_id", "loan_ref", "rownum"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    session_id = Column(UUID(as_uuid=True), ForeignKey("onboarding_import_sessions.id", ondelete="CASCADE"), nullable=False)
+    rownum = Column(Integer, nullable=False)
+
+    payment_ref = Column(String, nullable=True)
+    loan_ref = Column(String, nullable=True)
+    amount = Column(Money, nullable=True)
+    payment_date = Column(DateTime(timezone=True), nullable=True)
+    payment_type = Column(String, nullable=True)
+    description = Column(String, nullable=True)
+    collector_email = Column(String, nullable=True)
+
+
+class DailyRollup(Base):
+    """
+    Agregados diarios por (empresa, día local, cobrador). Se mantienen en cada
+    escritura (ver app/services/daily_rollups.py) y se pueden reconstruir con
+    `python -m app.cli.backfill_rollups`.
+
+    collector_id = 0 => "Sin asignar".
+    """
+    __tablename__ = "daily_rollups"
+    __table_args__ = (
+        UniqueConstraint("company_id", "local_day", "collector_id", name="ux_daily_rollups_company_day_collector"),
+        Index("ix_daily_rollups_company_day", "company_id", "local_day"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    company_id = Column(Integer, ForeignKey("companies.id", ondelete="CASCADE"), nullable=False)
+    local_day = Column(Date, nullable=False)
+    collector_id = Column(Integer, nullable=False, default=0)
+
+    # Pagos (por payment_date, Payment.collector_id)
+    collected_amount = Column(Money, nullable=False, default=0.0)
+    collected_count = Column(Integer, nullable=False, default=0)
+    voided_amount = Column(Money, nullable=False, default=0.0)
+    # Imputado por los pagos del día a cuotas ya vencidas (due_date <= ese día)
+    applied_to_due_amount = Column(Money, nullable=False, default=0.0)
+
+    # Cuotas (por due_date, cobrador asignado al préstamo/compra)
+    expected_amount = Column(Money, nullable=False, default=0.0)
+
+    # Otorgamientos (por start_date, Loan.employee_id)
+    loans_issued_count = Column(Integer, nullable=False, default=0)
+    loans_issued_amount = Column(Money, nullable=False, default=0.0)
+    # idem, sólo préstamos efectivos (ni cancelados ni refinanciados) => /loans/summary
+    loans_effective_count = Column(Integer, nullable=False, default=0)
+    loans_effective_amount = Column(Money, nullable=False, default=0.0)
+
+    updated_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+
+# app/models/scheduler_lease.py
+class SchedulerLease(Base):
+    """
+    Lease del líder de los jobs programados (uno por nombre). Con varios workers
+    (gunicorn) todos levantan el scheduler, pero sólo el que tiene el lease
+    vigente corre los jobs. Ver app/jobs/leader.py.
+    """
+    __tablename__ = "scheduler_leases"
+
+    name = Column(String(64), primary_key=True)
+    holder = Column(String(128), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    acquired_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+
+
+class CompanyDataVersion(Base):
+    """
+    Versión de datos por empresa (ETags y cache de summaries/listados). Se
+    incrementa después de cada escritura; todos los workers leen la misma fila.
+    Ver app/utils/response_cache.py.
+    """
+    __tablename__ = "company_data_versions"
+
+    company_id = Column(Integer, ForeignKey("companies.id", ondelete="CASCADE"), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+
+# app/models/loan_archive.py
+class LoanArchive(Base):
+    """
+    Préstamo cerrado archivado (app/services/loan_archive.py). La fila de
+    `loans` queda como stub (listados, refinanciaciones, rollups); sus cuotas,
+    pagos e imputaciones se mudan a las tablas archived_* y acá quedan los totales.
+    """
+    __tablename__ = "loan_archives"
+
+    loan_id = Column(Integer, ForeignKey("loans.id", ondelete="CASCADE"), primary_key=True)
+    company_id = Column(Integer, nullable=False, index=True)
+    customer_id = Column(Integer, nullable=True, index=True)
+    status = Column(String, nullable=True)
+    closed_at = Column(DateTime(timezone=True), nullable=True)
+    archived_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    installments_count = Column(Integer, nullable=False, default=0)
+    payments_count = Column(Integer, nullable=False, default=0)
+    allocations_count = Column(Integer, nullable=False, default=0)
+    paid_total = Column(Money, nullable=False, default=0.0)      # pagos no anulados
+    voided_total = Column(Money, nullable=False, default=0.0)
+    first_payment_date = Column(DateTime(timezone=True), nullable=True)
+    last_payment_date = Column(DateTime(timezone=True), nullable=True)
+
+
+# Copias 1:1 de installments / payments / payment_allocations (mismos ids y
+# columnas, sin FKs) + archived_at. Se leen con include_archived=true y desde
+# los agregados por período (loan_archive.payment_history() / installment_history()).
+class ArchivedInstallment(Base):
+    __tablename__ = "archived_installments"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    loan_id = Column(Integer, nullable=True, index=True)
+    purchase_id = Column(Integer, nullable=True)
+    number = Column(Integer, nullable=False)
+    due_date = Column(DateTime(timezone=True), nullable=False, index=True)
+    amount = Column(Money, nullable=False)
+    paid_amount = Column(Money, default=0)
+    is_paid = Column(Boolean, default=False)
+    status = Column(String, nullable=False)
+    is_overdue = Column(Boolean, default=False)
+    archived_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class ArchivedPayment(Base):
+    __tablename__ = "archived_payments"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    loan_id = Column(Integer, nullable=True, index=True)
+    purchase_id = Column(Integer, nullable=True)
+    amount = Column(Money, nullable=False)
+    payment_date = Column(DateTime(timezone=True), nullable=False, index=True)
+    is_voided = Column(Boolean, default=False)
+    voided_at = Column(DateTime(timezone=True), nullable=True)
+    void_reason = Column(String, nullable=True)
+    voided_by_employee_id = Column(Integer, nullable=True)
+    payment_type = Column(String, nullable=True)
+    description = Column(String, nullable=True)
+    collector_id = Column(Integer, nullable=False)
+    archived_at = Column(DateTime(timezone=True), nullable=False)
+
+    collector = relationship("Employee", primaryjoin="foreign(ArchivedPayment.collector_id) == Employee.id", viewonly=True)
+
+
+class ArchivedPaymentAllocation(Base):
+    __tablename__ = "archived_payment_allocations"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    payment_id = Column(Integer, nullable=False, index=True)
+    installment_id = Column(Integer, nullable=False)
+    amount_applied = Column(Money, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    archived_at = Column(DateTime(timezone=True), nullable=False)
+
+
+_JournalJSON = JSON().with_variant(JSONB(), "postgresql")
+
+
+class LedgerEvent(Base):
+    """
+    Diario append-only del ledger de cada deuda (préstamo / venta). Nunca se
+    actualiza ni se borra: una anulación es un evento nuevo. Ver
+    app/services/ledger_journal.py.
+    """
+    __tablename__ = "ledger_events"
+    __table_args__ = (
+        UniqueConstraint("debt_kind", "debt_id", "seq", name="ux_ledger_events_debt_seq"),
+        Index("ix_ledger_events_company_recorded", "company_id", "recorded_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    company_id = Column(Integer, nullable=False)
+    debt_kind = Column(String(16), nullable=False)      # "loan" | "purchase"
+    debt_id = Column(Integer, nullable=False)
+    seq = Column(Integer, nullable=False)               # 1, 2, 3... por deuda
+    event_type = Column(String(32), nullable=False)
+    occurred_at = Column(DateTime(timezone=True), nullable=False)   # fecha de negocio (ej. payment_date)
+    recorded_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+    employee_id = Column(Integer, nullable=True)
+    payload = Column(_JournalJSON, nullable=False, default=dict)
+
+
+class LedgerSnapshot(Base):
+    """Estado plegado de una deuda hasta `seq` (cada LEDGER_SNAPSHOT_EVERY eventos)."""
+    __tablename__ = "ledger_snapshots"
+    __table_args__ = (
+        UniqueConstraint("debt_kind", "debt_id", "seq", name="ux_ledger_snapshots_debt_seq"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    debt_kind = Column(String(16), nullable=False)
+    debt_id = Column(Integer, nullable=False)
+    seq = Column(Integer, nullable=False)
+    recorded_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+    state = Column(_JournalJSON, nullable=False)
@@ -1,5 +1,4 @@
 from datetime import datetime
-import re
 from typing import List, Optional
 from zoneinfo import ZoneInfo
 
@@ -12,13 +11,20 @@ from app.database.db import SessionLocal
 from app.models.models import Customer, Employee, Installment, Loan
 from app.routes.installments import _assert_customer_scoped
 from app.routes.loans import loan_is_effective_for_loans
-from app.schemas.customers import CustomerCreate, CustomerDashboardOut, CustomerLoanRowOut, CustomerLoansOut, CustomerUpdate, CustomerOut
+from app.schemas.customers import CustomerCreate, CustomerDashboardOut, CustomerLoanRowOut, CustomerLoansOut, CustomerSearchHit, CustomerUpdate, CustomerOut
+from app.services.customer_typeahead import invalidate_customer_index, search_customers
 from app.utils.auth import get_current_user
+from app.utils.batch import batch_ids, in_request_order, row_dicts
+from app.utils.conditional_get import conditional_list
 from app.utils.license import ensure_company_active
+from app.utils.admission import admission_control
+from app.utils.money import Money
+from app.utils.response_cache import bump_company_version
+from app.utils.search import SearchQuery, match_clause, normalize_phone, rank_expr, trigram_available
 from app.utils.time_windows import AR_TZ, local_dates_to_utc_window
 
 router = APIRouter(
-    dependencies=[Depends(get_current_user), Depends(ensure_company_active)],
+    dependencies=[Depends(get_current_user), Depends(ensure_company_active), Depends(admission_control)],
 )
 
 # --- DB session helper ---
@@ -30,16 +36,6 @@ def get_db():
         db.close()
 
 # --- Utils ---
-def normalize_phone(phone: str | None) -> str | None:
-    if not phone:
-        return None
-    digits = re.sub(r"\D", "", phone)
-    if digits.startswith("0"):
-        digits = digits[1:]
-    if digits.startswith("54") and len(digits) > 10:
-        digits = digits[2:]
-    return digits
-
 def _404():
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Recurso no encontrado")
 
@@ -125,11 +121,13 @@ def create_customer(
             raise HTTPException(status_code=409, detail="Email ya registrado.")
 
         raise HTTPException(status_code=409, detail="Ya existe un cliente con DNI/teléfono/email para este empleado.")
+    bump_company_version(current.company_id)
+    invalidate_customer_index(current.company_id)
     db.refresh(obj)
     return obj
 
 
-@router.get("/", response_model=List[CustomerOut])
+@router.get("/", response_model=List[CustomerOut], dependencies=[Depends(conditional_list)])
 def list_company_customers(
     created_from: Optional[str] = Query(None),
     created_to: Optional[str] = Query(None),
@@ -145,7 +143,7 @@ def list_company_customers(
     Filtros opcionales:
     - created_from / created_to (YYYY-MM-DD) sobre Customer.created_at (ventana local -> UTC)
     - employee_id (owner/cobrador)
-    - q: busca por nombre, apellido, DNI o teléfono (normalizado)
+    - q: busca por nombre, apellido, DNI, teléfono, dirección o provincia (normalizado, con ranking)
     """
     zone = ZoneInfo(tz) if tz else AR_TZ
 
@@ -166,25 +164,67 @@ def list_company_customers(
                .filter(Customer.created_at < end_utc_excl)
         )
 
-    if q:
-        qn = re.sub(r"\s+", " ", q).strip()
-        phone_norm = normalize_phone(qn)
-        like = f"%{qn.lower()}%"
+    search = SearchQuery(q)
+    if search:
+        # 🔎 índice de búsqueda (trigramas) + ranking: exacto > prefijo > similitud
+        qry = qry.filter(match_clause(search, Customer))
+        return qry.order_by(
+            rank_expr(search, Customer, trigram=trigram_available(db.get_bind())).desc(),
+            Customer.last_name.asc(),
+            Customer.first_name.asc(),
+        ).all()
 
-        ors = [
-            func.lower(Customer.first_name).like(like),
-            func.lower(Customer.last_name).like(like),
-        ]
-        if qn.isdigit():
-            ors.append(Customer.dni == qn)
-        if phone_norm:
-            ors.append(Customer.phone == phone_norm)
+    return qry.order_by(Customer.last_name.asc(), Customer.first_name.asc()).all()
 
-        qry = qry.filter(or_(*ors))
 
-    return qry.order_by(Customer.last_name.asc(), Customer.first_name.asc()).all()
+# ===========================
+#     TYPE-AHEAD (índice)
+# ===========================
+@router.get("/search", response_model=List[CustomerSearchHit])
+def typeahead_customers(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db),
+    current: Employee = Depends(get_current_user),
+):
+    """
+    Autocompletado: top-N clientes cuyo nombre/apellido/provincia/teléfono/DNI
+    empieza con cada palabra de `q`. Sale del índice en memoria de la empresa
+    (no consulta la base en cada tecla); para la búsqueda completa usar GET /.
+    """
+    return search_customers(db, current.company_id, q, limit)
 
 
+# ===========================
+#     BATCH (getMany)
+# ===========================
+@router.get("/batch", response_model=List[CustomerOut])
+def get_customers_batch(
+    ids: List[int] = Depends(batch_ids),
+    db: Session = Depends(get_db),
+    current: Employee = Depends(get_current_user),
+):
+    """Varios clientes por id en una sola consulta (sólo las columnas de CustomerOut)."""
+    rows = (
+        db.query(
+            Customer.id,
+            Customer.first_name,
+            Customer.last_name,
+            Customer.dni,
+            Customer.address,
+            Customer.phone,
+            Customer.email,
+            Customer.province,
+            Customer.employee_id,
+            Customer.company_id,
+            Customer.created_at,
+        )
+        .filter(Customer.company_id == current.company_id)
+        .filter(Customer.id.in_(ids))
+        .all()
+    )
+    return in_request_order(row_dicts(rows), ids)
+
 
 @router.get("/{customer_id}/dashboard", response_model=CustomerDashboardOut)
 def customer_dashboard(
@@ -240,6 +280,7 @@ def customer_dashboard(
     inst_balance = func.greatest(
         func.coalesce(Installment.amount, 0.0) - func.coalesce(Installment.paid_amount, 0.0),
         0.0,
+        type_=Money(),
     )
 
     overdue_q = (
@@ -367,6 +408,9 @@ def update_customer(
 
     db.add(obj)
     db.commit()
+    # provincia / cobrador del cliente filtran los resúmenes
+    bump_company_version(current.company_id)
+    invalidate_customer_index(current.company_id)
     db.refresh(obj)
     return obj
 
@@ -458,6 +502,7 @@ def customer_loans(
     inst_balance = func.greatest(
         func.coalesce(Installment.amount, 0.0) - func.coalesce(Installment.paid_amount, 0.0),
         0.0,
+        type_=Money(),
     )
 
     inst_base = (
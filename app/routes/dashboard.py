@@ -6,7 +6,7 @@ from datetime import date, datetime, timedelta, timezone
 from typing import Optional
 from zoneinfo import ZoneInfo
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request, Response
 from sqlalchemy import func, or_
 from sqlalchemy.orm import Session, aliased
 
@@ -17,7 +17,6 @@ from app.models.models import (
     Installment,
     Loan,
     Payment,
-    PaymentAllocation,
     Purchase,
 )
 from app.schemas.dashboard import (
@@ -31,9 +30,15 @@ from app.schemas.dashboard import (
     DashboardSummaryResponse,
     DashboardCashflowCollector,
     DashboardCashflowPoint,
+    PortfolioAsOfResponse,
 )
 from app.utils.auth import ensure_admin, get_current_user
 from app.utils.license import ensure_company_active
+from app.utils.admission import admission_control, heavy_route
+from app.services.daily_rollups import rollup_query, rollups_usable
+from app.services.loan_archive import allocation_history, installment_history, payment_history
+from app.services.portfolio import portfolio_as_of
+from app.utils.response_cache import SummaryCache
 from app.utils.time_windows import AR_TZ, local_dates_to_utc_window
 from app.constants import InstallmentStatus
 
@@ -41,7 +46,7 @@ from app.constants import InstallmentStatus
 router = APIRouter(
     prefix="/dashboard",
     tags=["Dashboard"],
-    dependencies=[Depends(get_current_user), Depends(ensure_company_active)],
+    dependencies=[Depends(get_current_user), Depends(ensure_company_active), Depends(admission_control)],
 )
 
 
@@ -55,7 +60,10 @@ def _full_name(c: Customer | None) -> str | None:
 
 
 @router.get("/summary", response_model=DashboardSummaryResponse)
+@heavy_route
 def dashboard_summary(
+    request: Request,
+    response: Response,
     start_date: date = Query(..., description="Fecha local (YYYY-MM-DD) inclusive"),
     end_date: date = Query(..., description="Fecha local (YYYY-MM-DD) inclusive"),
     tz: Optional[str] = Query(None, description="IANA TZ (default AR)"),
@@ -67,23 +75,40 @@ def dashboard_summary(
     zone = ZoneInfo(tz) if tz else AR_TZ
     tzname = (tz or zone.key or "America/Argentina/Buenos_Aires")
 
+    # ⚡ cache por empresa: el dashboard es la consulta más pesada del portal
+    cache = SummaryCache(
+        request, response, current.company_id, "dashboard.summary",
+        {"start_date": start_date, "end_date": end_date},
+        tz,
+    )
+    hit = cache.lookup()
+    if hit is not None:
+        return hit
+
     start_utc, end_utc_excl = local_dates_to_utc_window(start_date, end_date, zone)
 
+    # ⚡ daily_rollups: cobrado/esperado/otorgado por día y cobrador ya agregados
+    use_rollups = rollups_usable(tz)
+    if use_rollups:
+        period_rows = rollup_query(db, current.company_id, start_date, end_date).all()
+
     L = aliased(Loan)
     P = aliased(Purchase)
     CL = aliased(Customer)
     CP = aliased(Customer)
+    # 🗄️ período: tabla caliente + archivo (la mora y el cashflow de 30 días leen sólo lo vivo)
+    Pay, Inst, Alloc = payment_history(), installment_history(), allocation_history()
 
     # -------------------------
     # 1) COBRADO (pagos) en período
     # -------------------------
     payments_q = (
-        db.query(Payment)
-        .outerjoin(L, Payment.loan_id == L.id)
+        db.query(Pay)
+        .outerjoin(L, Pay.loan_id == L.id)
         .outerjoin(CL, L.customer_id == CL.id)
-        .outerjoin(P, Payment.purchase_id == P.id)
+        .outerjoin(P, Pay.purchase_id == P.id)
         .outerjoin(CP, P.customer_id == CP.id)
-        .filter(Payment.is_voided == False)
+        .filter(Pay.is_voided == False)
         .filter(
             or_(
                 L.company_id == current.company_id,
@@ -92,22 +117,26 @@ def dashboard_summary(
                 CP.company_id == current.company_id,
             )
         )
-        .filter(Payment.payment_date >= start_utc)
-        .filter(Payment.payment_date < end_utc_excl)
+        .filter(Pay.payment_date >= start_utc)
+        .filter(Pay.payment_date < end_utc_excl)
     )
 
-    collected_amount = float(
-        payments_q.with_entities(func.coalesce(func.sum(Payment.amount), 0.0)).scalar() or 0.0
-    )
-    payments_count = int(payments_q.with_entities(func.count(Payment.id)).scalar() or 0)
+    if use_rollups:
+        collected_amount = sum(float(r.collected_amount or 0.0) for r in period_rows)
+        payments_count = sum(int(r.collected_count or 0) for r in period_rows)
+    else:
+        collected_amount = float(
+            payments_q.with_entities(func.coalesce(func.sum(Pay.amount), 0.0)).scalar() or 0.0
+        )
+        payments_count = int(payments_q.with_entities(func.count(Pay.id)).scalar() or 0)
 
     # -------------------------
     # 2) ESPERADO (cuotas por due_date) en período
     # -------------------------
     inst_base = (
-        db.query(Installment)
-        .outerjoin(L, Installment.loan_id == L.id)
-        .outerjoin(P, Installment.purchase_id == P.id)
+        db.query(Inst)
+        .outerjoin(L, Inst.loan_id == L.id)
+        .outerjoin(P, Inst.purchase_id == P.id)
         .outerjoin(CL, L.customer_id == CL.id)
         .outerjoin(CP, P.customer_id == CP.id)
         .filter(
@@ -118,34 +147,37 @@ def dashboard_summary(
                 CP.company_id == current.company_id,
             )
         )
-        .filter(Installment.due_date >= start_utc)
-        .filter(Installment.due_date < end_utc_excl)
+        .filter(Inst.due_date >= start_utc)
+        .filter(Inst.due_date < end_utc_excl)
         .filter(
-            Installment.status.notin_(
+            Inst.status.notin_(
                 [InstallmentStatus.CANCELED.value, InstallmentStatus.REFINANCED.value]
             )
         )
     )
 
-    expected_amount = float(
-        inst_base.with_entities(func.coalesce(func.sum(Installment.amount), 0.0)).scalar() or 0.0
-    )
+    if use_rollups:
+        expected_amount = sum(float(r.expected_amount or 0.0) for r in period_rows)
+    else:
+        expected_amount = float(
+            inst_base.with_entities(func.coalesce(func.sum(Inst.amount), 0.0)).scalar() or 0.0
+        )
 
     # -------------------------
     # 3) COBRADO aplicado a cuotas del período
     # -------------------------
     collected_for_due_amount = float(
-        db.query(func.coalesce(func.sum(PaymentAllocation.amount_applied), 0.0))
-        .select_from(PaymentAllocation)
-        .join(Payment, PaymentAllocation.payment_id == Payment.id)
-        .join(Installment, PaymentAllocation.installment_id == Installment.id)
-        .outerjoin(L, Installment.loan_id == L.id)
-        .outerjoin(P, Installment.purchase_id == P.id)
-        .filter(Payment.is_voided == False)
-        .filter(Payment.payment_date >= start_utc)
-        .filter(Payment.payment_date < end_utc_excl)
-        .filter(Installment.due_date >= start_utc)
-        .filter(Installment.due_date < end_utc_excl)
+        db.query(func.coalesce(func.sum(Alloc.amount_applied), 0.0))
+        .select_from(Alloc)
+        .join(Pay, Alloc.payment_id == Pay.id)
+        .join(Inst, Alloc.installment_id == Inst.id)
+        .outerjoin(L, Inst.loan_id == L.id)
+        .outerjoin(P, Inst.purchase_id == P.id)
+        .filter(Pay.is_voided == False)
+        .filter(Pay.payment_date >= start_utc)
+        .filter(Pay.payment_date < end_utc_excl)
+        .filter(Inst.due_date >= start_utc)
+        .filter(Inst.due_date < end_utc_excl)
         .filter(or_(L.company_id == current.company_id, P.company_id == current.company_id))
         .scalar()
         or 0.0
@@ -157,30 +189,39 @@ def dashboard_summary(
     # -------------------------
     # 4) Serie por día (periodo seleccionado)
     # -------------------------
-    inst_day = func.date(func.timezone(tzname, Installment.due_date))
-    pay_day = func.date(func.timezone(tzname, Payment.payment_date))
-
-    expected_by_day_rows = (
-        inst_base.with_entities(
-            inst_day.label("day"),
-            func.coalesce(func.sum(Installment.amount), 0.0).label("expected"),
+    if use_rollups:
+        expected_by_day = defaultdict(float)
+        collected_by_day = defaultdict(float)
+        for r in period_rows:
+            if r.expected_amount:
+                expected_by_day[r.local_day] += float(r.expected_amount)
+            if r.collected_count:
+                collected_by_day[r.local_day] += float(r.collected_amount or 0.0)
+    else:
+        inst_day = func.date(func.timezone(tzname, Inst.due_date))
+        pay_day = func.date(func.timezone(tzname, Pay.payment_date))
+
+        expected_by_day_rows = (
+            inst_base.with_entities(
+                inst_day.label("day"),
+                func.coalesce(func.sum(Inst.amount), 0.0).label("expected"),
+            )
+            .group_by(inst_day)
+            .order_by(inst_day)
+            .all()
         )
-        .group_by(inst_day)
-        .order_by(inst_day)
-        .all()
-    )
-    expected_by_day = {r.day: float(r.expected) for r in expected_by_day_rows}
+        expected_by_day = {r.day: float(r.expected) for r in expected_by_day_rows}
 
-    collected_by_day_rows = (
-        payments_q.with_entities(
-            pay_day.label("day"),
-            func.coalesce(func.sum(Payment.amount), 0.0).label("collected"),
+        collected_by_day_rows = (
+            payments_q.with_entities(
+                pay_day.label("day"),
+                func.coalesce(func.sum(Pay.amount), 0.0).label("collected"),
+            )
+            .group_by(pay_day)
+            .order_by(pay_day)
+            .all()
         )
-        .group_by(pay_day)
-        .order_by(pay_day)
-        .all()
-    )
-    collected_by_day = {r.day: float(r.collected) for r in collected_by_day_rows}
+        collected_by_day = {r.day: float(r.collected) for r in collected_by_day_rows}
 
     all_days = sorted(set(expected_by_day.keys()) | set(collected_by_day.keys()))
     by_day = [
@@ -206,59 +247,72 @@ def dashboard_summary(
     #   - effectiveness_pct: applied_amount / expected_amount
     # -------------------------
 
-    # 5.1) Pagos registrados (monto + conteo) por cobrador
-    registered_by_collector_rows = (
-        payments_q.with_entities(
-            Payment.collector_id.label("collector_id"),
-            func.coalesce(func.sum(Payment.amount), 0.0).label("registered"),
-            func.count(Payment.id).label("payments_count"),
+    if use_rollups:
+        # 5.1 / 5.2 desde rollups (collector_id = 0 => "Sin asignar")
+        registered_by_collector = defaultdict(float)
+        payments_count_by_collector = defaultdict(int)
+        expected_by_collector = defaultdict(float)
+        for r in period_rows:
+            cid = int(r.collector_id or 0)
+            if r.collected_count:
+                registered_by_collector[cid] += float(r.collected_amount or 0.0)
+                payments_count_by_collector[cid] += int(r.collected_count)
+            if r.expected_amount:
+                expected_by_collector[cid] += float(r.expected_amount)
+    else:
+        # 5.1) Pagos registrados (monto + conteo) por cobrador
+        registered_by_collector_rows = (
+            payments_q.with_entities(
+                Pay.collector_id.label("collector_id"),
+                func.coalesce(func.sum(Pay.amount), 0.0).label("registered"),
+                func.count(Pay.id).label("payments_count"),
+            )
+            .group_by(Pay.collector_id)
+            .all()
         )
-        .group_by(Payment.collector_id)
-        .all()
-    )
-    registered_by_collector = {
-        (int(r.collector_id) if r.collector_id is not None else 0): float(r.registered or 0.0)
-        for r in registered_by_collector_rows
-    }
-    payments_count_by_collector = {
-        (int(r.collector_id) if r.collector_id is not None else 0): int(r.payments_count or 0)
-        for r in registered_by_collector_rows
-    }
-
-    # 5.2) Esperado por cobrador (cuotas del período asignadas)
-    assigned_collector_id = func.coalesce(L.employee_id, P.employee_id)
-    expected_by_collector_rows = (
-        inst_base.with_entities(
-            assigned_collector_id.label("collector_id"),
-            func.coalesce(func.sum(Installment.amount), 0.0).label("expected"),
+        registered_by_collector = {
+            (int(r.collector_id) if r.collector_id is not None else 0): float(r.registered or 0.0)
+            for r in registered_by_collector_rows
+        }
+        payments_count_by_collector = {
+            (int(r.collector_id) if r.collector_id is not None else 0): int(r.payments_count or 0)
+            for r in registered_by_collector_rows
+        }
+
+        # 5.2) Esperado por cobrador (cuotas del período asignadas)
+        assigned_collector_id = func.coalesce(L.employee_id, P.employee_id)
+        expected_by_collector_rows = (
+            inst_base.with_entities(
+                assigned_collector_id.label("collector_id"),
+                func.coalesce(func.sum(Inst.amount), 0.0).label("expected"),
+            )
+            .group_by(assigned_collector_id)
+            .all()
         )
-        .group_by(assigned_collector_id)
-        .all()
-    )
-    expected_by_collector = {
-        (int(r.collector_id) if r.collector_id is not None else 0): float(r.expected or 0.0)
-        for r in expected_by_collector_rows
-    }
+        expected_by_collector = {
+            (int(r.collector_id) if r.collector_id is not None else 0): float(r.expected or 0.0)
+            for r in expected_by_collector_rows
+        }
 
     # 5.3) Aplicado a cuotas del período por cobrador
     # (por payment.collector_id, y filtramos: payment_date en período + due_date en período)
     applied_by_collector_rows = (
         db.query(
-            Payment.collector_id.label("collector_id"),
-            func.coalesce(func.sum(PaymentAllocation.amount_applied), 0.0).label("applied"),
+            Pay.collector_id.label("collector_id"),
+            func.coalesce(func.sum(Alloc.amount_applied), 0.0).label("applied"),
         )
-        .select_from(PaymentAllocation)
-        .join(Payment, PaymentAllocation.payment_id == Payment.id)
-        .join(Installment, PaymentAllocation.installment_id == Installment.id)
-        .outerjoin(L, Installment.loan_id == L.id)
-        .outerjoin(P, Installment.purchase_id == P.id)
-        .filter(Payment.is_voided == False)
-        .filter(Payment.payment_date >= start_utc)
-        .filter(Payment.payment_date < end_utc_excl)
-        .filter(Installment.due_date >= start_utc)
-        .filter(Installment.due_date < end_utc_excl)
+        .select_from(Alloc)
+        .join(Pay, Alloc.payment_id == Pay.id)
+        .join(Inst, Alloc.installment_id == Inst.id)
+        .outerjoin(L, Inst.loan_id == L.id)
+        .outerjoin(P, Inst.purchase_id == P.id)
+        .filter(Pay.is_voided == False)
+        .filter(Pay.payment_date >= start_utc)
+        .filter(Pay.payment_date < end_utc_excl)
+        .filter(Inst.due_date >= start_utc)
+        .filter(Inst.due_date < end_utc_excl)
         .filter(or_(L.company_id == current.company_id, P.company_id == current.company_id))
-        .group_by(Payment.collector_id)
+        .group_by(Pay.collector_id)
         .all()
     )
     applied_by_collector = {
@@ -483,51 +537,64 @@ def dashboard_summary(
     start30_local = today_local - timedelta(days=29)
     start30_utc, end30_utc_excl = local_dates_to_utc_window(start30_local, today_local, zone)
 
-    # Cobrado por cobrador y día
-    pay_day_30 = func.date(func.timezone(tzname, Payment.payment_date))
-    collected_30_rows = (
-        db.query(
-            func.coalesce(Payment.collector_id, 0).label("collector_id"),
-            pay_day_30.label("day"),
-            func.coalesce(func.sum(Payment.amount), 0.0).label("collected"),
+    if use_rollups:
+        rows_30 = rollup_query(db, current.company_id, start30_local, today_local).all()
+        collected_map = defaultdict(float)
+        issued_map = defaultdict(float)
+        for r in rows_30:
+            cid = int(r.collector_id or 0)
+            if r.collected_count:
+                collected_map[(cid, r.local_day)] += float(r.collected_amount or 0.0)
+            if r.loans_issued_count:
+                issued_map[(cid, r.local_day)] += float(r.loans_issued_amount or 0.0)
+        cashflow_collector_ids = {cid for cid, _ in collected_map} | {cid for cid, _ in issued_map}
+        cashflow_collector_ids.add(0)  # por las dudas, "Sin asignar"
+    else:
+        # Cobrado por cobrador y día
+        pay_day_30 = func.date(func.timezone(tzname, Payment.payment_date))
+        collected_30_rows = (
+            db.query(
+                func.coalesce(Payment.collector_id, 0).label("collector_id"),
+                pay_day_30.label("day"),
+                func.coalesce(func.sum(Payment.amount), 0.0).label("collected"),
+            )
+            .select_from(Payment)
+            .outerjoin(L, Payment.loan_id == L.id)
+            .outerjoin(P, Payment.purchase_id == P.id)
+            .filter(Payment.is_voided == False)
+            .filter(or_(L.company_id == current.company_id, P.company_id == current.company_id))
+            .filter(Payment.payment_date >= start30_utc)
+            .filter(Payment.payment_date < end30_utc_excl)
+            .group_by(func.coalesce(Payment.collector_id, 0), pay_day_30)
+            .order_by(pay_day_30)
+            .all()
         )
-        .select_from(Payment)
-        .outerjoin(L, Payment.loan_id == L.id)
-        .outerjoin(P, Payment.purchase_id == P.id)
-        .filter(Payment.is_voided == False)
-        .filter(or_(L.company_id == current.company_id, P.company_id == current.company_id))
-        .filter(Payment.payment_date >= start30_utc)
-        .filter(Payment.payment_date < end30_utc_excl)
-        .group_by(func.coalesce(Payment.collector_id, 0), pay_day_30)
-        .order_by(pay_day_30)
-        .all()
-    )
 
-    # Prestado por cobrador y día (SOLO loans, como pediste usar Loan.amount)
-    loan_day_30 = func.date(func.timezone(tzname, Loan.start_date))
-    issued_30_rows = (
-        db.query(
-            func.coalesce(Loan.employee_id, 0).label("collector_id"),
-            loan_day_30.label("day"),
-            func.coalesce(func.sum(Loan.amount), 0.0).label("issued"),
+        # Prestado por cobrador y día (SOLO loans, como pediste usar Loan.amount)
+        loan_day_30 = func.date(func.timezone(tzname, Loan.start_date))
+        issued_30_rows = (
+            db.query(
+                func.coalesce(Loan.employee_id, 0).label("collector_id"),
+                loan_day_30.label("day"),
+                func.coalesce(func.sum(Loan.amount), 0.0).label("issued"),
+            )
+            .filter(Loan.company_id == current.company_id)
+            .filter(Loan.start_date >= start30_utc)
+            .filter(Loan.start_date < end30_utc_excl)
+            .group_by(func.coalesce(Loan.employee_id, 0), loan_day_30)
+            .order_by(loan_day_30)
+            .all()
         )
-        .filter(Loan.company_id == current.company_id)
-        .filter(Loan.start_date >= start30_utc)
-        .filter(Loan.start_date < end30_utc_excl)
-        .group_by(func.coalesce(Loan.employee_id, 0), loan_day_30)
-        .order_by(loan_day_30)
-        .all()
-    )
 
-    # Armamos sets de cobradores involucrados
-    cashflow_collector_ids = set()
-    cashflow_collector_ids |= {int(r.collector_id or 0) for r in collected_30_rows}
-    cashflow_collector_ids |= {int(r.collector_id or 0) for r in issued_30_rows}
-    cashflow_collector_ids.add(0)  # por las dudas, "Sin asignar"
+        # Armamos sets de cobradores involucrados
+        cashflow_collector_ids = set()
+        cashflow_collector_ids |= {int(r.collector_id or 0) for r in collected_30_rows}
+        cashflow_collector_ids |= {int(r.collector_id or 0) for r in issued_30_rows}
+        cashflow_collector_ids.add(0)  # por las dudas, "Sin asignar"
 
-    # Mapas: (collector_id, day) -> amount
-    collected_map = {(int(r.collector_id or 0), r.day): float(r.collected or 0.0) for r in collected_30_rows}
-    issued_map = {(int(r.collector_id or 0), r.day): float(r.issued or 0.0) for r in issued_30_rows}
+        # Mapas: (collector_id, day) -> amount
+        collected_map = {(int(r.collector_id or 0), r.day): float(r.collected or 0.0) for r in collected_30_rows}
+        issued_map = {(int(r.collector_id or 0), r.day): float(r.issued or 0.0) for r in issued_30_rows}
 
     # Lista de días (30)
     days_30 = []
@@ -595,42 +662,14 @@ def dashboard_summary(
     #    - Cobrado: Payment.payment_date
     #    - Otorgado: Loan.start_date usando Loan.amount (principal)
     # -------------------------
-    start30_local = today_local - timedelta(days=29)
-    start30_utc, end30_utc_excl = local_dates_to_utc_window(start30_local, today_local, zone)
-
-    pay_day_30 = func.date(func.timezone(tzname, Payment.payment_date))
-    collected_30_rows = (
-        db.query(
-            pay_day_30.label("day"),
-            func.coalesce(func.sum(Payment.amount), 0.0).label("collected"),
-        )
-        .select_from(Payment)
-        .outerjoin(L, Payment.loan_id == L.id)
-        .outerjoin(P, Payment.purchase_id == P.id)
-        .filter(Payment.is_voided == False)
-        .filter(or_(L.company_id == current.company_id, P.company_id == current.company_id))
-        .filter(Payment.payment_date >= start30_utc)
-        .filter(Payment.payment_date < end30_utc_excl)
-        .group_by(pay_day_30)
-        .order_by(pay_day_30)
-        .all()
-    )
-    collected_30 = {r.day: float(r.collected or 0.0) for r in collected_30_rows}
-
-    loan_day_30 = func.date(func.timezone(tzname, Loan.start_date))
-    issued_30_rows = (
-        db.query(
-            loan_day_30.label("day"),
-            func.coalesce(func.sum(Loan.amount), 0.0).label("issued"),
-        )
-        .filter(Loan.company_id == current.company_id)
-        .filter(Loan.start_date >= start30_utc)
-        .filter(Loan.start_date < end30_utc_excl)
-        .group_by(loan_day_30)
-        .order_by(loan_day_30)
-        .all()
-    )
-    issued_30 = {r.day: float(r.issued or 0.0) for r in issued_30_rows}
+    # Totales por día = suma de los mapas por cobrador ya calculados arriba
+    # (misma ventana de 30 días; evita repetir las dos consultas agrupadas por día)
+    collected_30 = defaultdict(float)
+    for (_cid, day), amount in collected_map.items():
+        collected_30[day] += amount
+    issued_30 = defaultdict(float)
+    for (_cid, day), amount in issued_map.items():
+        issued_30[day] += amount
 
     cashflow_30d = []
     d = start30_local
@@ -670,4 +709,41 @@ def dashboard_summary(
         cashflow_30d=cashflow_30d,
         cashflow_30d_by_collector=cashflow_30d_by_collector,
     )
-    return resp
+    return cache.store(resp)
+
+
+@router.get("/portfolio", response_model=PortfolioAsOfResponse)
+@heavy_route
+def portfolio(
+    request: Request,
+    response: Response,
+    as_of: date = Query(..., description="Fecha local (YYYY-MM-DD): cartera al cierre de ese día"),
+    employee_id: Optional[int] = Query(None, description="Sólo la cartera de este cobrador"),
+    include_archived: bool = Query(True, description="Sumar préstamos archivados que seguían abiertos al día X"),
+    tz: Optional[str] = Query(None, description="IANA TZ (default AR)"),
+    db: Session = Depends(get_db),
+    current: Employee = Depends(get_current_user),
+):
+    """
+    Cartera al día X: saldo, vencido y aging (1-30 / 31-60 / 61-90 / +90 días)
+    de préstamos y ventas, total y por cobrador, tal como estaban ese día.
+    """
+    # collector: siempre su propia cartera
+    if current.role == "collector":
+        employee_id = current.id
+
+    zone = ZoneInfo(tz) if tz else AR_TZ
+    cache = SummaryCache(
+        request, response, current.company_id, "dashboard.portfolio",
+        {"as_of": as_of, "employee_id": employee_id, "include_archived": include_archived},
+        tz,
+    )
+    hit = cache.lookup()
+    if hit is not None:
+        return hit
+
+    out = portfolio_as_of(
+        db, current.company_id, as_of, zone,
+        employee_id=employee_id, include_archived=include_archived,
+    )
+    return cache.store(PortfolioAsOfResponse(**out))
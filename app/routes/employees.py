@@ -13,13 +13,16 @@ from app.schemas.employee import EmployeeCreate, EmployeeMyPasswordUpdate, Emplo
 from app.models.models import Installment, Loan, Employee
 from datetime import date, datetime, timezone
 from app.schemas.schemas import LoginRequest
+from app.utils.batch import batch_ids, in_request_order, row_dicts
 from app.utils.license import ensure_company_active
+from app.utils.admission import admission_control
+from app.utils.response_cache import bump_company_version
 from app.utils.auth import hash_password, verify_password  # verify_password si existe
 
 
 
 router = APIRouter(
-    dependencies=[Depends(get_current_user), Depends(ensure_company_active)]  # 🔒
+    dependencies=[Depends(get_current_user), Depends(ensure_company_active), Depends(admission_control)]  # 🔒
 )
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
@@ -149,6 +152,33 @@ def list_employees(
     return query.all()
 
 
+@router.get("/batch", response_model=list[EmployeeOut])
+def get_employees_batch(
+    ids: list[int] = Depends(batch_ids),
+    db: Session = Depends(get_db),
+    current: Employee = Depends(get_current_user),
+):
+    """Varios empleados por id, SOLO de la empresa del usuario logueado."""
+    rows = (
+        db.query(
+            Employee.id,
+            Employee.name,
+            Employee.role,
+            Employee.phone,
+            Employee.email,
+            Employee.company_id,
+            Employee.created_at,
+            Employee.is_active,
+            Employee.disabled_at,
+            Employee.last_login_at,
+        )
+        .filter(Employee.company_id == current.company_id)
+        .filter(Employee.id.in_(ids))
+        .all()
+    )
+    return in_request_order(row_dicts(rows), ids)
+
+
 @router.get("/{employee_id}", response_model=EmployeeOut)
 def get_employee(employee_id: int, db: Session = Depends(get_db)):
     employee = db.query(Employee).get(employee_id)
@@ -188,6 +218,8 @@ def update_employee(employee_id: int, update_data: EmployeeUpdate, db: Session =
         employee.phone = update_data.phone
 
     db.commit()
+    # nombre del cobrador en los listados
+    bump_company_version(employee.company_id)
     db.refresh(employee)
     return employee
 
@@ -197,8 +229,10 @@ def delete_employee(employee_id: int, db: Session = Depends(get_db)):
     employee = db.query(Employee).get(employee_id)
     if not employee:
         raise HTTPException(status_code=404, detail="Empleado no encontrado")
+    company_id = employee.company_id
     db.delete(employee)
     db.commit()
+    bump_company_version(company_id)
     return {"message": "Empleado eliminado correctamente"}
 
 @router.get("/{employee_id}/cuotas-a-cobrar")
@@ -1,9 +1,8 @@
 # routes/installments.py
 from datetime import date, datetime, timezone
-from decimal import Decimal
 from typing import Optional, List
 
-from fastapi import APIRouter, HTTPException, Depends, status, Query
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, status, Query
 from sqlalchemy import func, Float, or_, case, and_, not_, func
 from sqlalchemy.orm import Session  
 
@@ -15,24 +14,32 @@ from app.schemas.installments import (
     InstallmentPaymentResult
 )
 from app.utils.auth import get_current_user
-from app.utils.ledger import recompute_ledger_for_loan
+from app.utils.batch import batch_ids, in_request_order
+from app.utils.conditional_get import conditional_list
+from app.utils.fast_json import fast_response
+from app.utils.ledger import DEBT_LOAN, DEBT_PURCHASE, lock_debt
+from app.utils.money import from_cents, to_cents
 from app.utils.license import ensure_company_active
-from app.utils.status import update_status_if_fully_paid
+from app.utils.admission import admission_control, heavy_route
+from app.utils.response_cache import SummaryCache, bump_company_version
+from app.utils.search import SearchQuery, match_clause
+from app.utils.status import refresh_debt_status
+from app.services.payment_service import PaymentService
+from app.services.ledger_journal import record_installment_amended
+from app.services.daily_rollups import capture_rollups, sync_rollups
+from app.services.loan_archive import installment_history
 
 # 👇 NUEVO: estados canónicos y normalizador
 from app.constants import InstallmentStatus
 from app.utils.normalize import norm_installment_status
-from app.utils.time_windows import parse_iso_aware_utc, local_dates_to_utc_window, AR_TZ
+from app.utils.time_windows import parse_iso_aware_utc, local_dates_to_utc_window, today_start_utc, AR_TZ
 from zoneinfo import ZoneInfo
 
 
 router = APIRouter(
-    dependencies=[Depends(get_current_user), Depends(ensure_company_active)],  # 👈 exige Bearer en todas las rutas
+    dependencies=[Depends(get_current_user), Depends(ensure_company_active), Depends(admission_control)],  # 👈 exige Bearer en todas las rutas
 )
 
-EPS = Decimal("0.000001")  # tolerancia para redondeos
-
-
 # =========================
 #        HELPERS
 # =========================
@@ -106,87 +113,64 @@ def pay_installment(
 ):
     """
     Registra un pago para una cuota específica.
-    Ahora NO muta manualmente paid_amount/status ni loan.total_due.
-    Crea el Payment y luego ejecuta recompute_ledger_for_loan para:
-      - recalcular todas las cuotas del préstamo afectado
-      - poblar payment_allocations consistentes
+    No muta a mano paid_amount/status ni loan.total_due: PaymentService crea el
+    Payment, lo imputa (una pasada), recalcula el estado del padre y commitea una vez.
     """
     installment = _get_installment_scoped(installment_id, db, current)
+    if installment.loan_id:
+        debt_kind, debt_id = DEBT_LOAN, installment.loan_id
+    else:
+        debt_kind, debt_id = DEBT_PURCHASE, installment.purchase_id
 
-    # --- Validaciones de monto ---
-    def D(x): return Decimal(str(x))
-    amount_to_pay = D(payment_data.amount)
+    # 🔒 serializa con otros pagos/anulaciones de la misma deuda y relee la cuota
+    service = PaymentService(db)
+    service.lock(debt_kind, debt_id)
+    db.refresh(installment)
+
+    # --- Validaciones de monto (en centavos enteros) ---
+    amount_to_pay = to_cents(payment_data.amount)
     if amount_to_pay <= 0:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="El monto debe ser mayor a cero"
         )
 
-    installment_amount = D(installment.amount)
-    paid_amount = D(installment.paid_amount or 0)
+    installment_amount = to_cents(installment.amount)
+    paid_amount = to_cents(installment.paid_amount)
 
     # Bloquear doble pago si ya está completamente pagada
-    if (paid_amount + EPS) >= installment_amount:
+    if paid_amount >= installment_amount:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Esta cuota ya está pagada completamente"
         )
 
-    remaining_amount = (installment_amount - paid_amount).quantize(Decimal("0.000001"))
-    if amount_to_pay - remaining_amount > EPS:
+    remaining_amount = installment_amount - paid_amount
+    if amount_to_pay > remaining_amount:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"El monto excede el saldo pendiente. Máximo a pagar: {remaining_amount}"
+            detail=f"El monto excede el saldo pendiente. Máximo a pagar: {from_cents(remaining_amount):.2f}"
         )
 
-    # --- Crear Payment (NO tocar paid_amount/status acá) ---
     try:
-        # normalizamos la fecha a UTC aware
-        if payment_data.payment_date:
-            # si es datetime con tz → lo pasamos a UTC; si es naive → asumimos UTC
-            pdt = payment_data.payment_date
-            if pdt.tzinfo is None:
-                pdt = pdt.replace(tzinfo=timezone.utc)
-            payment_dt_utc = pdt.astimezone(timezone.utc)
-        else:
-            payment_dt_utc = datetime.now(timezone.utc)
-
-        payment_row = Payment(
-            amount=float(payment_data.amount),
-            loan_id=installment.loan_id if installment.loan_id else None,
-            purchase_id=installment.purchase_id if installment.purchase_id else None,
-            payment_date=payment_dt_utc,
+        result = service.apply(
+            debt_kind,
+            debt_id,
+            amount=payment_data.amount,
+            collector_id=current.id,
+            company_id=current.company_id,
             payment_type=payment_data.payment_type,
             description=payment_data.description,
-            collector_id=current.id,
+            payment_date=payment_data.payment_date,
         )
-        db.add(payment_row)
-        db.commit()
-        db.refresh(payment_row)
-        if installment.loan_id:
-            recompute_ledger_for_loan(db, installment.loan_id)
-            db.commit()
-            update_status_if_fully_paid(db, loan_id=installment.loan_id, purchase_id=None)
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=500, detail=f"Error al registrar Payment: {e}")
 
-    # --- Recompute (reconstruye cuotas + allocations para préstamos) ---
-    parent_loan_id = installment.loan_id
-    parent_purchase_id = installment.purchase_id
-
-    if parent_loan_id:
-        recompute_ledger_for_loan(db, parent_loan_id)
-        db.commit()
-
-    # Estado agregado del padre (si usás esta utilidad para loan/purchase)
-    update_status_if_fully_paid(db, loan_id=parent_loan_id, purchase_id=parent_purchase_id)
-
-    # Refrescar cuota para devolverla consistente post-recompute
-    db.refresh(installment)
-
+    # la cuota ya quedó con el estado post-imputación (sin releer)
     return {
-        "payment_id": payment_row.id,
+        "payment_id": result.payment.id,
         "installment": installment
     }
 
@@ -218,7 +202,7 @@ def collectable_per_loan(
             func.min(Installment.number).label("next_number"),
         )
         .filter(Installment.loan_id.isnot(None))
-        .filter((Installment.amount - func.coalesce(Installment.paid_amount, 0)) > float(EPS))
+        .filter(Installment.amount > func.coalesce(Installment.paid_amount, 0))
         .group_by(Installment.loan_id)
         .subquery()
     )
@@ -259,15 +243,9 @@ def collectable_per_loan(
     if province and province.strip():
         base = base.filter(Customer.province == province.strip())
 
-    if q:
-        like = f"%{q.strip()}%"
-        base = base.filter(
-            or_(
-                Customer.first_name.ilike(like),
-                Customer.last_name.ilike(like),
-                Customer.phone.ilike(like),
-            )
-        )
+    search = SearchQuery(q)
+    if search:
+        base = base.filter(match_clause(search, Customer))
 
     total = base.count()
 
@@ -294,9 +272,8 @@ def collectable_per_loan(
 
     data = []
     for r in rows:
-        installment_amount = Decimal(str(r.installment_amount or 0))
-        paid_amount = Decimal(str(r.installment_paid_amount or 0))
-        inst_balance = installment_amount - paid_amount
+        installment_amount = to_cents(r.installment_amount)
+        inst_balance = installment_amount - to_cents(r.installment_paid_amount)
 
         data.append(
             {
@@ -310,8 +287,8 @@ def collectable_per_loan(
                 "installment_id": int(r.installment_id),
                 "installment_number": int(r.installment_number or 0),
                 "due_date": _due_local(r.due_date),
-                "installment_amount": float(installment_amount),
-                "installment_balance": float(inst_balance),
+                "installment_amount": from_cents(installment_amount),
+                "installment_balance": from_cents(inst_balance),
                 "loan_balance": float(r.loan_balance or 0),
             }
         )
@@ -323,7 +300,7 @@ def collectable_per_loan(
 # =========================
 #        LIST
 # =========================
-@router.get("/", response_model=List[InstallmentListOut])
+@router.get("/", response_model=List[InstallmentListOut], dependencies=[Depends(conditional_list)])
 def get_all_installment(
     employee_id: Optional[int] = Query(None),
     date_from: Optional[date] = Query(None),
@@ -356,9 +333,18 @@ def get_all_installment(
     if date_to is None and _looks_like_date(due_to):
         date_to = date.fromisoformat(due_to)
 
+    # sólo las columnas que se devuelven (sin hidratar Installment)
     qy = (
         db.query(
-            Installment,
+            Installment.id,
+            Installment.amount,
+            Installment.due_date,
+            Installment.status,
+            Installment.is_paid,
+            Installment.is_overdue,
+            Installment.loan_id,
+            Installment.number,
+            Installment.paid_amount,
             case(
                 (Installment.loan_id.is_not(None), "loan"),
                 else_="purchase",
@@ -392,16 +378,9 @@ def get_all_installment(
         qy = qy.filter(Installment.loan_id == loan_id)
 
     # búsqueda por cliente/teléfono
-    q_str = (q or "").strip()
-    if q_str:
-        like = f"%{q_str}%"
-        qy = qy.filter(
-            or_(
-                Customer.first_name.ilike(like),
-                Customer.last_name.ilike(like),
-                Customer.phone.ilike(like),
-            )
-        )
+    search = SearchQuery(q)
+    if search:
+        qy = qy.filter(match_clause(search, Customer))
 
     # filtro por provincia
     prov = (province or "").strip()
@@ -430,63 +409,52 @@ def get_all_installment(
 
     rows = qy.order_by(Installment.due_date.asc(), Installment.id.asc()).all()
 
-    out: list[InstallmentListOut] = []
+    # ⚡ tuplas → dicts (mismas claves/orden que InstallmentListOut) + orjson
+    out: list[dict] = []
     today_local = datetime.now(zone).date()
 
-    for (
-        inst,
-        debt_type,
-        customer_name,
-        customer_id,
-        customer_phone,
-        collection_day,
-        customer_province,
-    ) in rows:
-        amount = float(inst.amount or 0.0)
-
-        due_dt = getattr(inst, "due_date", None)
+    for r in rows:
+        due_dt = r.due_date
         if isinstance(due_dt, datetime):
             due_only = due_dt.astimezone(zone).date()
         else:
             due_only = due_dt or today_local
 
-        is_paid = bool(getattr(inst, "is_paid", getattr(inst, "paid", False)))
-        status_val = inst.status or (InstallmentStatus.PAID.value if is_paid else InstallmentStatus.PENDING.value)
+        is_paid = bool(r.is_paid)
+        status_val = r.status or (InstallmentStatus.PAID.value if is_paid else InstallmentStatus.PENDING.value)
 
-        number = int(getattr(inst, "number", 0) or 0)
-        paid_amount = float(getattr(inst, "paid_amount", 0.0) or 0.0)
-
-        iso_db = getattr(inst, "is_overdue", None)
-        if iso_db is None:
+        if r.is_overdue is None:
             is_overdue = (not is_paid) and (due_only < today_local)
         else:
-            is_overdue = bool(iso_db)
-
-        out.append(
-            InstallmentListOut(
-                id=inst.id,
-                amount=amount,
-                due_date=due_only,
-                status=status_val,
-                is_paid=is_paid,
-                loan_id=inst.loan_id,
-                is_overdue=is_overdue,
-                number=number,
-                paid_amount=paid_amount,
-                customer_name=customer_name,
-                debt_type=debt_type,
-                customer_id=customer_id,
-                customer_phone=customer_phone,
-                collection_day=collection_day,
-                customer_province=customer_province,
-            )
-        )
-
-    return out
+            is_overdue = bool(r.is_overdue)
+
+        out.append({
+            "id": r.id,
+            "amount": float(r.amount or 0.0),
+            # due_date es datetime en el schema: fecha local a las 00:00 (como antes)
+            "due_date": datetime.combine(due_only, datetime.min.time()),
+            "status": status_val,
+            "is_paid": is_paid,
+            "loan_id": r.loan_id,
+            "is_overdue": is_overdue,
+            "number": int(r.number or 0),
+            "paid_amount": float(r.paid_amount or 0.0),
+            "collection_day": r.collection_day,
+            "customer_name": r.customer_name,
+            "debt_type": r.debt_type,
+            "customer_id": r.customer_id,
+            "customer_phone": r.customer_phone,
+            "customer_province": r.customer_province,
+        })
+
+    return fast_response(out)
 
 
 @router.get("/summary", response_model=InstallmentSummaryOut)
+@heavy_route
 def installments_summary(
+    request: Request,
+    response: Response,
     employee_id: Optional[int] = None,
     date_from: Optional[date] = None,
     date_to: Optional[date] = None,
@@ -497,16 +465,27 @@ def installments_summary(
 ):
     zone = ZoneInfo(tz) if tz else AR_TZ
 
+    # ⚡ cache por empresa (el "hoy" local va en la clave por las vencidas)
+    cache = SummaryCache(
+        request, response, current.company_id, "installments.summary",
+        {"employee_id": employee_id, "from": date_from, "to": date_to, "province": province},
+        tz,
+    )
+    hit = cache.lookup()
+    if hit is not None:
+        return hit
+
+    Inst = installment_history()  # 🗄️ incluye cuotas archivadas
     base = (
-        db.query(Installment)
-          .outerjoin(Loan, Installment.loan_id == Loan.id)
-          .outerjoin(Purchase, Installment.purchase_id == Purchase.id)
+        db.query(Inst)
+          .outerjoin(Loan, Inst.loan_id == Loan.id)
+          .outerjoin(Purchase, Inst.purchase_id == Purchase.id)
           .outerjoin(
               Customer,
               or_(Customer.id == Loan.customer_id, Customer.id == Purchase.customer_id)
           )
           .filter(Customer.company_id == current.company_id)
-          .filter(loan_is_effective_clause(Installment, Loan))  # excluir loans bloqueados
+          .filter(loan_is_effective_clause(Inst, Loan))  # excluir loans bloqueados
     )
 
     if employee_id is not None:
@@ -514,12 +493,12 @@ def installments_summary(
             or_(
                 # Cuotas de PRÉSTAMOS: usar el dueño del préstamo
                 and_(
-                    Installment.loan_id.is_not(None),
+                    Inst.loan_id.is_not(None),
                     Loan.employee_id == employee_id,
                 ),
                 # Cuotas de COMPRAS: seguimos usando el owner del cliente
                 and_(
-                    Installment.loan_id.is_(None),
+                    Inst.loan_id.is_(None),
                     Customer.employee_id == employee_id,
                 ),
             )
@@ -532,40 +511,103 @@ def installments_summary(
     # Rango local → ventana UTC
     if date_from is not None and date_to is not None:
         start_utc, end_utc_excl = local_dates_to_utc_window(date_from, date_to, zone)
-        base = base.filter(Installment.due_date >= start_utc)
-        base = base.filter(Installment.due_date <  end_utc_excl)
+        base = base.filter(Inst.due_date >= start_utc)
+        base = base.filter(Inst.due_date <  end_utc_excl)
+
+    # ⚡ un solo agregado: conteos/sumas condicionales contra el borde UTC de "hoy local"
+    # (due_date < 00:00 local de hoy ⇔ vencida por día local), sin traer filas a Python
+    today_start = today_start_utc(zone)
+    unpaid = Inst.is_paid.is_(False)
+    not_paid = Inst.is_paid.isnot(True)  # NULL cuenta como impaga (igual que antes)
+    (
+        pending_count,
+        paid_count,
+        overdue_count,
+        total_amount,
+        pending_amount,
+    ) = base.with_entities(
+        func.coalesce(func.sum(case((unpaid, 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Inst.is_paid.is_(True), 1), else_=0)), 0),
+        func.coalesce(func.sum(case((and_(not_paid, Inst.due_date < today_start), 1), else_=0)), 0),
+        func.coalesce(func.sum(Inst.amount), 0.0),
+        func.coalesce(func.sum(case((unpaid, Inst.amount), else_=0)), 0.0),
+    ).one()
+
+    return cache.store(InstallmentSummaryOut(
+        pending_count=int(pending_count or 0),
+        paid_count=int(paid_count or 0),
+        overdue_count=int(overdue_count or 0),
+        total_amount=float(total_amount or 0.0),
+        pending_amount=float(pending_amount or 0.0),
+    ))
 
-    pending_count = base.filter(Installment.is_paid.is_(False)).count()
-    paid_count    = base.filter(Installment.is_paid.is_(True)).count()
 
-    # overdue por día LOCAL
-    rows_due = base.with_entities(Installment.id, Installment.due_date, Installment.is_paid).all()
-    today_local = datetime.now(zone).date()
-    overdue_count = 0
-    for _id, dd, is_paid in rows_due:
-        if bool(is_paid):
-            continue
-        due_local = dd.astimezone(zone).date() if isinstance(dd, datetime) else dd
-        if due_local and due_local < today_local:
-            overdue_count += 1
 
-    total_amount = float(
-        base.with_entities(func.coalesce(func.sum(Installment.amount), 0.0)).scalar() or 0.0
-    )
-    pending_amount = float(
-        base.filter(Installment.is_paid.is_(False))
-            .with_entities(func.coalesce(func.sum(Installment.amount), 0.0))
-            .scalar() or 0.0
-    )
+@router.get("/batch", response_model=List[InstallmentListOut])
+def get_installments_batch(
+    ids: List[int] = Depends(batch_ids),
+    tz: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+    current: Employee = Depends(get_current_user),
+):
+    """Varias cuotas por id (mismo formato que GET /{installment_id}) en una sola consulta."""
+    zone = ZoneInfo(tz) if tz else AR_TZ
+    today_local = datetime.now(zone).date()
 
-    return InstallmentSummaryOut(
-        pending_count=int(pending_count or 0),
-        paid_count=int(paid_count or 0),
-        overdue_count=int(overdue_count or 0),
-        total_amount=total_amount,
-        pending_amount=pending_amount,
+    rows = (
+        db.query(
+            Installment.id,
+            Installment.amount,
+            Installment.due_date,
+            Installment.status,
+            Installment.is_paid,
+            Installment.is_overdue,
+            Installment.loan_id,
+            Installment.number,
+            Installment.paid_amount,
+            case(
+                (Installment.loan_id.is_not(None), "loan"),
+                else_="purchase",
+            ).label("debt_type"),
+            Customer.id.label("customer_id"),
+            Customer.first_name,
+            Customer.last_name,
+            Customer.phone.label("customer_phone"),
+            Customer.province.label("customer_province"),
+            Loan.collection_day.label("collection_day"),
+        )
+        .outerjoin(Loan, Installment.loan_id == Loan.id)
+        .outerjoin(Purchase, Installment.purchase_id == Purchase.id)
+        .outerjoin(
+            Customer,
+            or_(Customer.id == Loan.customer_id, Customer.id == Purchase.customer_id),
+        )
+        .filter(Installment.id.in_(ids))
+        .filter(Customer.company_id == current.company_id)
+        .all()
     )
 
+    out = []
+    for r in rows:
+        d = dict(r._mapping)
+        first, last = d.pop("first_name"), d.pop("last_name")
+        d["customer_name"] = f"{first or ''} {last or ''}".strip()
+
+        # due_date a fecha local (igual que GET /{installment_id})
+        due_dt = d["due_date"]
+        due_only = due_dt.astimezone(zone).date() if isinstance(due_dt, datetime) else (due_dt or today_local)
+        d["due_date"] = due_only
+
+        is_paid = bool(d["is_paid"])
+        d["is_paid"] = is_paid
+        d["status"] = d["status"] or (InstallmentStatus.PAID.value if is_paid else InstallmentStatus.PENDING.value)
+        if d["is_overdue"] is None:
+            d["is_overdue"] = (not is_paid) and (due_only < today_local)
+        d["amount"] = float(d["amount"] or 0.0)
+        d["paid_amount"] = float(d["paid_amount"] or 0.0)
+        d["number"] = int(d["number"] or 0)
+        out.append(d)
+    return in_request_order(out, ids)
 
 
 @router.get("/{installment_id}", response_model=InstallmentListOut)
@@ -838,6 +880,14 @@ def update_installment(
     if parent_company_id is not None and parent_company_id != current.company_id:
         raise HTTPException(status_code=404, detail="Cuota no encontrada")
 
+    # 🔒 monto/estado de la cuota no se editan en medio de un pago de la misma deuda
+    debt_kind, debt_id = (DEBT_LOAN, ins.loan_id) if ins.loan_id else (DEBT_PURCHASE, ins.purchase_id)
+    if debt_id:
+        lock_debt(db, debt_kind, debt_id)
+    db.refresh(ins)
+    # monto, vencimiento y estado mueven "esperado" en daily_rollups
+    rollups_before = capture_rollups(db, parent_company_id, debt_kind, [debt_id]) if parent_company_id else {}
+
     if body.amount is not None:
         if body.amount <= 0:
             raise HTTPException(status_code=400, detail="Monto inválido")
@@ -869,12 +919,17 @@ def update_installment(
         ins.is_paid = (ins.status == InstallmentStatus.PAID.value)
 
     db.add(ins)
+    db.flush()
+    if parent_company_id is not None and (body.amount is not None or body.due_date is not None):
+        record_installment_amended(db, ins, parent_company_id, current.id)
+
+    # Actualizar estado y saldo del padre (todavía con el lock, mismo commit que la cuota)
+    refresh_debt_status(db, loan_id=ins.loan_id, purchase_id=ins.purchase_id)
+    if parent_company_id is not None:
+        sync_rollups(db, parent_company_id, debt_kind, [debt_id], rollups_before)
     db.commit()
     db.refresh(ins)
-
-    # Actualizar estado y saldo del padre
-    from app.utils.status import update_status_if_fully_paid
-    update_status_if_fully_paid(db, loan_id=ins.loan_id, purchase_id=ins.purchase_id)
+    bump_company_version(current.company_id)
 
     return InstallmentOut.from_orm(ins)
 
@@ -1,12 +1,12 @@
 from typing import List, Optional
 from zoneinfo import ZoneInfo
-from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, status
 from sqlalchemy.orm import Session
 from datetime import date, datetime, timedelta, timezone
 from sqlalchemy import func, literal, or_, and_, case
 
 from app.database.db import get_db
-from app.models.models import Loan, Installment, Customer, Company, Payment, Employee
+from app.models.models import Loan, Installment, Customer, Company, Payment, Employee, DailyRollup, ArchivedInstallment, ArchivedPayment
 from app.routes.installments import _assert_customer_scoped
 from app.schemas.installments import InstallmentOut
 from app.schemas.loans import (
@@ -14,22 +14,42 @@ from app.schemas.loans import (
     RefinanceRequest, LoanPaymentRequest
 )
 from app.utils.auth import ensure_admin, get_current_user
-from app.utils.ledger import recompute_ledger_for_loan
+from app.utils.batch import batch_ids, in_request_order
+from app.utils.conditional_get import conditional_list
+from app.utils.fast_json import fast_response
+from app.utils.ledger import DEBT_LOAN, lock_loan
 from app.utils.license import ensure_company_active
-from app.utils.status import normalize_loan_status_filter, update_status_if_fully_paid
+from app.utils.admission import admission_control, heavy_route
+from app.utils.money import Money, to_cents
+from app.utils.response_cache import SummaryCache, bump_company_version
+from app.services.daily_rollups import capture_rollups, rollup_query, rollups_usable, sync_rollups_for_loan
+from app.services.payment_service import PaymentService
+from app.services.ledger_journal import (
+    DEBT_CANCELED,
+    DEBT_REFINANCED,
+    ledger_state,
+    list_events,
+    record_event,
+    record_schedule,
+)
+from app.utils.search import SearchQuery, match_clause
+from app.utils.status import normalize_loan_status_filter
 from pydantic import BaseModel
 
 # 🔹 NUEVO: Enums canónicos y normalizadores
 from app.constants import InstallmentStatus, LoanStatus
 from app.utils.normalize import norm_loan_status
-from app.utils.time_windows import parse_iso_aware_utc, local_dates_to_utc_window, AR_TZ
+from app.utils.time_windows import parse_iso_aware_utc, local_dates_to_utc_window, today_start_utc, AR_TZ
 
 from sqlalchemy.orm import Session, joinedload
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from io import BytesIO
 from zoneinfo import ZoneInfo
-from app.services.coupons_v5 import CouponV5Data, build_coupons_v5_pdf
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # ReportLab se importa recién al pedir un cupón (arranque más rápido)
+    from app.services.coupons_v5 import CouponV5Data
 
 from typing import Optional
 from datetime import datetime
@@ -43,7 +63,7 @@ from sqlalchemy.sql import literal
 
 
 router = APIRouter(
-    dependencies=[Depends(get_current_user), Depends(ensure_company_active)],  # 👈 exige Bearer válido en todo el router
+    dependencies=[Depends(get_current_user), Depends(ensure_company_active), Depends(admission_control)],  # 👈 exige Bearer válido en todo el router
 )
 
 # ---------- helpers fecha ----------
@@ -137,7 +157,9 @@ def _assert_loan_same_company(loan_id: int, db: Session, current: Employee) -> L
         _404()
     return loan
 
-def _coupon_data_for_loan(loan: Loan, db: Session, tz: str) -> CouponV5Data:
+def _coupon_data_for_loan(loan: Loan, db: Session, tz: str) -> "CouponV5Data":
+    from app.services.coupons_v5 import CouponV5Data
+
     tzinfo = ZoneInfo(tz)
     today = datetime.now(tzinfo).date()
 
@@ -348,7 +370,10 @@ def _rebuild_installments_for_loan(db: Session, loan: Loan):
 
 # ============== SUMMARY ==============
 @router.get("/summary", response_model=LoansSummaryResponse)
+@heavy_route
 def loans_summary(
+    request: Request,
+    response: Response,
     employee_id: int | None = Query(None),
     date_from: str | None = Query(None),
     date_to: str | None = Query(None),
@@ -364,6 +389,7 @@ def loans_summary(
         return bool(s) and len(s) == 10 and s[4] == "-" and s[7] == "-"
 
     start_utc = end_utc_excl = None
+    dfrom = dto = None
     if _looks_like_date(date_from) and _looks_like_date(date_to):
         dfrom = date.fromisoformat(date_from) if date_from else None
         dto   = date.fromisoformat(date_to)   if date_to   else None
@@ -374,7 +400,7 @@ def loans_summary(
         end_utc   = parse_iso_aware_utc(date_to)
         end_utc_excl = end_utc
 
-        q = db.query(Loan)
+    q = db.query(Loan)
 
     # 👇 Regla de visibilidad por rol:
     # - collector: siempre ve SOLO sus préstamos (employee_id = current.id)
@@ -384,6 +410,44 @@ def loans_summary(
         # Ignoramos cualquier employee_id que venga por query
         effective_employee_id = current.id
 
+    # ⚡ cache por empresa (la clave usa el employee efectivo, no el del query)
+    cache = SummaryCache(
+        request, response, current.company_id, "loans.summary",
+        {"employee_id": effective_employee_id, "from": date_from, "to": date_to,
+         "province": province, "by_day": by_day},
+        tz,
+    )
+    hit = cache.lookup()
+    if hit is not None:
+        return hit
+
+    # ⚡ daily_rollups: rango por días locales (o sin rango) y sin provincia
+    by_local_days = dfrom is not None or (not date_from and not date_to)
+    if by_local_days and province is None and rollups_usable(tz):
+        rq = rollup_query(db, current.company_id, dfrom, dto, collector_id=effective_employee_id)
+        count, amount = rq.with_entities(
+            func.coalesce(func.sum(DailyRollup.loans_effective_count), 0),
+            func.coalesce(func.sum(DailyRollup.loans_effective_amount), 0.0),
+        ).one()
+        result = {"count": int(count or 0), "amount": float(amount or 0.0), "by_day": []}
+        if by_day:
+            rows = (
+                rq.with_entities(
+                    DailyRollup.local_day.label("d"),
+                    func.sum(DailyRollup.loans_effective_count).label("cnt"),
+                    func.coalesce(func.sum(DailyRollup.loans_effective_amount), 0.0).label("amt"),
+                )
+                .group_by(DailyRollup.local_day)
+                .having(func.sum(DailyRollup.loans_effective_count) > 0)
+                .order_by(DailyRollup.local_day)
+                .all()
+            )
+            result["by_day"] = [
+                {"date": r.d, "count": int(r.cnt or 0), "amount": float(r.amt or 0.0)}
+                for r in rows
+            ]
+        return cache.store(LoansSummaryResponse(**result))
+
     # Necesitamos join con Customer SOLO si filtramos por provincia
     needs_customer = (province is not None) or (not hasattr(Loan, "company_id"))
 
@@ -447,11 +511,12 @@ def loans_summary(
             for r in rows
         ]
 
-    return LoansSummaryResponse(**result)
+    return cache.store(LoansSummaryResponse(**result))
 
 
 
-@router.get("/all", response_model=List[LoanListItem])
+@router.get("/all", response_model=List[LoanListItem], dependencies=[Depends(conditional_list)])
+@heavy_route
 def list_loans_all(
     employee_id: Optional[int] = Query(None),
 
@@ -574,25 +639,16 @@ def list_loans_all(
     if canonical_status:
         base_ids = base_ids.filter(Loan.status == canonical_status)
 
-    # ✅ Filtro personalizado q (nombre cliente / provincia / id préstamo)
-    q_str = (q or "").strip()
-    if q_str:
-        like = f"%{q_str}%"
-        conditions = []
+    # ✅ Filtro personalizado q (cliente vía índice de búsqueda / id préstamo)
+    search = SearchQuery(q)
+    if search:
+        conditions = [match_clause(search, Customer)]
 
         # si es número: permitir buscar por ID exacto
-        if q_str.isdigit():
-            conditions.append(Loan.id == int(q_str))
-
-        # si tenemos Customer join (lo tenemos si needs_customer=True)
-        if needs_customer:
-            conditions.append(Customer.first_name.ilike(like))
-            conditions.append(Customer.last_name.ilike(like))
-            conditions.append(Customer.province.ilike(like))
+        if search.id_value is not None:
+            conditions.append(Loan.id == search.id_value)
 
-        # si no hay conditions por alguna razón, no aplicamos nada
-        if conditions:
-            base_ids = base_ids.filter(or_(*conditions))
+        base_ids = base_ids.filter(or_(*conditions))
 
     # Rango por start_date (UTC)
     if start_utc is not None:
@@ -636,26 +692,25 @@ def list_loans_all(
           .all()
     )
 
-    return [
-        LoanListItem(
-            id=r.id,
-            amount=float(r.amount or 0.0),
-            start_date=r.start_date,
-            customer_name=(r.customer_name or "-"),
-            customer_province=r.customer_province,
-
-            collector_id=r.collector_id,
-            collector_name=r.collector_name,
-            employee_name=r.employee_name,
-
-            total_due=float(r.total_due or 0.0),
-            remaining_due=float(r.remaining_due or 0.0),
-            status=r.status,
-        )
+    # ⚡ tuplas → dicts (mismas claves/orden que LoanListItem) + orjson
+    return fast_response([
+        {
+            "id": r.id,
+            "amount": float(r.amount or 0.0),
+            "total_due": float(r.total_due or 0.0),
+            "remaining_due": float(r.remaining_due or 0.0),
+            "start_date": r.start_date,
+            "status": r.status,
+            "customer_name": (r.customer_name or "-"),
+            "customer_province": r.customer_province,
+            "employee_name": r.employee_name,
+            "collector_id": r.collector_id,
+            "collector_name": r.collector_name,
+        }
         for r in rows
-    ]
+    ])
 
-@router.get("/", response_model=List[LoanListItem])
+@router.get("/", response_model=List[LoanListItem], dependencies=[Depends(conditional_list)])
 def list_loans(
     employee_id: Optional[int] = Query(None),
     customer_id: Optional[int] = Query(None),
@@ -944,13 +999,17 @@ def create_loan(
         )
         db.add(installment)
 
+    record_schedule(db, DEBT_LOAN, new_loan.id, new_loan.company_id, current.id, occurred_at=new_loan.start_date)
+    sync_rollups_for_loan(db, new_loan.id)
     db.commit()
+    bump_company_version(current.company_id)
     return new_loan
 
 # Loan, Installment, Customer, Payment, Employee ya están importados en tu archivo
 # get_db, get_current_user, AR_TZ, loan_is_effective_for_loans ya existen
 
 @router.get("/printables")
+@heavy_route
 def list_loans_printables(
     q: Optional[str] = Query(None, description="Busca por cliente/telefono/dni"),
     collector_id: Optional[int] = Query(None),
@@ -1021,6 +1080,7 @@ def list_loans_printables(
                     func.greatest(
                         func.coalesce(Installment.amount, 0.0) - func.coalesce(Installment.paid_amount, 0.0),
                         0.0,
+                        type_=Money(),
                     )
                 ),
                 0.0,
@@ -1064,7 +1124,7 @@ def list_loans_printables(
             first_unpaid.c.installment_paid_amount,
             func.greatest(
             func.coalesce(first_unpaid.c.installment_amount, 0.0) - func.coalesce(first_unpaid.c.installment_paid_amount, 0.0),
-            0.0).label("installment_balance"),
+            0.0, type_=Money()).label("installment_balance"),
 
             func.coalesce(total_paid_subq.c.total_paid, 0.0).label("total_paid"),
 
@@ -1090,17 +1150,9 @@ def list_loans_printables(
     if effective_collector_id is not None:
         base = base.filter(Loan.employee_id == effective_collector_id)
 
-    if q and q.strip():
-        s = f"%{q.strip()}%"
-        base = base.filter(
-            or_(
-                Customer.first_name.ilike(s),
-                Customer.last_name.ilike(s),
-                cust_name.ilike(s),
-                Customer.phone.ilike(s),
-                Customer.dni.ilike(s),
-            )
-        )
+    search = SearchQuery(q)
+    if search:
+        base = base.filter(match_clause(search, Customer))
 
     total = base.with_entities(func.count()).scalar() or 0
 
@@ -1265,7 +1317,7 @@ def get_loans_by_customer(
 
     return out
 
-@router.get("/by-employee", response_model=List[LoansOut])
+@router.get("/by-employee", response_model=List[LoansOut], dependencies=[Depends(conditional_list)])
 def get_loans_by_employee(
     employee_id: int = Query(...),
     date_from: Optional[str] = Query(None),
@@ -1309,26 +1361,47 @@ def get_loans_by_employee(
 
     loans = q.order_by(Loan.start_date.desc(), Loan.id.desc()).all()
 
-    out: List[LoansOut] = []
-    today_local = datetime.now(zone).date()
+    # ⚡ cuotas de todos los préstamos en UNA consulta (antes: lazy-load por préstamo),
+    # con "vencida" resuelta en SQL contra el borde UTC de hoy local
+    today_start = today_start_utc(zone)
+    is_overdue_now = case(
+        (and_(Installment.is_paid.isnot(True), Installment.due_date < today_start), True),
+        else_=False,
+    )
+    inst_by_loan: dict[int, List[InstallmentOut]] = {loan.id: [] for loan in loans}
+    if inst_by_loan:
+        inst_rows = (
+            db.query(
+                Installment.id,
+                Installment.loan_id,
+                Installment.amount,
+                Installment.due_date,
+                Installment.status,
+                Installment.is_paid,
+                Installment.number,
+                Installment.paid_amount,
+                is_overdue_now.label("is_overdue_now"),
+            )
+            .filter(Installment.loan_id.in_(q.with_entities(Loan.id).order_by(None)))
+            .order_by(Installment.loan_id, Installment.number, Installment.id)
+            .all()
+        )
+        for r in inst_rows:
+            inst_by_loan[r.loan_id].append(InstallmentOut(
+                id=r.id,
+                amount=r.amount,
+                due_date=r.due_date,
+                status=r.status,
+                is_paid=r.is_paid,
+                loan_id=r.loan_id,
+                is_overdue=bool(r.is_overdue_now),
+                number=r.number,
+                paid_amount=r.paid_amount,
+            ))
 
+    out: List[LoansOut] = []
     for loan in loans:
-        inst_out: List[InstallmentOut] = []
-        for inst in loan.installments:
-            dd = inst.due_date
-            due_local_date = dd.astimezone(zone).date() if isinstance(dd, datetime) else dd
-            is_overdue = (not inst.is_paid) and (due_local_date and due_local_date < today_local)
-            inst_out.append(InstallmentOut(
-                id=inst.id,
-                amount=inst.amount,
-                due_date=inst.due_date,
-                status=inst.status,
-                is_paid=inst.is_paid,
-                loan_id=loan.id,
-                is_overdue=is_overdue,
-                number=inst.number,
-                paid_amount=inst.paid_amount,
-            ))
+        inst_out = inst_by_loan[loan.id]
 
         out.append(LoansOut(
             id=loan.id,
@@ -1352,11 +1425,14 @@ class CouponsBatchRequest(BaseModel):
     tz: Optional[str] = "America/Argentina/Tucuman"
 
 @router.post("/coupons.pdf")
+@heavy_route
 def loans_coupons_pdf(
     body: CouponsBatchRequest,
     db: Session = Depends(get_db),
     current: Employee = Depends(get_current_user),
 ):
+    from app.services.coupons_v5 import build_coupons_v5_pdf
+
     tz = body.tz or "America/Argentina/Tucuman"
     loan_ids = list(dict.fromkeys([int(x) for x in (body.loan_ids or []) if x]))
 
@@ -1410,6 +1486,8 @@ def update_loan(
     )
     if not loan:
         raise HTTPException(status_code=404, detail="Préstamo no encontrado")
+    # 🔒 "tiene pagos?" y el rearmado de cuotas no pueden cruzarse con un pago en curso
+    loan = lock_loan(db, loan_id)
 
     # ¿Tiene pagos? (no voided)
     payments_count = (
@@ -1422,6 +1500,9 @@ def update_loan(
         or 0
     )
 
+    # lo que hoy aporta a daily_rollups (las cuotas pueden rearmarse abajo)
+    rollups_before = capture_rollups(db, loan.company_id, DEBT_LOAN, [loan.id])
+
     # =========================
     # 1) Siempre editables
     # =========================
@@ -1514,9 +1595,12 @@ def update_loan(
                     is_overdue=is_overdue,
                 )
             )
+        record_schedule(db, DEBT_LOAN, loan.id, loan.company_id, current.id)
 
     db.add(loan)
+    sync_rollups_for_loan(db, loan.id, rollups_before)
     db.commit()
+    bump_company_version(current.company_id)
     db.refresh(loan)
     return LoansOut.model_validate(loan)
 
@@ -1546,6 +1630,8 @@ def cancel_loan(
     )
     if not loan:
         raise HTTPException(status_code=404, detail="Préstamo no encontrado")
+    loan = lock_loan(db, loan_id)
+    rollups_before = capture_rollups(db, loan.company_id, DEBT_LOAN, [loan.id])
 
     reason = (body.reason.strip() if body and body.reason else None)
 
@@ -1572,7 +1658,13 @@ def cancel_loan(
     loan.status_reason = reason
 
     db.add(loan)
+    record_event(
+        db, DEBT_LOAN, loan.id, loan.company_id, DEBT_CANCELED, {"reason": reason},
+        occurred_at=loan.status_changed_at, employee_id=current.id,
+    )
+    sync_rollups_for_loan(db, loan.id, rollups_before)
     db.commit()
+    bump_company_version(current.company_id)
 
     return {"message": "Préstamo cancelado", "loan_id": loan.id}
 
@@ -1611,6 +1703,8 @@ def refinance_loan(
     )
     if not loan:
         raise HTTPException(status_code=404, detail="Préstamo no encontrado")
+    loan = lock_loan(db, loan_id)
+    rollups_before = capture_rollups(db, loan.company_id, DEBT_LOAN, [loan.id])
 
     reason = (body.reason.strip() if body and body.reason else None)
 
@@ -1635,7 +1729,14 @@ def refinance_loan(
     loan.status_reason = reason
 
     db.add(loan)
+    record_event(
+        db, DEBT_LOAN, loan.id, loan.company_id, DEBT_REFINANCED,
+        {"reason": reason, "remaining_due_c": to_cents(remaining_due)},
+        occurred_at=loan.status_changed_at, employee_id=current.id,
+    )
+    sync_rollups_for_loan(db, loan.id, rollups_before)
     db.commit()
+    bump_company_version(current.company_id)
 
     return RefinanceResponse(remaining_due=remaining_due)
 
@@ -1644,6 +1745,7 @@ def refinance_loan(
 def list_payments_by_loan(
     loan_id: int,
     include_voided: bool = True,
+    include_archived: bool = Query(False, description="Incluir pagos archivados (préstamos cerrados viejos)"),
     db: Session = Depends(get_db),
     current: Employee = Depends(get_current_user),
 ):
@@ -1661,6 +1763,12 @@ def list_payments_by_loan(
 
     rows = q.order_by(Payment.payment_date.desc(), Payment.id.desc()).all()
 
+    if include_archived:
+        aq = db.query(ArchivedPayment).filter(ArchivedPayment.loan_id == loan_id)
+        if not include_voided:
+            aq = aq.filter(ArchivedPayment.is_voided.is_(False))
+        rows = sorted(rows + aq.all(), key=lambda p: (p.payment_date, p.id), reverse=True)
+
     out = []
     for p in rows:
         out.append({
@@ -1677,6 +1785,34 @@ def list_payments_by_loan(
     return out
 
 
+@router.get("/{loan_id}/ledger")
+def get_loan_ledger(
+    loan_id: int,
+    as_of: Optional[date] = Query(None, description="Estado al cierre de ese día local (YYYY-MM-DD)"),
+    tz: str | None = Query(None),
+    include_events: bool = Query(False, description="Incluir el diario de eventos"),
+    db: Session = Depends(get_db),
+    current: Employee = Depends(get_current_user),
+):
+    """
+    Estado del préstamo reconstruido desde el diario (ledger_events): saldos por
+    cuota, cobrado y estado. Con `as_of` devuelve cómo estaba al cierre de ese día
+    (pagos con fecha posterior o anulaciones posteriores no cuentan).
+    """
+    _assert_loan_same_company(loan_id, db, current)
+    as_of_utc = None
+    if as_of is not None:
+        zone = ZoneInfo(tz) if tz else AR_TZ
+        _, as_of_utc = local_dates_to_utc_window(as_of, as_of, zone)
+
+    out = ledger_state(db, DEBT_LOAN, loan_id, as_of=as_of_utc)
+    if not out["seq"]:
+        raise HTTPException(status_code=404, detail="El préstamo no tiene diario (correr el backfill)")
+    if include_events:
+        out["events"] = list_events(db, DEBT_LOAN, loan_id)
+    return out
+
+
 # ============== PAY ==============
 @router.post("/{loan_id}/pay")
 def pay_loan_installments(
@@ -1685,85 +1821,115 @@ def pay_loan_installments(
     db: Session = Depends(get_db),
     current: Employee = Depends(get_current_user),
 ):
-    loan = _assert_loan_same_company(loan_id, db, current)
+    _assert_loan_same_company(loan_id, db, current)
 
     if payment.amount_paid <= 0:
         raise HTTPException(status_code=400, detail="El monto pagado debe ser mayor a 0")
 
-    if payment.amount_paid > loan.total_due:
-        raise HTTPException(status_code=400, detail="El monto a pagar no puede ser mayor al saldo pendiente")
-
-    unpaid_installments = (
-        db.query(Installment)
-        .filter(Installment.loan_id == loan_id, Installment.is_paid == False)  # noqa: E712
-        .order_by(Installment.number)
-        .all()
-    )
-    if not unpaid_installments:
-        raise HTTPException(status_code=400, detail="Todas las cuotas ya están pagadas")
-
-    remaining_amount = payment.amount_paid
-    cuotas_afectadas = 0
+    # 🔒 serializa pagos concurrentes sobre el mismo préstamo (saldo leído post-lock)
+    service = PaymentService(db)
+    loan = service.lock(DEBT_LOAN, loan_id)
 
-    # ---- aplicar pago en cuotas ----
-    for inst in unpaid_installments:
-        if remaining_amount <= 0:
-            break
-        before = remaining_amount
-        remaining_amount = inst.register_payment(remaining_amount)
-        if before != remaining_amount:
-            cuotas_afectadas += 1
-
-    applied_amount = payment.amount_paid - remaining_amount
-    if applied_amount <= 0:
-        raise HTTPException(status_code=400, detail="No se aplicó ningún pago")
+    if to_cents(payment.amount_paid) > to_cents(loan.total_due):
+        raise HTTPException(status_code=400, detail="El monto a pagar no puede ser mayor al saldo pendiente")
 
     # ---- Determinar collector_id ----
     # 1. Por defecto: el usuario logueado que está cobrando
-    collector_id = current.id
-
-    # 2. Si este payment es legacy o por cualquier razón viene null, usar el cobrador del préstamo
-    if not collector_id:
-        collector_id = loan.employee_id
-
-    # ---- Registrar Payment ----
-    payment_row = Payment(
-        amount=float(applied_amount),
-        loan_id=loan.id,
-        purchase_id=None,
-        payment_date=datetime.now(timezone.utc),
+    # 2. Si por cualquier razón viene null, usar el cobrador del préstamo
+    collector_id = current.id or loan.employee_id
+
+    # ---- Registrar + imputar (cuotas más viejas primero) en una transacción ----
+    result = service.apply(
+        DEBT_LOAN,
+        loan_id,
+        amount=payment.amount_paid,
+        collector_id=collector_id,
+        company_id=current.company_id,
         payment_type=payment.payment_type,
         description=(payment.description or "").strip() or None,
-        collector_id=collector_id
+        require_applied=True,
     )
 
-    db.add(payment_row)
-
-    # ---- Actualizar saldo del loan ----
-    loan.total_due = max(loan.total_due - applied_amount, 0.0)
-    if loan.total_due == 0:
-        loan.status = LoanStatus.PAID.value
-
-    db.commit()
-
-    # ---- Ledger + status ----
-    try:
-        recompute_ledger_for_loan(db, loan_id)
-        db.commit()
-        update_status_if_fully_paid(db, loan_id=loan_id, purchase_id=None)
-    except Exception:
-        db.rollback()
-        raise
-
     return {
         "mensaje": "Pago registrado correctamente",
-        "payment_id": payment_row.id,
-        "monto_pagado": applied_amount,
+        "payment_id": result.payment.id,
+        "monto_pagado": result.applied_amount,
         "saldo_pendiente": loan.total_due,
-        "cuotas_afectadas": cuotas_afectadas
+        "cuotas_afectadas": result.installments_affected
     }
 
 
+# ============== BATCH (getMany) ==============
+@router.get("/batch", response_model=List[LoansOut])
+def get_loans_batch(
+    ids: List[int] = Depends(batch_ids),
+    db: Session = Depends(get_db),
+    current: Employee = Depends(get_current_user),
+):
+    """
+    Varios préstamos por id: una consulta `IN` con los mismos agregados que
+    GET /{loan_id} (cliente, cobrador, pagos no anulados), sin cuotas.
+    """
+    pay_agg = (
+        db.query(
+            Payment.loan_id.label("loan_id"),
+            func.count(Payment.id).label("payments_count"),
+            func.coalesce(func.sum(Payment.amount), 0.0).label("total_paid"),
+        )
+        .filter(Payment.loan_id.in_(ids))
+        .filter(Payment.is_voided == False)  # noqa: E712
+        .group_by(Payment.loan_id)
+        .subquery()
+    )
+
+    rows = (
+        db.query(
+            Loan.id,
+            Loan.customer_id,
+            Loan.company_id,
+            Loan.employee_id,
+            Loan.amount,
+            Loan.total_due,
+            Loan.installments_count,
+            Loan.installment_amount,
+            Loan.frequency,
+            Loan.installment_interval_days,
+            Loan.start_date,
+            Loan.status,
+            Loan.status_changed_at,
+            Loan.status_reason,
+            Loan.description,
+            Loan.collection_day,
+            Loan.refinanced_from_loan_id,
+            Loan.refinanced_to_loan_id,
+            Customer.first_name,
+            Customer.last_name,
+            Employee.name.label("collector_name"),
+            func.coalesce(pay_agg.c.payments_count, 0).label("payments_count"),
+            func.coalesce(pay_agg.c.total_paid, 0.0).label("total_paid"),
+        )
+        .select_from(Loan)
+        .join(Customer, Customer.id == Loan.customer_id)
+        .outerjoin(Employee, Employee.id == Loan.employee_id)
+        .outerjoin(pay_agg, pay_agg.c.loan_id == Loan.id)
+        .filter(Loan.id.in_(ids))
+        .filter(Loan.company_id == current.company_id)
+        .all()
+    )
+
+    out = []
+    for r in rows:
+        d = dict(r._mapping)
+        first, last = d.pop("first_name"), d.pop("last_name")
+        d["customer_name"] = f"{first or ''} {last or ''}".strip() or "-"
+        d["payments_count"] = int(d["payments_count"] or 0)
+        d["total_paid"] = float(d["total_paid"] or 0.0)
+        # compatibilidad con front viejo
+        d["employee_name"] = d["collector_name"]
+        out.append(d)
+    return in_request_order(out, ids)
+
+
 # ============== GET ONE ==============
 @router.get("/{loan_id}", response_model=LoansOut)
 def get_loan(
@@ -1835,6 +2001,7 @@ def get_loan(
 @router.get("/{loan_id}/installments", response_model=List[InstallmentOut])
 def get_installments_for_loan(
     loan_id: int,
+    include_archived: bool = Query(False, description="Incluir cuotas archivadas (préstamos cerrados viejos)"),
     db: Session = Depends(get_db),
     current: Employee = Depends(get_current_user),
 ):
@@ -1845,6 +2012,13 @@ def get_installments_for_loan(
         .order_by(Installment.id)
         .all()
     )
+    if include_archived:
+        installments += (
+            db.query(ArchivedInstallment)
+            .filter(ArchivedInstallment.loan_id == loan_id)
+            .order_by(ArchivedInstallment.id)
+            .all()
+        )
     if not installments:
         raise HTTPException(status_code=404, detail="No se encontraron cuotas para este préstamo")
     return installments
@@ -1857,6 +2031,8 @@ def loan_coupon_pdf(
     db: Session = Depends(get_db),
     current: Employee = Depends(get_current_user),
 ):
+    from app.services.coupons_v5 import build_coupons_v5_pdf
+
     loan = _assert_loan_same_company(loan_id, db, current)
 
     # Cargar relaciones si hiciera falta
@@ -1,6 +1,6 @@
 from typing import Optional
 from zoneinfo import ZoneInfo
-from fastapi import APIRouter, Body, HTTPException, Depends, Query, Path
+from fastapi import APIRouter, Body, HTTPException, Depends, Query, Path, Request, Response
 from pydantic import BaseModel
 from sqlalchemy.orm import Session, aliased, joinedload
 from datetime import datetime, timezone, date, time, timedelta
@@ -16,21 +16,42 @@ from app.models.models import (
     Customer,
     Installment,
     PaymentAllocation,
+    DailyRollup,
+    ArchivedPayment,
 )
 from app.schemas.payments import (
     BulkPaymentApplyIn,
     BulkPaymentApplyOut,
     BulkPaymentItemOut,
     PaymentCreate,
+    PaymentsListResponse,
     PaymentOut,
     PaymentDetailOut,
     PaymentsSummaryResponse,
     PaymentUpdate,
 )
 from app.utils.license import ensure_company_active
-from app.utils.status import update_status_if_fully_paid
+from app.utils.admission import admission_control, heavy_route
+from app.utils.status import refresh_debt_status
 from app.utils.auth import get_current_user
-from app.utils.ledger import recompute_ledger_for_loan
+from app.utils.batch import batch_ids, in_request_order
+from app.utils.conditional_get import conditional_list
+from app.utils.fast_json import fast_response
+from app.utils.ledger import (
+    DEBT_LOAN,
+    DEBT_PURCHASE,
+    debt_of,
+    lock_debt,
+    recompute_ledger,
+    recompute_ledger_for_loan,
+)
+from app.utils.response_cache import SummaryCache, bump_company_version
+from app.utils.search import SearchQuery, match_clause
+from app.services.payment_receipts import get_receipt_bytes, load_receipt_data
+from app.services.payment_service import PaymentService
+from app.services.ledger_journal import record_payment_posted, record_payment_voided
+from app.services.daily_rollups import capture_rollups, rollup_query, rollups_usable, sync_rollups
+from app.services.loan_archive import payment_history
 from app.utils.time_windows import local_dates_to_utc_window as _local_dates_to_utc_window
 
 # Helpers de allocations
@@ -41,11 +62,14 @@ from app.utils.allocations import (
 from app.utils.time_windows import parse_iso_aware_utc, local_dates_to_utc_window, AR_TZ
 
 router = APIRouter(
-    dependencies=[Depends(get_current_user), Depends(ensure_company_active)]  # 🔒 exige Bearer válido en todo el router
+    dependencies=[Depends(get_current_user), Depends(ensure_company_active), Depends(admission_control)]  # 🔒 exige Bearer válido en todo el router
 )
 
 @router.get("/summary", response_model=PaymentsSummaryResponse)
+@heavy_route
 def get_payments_summary(
+    request: Request,
+    response: Response,
     # admitimos ambos nombres para compat
     date_from: Optional[str] = Query(None, alias="date_from"),
     date_to:   Optional[str] = Query(None, alias="date_to"),
@@ -61,8 +85,19 @@ def get_payments_summary(
     raw_to   = date_to   or end_date
     zone = ZoneInfo(tz) if tz else AR_TZ
 
+    # ⚡ cache por empresa (se invalida con cada pago/anulación)
+    cache = SummaryCache(
+        request, response, current.company_id, "payments.summary",
+        {"from": raw_from, "to": raw_to, "employee_id": employee_id, "province": province},
+        tz,
+    )
+    hit = cache.lookup()
+    if hit is not None:
+        return hit
+
     start_utc: Optional[datetime] = None
     end_utc_excl: Optional[datetime] = None
+    dfrom = dto = None
 
     def _looks_like_date(s: Optional[str]) -> bool:
         if not s:
@@ -78,44 +113,63 @@ def get_payments_summary(
         end_utc   = parse_iso_aware_utc(raw_to)
         end_utc_excl = end_utc
 
+    # ⚡ daily_rollups: rango por días locales (o sin rango) y sin provincia
+    by_local_days = dfrom is not None or (not raw_from and not raw_to)
+    if by_local_days and not province and rollups_usable(tz):
+        rq = rollup_query(db, current.company_id, dfrom, dto, collector_id=employee_id)
+        total = float(rq.with_entities(func.coalesce(func.sum(DailyRollup.collected_amount), 0.0)).scalar() or 0.0)
+        by_day_rows = (
+            rq.with_entities(
+                DailyRollup.local_day.label("day"),
+                func.coalesce(func.sum(DailyRollup.collected_amount), 0.0).label("amount"),
+            )
+            .group_by(DailyRollup.local_day)
+            .having(func.sum(DailyRollup.collected_count) > 0)
+            .order_by(DailyRollup.local_day)
+            .all()
+        )
+        by_day = [{"date": r.day, "amount": float(r.amount)} for r in by_day_rows]
+        return cache.store(PaymentsSummaryResponse(total_amount=total, by_day=by_day))
+
     L  = aliased(Loan)
     P  = aliased(Purchase)
     CL = aliased(Customer)
     CP = aliased(Customer)
+    Pay = payment_history()  # 🗄️ incluye pagos archivados
 
     base = (
-        db.query(Payment)
-          .outerjoin(L, Payment.loan_id == L.id)
+        db.query(Pay)
+          .outerjoin(L, Pay.loan_id == L.id)
           .outerjoin(CL, L.customer_id == CL.id)
-          .outerjoin(P, Payment.purchase_id == P.id)
+          .outerjoin(P, Pay.purchase_id == P.id)
           .outerjoin(CP, P.customer_id == CP.id)
-          .filter(Payment.is_voided == False)
+          .filter(Pay.is_voided == False)
           .filter(or_(CL.company_id == current.company_id,
                       CP.company_id == current.company_id))
     )
 
     if start_utc is not None:
-        base = base.filter(Payment.payment_date >= start_utc)
+        base = base.filter(Pay.payment_date >= start_utc)
     if end_utc_excl is not None:
-        base = base.filter(Payment.payment_date < end_utc_excl)
+        base = base.filter(Pay.payment_date < end_utc_excl)
 
     # 🔴 CAMBIO CLAVE: ahora filtra por collector_id
     if employee_id is not None:
-        base = base.filter(Payment.collector_id == employee_id)
+        base = base.filter(Pay.collector_id == employee_id)
 
     if province:
         base = base.filter(or_(CL.province == province,
                                CP.province == province))
 
-    total_q = base.with_entities(func.coalesce(func.sum(Payment.amount), 0.0))
+    total_q = base.with_entities(func.coalesce(func.sum(Pay.amount), 0.0))
     total = float(total_q.scalar() or 0.0)
 
     tzname = (tz or "America/Argentina/Buenos_Aires")
-    day_local = func.date(func.timezone(tzname, Payment.payment_date))
+    day_local = func.date(func.timezone(tzname, Pay.payment_date))
     by_day_rows = (
         base.with_entities(
             day_local.label("day"),
-            func.coalesce(func.sum(Payment.amount), 0.0).label("amount"),
+            func.coalesce(func.sum(Pay.amount), 0.0).label("amount"),
         )
         .group_by(day_local)
         .order_by(day_local)
@@ -123,7 +177,7 @@ def get_payments_summary(
     )
     by_day = [{"date": r.day, "amount": float(r.amount)} for r in by_day_rows]
 
-    return PaymentsSummaryResponse(total_amount=total, by_day=by_day)
+    return cache.store(PaymentsSummaryResponse(total_amount=total, by_day=by_day))
 
 
 
@@ -137,58 +191,34 @@ def create_payment(
     if not payment.loan_id and not payment.purchase_id:
         raise HTTPException(status_code=400, detail="Debe indicar loan_id o purchase_id")
 
-    # ⏰ Siempre UTC aware
-    now_utc = datetime.now(timezone.utc)
-
     # --- Validar scoping por empresa ---
     if payment.loan_id:
-        # Si usás SQLAlchemy 1.4+: loan = db.get(Loan, payment.loan_id)
-        loan = db.query(Loan).get(payment.loan_id)
-        if not loan:
-            raise HTTPException(status_code=404, detail="Préstamo no encontrado")
-        if loan.company_id != current.company_id:
-            raise HTTPException(status_code=403, detail="No autorizado para este préstamo")
-
-    if payment.purchase_id:
-        purchase = db.query(Purchase).get(payment.purchase_id)
-        if not purchase:
-            raise HTTPException(status_code=404, detail="Compra no encontrada")
-        if purchase.company_id != current.company_id:
-            raise HTTPException(status_code=403, detail="No autorizado para esta compra")
-
-    # --- Crear pago en UTC ---
-    new_p = Payment(
-        amount=payment.amount,
-        payment_date=now_utc,            # 👈 guardado canonical en UTC (timestamptz)
-        loan_id=payment.loan_id,
-        purchase_id=payment.purchase_id,
-        payment_type=payment.payment_type,
-        description=payment.description,
-        collector_id=current.id,
-    )
+        debt_kind, debt_id = DEBT_LOAN, payment.loan_id
+    else:
+        debt_kind, debt_id = DEBT_PURCHASE, payment.purchase_id
 
-    db.add(new_p)
-    db.commit()
-    db.refresh(new_p)
+    # 🔒 un pago a la vez por deuda: alta + imputación en la misma transacción
+    service = PaymentService(db)
+    debt = service.lock(debt_kind, debt_id)
+    if debt.company_id != current.company_id:
+        detail = "No autorizado para este préstamo" if debt_kind == DEBT_LOAN else "No autorizado para esta compra"
+        raise HTTPException(status_code=403, detail=detail)
 
-    # --- Actualizaciones derivadas (no bloquear alta ante errores) ---
+    # Un pago sin imputar deja el ledger inconsistente: si la imputación falla, no se registra.
     try:
-        if new_p.loan_id:
-            update_status_if_fully_paid(db, loan_id=new_p.loan_id, purchase_id=None)
-            recompute_ledger_for_loan(db, new_p.loan_id)
-            db.commit()
-        if new_p.purchase_id:
-            update_status_if_fully_paid(db, loan_id=None, purchase_id=new_p.purchase_id)
-            db.commit()
-    except Exception:
-        # no romper alta si algo falla en utilidades
-        pass
-
-    # NOTA:
-    # Las imputaciones (PaymentAllocation) las hacés en el flujo específico de imputación,
-    # por eso no se tocan aquí.
+        result = service.apply(
+            debt_kind,
+            debt_id,
+            amount=payment.amount,
+            collector_id=current.id,
+            company_id=current.company_id,
+            payment_type=payment.payment_type,
+            description=payment.description,
+        )
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=500, detail=f"Error al registrar el pago: {e}")
 
-    return new_p
+    return result.payment
 
 
 def mark_next_installment_pending(db: Session, loan_id: int = None, purchase_id: int = None):
@@ -215,7 +245,7 @@ from fastapi import Depends, Query
 from sqlalchemy.orm import Session, aliased, joinedload
 from sqlalchemy import or_
 
-@router.get("/", response_model=list[PaymentOut])
+@router.get("/", response_model=list[PaymentOut], dependencies=[Depends(conditional_list)])
 def list_payments(
     # ✅ compat: aceptar date_from/date_to (Flutter) y start_date/end_date (legacy/admin)
     date_from: Optional[str] = Query(None, alias="date_from"),
@@ -308,7 +338,8 @@ def list_payments(
 
     return out
 
-@router.get("/all")
+@router.get("/all", response_model=PaymentsListResponse, dependencies=[Depends(conditional_list)])
+@heavy_route
 def list_payments_all(
     # ✅ compat: aceptar date_from/date_to (Flutter) y start_date/end_date (legacy/admin)
     date_from: Optional[str] = Query(None, alias="date_from"),
@@ -402,21 +433,17 @@ def list_payments_all(
         prov = province.strip()
         base_ids = base_ids.filter(or_(CL.province == prov, CP.province == prov))
 
-    q_str = (q or "").strip()
-    if q_str:
-        like = f"%{q_str}%"
+    search = SearchQuery(q)
+    if search:
+        # cliente del préstamo o de la compra, vía índice de búsqueda
         conds = [
-            CL.first_name.ilike(like),
-            CL.last_name.ilike(like),
-            CL.phone.ilike(like),
-            CP.first_name.ilike(like),
-            CP.last_name.ilike(like),
-            CP.phone.ilike(like),
+            match_clause(search, CL),
+            match_clause(search, CP),
         ]
 
         # si es número, permitir buscar por ID pago exacto
-        if q_str.isdigit():
-            conds.append(Payment.id == int(q_str))
+        if search.id_value is not None:
+            conds.append(Payment.id == search.id_value)
 
         base_ids = base_ids.filter(or_(*conds))
 
@@ -430,48 +457,61 @@ def list_payments_all(
         .subquery()
     )
 
+    # ⚡ sólo columnas (sin hidratar Payment/Loan/Customer) → dicts + orjson
+    E = aliased(Employee)
     rows = (
-        db.query(Payment)
-        .join(ids_subq, ids_subq.c.id == Payment.id)
-        .options(
-            joinedload(Payment.loan).joinedload(Loan.customer),
-            joinedload(Payment.purchase).joinedload(Purchase.customer),
-            joinedload(Payment.collector),
+        db.query(
+            Payment.id,
+            Payment.amount,
+            Payment.payment_date,
+            Payment.loan_id,
+            Payment.purchase_id,
+            Payment.payment_type,
+            Payment.description,
+            Payment.collector_id,
+            Payment.is_voided,
+            func.coalesce(CL.id, CP.id).label("customer_id"),
+            func.coalesce(CL.first_name, CP.first_name).label("first_name"),
+            func.coalesce(CL.last_name, CP.last_name).label("last_name"),
+            func.coalesce(CL.province, CP.province).label("customer_province"),
+            E.name.label("collector_name"),
         )
+        .join(ids_subq, ids_subq.c.id == Payment.id)
+        .outerjoin(L, Payment.loan_id == L.id)
+        .outerjoin(CL, L.customer_id == CL.id)
+        .outerjoin(P, Payment.purchase_id == P.id)
+        .outerjoin(CP, P.customer_id == CP.id)
+        .outerjoin(E, E.id == Payment.collector_id)
         .order_by(Payment.payment_date.desc(), Payment.id.desc())
         .all()
     )
 
-    out: list[PaymentOut] = []
-    for p in rows:
-        loan = p.loan
-        purch = p.purchase
-        cust = (loan.customer if loan else None) or (purch.customer if purch else None)
-
-        out.append(
-            PaymentOut(
-                id=p.id,
-                amount=float(p.amount or 0),
-                payment_date=p.payment_date,
-                loan_id=p.loan_id,
-                purchase_id=p.purchase_id,
-                payment_type=p.payment_type,
-                description=p.description,
-                customer_id=cust.id if cust else None,
-                customer_name=(
-                    f"{(cust.last_name or '').strip()} {(cust.first_name or '').strip()}".strip()
-                    if cust
-                    else None
-                ),
-                customer_province=(cust.province if cust else None),
-                collector_id=p.collector_id,
-                collector_name=p.collector.name if p.collector else None,
-                # ✅ recomendado: exponerlo para UI (chips/estados)
-                is_voided=bool(p.is_voided),
-            )
-        )
+    # mismas claves/orden que PaymentOut
+    out = [
+        {
+            "amount": float(r.amount or 0),
+            "loan_id": r.loan_id,
+            "purchase_id": r.purchase_id,
+            "payment_type": r.payment_type,
+            "description": r.description,
+            "id": r.id,
+            "payment_date": r.payment_date,
+            "customer_id": r.customer_id,
+            "customer_name": (
+                f"{(r.last_name or '').strip()} {(r.first_name or '').strip()}".strip()
+                if r.customer_id is not None
+                else None
+            ),
+            "customer_province": r.customer_province,
+            "collector_id": r.collector_id,
+            "collector_name": r.collector_name,
+            # ✅ recomendado: exponerlo para UI (chips/estados)
+            "is_voided": bool(r.is_voided),
+        }
+        for r in rows
+    ]
 
-    return {"data": out, "total": int(total or 0)}
+    return fast_response({"data": out, "total": int(total or 0)})
 
 
 
@@ -518,7 +558,7 @@ def _ensure_scope_and_get_context(db: Session, payment: Payment, current: Employ
             customer_name = _full_name(purchase.customer)
             customer_doc = getattr(purchase.customer, "dni", None)
             customer_phone = getattr(purchase.customer, "phone", None)
-            customer_province = getattr(loan.customer, "province", None)
+            customer_province = getattr(purchase.customer, "province", None)
         if purchase.company:
             company_name = purchase.company.name
             company_cuit = getattr(purchase.company, "cuit", None)
@@ -546,6 +586,7 @@ def _ensure_scope_and_get_context(db: Session, payment: Payment, current: Employ
 
 
 @router.post("/bulk-apply", response_model=BulkPaymentApplyOut)
+@heavy_route
 def bulk_apply_payments(
     payload: BulkPaymentApplyIn,
     db: Session = Depends(get_db),
@@ -563,14 +604,22 @@ def bulk_apply_payments(
     if not items:
         raise HTTPException(status_code=400, detail="items vacío")
 
-    # Pre-cargar loans únicos y validar scope
-    loan_ids = sorted({it.loan_id for it in items})
-    loans = (
-        db.query(Loan)
-        .filter(Loan.id.in_(loan_ids), Loan.company_id == current.company_id)
+    # Validar scope primero: nunca bloquear préstamos de otra empresa
+    loan_ids = [
+        lid
+        for (lid,) in db.query(Loan.id)
+        .filter(Loan.id.in_({it.loan_id for it in items}), Loan.company_id == current.company_id)
+        .order_by(Loan.id)
         .all()
-    )
-    loans_by_id = {l.id: l for l in loans}
+    ]
+    # 🔒 en orden de id (evita deadlocks entre dos bulk con préstamos en común);
+    # los saldos de abajo se leen ya bloqueados
+    loans_by_id = {}
+    for lid in loan_ids:
+        loan = lock_debt(db, DEBT_LOAN, lid)
+        if loan is not None:
+            loans_by_id[lid] = loan
+    rollups_before = capture_rollups(db, current.company_id, DEBT_LOAN, list(loans_by_id))
 
     results = []
     ok = 0
@@ -650,6 +699,7 @@ def bulk_apply_payments(
             )
             db.add(pay)
             db.flush()  # obtener pay.id
+            record_payment_posted(db, pay, loan.company_id)
             payments_created[idx] = pay.id
             affected_loans.add(loan.id)
             ok += 1
@@ -663,7 +713,7 @@ def bulk_apply_payments(
     for loan_id in affected_loans:
         try:
             recompute_ledger_for_loan(db, loan_id)
-            update_status_if_fully_paid(db, loan_id=loan_id, purchase_id=None)
+            refresh_debt_status(db, loan_id=loan_id)  # sin commit: un solo commit al final, con los locks
         except Exception as e:
             if payload.all_or_nothing:
                 db.rollback()
@@ -672,7 +722,9 @@ def bulk_apply_payments(
             # (mejorable: flaggear resultados por loan)
             continue
 
+    sync_rollups(db, current.company_id, DEBT_LOAN, list(loans_by_id), rollups_before)
     db.commit()
+    bump_company_version(current.company_id)
 
     return BulkPaymentApplyOut(ok=ok, failed=failed, results=results)
 
@@ -680,87 +732,131 @@ def bulk_apply_payments(
 
 
 
+@router.get("/batch", response_model=list[PaymentOut])
+def get_payments_batch(
+    ids: list[int] = Depends(batch_ids),
+    db: Session = Depends(get_db),
+    current: Employee = Depends(get_current_user),
+):
+    """Varios pagos por id (incluye anulados) con cliente/cobrador, en una sola consulta."""
+    L  = aliased(Loan)
+    P  = aliased(Purchase)
+    CL = aliased(Customer)
+    CP = aliased(Customer)
+    E  = aliased(Employee)
+
+    rows = (
+        db.query(
+            Payment.id,
+            Payment.amount,
+            Payment.payment_date,
+            Payment.loan_id,
+            Payment.purchase_id,
+            Payment.payment_type,
+            Payment.description,
+            Payment.collector_id,
+            Payment.is_voided,
+            func.coalesce(CL.id, CP.id).label("customer_id"),
+            func.coalesce(CL.first_name, CP.first_name).label("first_name"),
+            func.coalesce(CL.last_name, CP.last_name).label("last_name"),
+            func.coalesce(CL.province, CP.province).label("customer_province"),
+            E.name.label("collector_name"),
+        )
+        .outerjoin(L, Payment.loan_id == L.id)
+        .outerjoin(CL, L.customer_id == CL.id)
+        .outerjoin(P, Payment.purchase_id == P.id)
+        .outerjoin(CP, P.customer_id == CP.id)
+        .outerjoin(E, E.id == Payment.collector_id)
+        .filter(Payment.id.in_(ids))
+        .filter(or_(CL.company_id == current.company_id,
+                    CP.company_id == current.company_id))
+        .all()
+    )
+
+    out = []
+    for r in rows:
+        d = dict(r._mapping)
+        first, last = d.pop("first_name"), d.pop("last_name")
+        # mismo formato que el listado: "Apellido Nombre"
+        d["customer_name"] = f"{(last or '').strip()} {(first or '').strip()}".strip() if d["customer_id"] else None
+        d["amount"] = float(d["amount"] or 0)
+        d["is_voided"] = bool(d["is_voided"])
+        out.append(d)
+    return in_request_order(out, ids)
+
+
 @router.get("/{payment_id}", response_model=PaymentDetailOut)
 def get_payment_detail(
     payment_id: int = Path(..., ge=1),
     db: Session = Depends(get_db),
     current: Employee = Depends(get_current_user),
 ):
-    payment = db.query(Payment).get(payment_id)
-    if not payment:
+    # ⚡ una sola consulta: pago + cliente/empresa/cobrador + agregado de cuotas del
+    # préstamo (sumas condicionales contra el borde UTC de "hoy local"), igual que el recibo
+    d = load_receipt_data(db, payment_id, current.company_id)
+    if d is None:
         raise HTTPException(status_code=404, detail="Payment no encontrado")
 
-    ctx = _ensure_scope_and_get_context(db, payment, current)
-
-    loan_total_amount = None
-    loan_total_due = None
-    installments_paid = None
-    installments_overdue = None
-    installments_pending = None
+    return PaymentDetailOut(
+        id=d.payment_id,
+        amount=d.amount,
+        payment_date=d.payment_date,
+        loan_id=d.loan_id,
+        purchase_id=d.purchase_id,
+        payment_type=d.payment_type,
+        description=d.description,
+        customer_name=d.customer_name,
+        customer_doc=d.customer_doc,
+        customer_phone=d.customer_phone,
+        customer_province=d.customer_province,
+        company_name=d.company_name,
+        collector_name=d.collector_name,
+        reference=d.reference,
+        loan_total_amount=d.loan_total_amount,
+        loan_total_due=d.loan_total_due,
+        installments_paid=d.installments_paid,
+        installments_overdue=d.installments_overdue,
+        installments_pending=d.installments_pending,
+        is_voided=d.is_voided,
+        voided_at=d.voided_at,
+        void_reason=d.void_reason,
+    )
 
-    if payment.loan_id:
-        loan_ins = db.query(Installment).filter(Installment.loan_id == payment.loan_id).all()
-        if loan_ins:
-            loan_total_amount = float(sum((ins.amount or 0) for ins in loan_ins))
-            loan_total_due = float(sum(max(0.0, (ins.amount or 0) - (ins.paid_amount or 0)) for ins in loan_ins))
-
-            # 👇 usar día LOCAL AR (o podrías parametrizar tz si querés)
-            today_local = datetime.now(AR_TZ).date()
-
-            paid = over = pend = 0
-            for ins in loan_ins:
-                amt = float(ins.amount or 0)
-                paid_amt = float(ins.paid_amount or 0)
-                is_paid = paid_amt >= amt - 1e-6
-
-                if is_paid:
-                    paid += 1
-                else:
-                    due_dt = getattr(ins, "due_date", None)
-                    # due_date podría ser aware UTC → comparar por fecha local
-                    if isinstance(due_dt, datetime):
-                        due_local_date = due_dt.astimezone(AR_TZ).date()
-                    else:
-                        # si fuera DATE puro
-                        due_local_date = due_dt
-                    if due_local_date and due_local_date < today_local:
-                        over += 1
-                    else:
-                        pend += 1
-
-            installments_paid = paid
-            installments_overdue = over
-            installments_pending = pend
 
-    return PaymentDetailOut(
-        id=payment.id,
-        amount=float(payment.amount or 0),
-        payment_date=payment.payment_date,
-        loan_id=payment.loan_id,
-        purchase_id=payment.purchase_id,
-        payment_type=payment.payment_type,
-        description=payment.description,
-        customer_name=ctx["customer_name"],
-        customer_doc=ctx["customer_doc"],
-        customer_phone=ctx["customer_phone"],
-        customer_province=ctx["customer_province"],
-        company_name=ctx["company_name"],
-        company_cuit=ctx["company_cuit"],
-        collector_name=ctx["collector_name"],
-        receipt_number=getattr(payment, "receipt_number", None),
-        reference=ctx["reference"],
-        loan_total_amount=loan_total_amount,
-        loan_total_due=loan_total_due,
-        installments_paid=installments_paid,
-        installments_overdue=installments_overdue,
-        installments_pending=installments_pending,
-        is_voided=payment.is_voided,
-        voided_at=payment.voided_at,
-        void_reason=payment.void_reason,
 
+@router.get("/{payment_id}/receipt.pdf")
+def get_payment_receipt_pdf(
+    payment_id: int = Path(..., ge=1),
+    db: Session = Depends(get_db),
+    current: Employee = Depends(get_current_user),
+):
+    body = get_receipt_bytes(db, payment_id, current.company_id, "pdf")
+    if body is None:
+        raise HTTPException(status_code=404, detail="Payment no encontrado")
+    return Response(
+        content=body,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'inline; filename="recibo_{payment_id}.pdf"'},
     )
 
 
+@router.get("/{payment_id}/receipt.escpos")
+def get_payment_receipt_escpos(
+    payment_id: int = Path(..., ge=1),
+    cols: int = Query(32, ge=24, le=64, description="Columnas de la impresora (58 mm = 32, 80 mm = 48)"),
+    db: Session = Depends(get_db),
+    current: Employee = Depends(get_current_user),
+):
+    # 🧾 bytes ESC/POS crudos: la app los manda tal cual a la impresora Bluetooth
+    body = get_receipt_bytes(db, payment_id, current.company_id, "escpos", cols=cols)
+    if body is None:
+        raise HTTPException(status_code=404, detail="Payment no encontrado")
+    return Response(
+        content=body,
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="recibo_{payment_id}.bin"'},
+    )
+
 
 @router.put("/{payment_id}", response_model=PaymentDetailOut)
 def update_payment(
@@ -784,6 +880,7 @@ def update_payment(
 
     db.add(payment)
     db.commit()
+    bump_company_version(current.company_id)  # los listados devuelven tipo y descripción
     db.refresh(payment)
 
     ctx = _ensure_scope_and_get_context(db, payment, current)
@@ -819,39 +916,53 @@ def void_payment(
     current = Depends(get_current_user),   # Employee
 ):
     """
-    Anula un pago:
+    Anula un pago (de préstamo o de venta):
       - Marca el Payment como is_voided=True y guarda motivo/fecha/usuario.
       - Elimina allocations del pago (si existen).
-      - Recalcula TODAS las cuotas del préstamo afectado (replay de pagos no anulados).
-      - Actualiza estado y totales del préstamo.
+      - Recalcula TODAS las cuotas de la deuda afectada (replay de pagos no anulados).
+      - Actualiza estado y totales del préstamo/venta.
     """
 
     try:
-        # 1) Bloqueo de la fila (evita doble anulación por doble tap)
+        pay = db.query(Payment).filter(Payment.id == payment_id).one_or_none()
+        if not pay:
+            raise HTTPException(status_code=404, detail="Pago no encontrado")
+
+        # 2) Deuda asociada (préstamo o venta)
+        debt = debt_of(pay)
+        if debt is None:
+            raise HTTPException(status_code=400, detail="El pago no está asociado a un préstamo ni a una venta")
+        debt_kind, debt_id = debt
+        is_loan = debt_kind == DEBT_LOAN
+
+        # 1) Bloqueo: primero la deuda (mismo orden que los pagos) y después la fila
+        #    del pago, releída post-lock (evita doble anulación por doble tap)
+        parent = lock_debt(db, debt_kind, debt_id)
         pay = (
             db.query(Payment)
+              .populate_existing()
               .filter(Payment.id == payment_id)
               .with_for_update()
-              .one_or_none()
+              .one()
         )
-        if not pay:
-            raise HTTPException(status_code=404, detail="Pago no encontrado")
-
-        # 2) P0: solo prestamos (no compras)
-        if pay.loan_id is None:
-            raise HTTPException(status_code=400, detail="La anulación P0 aplica sólo a pagos de préstamos")
 
         # 3) Scope por empresa
-        loan = db.query(Loan).filter(Loan.id == pay.loan_id).one_or_none()
-        if not loan:
-            raise HTTPException(status_code=404, detail="Préstamo no encontrado")
+        if not parent:
+            raise HTTPException(status_code=404, detail="Préstamo no encontrado" if is_loan else "Compra no encontrada")
 
-        if loan.company_id != current.company_id:
+        if parent.company_id != current.company_id:
             raise HTTPException(status_code=403, detail="No autorizado para anular pagos de otra compañía")
 
         # 4) Idempotencia
         if pay.is_voided:
-            return {"message": "El pago ya estaba anulado", "payment_id": pay.id, "loan_id": pay.loan_id}
+            return {
+                "message": "El pago ya estaba anulado",
+                "payment_id": pay.id,
+                "loan_id": pay.loan_id,
+                "purchase_id": pay.purchase_id,
+            }
+
+        rollups_before = capture_rollups(db, parent.company_id, debt_kind, [debt_id])
 
         # 5) Marcar como anulado + auditoría
         pay.is_voided = True
@@ -860,27 +971,33 @@ def void_payment(
         pay.voided_by_employee_id = getattr(current, "id", None)
         db.add(pay)
         db.flush()
+        record_payment_voided(db, pay, parent.company_id)
 
         # 6) Eliminar allocations del pago anulado (si tu modelo las usa)
         delete_allocations_for_payment(db, pay.id)
         db.flush()
 
         # 7) Recalcular ledger (replay de pagos no anulados)
-        recompute_ledger_for_loan(db, pay.loan_id)
+        recompute_ledger(db, debt_kind, debt_id)
 
-        # 8) Actualizar estado y totales del préstamo (incluye total_due)
-        update_status_if_fully_paid(db, loan_id=pay.loan_id, purchase_id=None)
+        # 8) Actualizar estado y totales del préstamo/venta (incluye total_due);
+        #    sin commit: anulación, diario y rollups van en el mismo commit, con el lock
+        refresh_debt_status(db, loan_id=pay.loan_id, purchase_id=pay.purchase_id)
 
+        sync_rollups(db, parent.company_id, debt_kind, [debt_id], rollups_before)
         db.commit()
+        bump_company_version(current.company_id)
 
         # (Opcional) refrescar y devolver total_due actualizado
-        db.refresh(loan)
+        db.refresh(parent)
+        prefix = "loan" if is_loan else "purchase"
         return {
             "message": "Pago anulado",
             "payment_id": pay.id,
             "loan_id": pay.loan_id,
-            "loan_total_due": float(getattr(loan, "total_due", 0) or 0),
-            "loan_status": getattr(loan, "status", None),
+            "purchase_id": pay.purchase_id,
+            f"{prefix}_total_due": float(getattr(parent, "total_due", 0) or 0),
+            f"{prefix}_status": getattr(parent, "status", None),
         }
 
     except HTTPException:
@@ -934,6 +1051,7 @@ def list_payments_by_customer(
     start_date: str | None = Query(None),
     end_date: str | None = Query(None),
     tz: str | None = Query(None),
+    include_archived: bool = Query(False, description="Incluir pagos archivados (préstamos cerrados viejos)"),
     db: Session = Depends(get_db),
     current: Employee = Depends(get_current_user),
 ):
@@ -955,38 +1073,44 @@ def list_payments_by_customer(
         end_utc   = parse_iso_aware_utc(end_date)
         end_utc_excl = end_utc
 
-    L = aliased(Loan)
-    P = aliased(Purchase)
-    CL = aliased(Customer)
-    CP = aliased(Customer)
-
-    q = (
-        db.query(Payment)
-        .outerjoin(L, Payment.loan_id == L.id)
-        .outerjoin(CL, L.customer_id == CL.id)
-        .outerjoin(P, Payment.purchase_id == P.id)
-        .outerjoin(CP, P.customer_id == CP.id)
-        .filter(Payment.is_voided.is_(False))
-        .filter(or_(L.company_id == current.company_id, P.company_id == current.company_id))
-        .filter(or_(CL.id == customer_id, CP.id == customer_id))
-    )
+    def _customer_payments(M):
+        # M = Payment o ArchivedPayment (mismas columnas)
+        L = aliased(Loan)
+        P = aliased(Purchase)
+        CL = aliased(Customer)
+        CP = aliased(Customer)
+
+        q = (
+            db.query(M)
+            .outerjoin(L, M.loan_id == L.id)
+            .outerjoin(CL, L.customer_id == CL.id)
+            .outerjoin(P, M.purchase_id == P.id)
+            .outerjoin(CP, P.customer_id == CP.id)
+            .filter(M.is_voided.is_(False))
+            .filter(or_(L.company_id == current.company_id, P.company_id == current.company_id))
+            .filter(or_(CL.id == customer_id, CP.id == customer_id))
+        )
 
-    # 👉 Solo el admin ve TODO. El resto, solo lo que le pertenece.
-    if current.role != "admin":
-        q = q.filter(
-            or_(
-                Payment.collector_id == current.id,  # pagos que él registró
-                L.employee_id == current.id,         # préstamos que él dio
-                P.employee_id == current.id,         # ventas que él dio
+        # 👉 Solo el admin ve TODO. El resto, solo lo que le pertenece.
+        if current.role != "admin":
+            q = q.filter(
+                or_(
+                    M.collector_id == current.id,  # pagos que él registró
+                    L.employee_id == current.id,   # préstamos que él dio
+                    P.employee_id == current.id,   # ventas que él dio
+                )
             )
-        )
 
-    if start_utc is not None:
-        q = q.filter(Payment.payment_date >= start_utc)
-    if end_utc_excl is not None:
-        q = q.filter(Payment.payment_date < end_utc_excl)
+        if start_utc is not None:
+            q = q.filter(M.payment_date >= start_utc)
+        if end_utc_excl is not None:
+            q = q.filter(M.payment_date < end_utc_excl)
 
-    rows = q.order_by(Payment.payment_date.desc(), Payment.id.desc()).all()
+        return q.order_by(M.payment_date.desc(), M.id.desc()).all()
+
+    rows = _customer_payments(Payment)
+    if include_archived:
+        rows = sorted(rows + _customer_payments(ArchivedPayment), key=lambda p: (p.payment_date, p.id), reverse=True)
 
     return [
         PaymentOut(
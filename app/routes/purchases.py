@@ -10,14 +10,19 @@ from app.models.models import Employee, Purchase, Customer, Installment
 from app.schemas.installments import InstallmentOut
 from app.schemas.purchases import PurchaseCreate, PurchaseOut
 from app.utils.auth import get_current_user
+from app.utils.ledger import DEBT_PURCHASE, lock_purchase
 from app.utils.license import ensure_company_active
+from app.utils.admission import admission_control
+from app.utils.response_cache import bump_company_version
+from app.services.daily_rollups import capture_rollups, sync_rollups, sync_rollups_for_purchase
+from app.services.ledger_journal import record_schedule
 
 from app.constants import InstallmentStatus
 from app.utils.time_windows import AR_TZ
 
 
 router = APIRouter(
-    dependencies=[Depends(get_current_user), Depends(ensure_company_active)]  # 🔒
+    dependencies=[Depends(get_current_user), Depends(ensure_company_active), Depends(admission_control)]  # 🔒
 )
 
 # =========================
@@ -70,7 +75,7 @@ def create_purchase(
 
     # === 4) Crear Purchase (company_id desde token) ===
     new_purchase = Purchase(
-        **purchase.model_dump(exclude={"start_date", "company_id"}),
+        **purchase.model_dump(exclude={"start_date", "company_id", "installment_amount"}),
         start_date=start_date_utc,
         company_id=current.company_id,
         total_due=purchase.amount,  # saldo inicial igual al total
@@ -110,7 +115,10 @@ def create_purchase(
         )
         db.add(inst)
 
+    record_schedule(db, DEBT_PURCHASE, new_purchase.id, new_purchase.company_id, current.id, occurred_at=new_purchase.start_date)
+    sync_rollups_for_purchase(db, new_purchase.id)
     db.commit()
+    bump_company_version(current.company_id)
     db.refresh(new_purchase)
     return new_purchase
 
@@ -168,6 +176,9 @@ def update_purchase(
     )
     if not purchase:
         raise HTTPException(status_code=404, detail="Compra no encontrada")
+    purchase = lock_purchase(db, purchase_id)
+    # lo que la compra aporta a daily_rollups antes del update (cobrador del "esperado" = employee_id)
+    rollups_before = capture_rollups(db, current.company_id, DEBT_PURCHASE, [purchase_id])
 
     # WARNING: este update es "legacy": no regenera cuotas ni recalcula total_due.
     # Sólo actualiza campos permitidos.
@@ -175,7 +186,9 @@ def update_purchase(
     for key, value in payload.items():
         setattr(purchase, key, value)
 
+    sync_rollups(db, current.company_id, DEBT_PURCHASE, [purchase_id], rollups_before)
     db.commit()
+    bump_company_version(current.company_id)
     db.refresh(purchase)
     return purchase
 
@@ -196,9 +209,15 @@ def delete_purchase(
     )
     if not purchase:
         raise HTTPException(status_code=404, detail="Compra no encontrada")
+    purchase = lock_purchase(db, purchase_id)
+
+    # lo que la compra aporta a daily_rollups (después del delete ya no se puede calcular)
+    rollups_before = capture_rollups(db, current.company_id, DEBT_PURCHASE, [purchase_id])
 
     db.delete(purchase)
+    sync_rollups(db, current.company_id, DEBT_PURCHASE, [purchase_id], rollups_before)
     db.commit()
+    bump_company_version(current.company_id)
     return {"message": "Compra eliminada correctamente"}
 
 
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import logging
 import uuid
 from datetime import datetime, timedelta, timezone
 from typing import List
@@ -13,16 +14,9 @@ from app.database.db import get_db
 from app.models.models import (
     Company,
     Employee,
-    Customer,
-    Loan,
-    Installment,
-    Payment,
-    PaymentAllocation,
     OnboardingImportSession,
 )
 
-from app.constants import InstallmentStatus, LoanStatus
-from app.utils.time_windows import AR_TZ
 from app.schemas.companies import Company as CompanyOut
 from app.schemas.employee import (
     EmployeeCreateIn,
@@ -32,14 +26,25 @@ from app.schemas.employee import (
 )
 
 from app.schemas.superadmin_onboarding import (
-    OnboardingCommitCounts,
     OnboardingCommitOut,
     CommitIn,
 )
 from app.utils.auth import get_current_user, hash_password
+from app.utils.response_cache import bump_company_version
+from app.services.customer_typeahead import invalidate_customer_index
+from app.services import daily_rollups
 
 from app.services.onboarding_import_validate import validate_onboarding_xlsx
+from app.services.onboarding_import_commit import (
+    STAGING_CHUNK,
+    StagingWriter,
+    commit_onboarding_session,
+    purge_expired_staging,
+)
+from app.utils.admission import controller as admission_controller
+
 
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/superadmin",
@@ -242,8 +247,7 @@ async def superadmin_validate_onboarding_import(
     if not file.filename or not file.filename.lower().endswith(".xlsx"):
         raise HTTPException(status_code=400, detail="Solo se acepta .xlsx")
 
-    raw = await file.read()
-    result = validate_onboarding_xlsx(raw)
+    purge_expired_staging(db, company_id)
 
     batch_id = uuid.uuid4()
     expires_at = datetime.now(timezone.utc) + timedelta(hours=6)
@@ -252,14 +256,31 @@ async def superadmin_validate_onboarding_import(
         id=batch_id,
         company_id=company_id,
         original_filename=file.filename,
-        status="validated",
-        payload_json=result["payload"],
-        summary_json=result["summary"],
-        errors_json=result["errors"],
-        warnings_json=result["warnings"],
+        status="validating",
+        summary_json={},
+        errors_json=[],
+        warnings_json=[],
         expires_at=expires_at,
     )
     db.add(session)
+    db.flush()
+
+    # streaming: openpyxl read_only sobre el archivo spooleado + filas al staging por chunks
+    await file.seek(0)
+    try:
+        result = validate_onboarding_xlsx(
+            file.file,
+            sink=StagingWriter(db, batch_id),
+            chunk_size=STAGING_CHUNK,
+        )
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"No se pudo leer el Excel: {str(e)}")
+
+    session.status = "validated"
+    session.summary_json = result["summary"]
+    session.errors_json = result["errors"]
+    session.warnings_json = result["warnings"]
     db.commit()
 
     return {
@@ -428,19 +449,18 @@ def superadmin_summary(
     )
 
 
-@router.post(
-    "/companies/{company_id}/onboarding-import/commit",
-    response_model=OnboardingCommitOut,
-)
-def superadmin_commit_onboarding_import(
-    company_id: int,
-    payload: CommitIn,
-    db: Session = Depends(get_db),
+@router.get("/admission-metrics")
+def superadmin_admission_metrics(
     _: Employee = Depends(ensure_superadmin),
 ):
-    # 1) Buscar sesión por UUID
+    """Estado del control de admisión de este worker (app/utils/admission.py)."""
+    return admission_controller.snapshot()
+
+
+def _get_onboarding_session(db: Session, company_id: int, batch_token: str) -> OnboardingImportSession:
+    # Buscar sesión por UUID
     try:
-        batch_uuid = uuid.UUID(payload.batch_token)
+        batch_uuid = uuid.UUID(batch_token)
     except Exception:
         raise HTTPException(status_code=400, detail="batch_token inválido (UUID esperado)")
 
@@ -452,293 +472,27 @@ def superadmin_commit_onboarding_import(
     )
     if not session:
         raise HTTPException(status_code=404, detail="Batch token inválido o no encontrado")
+    return session
 
-    now = datetime.now(timezone.utc)
-
-    if session.expires_at and session.expires_at < now:
-        raise HTTPException(status_code=400, detail="Batch token expirado; volvé a validar el Excel")
-
-    if session.status != "validated":
-        raise HTTPException(status_code=400, detail=f"El batch está en estado {session.status}")
-
-    data = session.payload_json or {}
-    customers_rows = data.get("customers", []) or []
-    loans_rows = data.get("loans", []) or []
-    payments_rows = data.get("payments", []) or []
-
-    # Owner “default” para Customer.employee_id (por consistencia con tu modelo/índices)
-    default_owner = (
-        db.query(Employee)
-        .filter(Employee.company_id == company_id)
-        .order_by(Employee.id.asc())
-        .first()
-    )
-    if not default_owner:
-        raise HTTPException(status_code=400, detail="La empresa no tiene empleados; creá al menos 1 empleado antes")
-
-    def _get_employee_id_by_email(email: str | None) -> int | None:
-        if not email:
-            return None
-        e = (
-            db.query(Employee)
-            .filter(Employee.company_id == company_id)
-            .filter(Employee.email.ilike(email.strip()))
-            .first()
-        )
-        return e.id if e else None
-
-    def _parse_iso_dt(s: str | None) -> datetime | None:
-        if not s:
-            return None
-        try:
-            dt = datetime.fromisoformat(s)
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=timezone.utc)
-            return dt.astimezone(timezone.utc)
-        except Exception:
-            return None
-
-    counts = OnboardingCommitCounts()
 
+def _run_onboarding_commit(db: Session, session: OnboardingImportSession, company_id: int) -> OnboardingCommitOut:
     try:
-        customer_ref_to_id: dict[str, int] = {}
-        loan_ref_to_id: dict[str, int] = {}
-        loan_id_to_installments: dict[int, list[Installment]] = {}
-
-        # =========================
-        # 1) Customers
-        # =========================
-        for c in customers_rows:
-            cref = (c.get("customer_ref") or "").strip()
-            if not cref:
-                raise HTTPException(status_code=400, detail="Customers: customer_ref vacío")
-
-            customer = Customer(
-                company_id=company_id,
-                employee_id=default_owner.id,
-                first_name=(c.get("first_name") or "").strip(),
-                last_name=(c.get("last_name") or "").strip(),
-                dni=(c.get("dni") or None),
-                phone=(c.get("phone") or None),
-                email=(c.get("email") or None),
-                address=(c.get("address") or None),
-                province=(c.get("province") or None),
-                created_at=now,
-            )
-            db.add(customer)
-            db.flush()
-            customer_ref_to_id[cref] = customer.id
-            counts.customers_created += 1
-
-        # =========================
-        # 2) Loans + 3) Installments
-        # =========================
-        for l in loans_rows:
-            lref = (l.get("loan_ref") or "").strip()
-            cref = (l.get("customer_ref") or "").strip()
-            if not lref or not cref:
-                raise HTTPException(status_code=400, detail="Loans: loan_ref/customer_ref vacío")
-
-            customer_id = customer_ref_to_id.get(cref)
-            if not customer_id:
-                raise HTTPException(status_code=400, detail=f"Loans: customer_ref no resuelto: {cref}")
-
-            employee_id = _get_employee_id_by_email(l.get("employee_email")) or default_owner.id
-            start_dt = _parse_iso_dt(l.get("start_date")) or now
-
-            interval_days = int(l.get("installment_interval_days") or 0)
-            if interval_days < 1:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Loans: installment_interval_days inválido en loan_ref={lref} (>=1 requerido)",
-                )
-
-            loan = Loan(
-                company_id=company_id,
-                customer_id=customer_id,
-                employee_id=employee_id,
-                amount=float(l.get("amount") or 0),
-                total_due=float(l.get("total_due") or 0),
-                installments_count=int(l.get("installments_count") or 0),
-                installment_amount=float(l.get("installment_amount") or 0),
-
-                # ✅ frequency deprecado; lo guardamos null y usamos interval_days
-                frequency=None,
-                installment_interval_days=interval_days,
-
-                start_date=start_dt,
-                status=(l.get("status") or LoanStatus.ACTIVE.value),
-                description=l.get("description"),
-                collection_day=l.get("collection_day"),
-            )
-            db.add(loan)
-            db.flush()
-            loan_ref_to_id[lref] = loan.id
-            counts.loans_created += 1
-
-            # ✅ Generación de cuotas (MISMA lógica que create_loan actual):
-            # - start_dt está en UTC (tz-aware)
-            # - trabajamos en local AR_TZ
-            # - due_date = medianoche local convertida a UTC
-            start_local = start_dt.astimezone(AR_TZ)
-
-            today_local = datetime.now(AR_TZ).date()
-
-            n = loan.installments_count
-            for i in range(n):
-                due_local = start_local + timedelta(days=interval_days * (i + 1))
-
-                local_midnight = due_local.replace(hour=0, minute=0, second=0, microsecond=0)
-                due_utc = local_midnight.astimezone(timezone.utc)
-
-                is_overdue = (local_midnight.date() < today_local)
-
-                inst = Installment(
-                    loan_id=loan.id,
-                    number=i + 1,
-                    due_date=due_utc,
-                    amount=loan.installment_amount,
-                    paid_amount=0.0,
-                    is_paid=False,
-                    is_overdue=is_overdue,
-                    status=InstallmentStatus.OVERDUE.value if is_overdue else InstallmentStatus.PENDING.value,
-                )
-                db.add(inst)
-                counts.installments_created += 1
-                loan_id_to_installments.setdefault(loan.id, []).append(inst)
-
-        db.flush()
-
-        for lid, insts in loan_id_to_installments.items():
-            insts.sort(key=lambda x: (x.due_date, x.number))
-
-        # =========================
-        # 4) Payments + 5) Allocations
-        # =========================
-        for p in payments_rows:
-            pref = (p.get("payment_ref") or "").strip()
-            lref = (p.get("loan_ref") or "").strip()
-            if not pref or not lref:
-                raise HTTPException(status_code=400, detail="Payments: payment_ref/loan_ref vacío")
-
-            loan_id = loan_ref_to_id.get(lref)
-            if not loan_id:
-                raise HTTPException(status_code=400, detail=f"Payments: loan_ref no resuelto: {lref}")
-
-            loan_obj = db.get(Loan, loan_id)
-            if not loan_obj:
-                raise HTTPException(status_code=400, detail=f"Payments: loan_id no encontrado: {loan_id}")
-
-            collector_id = (
-                _get_employee_id_by_email(p.get("collector_email"))
-                or loan_obj.employee_id
-                or default_owner.id
-            )
-
-            payment_dt = _parse_iso_dt(p.get("payment_date")) or now
-            amount = float(p.get("amount") or 0)
-            if amount <= 0:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Payments: amount inválido (<=0) en payment_ref={pref}",
-                )
-
-            payment = Payment(
-                loan_id=loan_id,
-                amount=amount,
-                payment_date=payment_dt,
-                payment_type=p.get("payment_type"),
-                description=p.get("description"),
-                collector_id=collector_id,
-                is_voided=False,
-            )
-            db.add(payment)
-            db.flush()
-            counts.payments_created += 1
-
-            remaining = amount
-            installments = loan_id_to_installments.get(loan_id, [])
-            if not installments:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Payments: el préstamo loan_ref={lref} no tiene cuotas generadas",
-                )
-
-            # Distribuir sobre cuotas en orden
-            for inst in installments:
-                if remaining <= 0:
-                    break
-
-                before = float(inst.paid_amount or 0.0)
-                remaining = inst.register_payment(remaining)
-                after = float(inst.paid_amount or 0.0)
-                applied = after - before
-
-                if applied > 0:
-                    alloc = PaymentAllocation(
-                        payment_id=payment.id,
-                        installment_id=inst.id,
-                        amount_applied=applied,
-                        created_at=now,
-                    )
-                    db.add(alloc)
-                    counts.payment_allocations_created += 1
-
-            # Bloqueo si sobra plata
-            if remaining > 0.000001:
-                applied_total = amount - remaining
-                raise HTTPException(
-                    status_code=400,
-                    detail=(
-                        f"Pago excede la deuda del préstamo: "
-                        f"payment_ref={pref}, loan_ref={lref}. "
-                        f"Monto pago={amount:.2f}, aplicado={applied_total:.2f}, excedente={remaining:.2f}. "
-                        f"Corregí el Excel y reintentá."
-                    ),
-                )
+        counts = commit_onboarding_session(db, session, company_id)
+        db.commit()
 
-        # =========================
-        # 6) Recalcular saldo de cada loan (total_due) según cuotas
-        # =========================
-        EPS = 0.000001
-
-        for lref, loan_id in loan_ref_to_id.items():
-            loan_obj = db.get(Loan, loan_id)
-            if not loan_obj:
-                continue
-
-            insts = loan_id_to_installments.get(loan_id, [])
-            # Si por alguna razón no está en el dict, lo recalculamos desde DB
-            if not insts:
-                insts = (
-                    db.query(Installment)
-                    .filter(Installment.loan_id == loan_id)
-                    .order_by(Installment.number.asc())
-                    .all()
+        # histórico importado en bloque (no pasa por los deltas) => reconstruir rollups de la empresa.
+        # El import ya quedó commiteado: si esto falla se avisa en el log y se corre el CLI.
+        if daily_rollups.ROLLUPS_ENABLED:
+            try:
+                daily_rollups.backfill_company(db, company_id)
+            except Exception:
+                db.rollback()
+                logger.exception(
+                    "⚠️ daily_rollups sin reconstruir (company_id=%s): correr python -m app.cli.backfill_rollups",
+                    company_id,
                 )
-
-            remaining_due = 0.0
-            for inst in insts:
-                amt = float(inst.amount or 0.0)
-                paid = float(inst.paid_amount or 0.0)
-                remaining_due += max(0.0, amt - paid)
-
-            if remaining_due < EPS:
-                remaining_due = 0.0
-
-            loan_obj.total_due = remaining_due
-
-            # Status según saldo (misma convención que venís usando)
-            if remaining_due == 0.0:
-                loan_obj.status = LoanStatus.PAID.value
-            else:
-                # Si el excel puso "paid" pero queda saldo, lo corregimos
-                if (loan_obj.status or "") == LoanStatus.PAID.value:
-                    loan_obj.status = LoanStatus.ACTIVE.value
-
-        session.status = "committed"
-
-        db.commit()
+        bump_company_version(company_id)
+        invalidate_customer_index(company_id)
 
         return OnboardingCommitOut(
             import_batch_id=str(session.id),
@@ -749,7 +503,60 @@ def superadmin_commit_onboarding_import(
 
     except HTTPException:
         db.rollback()
+        # chunks ya commiteados => la data parcial es visible
+        bump_company_version(company_id)
+        invalidate_customer_index(company_id)
         raise
     except Exception as e:
         db.rollback()
+        bump_company_version(company_id)
+        invalidate_customer_index(company_id)
         raise HTTPException(status_code=500, detail=f"Error al importar: {str(e)}")
+
+
+@router.post(
+    "/companies/{company_id}/onboarding-import/commit",
+    response_model=OnboardingCommitOut,
+)
+def superadmin_commit_onboarding_import(
+    company_id: int,
+    payload: CommitIn,
+    db: Session = Depends(get_db),
+    _: Employee = Depends(ensure_superadmin),
+):
+    session = _get_onboarding_session(db, company_id, payload.batch_token)
+
+    now = datetime.now(timezone.utc)
+    expires_at = session.expires_at
+    if expires_at and expires_at.tzinfo is None:  # SQLite devuelve naive (UTC)
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+
+    if expires_at and expires_at < now:
+        raise HTTPException(status_code=400, detail="Batch token expirado; volvé a validar el Excel")
+
+    if session.status != "validated":
+        raise HTTPException(status_code=400, detail=f"El batch está en estado {session.status}")
+
+    return _run_onboarding_commit(db, session, company_id)
+
+
+@router.post(
+    "/companies/{company_id}/onboarding-import/resume",
+    response_model=OnboardingCommitOut,
+)
+def superadmin_resume_onboarding_import(
+    company_id: int,
+    payload: CommitIn,
+    db: Session = Depends(get_db),
+    _: Employee = Depends(ensure_superadmin),
+):
+    """
+    Continúa un commit cortado (error / timeout / caída del proceso) desde el último
+    checkpoint. No vence con expires_at: el staging se conserva hasta terminar.
+    """
+    session = _get_onboarding_session(db, company_id, payload.batch_token)
+
+    if session.status not in ("committing", "failed"):
+        raise HTTPException(status_code=400, detail=f"El batch está en estado {session.status}; no hay commit para reanudar")
+
+    return _run_onboarding_commit(db, session, company_id)
@@ -70,6 +70,13 @@ class CustomerOut(BaseModel):
         from_attributes = True  # (pydantic v2)
 
 
+# ---------- Type-ahead (liviano) ----------
+class CustomerSearchHit(BaseModel):
+    id: int
+    name: str
+    phone: Optional[str] = None
+    province: Optional[str] = None
+
 
 class CustomerDashboardOut(BaseModel):
     customer_id: int
@@ -121,3 +121,32 @@ class DashboardCashflowCollector(BaseModel):
     collector_id: int
     collector_name: Optional[str] = None
     points: List[DashboardCashflowPoint]
+
+
+# ===== Cartera al día X (/dashboard/portfolio) =====
+class PortfolioAging(BaseModel):
+    d1_30: float = 0.0
+    d31_60: float = 0.0
+    d61_90: float = 0.0
+    d91_plus: float = 0.0
+
+
+class PortfolioFigures(BaseModel):
+    outstanding: float        # saldo total (vencido + a vencer)
+    not_due: float            # cuotas que vencen el día X o después
+    overdue: float            # cuotas vencidas antes del día X
+    paid: float               # imputado a cuotas hasta el día X
+    aging: PortfolioAging
+    debts_count: int          # deudas con saldo
+    overdue_installments_count: int
+
+
+class PortfolioCollectorRow(PortfolioFigures):
+    collector_id: int         # 0 = "Sin asignar"
+    collector_name: Optional[str] = None
+
+
+class PortfolioAsOfResponse(PortfolioFigures):
+    as_of: date
+    employee_id: Optional[int] = None
+    by_collector: List[PortfolioCollectorRow]
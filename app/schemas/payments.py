@@ -26,6 +26,11 @@ class PaymentOut(PaymentBase):
     class Config:
         from_attributes = True  # pydantic v2 (equiv. orm_mode=True)
 
+# 📄 Página de /payments/all
+class PaymentsListResponse(BaseModel):
+    data: List[PaymentOut]
+    total: int
+
 # 🔽 Para listados enriquecidos (si ya lo usabas, lo mantenemos tal cual)
 class PaymentDetailOut(PaymentOut):
     customer_name: Optional[str] = None
@@ -1,6 +1,12 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from datetime import date
 from io import BytesIO
+from multiprocessing import get_context
 
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm
@@ -64,201 +70,269 @@ def _fit_text(c: canvas.Canvas, text: str, font: str, size: float, max_width: fl
     return text[:cut].rstrip() + ell
 
 
-def build_coupons_v5_pdf(
-    items: list[CouponV5Data],
-    tz: str | None = None,
-) -> bytes:
-    _ = tz
+# Geometría de página (A4, 3 cupones por hoja)
+W, H = A4
 
-    buf = BytesIO()
-    c = canvas.Canvas(buf, pagesize=A4)
-    W, H = A4
-
-    # Ocupar total ancho: márgenes laterales a 0
-    mx = 0
-    my = 8 * mm
-    gap_y = 4 * mm
-
-    usable_h = H - 2 * my - 2 * gap_y
-    slot_h = usable_h / 3
-    slot_w = W  # Total ancho
-
-    def draw_pair(x: float, y: float, w: float, h: float, d: CouponV5Data):
-        mid = x + w / 2
-        c.setDash(3, 3)
-        c.setLineWidth(1)
-        c.line(mid, y + 2 * mm, mid, y + h - 2 * mm)
-        c.setDash()
-
-        def half(x0: float, label: str):
-            pad = 5 * mm
-            w0 = w / 2
-            top = y + h - pad
-            cur = top
-
-            header = d.company_name
-            if d.company_cuit:
-                header = f"{header} (CUIT {d.company_cuit})"
-
-            c.setFont("Helvetica-Bold", 8.5)
-            c.drawString(x0 + pad, cur - 6, header)
-
-            # Rol a la derecha
-            c.setFont("Helvetica", 8)
-            c.setFillColor(colors.grey)
-            c.drawRightString(x0 + w0 - pad, cur - 6, label)
+# Ocupar total ancho: márgenes laterales a 0
+MX = 0
+MY = 8 * mm
+GAP_Y = 4 * mm
 
-            # ID préstamo (más discreto y sin “apretar” el bloque principal)
-            c.setFont("Helvetica", 8)
-            c.drawRightString(x0 + w0 - pad, cur - 18, f"ID préstamo: {d.loan_id}")
-            c.setFillColor(colors.black)
+USABLE_H = H - 2 * MY - 2 * GAP_Y
+SLOT_H = USABLE_H / 3
+SLOT_W = W  # Total ancho
 
-            cur -= 25  # Espacio aumentado para balancear verticalmente
-            c.setLineWidth(0.5)
-            c.line(x0 + pad, cur, x0 + w0 - pad, cur)
-            cur -= 20  # Espacio aumentado
+COUPONS_PER_PAGE = 3
 
-            # Cliente
-            c.setFont("Helvetica-Bold", 13.5)
-            c.drawString(x0 + pad, cur, d.customer_name)
-            cur -= 15  # Espacio aumentado
+# Render multiproceso (lotes grandes de fin de mes)
+PDF_WORKERS = int(os.getenv("COUPONS_PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PARALLEL_MIN_ITEMS = int(os.getenv("COUPONS_PDF_PARALLEL_MIN_ITEMS", "600"))
+SHARDS_PER_WORKER = 2
 
-            # Dirección + provincia en 2 líneas
-            addr = d.customer_address or "-"
-            prov = d.customer_province or "-"
-            c.setFont("Helvetica", 9.5)
-            c.setFillColor(colors.grey)
-            c.drawString(x0 + pad, cur, addr)
-            cur -= 12  # Espacio ajustado
-            c.drawString(x0 + pad, cur, prov)
-            c.setFillColor(colors.black)
-            cur -= 15  # Espacio aumentado
-
-            # Cobrador
-            cob = d.collector_name or "Sin asignar"
-            c.setFont("Helvetica", 9.5)
-            c.drawString(x0 + pad, cur, f"Cobrador: {cob}")
-            cur -= 15  # Espacio aumentado
-
-            # Descripción
-            if d.description:
-                c.setFont("Helvetica-Oblique", 8.8)
-                c.setFillColor(colors.grey)
-                c.drawString(x0 + pad, cur, d.description[:70])
-                c.setFillColor(colors.black)
-                cur -= 18  # Espacio aumentado
-            else:
-                cur -= 10  # Espacio mínimo si no hay descripción
-
-            # Cuota + monto (sin solape)
-            amount_gap = 8 * mm
-            amount_reserved = 32 * mm
-            left_max_x = x0 + w0 - pad - amount_reserved - amount_gap
-            left_max_w = max(10, left_max_x - (x0 + pad))
-
-            # Línea 1: cuota
-            c.setFont("Helvetica-Bold", 11)
-            c.drawString(
-                x0 + pad,
-                cur,
-                f"Cuota {d.installment_number}/{d.installments_count}",
-            )
+# Orden fijo de fuentes => mismos nombres internos (/F1, /F2...) en todos los procesos,
+# así las páginas renderizadas en un worker se pueden pegar tal cual en el PDF final.
+_FONTS = ("Helvetica", "Helvetica-Bold", "Helvetica-Oblique")
 
-            # Línea 2: vencimiento
-            c.setFont("Helvetica", 9.5)
-            c.setFillColor(colors.grey)
-            c.drawString(
-                x0 + pad,
-                cur - 12,
-                f"Vence: {d.due_date.strftime('%d/%m/%Y')}",
-            )
-            c.setFillColor(colors.black)
 
-            cur -= 22  # ajustar cursor para que no se pise con el monto
+# -----------------------------
+# Esqueleto estático (form XObject)
+# -----------------------------
+# Todo lo que no depende del cupón (separador punteado, encabezado de empresa,
+# rol, reglas, "Saldo cuota", "Monto pagado:") se dibuja UNA vez por documento
+# como form XObject y cada cupón sólo estampa sus textos variables.
+# Variantes: empresa/CUIT, con/sin descripción (mueve "Saldo cuota") y tamaño de slot.
+PAD = 5 * mm
+FOOTER_PAD = 4 * mm
+AMOUNT_LABEL = "Saldo cuota"
 
+TEMPLATE_CACHE_MAX = 64
+_template_ops: "OrderedDict[tuple, str]" = OrderedDict()
+_template_lock = threading.Lock()
 
-            # ✅ Mostrar: "$90 de $150" (saldo en negrita, total en gris)
-            saldo = _money(getattr(d, "installment_balance", 0) or 0)   # $90
-            total = _money(getattr(d, "installment_amount", 0) or 0)    # $150
-            suffix = f" de {total}"
 
-            x_right = x0 + w0 - pad
-            y_amt = cur + 1
+def _template_key(d: CouponV5Data, w: float, h: float) -> tuple:
+    return (d.company_name, d.company_cuit or "", bool(d.description), round(w, 3), round(h, 3))
 
-            # Parte gris (derecha): " de $150"
-            suffix_font = "Helvetica"
-            suffix_size = 9
-            c.setFont(suffix_font, suffix_size)
-            c.setFillColor(colors.grey)
-            c.drawRightString(x_right, y_amt, suffix)
 
-            # Parte negra en negrita (izquierda de la gris): "$90"
-            suffix_w = pdfmetrics.stringWidth(suffix, suffix_font, suffix_size)
-            c.setFont("Helvetica-Bold", 17)
-            c.setFillColor(colors.black)
-            c.drawRightString(x_right - suffix_w, y_amt, saldo)
+def _template_name(key: tuple) -> str:
+    return "cpn5_" + hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:16]
 
-            # Label (lo dejo para no tocar layout)
-            c.setFont("Helvetica", 8.8)
-            c.setFillColor(colors.grey)
-            c.drawRightString(x_right, cur - 10, "Saldo cuota")
-            c.setFillColor(colors.black)
 
-            cur -= 20
+def _amount_cursor(top: float, has_description: bool) -> float:
+    """cur justo después del bloque cuota/vencimiento (misma cuenta que el cupón)."""
+    cur = top - 25 - 20  # encabezado + regla
+    cur -= 15            # cliente
+    cur -= 12 + 15       # dirección + provincia
+    cur -= 15            # cobrador
+    cur -= 18 if has_description else 10
+    return cur - 22
 
 
+def _draw_pair_skeleton(c: canvas.Canvas, key: tuple) -> None:
+    """Parte fija del par de cupones, en coordenadas del slot (origen 0,0)."""
+    company_name, company_cuit, has_description, w, h = key
+    x, y = 0, 0
+    mid = x + w / 2
+    c.setDash(3, 3)
+    c.setLineWidth(1)
+    c.line(mid, y + 2 * mm, mid, y + h - 2 * mm)
+    c.setDash()
 
-            if d.is_overdue:
-                c.setFont("Helvetica-Bold", 10)
-                c.setFillColor(colors.red)
-                c.drawString(x0 + pad, cur, f"Vencida · {d.days_overdue} días")  # ✅ izquierda
-                c.setFillColor(colors.black)
-                cur -= 15
+    header = company_name
+    if company_cuit:
+        header = f"{header} (CUIT {company_cuit})"
 
+    for x0, label in ((x, "COBRADOR"), (mid, "CLIENTE")):
+        w0 = w / 2
+        top = y + h - PAD
 
-            # Pie del cupón: Monto pagado al final, con padding inferior
-            # Agregar padding de 10mm desde el bottom
-            # Pie del cupón: anclado al bottom con padding chico
-            footer_pad = 4 * mm
+        c.setFont("Helvetica-Bold", 8.5)
+        c.drawString(x0 + PAD, top - 6, header)
 
-            monto_title_y = y + footer_pad + 12 * mm
-            monto_line_y  = y + footer_pad + 10 * mm
+        # Rol a la derecha
+        c.setFont("Helvetica", 8)
+        c.setFillColor(colors.grey)
+        c.drawRightString(x0 + w0 - PAD, top - 6, label)
+        c.setFillColor(colors.black)
 
-            line_gap = 4 * mm  # interlineado real
+        c.setLineWidth(0.5)
+        c.line(x0 + PAD, top - 25, x0 + w0 - PAD, top - 25)
 
-            status1_y = y + footer_pad + 6 * mm
-            status2_y = status1_y - line_gap
+        # Label (lo dejo para no tocar layout)
+        cur = _amount_cursor(top, has_description)
+        c.setFont("Helvetica", 8.8)
+        c.setFillColor(colors.grey)
+        c.drawRightString(x0 + w0 - PAD, cur - 10, AMOUNT_LABEL)
+        c.setFillColor(colors.black)
 
-            c.setFont("Helvetica-Bold", 11.5)
-            c.drawString(x0 + pad, monto_title_y, "Monto pagado:")
-            c.setLineWidth(0.9)
-            c.line(x0 + pad, monto_line_y, x0 + w0 - pad, monto_line_y)
+        # Pie del cupón: anclado al bottom con padding chico
+        monto_title_y = y + FOOTER_PAD + 12 * mm
+        monto_line_y = y + FOOTER_PAD + 10 * mm
 
-            c.setFont("Helvetica", 9)
+        c.setFont("Helvetica-Bold", 11.5)
+        c.drawString(x0 + PAD, monto_title_y, "Monto pagado:")
+        c.setLineWidth(0.9)
+        c.line(x0 + PAD, monto_line_y, x0 + w0 - PAD, monto_line_y)
+
+
+def _skeleton_ops(key: tuple) -> str:
+    """Content stream del esqueleto, cacheado por empresa/layout entre requests."""
+    with _template_lock:
+        ops = _template_ops.get(key)
+        if ops is not None:
+            _template_ops.move_to_end(key)
+            return ops
+
+    sc = _new_canvas(BytesIO())
+    _draw_pair_skeleton(sc, key)
+    ops = "\n".join(sc._code)
+
+    with _template_lock:
+        _template_ops[key] = ops
+        while len(_template_ops) > TEMPLATE_CACHE_MAX:
+            _template_ops.popitem(last=False)
+    return ops
+
+
+def _define_templates(c: canvas.Canvas, items: list[CouponV5Data]) -> None:
+    """Define (una vez por documento) los forms que van a usar estos cupones."""
+    for key in dict.fromkeys(_template_key(d, SLOT_W, SLOT_H) for d in items):
+        name = _template_name(key)
+        if c.hasForm(name):
+            continue
+        c.beginForm(name, 0, 0, key[3], key[4])
+        c._code.append(_skeleton_ops(key))
+        c.endForm()
+
+
+def draw_pair(c: canvas.Canvas, x: float, y: float, w: float, h: float, d: CouponV5Data):
+    """Estampa el esqueleto (form) + los textos variables del cupón."""
+    c.saveState()
+    c.translate(x, y)
+    c.doForm(_template_name(_template_key(d, w, h)))
+    c.restoreState()
+
+    mid = x + w / 2
+
+    def half(x0: float):
+        w0 = w / 2
+        top = y + h - PAD
+        x_right = x0 + w0 - PAD
+
+        # ID préstamo (más discreto y sin “apretar” el bloque principal)
+        c.setFont("Helvetica", 8)
+        c.setFillColor(colors.grey)
+        c.drawRightString(x_right, top - 18, f"ID préstamo: {d.loan_id}")
+        c.setFillColor(colors.black)
+
+        cur = top - 25 - 20
+
+        # Cliente
+        c.setFont("Helvetica-Bold", 13.5)
+        c.drawString(x0 + PAD, cur, d.customer_name)
+        cur -= 15
+
+        # Dirección + provincia en 2 líneas
+        addr = d.customer_address or "-"
+        prov = d.customer_province or "-"
+        c.setFont("Helvetica", 9.5)
+        c.setFillColor(colors.grey)
+        c.drawString(x0 + PAD, cur, addr)
+        cur -= 12
+        c.drawString(x0 + PAD, cur, prov)
+        c.setFillColor(colors.black)
+        cur -= 15
+
+        # Cobrador
+        cob = d.collector_name or "Sin asignar"
+        c.setFont("Helvetica", 9.5)
+        c.drawString(x0 + PAD, cur, f"Cobrador: {cob}")
+        cur -= 15
+
+        # Descripción
+        if d.description:
+            c.setFont("Helvetica-Oblique", 8.8)
             c.setFillColor(colors.grey)
+            c.drawString(x0 + PAD, cur, d.description[:70])
+            c.setFillColor(colors.black)
+            cur -= 18
+        else:
+            cur -= 10
+
+        # Línea 1: cuota
+        c.setFont("Helvetica-Bold", 11)
+        c.drawString(x0 + PAD, cur, f"Cuota {d.installment_number}/{d.installments_count}")
+
+        # Línea 2: vencimiento
+        c.setFont("Helvetica", 9.5)
+        c.setFillColor(colors.grey)
+        c.drawString(x0 + PAD, cur - 12, f"Vence: {d.due_date.strftime('%d/%m/%Y')}")
+        c.setFillColor(colors.black)
+
+        cur -= 22  # ajustar cursor para que no se pise con el monto
+
+        # ✅ Mostrar: "$90 de $150" (saldo en negrita, total en gris)
+        saldo = _money(getattr(d, "installment_balance", 0) or 0)   # $90
+        total = _money(getattr(d, "installment_amount", 0) or 0)    # $150
+        suffix = f" de {total}"
+        y_amt = cur + 1
+
+        # Parte gris (derecha): " de $150"
+        suffix_font = "Helvetica"
+        suffix_size = 9
+        c.setFont(suffix_font, suffix_size)
+        c.setFillColor(colors.grey)
+        c.drawRightString(x_right, y_amt, suffix)
+
+        # Parte negra en negrita (izquierda de la gris): "$90"
+        suffix_w = pdfmetrics.stringWidth(suffix, suffix_font, suffix_size)
+        c.setFont("Helvetica-Bold", 17)
+        c.setFillColor(colors.black)
+        c.drawRightString(x_right - suffix_w, y_amt, saldo)
+
+        cur -= 20
+
+        if d.is_overdue:
+            c.setFont("Helvetica-Bold", 10)
+            c.setFillColor(colors.red)
+            c.drawString(x0 + PAD, cur, f"Vencida · {d.days_overdue} días")  # ✅ izquierda
+            c.setFillColor(colors.black)
+
+        # Pie: estado del préstamo (el título/regla "Monto pagado:" está en el form)
+        line_gap = 4 * mm  # interlineado real
+        status1_y = y + FOOTER_PAD + 6 * mm
+        status2_y = status1_y - line_gap
+
+        c.setFont("Helvetica", 9)
+        c.setFillColor(colors.grey)
+        c.drawString(
+            x0 + PAD,
+            status1_y,
+            f"Pagado: {_money(d.total_paid)} | Saldo préstamo: {_money(d.remaining)}",
+        )
+        if d.overdue_count > 0:
             c.drawString(
-                x0 + pad,
-                status1_y,
-                f"Pagado: {_money(d.total_paid)} | Saldo préstamo: {_money(d.remaining)}",
+                x0 + PAD,
+                status2_y,
+                f"Atraso: {d.overdue_count} cuotas ({_money(d.overdue_amount)})",
             )
-            if d.overdue_count > 0:
-                c.drawString(
-                    x0 + pad,
-                    status2_y,
-                    f"Atraso: {d.overdue_count} cuotas ({_money(d.overdue_amount)})",
-                )
-            c.setFillColor(colors.black)
+        c.setFillColor(colors.black)
 
-        half(x, "COBRADOR")
-        half(mid, "CLIENTE")
+    half(x)
+    half(mid)
 
-    for i, item in enumerate(items):
-        pos_in_page = i % 3
-        if i > 0 and pos_in_page == 0:
-            c.showPage()
 
-        y0 = H - my - (pos_in_page + 1) * slot_h - pos_in_page * gap_y
-        draw_pair(mx, y0, slot_w, slot_h, item)
+def _new_canvas(buf: BytesIO) -> canvas.Canvas:
+    c = canvas.Canvas(buf, pagesize=A4)
+    for font in _FONTS:
+        c._doc.getInternalFontName(font)
+    return c
+
+
+def _draw_page(c: canvas.Canvas, page_items: list[CouponV5Data]) -> None:
+    for pos_in_page, item in enumerate(page_items):
+        y0 = H - MY - (pos_in_page + 1) * SLOT_H - pos_in_page * GAP_Y
+        draw_pair(c, MX, y0, SLOT_W, SLOT_H, item)
         # Separadores horizontales entre cupones (una sola línea)
         c.setStrokeColor(colors.black)
         c.setLineWidth(0.9)
@@ -266,9 +340,68 @@ def build_coupons_v5_pdf(
         # Línea superior de la página (opcional): yo NO la dibujaría.
         # Solo separadores ENTRE slots:
         if pos_in_page in (1, 2):
-            y_sep = y0 + slot_h + gap_y / 2  # línea entre este slot y el anterior
-            c.line(mx, y_sep, mx + slot_w, y_sep)
+            y_sep = y0 + SLOT_H + GAP_Y / 2  # línea entre este slot y el anterior
+            c.line(MX, y_sep, MX + SLOT_W, y_sep)
+
+
+def _render_page_streams(pages: list[list[CouponV5Data]]) -> tuple[list[tuple[str, list[str]]], tuple]:
+    """
+    Worker: dibuja las páginas y devuelve, por página, el content stream (los
+    operadores PDF, sin armar documento) y los forms que referencia, + la versión
+    mínima de PDF que requirieron (los grises con alpha suben a 1.4).
+    Recursos compartidos: fuentes base y los forms del esqueleto (los define el padre).
+    """
+    c = _new_canvas(BytesIO())
+    out: list[tuple[str, list[str]]] = []
+    for page_items in pages:
+        _draw_page(c, page_items)
+        out.append(("\n".join(c._code), list(c._formsinuse)))
+        c._startPage()  # mismo reset de estado que showPage, sin agregar la página
+    return out, c._doc._pdfVersion
+
 
+def _shards(pages: list, n: int) -> list[list]:
+    size = max(1, -(-len(pages) // n))
+    return [pages[i:i + size] for i in range(0, len(pages), size)]
+
+
+def build_coupons_v5_pdf(
+    items: list[CouponV5Data],
+    tz: str | None = None,
+    workers: int | None = None,
+) -> bytes:
+    """
+    PDF de cupones V5 (3 pares por A4).
+
+    Lotes grandes (>= COUPONS_PDF_PARALLEL_MIN_ITEMS) se dibujan en un pool de
+    procesos por shards alineados a página; el proceso principal sólo pega los
+    content streams en un único canvas (mismas fuentes => mismo PDF que en serie).
+    """
+    _ = tz
+
+    buf = BytesIO()
+    c = _new_canvas(buf)
+    _define_templates(c, items)
+
+    pages = [items[i:i + COUPONS_PER_PAGE] for i in range(0, len(items), COUPONS_PER_PAGE)]
+
+    if workers is None:
+        workers = PDF_WORKERS if len(items) >= PARALLEL_MIN_ITEMS else 1
+    workers = min(workers, len(pages))
+
+    if workers > 1:
+        shards = _shards(pages, workers * SHARDS_PER_WORKER)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+            for streams, pdf_version in pool.map(_render_page_streams, shards):
+                c._doc._pdfVersion = max(c._doc._pdfVersion, pdf_version)
+                for stream, forms in streams:
+                    c._code.append(stream)
+                    c._formsinuse.extend(forms)
+                    c.showPage()
+    else:
+        for page_items in pages:
+            _draw_page(c, page_items)
+            c.showPage()
 
     c.save()
-    return buf.getvalue()
\ No newline at end of file
+    return buf.getvalue()
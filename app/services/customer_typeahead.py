@@ -0,0 +1,187 @@
+# app/services/customer_typeahead.py
+"""
+Type-ahead de clientes (GET /customers/search): índice de prefijos en memoria
+por empresa, para responder cada tecla sin ir a la base.
+
+- Índice = array ordenado de (palabra, posición): palabras normalizadas de
+  nombre, apellido y provincia + teléfono/DNI normalizados. Un prefijo se
+  resuelve con bisect (O(log n) + hits).
+- Las filas se guardan ya ordenadas por apellido/nombre, así que la posición
+  sirve de desempate del ranking sin volver a comparar strings.
+- Se construye con UNA consulta la primera vez que se busca en la empresa y
+  queda caliente hasta que una escritura de clientes llama
+  `invalidate_customer_index()` (alta/edición/importación) o vence el TTL.
+  Con varios workers cada proceso tiene su índice: el TTL acota la ventana
+  en la que otro worker puede no ver un cliente recién creado/editado.
+"""
+from __future__ import annotations
+
+import heapq
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.models.models import Customer
+from app.utils.search import SearchQuery, normalize_text
+
+
+TYPEAHEAD_TTL_SECONDS = int(os.getenv("CUSTOMER_TYPEAHEAD_TTL_SECONDS", "300"))
+TYPEAHEAD_MAX_COMPANIES = int(os.getenv("CUSTOMER_TYPEAHEAD_MAX_COMPANIES", "256"))
+
+# sentinela para cortar el rango de prefijo: mayor que cualquier carácter normalizado
+_MAX_CHAR = "\U0010ffff"
+
+
+class CustomerPrefixIndex:
+    """Índice inmutable de una empresa (se reemplaza entero al invalidar)."""
+
+    __slots__ = ("rows", "keys", "positions", "name_keys", "name_positions", "built_at")
+
+    def __init__(self, records: list[tuple]):
+        # records: (id, first_name, last_name, phone, province, phone_norm, dni_norm)
+        records = sorted(records, key=lambda r: (normalize_text(r[2]), normalize_text(r[1]), r[0]))
+
+        self.rows: list[dict] = []
+        pairs: list[tuple[str, int]] = []
+        name_pairs: list[tuple[str, int]] = []
+
+        for pos, (cid, first, last, phone, province, phone_norm, dni_norm) in enumerate(records):
+            first_n, last_n = normalize_text(first), normalize_text(last)
+            self.rows.append({
+                "id": cid,
+                "name": f"{first or ''} {last or ''}".strip(),
+                "phone": phone,
+                "province": province,
+            })
+
+            words = set(f"{first_n} {last_n} {normalize_text(province)}".split())
+            words.update(w for w in (phone_norm, dni_norm) if w)
+            pairs.extend((w, pos) for w in words)
+
+            # "nombre apellido" y "apellido nombre": para el boost de prefijo de nombre
+            name_pairs.append((f"{first_n} {last_n}".strip(), pos))
+            name_pairs.append((f"{last_n} {first_n}".strip(), pos))
+
+        pairs.sort()
+        name_pairs.sort()
+        self.keys = [k for k, _ in pairs]
+        self.positions = [p for _, p in pairs]
+        self.name_keys = [k for k, _ in name_pairs]
+        self.name_positions = [p for _, p in name_pairs]
+        self.built_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @staticmethod
+    def _range(keys: list[str], positions: list[int], prefix: str, exact: bool = False) -> set[int]:
+        lo = bisect_left(keys, prefix)
+        hi = bisect_right(keys, prefix, lo) if exact else bisect_left(keys, prefix + _MAX_CHAR, lo)
+        return set(positions[lo:hi])
+
+    def search(self, q: Optional[str], limit: int = 10) -> list[dict]:
+        """
+        Todos los tokens deben ser prefijo de alguna palabra del cliente.
+        Ranking: teléfono/DNI exacto > nombre ("nombre apellido" o "apellido
+        nombre") que empieza con la búsqueda > resto; desempate alfabético
+        (la posición en el índice).
+        """
+        search = SearchQuery(q)
+        if not search or not self.rows:
+            return []
+
+        # intersección de rangos de prefijo, del token más selectivo (más largo) al menos
+        tokens = sorted(set(search.tokens), key=len, reverse=True)
+        candidates = self._range(self.keys, self.positions, tokens[0])
+        for tok in tokens[1:]:
+            if not candidates:
+                return []
+            candidates &= self._range(self.keys, self.positions, tok)
+
+        tiers: list[set[int]] = []
+        if search.exact_digits:
+            exact = self._range(self.keys, self.positions, tokens[0], exact=True)
+            # el token es el teléfono normalizado; el DNI se busca tal cual
+            exact |= self._range(self.keys, self.positions, search.exact_digits, exact=True)
+            candidates |= exact
+            tiers.append(exact)
+        tiers.append(self._range(self.name_keys, self.name_positions, search.text) & candidates)
+        tiers.append(candidates)
+
+        out: list[int] = []
+        seen: set[int] = set()
+        for tier in tiers:
+            for pos in heapq.nsmallest(limit - len(out), tier - seen):
+                out.append(pos)
+            if len(out) >= limit:
+                break
+            seen.update(out)
+        return [self.rows[pos] for pos in out]
+
+
+# =========================
+#     CACHE POR EMPRESA
+# =========================
+_lock = threading.Lock()
+_indexes: "OrderedDict[int, tuple[int, CustomerPrefixIndex]]" = OrderedDict()
+_generations: dict[int, int] = {}
+
+
+def _load_records(db: Session, company_id: int) -> list[tuple]:
+    return [
+        tuple(r)
+        for r in db.query(
+            Customer.id,
+            Customer.first_name,
+            Customer.last_name,
+            Customer.phone,
+            Customer.province,
+            Customer.phone_norm,
+            Customer.dni_norm,
+        )
+        .filter(Customer.company_id == company_id)
+        .all()
+    ]
+
+
+def get_customer_index(db: Session, company_id: int) -> CustomerPrefixIndex:
+    company_id = int(company_id)
+    with _lock:
+        gen = _generations.get(company_id, 0)
+        cached = _indexes.get(company_id)
+        if cached is not None:
+            cached_gen, index = cached
+            if cached_gen == gen and time.monotonic() - index.built_at < TYPEAHEAD_TTL_SECONDS:
+                _indexes.move_to_end(company_id)
+                return index
+
+    # construir fuera del lock (consulta a la base); si se invalida en el medio
+    # la generación ya no coincide y la próxima búsqueda vuelve a construir
+    index = CustomerPrefixIndex(_load_records(db, company_id))
+
+    with _lock:
+        if _generations.get(company_id, 0) == gen:
+            _indexes[company_id] = (gen, index)
+            _indexes.move_to_end(company_id)
+            while len(_indexes) > TYPEAHEAD_MAX_COMPANIES:
+                _indexes.popitem(last=False)
+    return index
+
+
+def invalidate_customer_index(company_id: Optional[int]) -> None:
+    """Llamar DESPUÉS del commit de cualquier alta/edición/importación de clientes."""
+    if company_id is None:
+        return
+    company_id = int(company_id)
+    with _lock:
+        _generations[company_id] = _generations.get(company_id, 0) + 1
+        _indexes.pop(company_id, None)
+
+
+def search_customers(db: Session, company_id: int, q: Optional[str], limit: int = 10) -> list[dict]:
+    return get_customer_index(db, company_id).search(q, limit)
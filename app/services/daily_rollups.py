@@ -0,0 +1,414 @@
+# app/services/daily_rollups.py
+"""
+Rollups diarios por (company_id, día local, cobrador) => tabla daily_rollups.
+
+Los resúmenes (dashboard, /payments/summary, /loans/summary) agrupaban por
+`func.date(func.timezone(tz, ...))` sobre pagos/cuotas crudos en cada request.
+Con los rollups un año de dashboard son ~365 filas por cobrador.
+
+Mantenimiento (sólo con DAILY_ROLLUPS_ENABLED=true; apagado no se toca la tabla):
+- En cada escritura, dentro de su transacción: `capture_rollups(...)` con la
+  deuda lockeada y antes de tocarla, y `sync_rollups_for_loan/purchase(...)`
+  antes del commit. Se suma la diferencia de lo que aporta ESA deuda
+  (otorgamiento, vencimientos, pagos e imputación, así el replay del ledger o
+  una anulación quedan reflejados) con un upsert incremental. Si falla, falla
+  la escritura.
+- Backfill: `python -m app.cli.backfill_rollups` (reconstruye días completos).
+
+Los días se calculan en ROLLUP_TZ (AR). Si el request pide otra tz, o filtra
+por provincia (dimensión que el rollup no tiene), los endpoints siguen usando
+la consulta cruda.
+"""
+from __future__ import annotations
+
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable, Optional
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import and_, false, func, or_
+from sqlalchemy.orm import Session
+
+from app.constants import InstallmentStatus, LoanStatus
+from app.models.models import (
+    DailyRollup,
+    Installment,
+    Loan,
+    Payment,
+    PaymentAllocation,
+    Purchase,
+)
+from app.services.loan_archive import allocation_history, installment_history, payment_history
+from app.utils.ledger import DEBT_LOAN, DEBT_PURCHASE, _fks
+from app.utils.money import from_cents, to_cents
+from app.utils.time_windows import AR_TZ, local_dates_to_utc_window
+
+ROLLUP_TZ = AR_TZ
+
+# Apagado: ni se leen ni se mantienen. Al activarlo hay que correr el backfill (ver README)
+ROLLUPS_ENABLED = os.getenv("DAILY_ROLLUPS_ENABLED", "false").lower() == "true"
+
+_EXCLUDED_INSTALLMENT_STATUSES = [InstallmentStatus.CANCELED.value, InstallmentStatus.REFINANCED.value]
+_NON_EFFECTIVE_LOAN_STATUSES = {"canceled", "cancelled", LoanStatus.REFINANCED.value}
+
+_AMOUNT_METRICS = {
+    "collected_amount",
+    "voided_amount",
+    "applied_to_due_amount",
+    "expected_amount",
+    "loans_issued_amount",
+    "loans_effective_amount",
+}
+_METRICS = (
+    "collected_amount",
+    "collected_count",
+    "voided_amount",
+    "applied_to_due_amount",
+    "expected_amount",
+    "loans_issued_count",
+    "loans_issued_amount",
+    "loans_effective_count",
+    "loans_effective_amount",
+)
+
+
+# =========================
+#        HELPERS
+# =========================
+def rollups_usable(tz: Optional[str]) -> bool:
+    """True si el request puede responderse desde daily_rollups."""
+    if not ROLLUPS_ENABLED:
+        return False
+    if not tz:
+        return True
+    try:
+        return ZoneInfo(tz).key == ROLLUP_TZ.key
+    except Exception:
+        return False
+
+
+def local_day(dt: Optional[datetime]) -> Optional[date]:
+    if dt is None:
+        return None
+    if not isinstance(dt, datetime):
+        return dt
+    if dt.tzinfo is None:
+        # SQLite devuelve naive: lo guardamos siempre en UTC
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(ROLLUP_TZ).date()
+
+
+def _in_runs(col, runs: list[tuple[date, date]]):
+    clauses = []
+    for dfrom, dto in runs:
+        start_utc, end_utc_excl = local_dates_to_utc_window(dfrom, dto, ROLLUP_TZ)
+        clauses.append(and_(col >= start_utc, col < end_utc_excl))
+    return or_(*clauses)
+
+
+# =========================
+#      AGREGADO
+# =========================
+def _empty_metrics() -> dict[str, int]:
+    return dict.fromkeys(_METRICS, 0)
+
+
+def _aggregate(
+    db: Session,
+    company_id: int,
+    runs: Optional[list[tuple[date, date]]] = None,
+    debt_kind: Optional[str] = None,
+    debt_ids: Iterable[int] = (),
+) -> dict[tuple[date, int], dict[str, int]]:
+    """
+    Métricas por (día local, cobrador), montos en centavos. Dos alcances:
+    - `runs`: días completos de la empresa (backfill).
+    - `debt_kind` + `debt_ids`: sólo lo que aportan esas deudas (mantenimiento).
+    Los días completos incluyen cuotas/pagos archivados (reconstruir un día viejo
+    no pierde historia); las deudas archivadas ya no reciben escrituras.
+    """
+    if runs is not None:
+        Pay, Inst, Alloc = payment_history(), installment_history(), allocation_history()
+        wanted = {dfrom + timedelta(days=i) for dfrom, dto in runs for i in range((dto - dfrom).days + 1)}
+        pay_scope = _in_runs(Pay.payment_date, runs)
+        inst_scope = _in_runs(Inst.due_date, runs)
+        loan_scope = _in_runs(Loan.start_date, runs)
+    else:
+        Pay, Inst, Alloc = Payment, Installment, PaymentAllocation
+        wanted = None
+        ids = sorted(set(debt_ids))
+        if not ids:
+            return {}
+        inst_fk, pay_fk = _fks(debt_kind)
+        pay_scope = getattr(Pay, pay_fk.key).in_(ids)
+        inst_scope = getattr(Inst, inst_fk.key).in_(ids)
+        loan_scope = Loan.id.in_(ids) if debt_kind == DEBT_LOAN else false()
+
+    acc: dict[tuple[date, int], dict[str, int]] = defaultdict(_empty_metrics)
+
+    def _bucket(day: Optional[date], collector_id: Optional[int]) -> Optional[dict]:
+        if day is None or (wanted is not None and day not in wanted):
+            return None
+        return acc[(day, int(collector_id or 0))]
+
+    company_clause = or_(Loan.company_id == company_id, Purchase.company_id == company_id)
+
+    # 1) Pagos (cobrado / anulado) por payment_date
+    pay_rows = (
+        db.query(Pay.payment_date, Pay.amount, Pay.is_voided, Pay.collector_id)
+        .outerjoin(Loan, Pay.loan_id == Loan.id)
+        .outerjoin(Purchase, Pay.purchase_id == Purchase.id)
+        .filter(company_clause)
+        .filter(pay_scope)
+        .all()
+    )
+    for pdate, amount, is_voided, collector_id in pay_rows:
+        b = _bucket(local_day(pdate), collector_id)
+        if b is None:
+            continue
+        if is_voided:
+            b["voided_amount"] += to_cents(amount)
+        else:
+            b["collected_amount"] += to_cents(amount)
+            b["collected_count"] += 1
+
+    # 2) Imputado a cuotas ya vencidas por los pagos del día
+    alloc_rows = (
+        db.query(Pay.payment_date, Pay.collector_id, Inst.due_date, Alloc.amount_applied)
+        .select_from(Alloc)
+        .join(Pay, Alloc.payment_id == Pay.id)
+        .join(Inst, Alloc.installment_id == Inst.id)
+        .outerjoin(Loan, Inst.loan_id == Loan.id)
+        .outerjoin(Purchase, Inst.purchase_id == Purchase.id)
+        .filter(Pay.is_voided == False)  # noqa: E712
+        .filter(company_clause)
+        .filter(pay_scope)
+        .all()
+    )
+    for pdate, collector_id, due_date, applied in alloc_rows:
+        pday = local_day(pdate)
+        b = _bucket(pday, collector_id)
+        if b is None:
+            continue
+        dday = local_day(due_date)
+        if dday is not None and dday <= pday:
+            b["applied_to_due_amount"] += to_cents(applied)
+
+    # 3) Esperado: cuotas por due_date (cobrador asignado al préstamo/compra)
+    inst_rows = (
+        db.query(Inst.due_date, Inst.amount, func.coalesce(Loan.employee_id, Purchase.employee_id))
+        .outerjoin(Loan, Inst.loan_id == Loan.id)
+        .outerjoin(Purchase, Inst.purchase_id == Purchase.id)
+        .filter(company_clause)
+        .filter(Inst.status.notin_(_EXCLUDED_INSTALLMENT_STATUSES))
+        .filter(inst_scope)
+        .all()
+    )
+    for due_date, amount, collector_id in inst_rows:
+        b = _bucket(local_day(due_date), collector_id)
+        if b is not None:
+            b["expected_amount"] += to_cents(amount)
+
+    # 4) Otorgamientos por start_date
+    loan_rows = (
+        db.query(Loan.start_date, Loan.amount, Loan.employee_id, Loan.status)
+        .filter(Loan.company_id == company_id)
+        .filter(loan_scope)
+        .all()
+    )
+    for start_date, amount, employee_id, loan_status in loan_rows:
+        b = _bucket(local_day(start_date), employee_id)
+        if b is None:
+            continue
+        b["loans_issued_count"] += 1
+        b["loans_issued_amount"] += to_cents(amount)
+        if (loan_status or "").lower() not in _NON_EFFECTIVE_LOAN_STATUSES:
+            b["loans_effective_count"] += 1
+            b["loans_effective_amount"] += to_cents(amount)
+
+    return acc
+
+
+def _to_row_values(metrics: dict[str, int]) -> dict:
+    return {m: (from_cents(v) if m in _AMOUNT_METRICS else v) for m, v in metrics.items()}
+
+
+# =========================
+#   MANTENIMIENTO (deltas)
+# =========================
+def capture_rollups(db: Session, company_id: int, debt_kind: str, debt_ids: Iterable[int]) -> dict:
+    """
+    Lo que hoy aportan las deudas a daily_rollups. Llamar con la deuda ya
+    lockeada y ANTES de tocarla; después de escribir, `sync_rollups(..., before)`.
+    Con DAILY_ROLLUPS_ENABLED=false no consulta nada.
+    """
+    if not ROLLUPS_ENABLED:
+        return {}
+    db.flush()
+    return _aggregate(db, company_id, debt_kind=debt_kind, debt_ids=debt_ids)
+
+
+def sync_rollups(
+    db: Session,
+    company_id: int,
+    debt_kind: str,
+    debt_ids: Iterable[int],
+    before: Optional[dict] = None,
+) -> int:
+    """
+    Suma a daily_rollups la diferencia (después - antes) de lo que aportan las
+    deudas, con INSERT ... ON CONFLICT DO UPDATE SET col = col + delta, en la
+    MISMA transacción de la escritura (no commitea; los errores se propagan).
+
+    Los deltas conmutan: dos escrituras concurrentes sobre deudas distintas del
+    mismo día no se pisan ni chocan con ux_daily_rollups_company_day_collector,
+    y las de una misma deuda ya están serializadas por lock_debt. `before=None`
+    = la deuda no aportaba nada (alta). Devuelve filas tocadas.
+    """
+    if not ROLLUPS_ENABLED:
+        return 0
+    db.flush()
+    after = _aggregate(db, company_id, debt_kind=debt_kind, debt_ids=debt_ids)
+    before = before or {}
+
+    now_utc = datetime.now(timezone.utc)
+    rows = []
+    for day, cid in sorted(set(before) | set(after)):
+        old = before.get((day, cid)) or _empty_metrics()
+        new = after.get((day, cid)) or _empty_metrics()
+        delta = {m: new[m] - old[m] for m in _METRICS}
+        if any(delta.values()):
+            rows.append(dict(company_id=company_id, local_day=day, collector_id=cid, updated_at=now_utc,
+                             **_to_row_values(delta)))
+    if not rows:
+        return 0
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as upsert
+    stmt = upsert(DailyRollup)
+    cols = DailyRollup.__table__.c
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[cols.company_id, cols.local_day, cols.collector_id],
+        set_={**{m: cols[m] + stmt.excluded[m] for m in _METRICS}, "updated_at": stmt.excluded.updated_at},
+    )
+    db.execute(stmt, rows)
+    return len(rows)
+
+
+def sync_rollups_for_loan(db: Session, loan_id: Optional[int], before: Optional[dict] = None) -> None:
+    """Llamar ANTES del commit de la escritura (ver sync_rollups)."""
+    if not loan_id or not ROLLUPS_ENABLED:
+        return
+    company_id = db.query(Loan.company_id).filter(Loan.id == loan_id).scalar()
+    if company_id is not None:
+        sync_rollups(db, company_id, DEBT_LOAN, [loan_id], before)
+
+
+def sync_rollups_for_purchase(db: Session, purchase_id: Optional[int], before: Optional[dict] = None) -> None:
+    if not purchase_id or not ROLLUPS_ENABLED:
+        return
+    company_id = db.query(Purchase.company_id).filter(Purchase.id == purchase_id).scalar()
+    if company_id is not None:
+        sync_rollups(db, company_id, DEBT_PURCHASE, [purchase_id], before)
+
+
+# =========================
+#   RECÁLCULO (backfill)
+# =========================
+def _refresh_runs(db: Session, company_id: int, runs: list[tuple[date, date]]) -> int:
+    """Reconstruye (delete + insert) los días completos de la empresa. No commitea."""
+    acc = _aggregate(db, company_id, runs=runs)
+    wanted = {dfrom + timedelta(days=i) for dfrom, dto in runs for i in range((dto - dfrom).days + 1)}
+    (
+        db.query(DailyRollup)
+        .filter(DailyRollup.company_id == company_id)
+        .filter(DailyRollup.local_day.in_(sorted(wanted)))
+        .delete(synchronize_session=False)
+    )
+    now_utc = datetime.now(timezone.utc)
+    rows = [
+        dict(company_id=company_id, local_day=day, collector_id=cid, updated_at=now_utc, **_to_row_values(metrics))
+        for (day, cid), metrics in acc.items()
+        if any(metrics.values())
+    ]
+    if rows:
+        db.bulk_insert_mappings(DailyRollup, rows)
+    return len(rows)
+
+
+# =========================
+#        LECTURA
+# =========================
+def rollup_query(
+    db: Session,
+    company_id: int,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    collector_id: Optional[int] = None,
+):
+    q = db.query(DailyRollup).filter(DailyRollup.company_id == company_id)
+    if date_from is not None:
+        q = q.filter(DailyRollup.local_day >= date_from)
+    if date_to is not None:
+        q = q.filter(DailyRollup.local_day <= date_to)
+    if collector_id is not None:
+        q = q.filter(DailyRollup.collector_id == collector_id)
+    return q
+
+
+# =========================
+#        BACKFILL
+# =========================
+def company_data_range(db: Session, company_id: int) -> tuple[Optional[date], Optional[date]]:
+    """Primer y último día local con datos (otorgamiento, vencimiento o pago, también archivados)."""
+    Pay, Inst = payment_history(), installment_history()
+    candidates = []
+    for lo, hi in (
+        db.query(func.min(Loan.start_date), func.max(Loan.start_date)).filter(Loan.company_id == company_id).one(),
+        db.query(func.min(Purchase.start_date), func.max(Purchase.start_date)).filter(Purchase.company_id == company_id).one(),
+        db.query(func.min(Inst.due_date), func.max(Inst.due_date))
+        .outerjoin(Loan, Inst.loan_id == Loan.id)
+        .outerjoin(Purchase, Inst.purchase_id == Purchase.id)
+        .filter(or_(Loan.company_id == company_id, Purchase.company_id == company_id))
+        .one(),
+        db.query(func.min(Pay.payment_date), func.max(Pay.payment_date))
+        .outerjoin(Loan, Pay.loan_id == Loan.id)
+        .outerjoin(Purchase, Pay.purchase_id == Purchase.id)
+        .filter(or_(Loan.company_id == company_id, Purchase.company_id == company_id))
+        .one(),
+    ):
+        if lo is not None:
+            candidates.append(local_day(lo))
+        if hi is not None:
+            candidates.append(local_day(hi))
+    if not candidates:
+        return None, None
+    return min(candidates), max(candidates)
+
+
+def backfill_company(
+    db: Session,
+    company_id: int,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    step_days: int = 31,
+) -> int:
+    """Recalcula todo el rango de la empresa en tramos, con commit por tramo."""
+    lo, hi = company_data_range(db, company_id)
+    date_from = date_from or lo
+    date_to = date_to or hi
+    if date_from is None or date_to is None:
+        return 0
+
+    written = 0
+    d = date_from
+    while d <= date_to:
+        chunk_end = min(d + timedelta(days=step_days - 1), date_to)
+        written += _refresh_runs(db, company_id, [(d, chunk_end)])
+        db.commit()
+        d = chunk_end + timedelta(days=1)
+    return written
@@ -0,0 +1,473 @@
+# app/services/ledger_journal.py
+"""
+Diario append-only del ledger (event sourcing liviano) + snapshots por deuda.
+
+Cada cambio que mueve saldos agrega un LedgerEvent en la MISMA transacción que
+escribe las tablas (payments / installments / loans):
+
+    schedule_created     cronograma de cuotas (alta / regeneración)
+    installment_amended  cambio de monto o vencimiento de una cuota
+    payment_posted       pago registrado (occurred_at = payment_date, puede ser retroactivo)
+    payment_voided       anulación (el pago original NO se toca)
+    canceled / refinanced
+
+El estado se reconstruye plegando eventos: último LedgerSnapshot + la cola de
+eventos posteriores (a lo sumo LEDGER_SNAPSHOT_EVERY). La imputación es la
+misma que `recompute_ledger` (pagos vivos por fecha/id sobre cuotas por número),
+pero en memoria y sin borrar nada: una anulación o un pago con fecha vieja es
+un INSERT, y "¿cómo estaba al día X?" es `ledger_state(..., as_of=X)`.
+
+Las columnas paid_amount / status siguen siendo la proyección que leen los
+endpoints; `verify_debt()` compara ambas (auditoría) y `backfill_debt()` arma
+o completa el diario desde las tablas (python -m app.cli.ledger_journal). Una
+deuda sin eventos (anterior a este cambio) se arma sola con el primer evento
+que se le registre. El onboarding escribe sus eventos en bloque
+(`record_events_bulk`).
+"""
+from __future__ import annotations
+
+import copy
+import os
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from app.constants import NORMALIZE_LOAN_STATUS, LoanStatus
+from app.models.models import Installment, LedgerEvent, LedgerSnapshot, Payment
+from app.utils.ledger import DEBT_LOAN, DEBT_PURCHASE, _allocate, _fks, debt_of, lock_debt
+from app.utils.money import from_cents, to_cents
+
+JOURNAL_ENABLED = os.getenv("LEDGER_JOURNAL_ENABLED", "true").lower() == "true"
+SNAPSHOT_EVERY = int(os.getenv("LEDGER_SNAPSHOT_EVERY", "20"))
+
+SCHEDULE_CREATED = "schedule_created"
+INSTALLMENT_AMENDED = "installment_amended"
+PAYMENT_POSTED = "payment_posted"
+PAYMENT_VOIDED = "payment_voided"
+DEBT_CANCELED = "canceled"
+DEBT_REFINANCED = "refinanced"
+
+
+def _utc(dt: Optional[datetime]) -> Optional[datetime]:
+    if dt is None:
+        return None
+    # SQLite devuelve naive: es UTC
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+def _iso(dt: Optional[datetime]) -> Optional[str]:
+    dt = _utc(dt)
+    return dt.isoformat() if dt else None
+
+
+def _parse(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+# =========================
+#   PLEGADO (puro, sin DB)
+# =========================
+def empty_state() -> dict:
+    return {"installments": [], "payments": {}, "status": None, "status_at": None}
+
+
+def apply_event(state: dict, event_type: str, payload: dict, occurred_at: str) -> dict:
+    if event_type == SCHEDULE_CREATED:
+        state["installments"] = sorted(payload["installments"], key=lambda i: (i["number"], i["id"]))
+    elif event_type == INSTALLMENT_AMENDED:
+        for ins in state["installments"]:
+            if ins["id"] == payload["installment_id"]:
+                if "amount_c" in payload:
+                    ins["amount_c"] = payload["amount_c"]
+                if "due_date" in payload:
+                    ins["due_date"] = payload["due_date"]
+    elif event_type == PAYMENT_POSTED:
+        state["payments"][str(payload["payment_id"])] = {
+            "amount_c": payload["amount_c"],
+            "payment_date": payload["payment_date"],
+            "voided_at": None,
+        }
+    elif event_type == PAYMENT_VOIDED:
+        p = state["payments"].get(str(payload["payment_id"]))
+        if p is not None:
+            p["voided_at"] = occurred_at
+    elif event_type in (DEBT_CANCELED, DEBT_REFINANCED):
+        state["status"] = event_type
+        state["status_at"] = occurred_at
+    return state
+
+
+def derive(state: dict, as_of: Optional[datetime] = None) -> dict:
+    """
+    Saldos a partir del estado plegado. `as_of` (exclusivo, UTC) filtra por fecha
+    de negocio: pagos con payment_date < as_of y no anulados antes de as_of.
+    """
+    as_of = _utc(as_of)
+
+    def _before(value: Optional[str]) -> bool:
+        return value is not None and (as_of is None or _parse(value) < as_of)
+
+    installments = [
+        {"id": i["id"], "number": i["number"], "due_date": i["due_date"], "amount_c": i["amount_c"], "paid_c": 0}
+        for i in state["installments"]
+    ]
+    live = sorted(
+        (
+            (_parse(p["payment_date"]), int(pid), p["amount_c"])
+            for pid, p in state["payments"].items()
+            if _before(p["payment_date"]) and not _before(p["voided_at"])
+        ),
+    )
+    _allocate(installments, [(pid, from_cents(amount_c)) for _, pid, amount_c in live])
+
+    total_c = sum(i["amount_c"] for i in installments)
+    paid_c = sum(i["paid_c"] for i in installments)
+    if _before(state["status_at"]):
+        status = state["status"]
+    else:
+        status = "paid" if installments and paid_c >= total_c else "active"
+
+    return {
+        "as_of": as_of.isoformat() if as_of else None,
+        "status": status,
+        "total": from_cents(total_c),
+        "paid": from_cents(paid_c),
+        "outstanding": from_cents(total_c - paid_c),
+        "payments_count": len(live),
+        "collected": from_cents(sum(amount_c for _, _, amount_c in live)),
+        "installments": [
+            {
+                "id": i["id"],
+                "number": i["number"],
+                "due_date": i["due_date"],
+                "amount": from_cents(i["amount_c"]),
+                "paid": from_cents(i["paid_c"]),
+                "balance": from_cents(i["amount_c"] - i["paid_c"]),
+            }
+            for i in installments
+        ],
+    }
+
+
+# =========================
+#   LECTURA
+# =========================
+def fold(db: Session, debt_kind: str, debt_id: int, known_at: Optional[datetime] = None) -> tuple[dict, int]:
+    """Último snapshot + cola de eventos. `known_at`: sólo lo registrado hasta ese momento."""
+    snap_q = select(LedgerSnapshot).where(LedgerSnapshot.debt_kind == debt_kind, LedgerSnapshot.debt_id == debt_id)
+    ev_q = select(LedgerEvent).where(LedgerEvent.debt_kind == debt_kind, LedgerEvent.debt_id == debt_id)
+    if known_at is not None:
+        snap_q = snap_q.where(LedgerSnapshot.recorded_at <= known_at)
+        ev_q = ev_q.where(LedgerEvent.recorded_at <= known_at)
+
+    snap = db.execute(snap_q.order_by(LedgerSnapshot.seq.desc()).limit(1)).scalar_one_or_none()
+    state = copy.deepcopy(snap.state) if snap else empty_state()
+    seq = snap.seq if snap else 0
+
+    for ev in db.execute(ev_q.where(LedgerEvent.seq > seq).order_by(LedgerEvent.seq)).scalars():
+        apply_event(state, ev.event_type, ev.payload, _iso(ev.occurred_at))
+        seq = ev.seq
+    return state, seq
+
+
+def ledger_state(
+    db: Session,
+    debt_kind: str,
+    debt_id: int,
+    as_of: Optional[datetime] = None,
+    known_at: Optional[datetime] = None,
+) -> dict:
+    state, seq = fold(db, debt_kind, debt_id, known_at)
+    out = derive(state, as_of)
+    out.update(debt_kind=debt_kind, debt_id=debt_id, seq=seq)
+    return out
+
+
+def list_events(db: Session, debt_kind: str, debt_id: int) -> list[dict]:
+    rows = db.execute(
+        select(LedgerEvent)
+        .where(LedgerEvent.debt_kind == debt_kind, LedgerEvent.debt_id == debt_id)
+        .order_by(LedgerEvent.seq)
+    ).scalars()
+    return [
+        {
+            "seq": ev.seq,
+            "event_type": ev.event_type,
+            "occurred_at": _iso(ev.occurred_at),
+            "recorded_at": _iso(ev.recorded_at),
+            "employee_id": ev.employee_id,
+            "payload": ev.payload,
+        }
+        for ev in rows
+    ]
+
+
+# =========================
+#   ESCRITURA (append-only)
+# =========================
+def take_snapshot(db: Session, debt_kind: str, debt_id: int) -> Optional[LedgerSnapshot]:
+    state, seq = fold(db, debt_kind, debt_id)
+    if not seq:
+        return None
+    snap = LedgerSnapshot(debt_kind=debt_kind, debt_id=debt_id, seq=seq, state=state)
+    db.add(snap)
+    db.flush()
+    return snap
+
+
+def _last_seq(db: Session, debt_kind: str, debt_id: int) -> int:
+    return int(db.execute(
+        select(func.coalesce(func.max(LedgerEvent.seq), 0))
+        .where(LedgerEvent.debt_kind == debt_kind, LedgerEvent.debt_id == debt_id)
+    ).scalar())
+
+
+def _append(
+    db: Session,
+    debt_kind: str,
+    debt_id: int,
+    company_id: int,
+    event_type: str,
+    payload: dict,
+    occurred_at: Optional[datetime] = None,
+    employee_id: Optional[int] = None,
+    seq: Optional[int] = None,
+) -> LedgerEvent:
+    if seq is None:
+        seq = _last_seq(db, debt_kind, debt_id) + 1
+    now = datetime.now(timezone.utc)
+    ev = LedgerEvent(
+        company_id=company_id,
+        debt_kind=debt_kind,
+        debt_id=debt_id,
+        seq=seq,
+        event_type=event_type,
+        occurred_at=_utc(occurred_at) or now,
+        recorded_at=now,
+        employee_id=employee_id,
+        payload=payload,
+    )
+    db.add(ev)
+    db.flush()
+    if ev.seq % SNAPSHOT_EVERY == 0:
+        take_snapshot(db, debt_kind, debt_id)
+    return ev
+
+
+def record_event(
+    db: Session,
+    debt_kind: str,
+    debt_id: int,
+    company_id: int,
+    event_type: str,
+    payload: dict,
+    occurred_at: Optional[datetime] = None,
+    employee_id: Optional[int] = None,
+) -> Optional[LedgerEvent]:
+    """
+    Agrega un evento (no commitea). El que llama tiene el lock de la deuda
+    (lock_debt), así que max(seq)+1 no compite; la unique (debt, seq) lo garantiza igual.
+
+    Si la deuda todavía no tiene diario, se arma entero desde las tablas
+    (`backfill_debt`, que ya ve este cambio) y se devuelve None.
+    """
+    if not JOURNAL_ENABLED or not debt_id:
+        return None
+    last = _last_seq(db, debt_kind, debt_id)
+    if not last and event_type != SCHEDULE_CREATED:
+        backfill_debt(db, debt_kind, debt_id)
+        return None
+    ev = _append(db, debt_kind, debt_id, company_id, event_type, payload, occurred_at, employee_id, seq=last + 1)
+    if not last:
+        # cronograma regenerado de una deuda sin diario: faltan sus pagos
+        backfill_debt(db, debt_kind, debt_id)
+    return ev
+
+
+def record_events_bulk(db: Session, company_id: int, events: list[dict]) -> int:
+    """
+    Alta masiva (onboarding): eventos de muchas deudas en un solo INSERT, cada
+    uno con seq a continuación del último de su deuda. Cada dict trae debt_kind,
+    debt_id, event_type, payload y opcionalmente occurred_at / employee_id.
+    Sin snapshots (fold funciona igual). No commitea.
+    """
+    if not JOURNAL_ENABLED or not events:
+        return 0
+    last: dict[tuple[str, int], int] = {}
+    for kind in {e["debt_kind"] for e in events}:
+        ids = {e["debt_id"] for e in events if e["debt_kind"] == kind}
+        last.update(
+            ((kind, debt_id), int(seq))
+            for debt_id, seq in db.execute(
+                select(LedgerEvent.debt_id, func.max(LedgerEvent.seq))
+                .where(LedgerEvent.debt_kind == kind, LedgerEvent.debt_id.in_(ids))
+                .group_by(LedgerEvent.debt_id)
+            )
+        )
+    now = datetime.now(timezone.utc)
+    rows = []
+    for e in events:
+        key = (e["debt_kind"], e["debt_id"])
+        last[key] = last.get(key, 0) + 1
+        rows.append(dict(
+            company_id=company_id,
+            debt_kind=e["debt_kind"],
+            debt_id=e["debt_id"],
+            seq=last[key],
+            event_type=e["event_type"],
+            occurred_at=_utc(e.get("occurred_at")) or now,
+            recorded_at=now,
+            employee_id=e.get("employee_id"),
+            payload=e["payload"],
+        ))
+    db.execute(insert(LedgerEvent), rows)
+    return len(rows)
+
+
+def schedule_payload(installments) -> dict:
+    """Payload de schedule_created desde tuplas (id, number, due_date, amount)."""
+    return {
+        "installments": [
+            {"id": i, "number": number, "due_date": _iso(due_date), "amount_c": to_cents(amount)}
+            for i, number, due_date, amount in sorted(installments, key=lambda r: (r[1], r[0]))
+        ]
+    }
+
+
+def payment_payload(payment_id: int, amount: Any, payment_date: Optional[datetime]) -> dict:
+    return {"payment_id": payment_id, "amount_c": to_cents(amount), "payment_date": _iso(payment_date)}
+
+
+def record_schedule(
+    db: Session,
+    debt_kind: str,
+    debt_id: int,
+    company_id: int,
+    employee_id: Optional[int] = None,
+    occurred_at: Optional[datetime] = None,
+) -> Optional[LedgerEvent]:
+    """Cronograma actual de la deuda (después de crear / regenerar cuotas)."""
+    if not JOURNAL_ENABLED:
+        return None
+    db.flush()
+    payload = _current_schedule(db, debt_kind, debt_id)
+    return record_event(db, debt_kind, debt_id, company_id, SCHEDULE_CREATED, payload, occurred_at, employee_id)
+
+
+def _current_schedule(db: Session, debt_kind: str, debt_id: int) -> dict:
+    inst_fk, _ = _fks(debt_kind)
+    rows = db.execute(
+        select(Installment.id, Installment.number, Installment.due_date, Installment.amount)
+        .where(inst_fk == debt_id)
+    ).all()
+    return schedule_payload(rows)
+
+
+def record_payment_posted(db: Session, payment: Payment, company_id: int) -> Optional[LedgerEvent]:
+    debt = debt_of(payment)
+    if debt is None:
+        return None
+    payload = payment_payload(payment.id, payment.amount, payment.payment_date)
+    return record_event(
+        db, debt[0], debt[1], company_id, PAYMENT_POSTED, payload,
+        occurred_at=payment.payment_date, employee_id=payment.collector_id,
+    )
+
+
+def record_payment_voided(db: Session, payment: Payment, company_id: int) -> Optional[LedgerEvent]:
+    debt = debt_of(payment)
+    if debt is None:
+        return None
+    payload = {"payment_id": payment.id, "reason": payment.void_reason}
+    return record_event(
+        db, debt[0], debt[1], company_id, PAYMENT_VOIDED, payload,
+        occurred_at=payment.voided_at, employee_id=payment.voided_by_employee_id,
+    )
+
+
+def record_installment_amended(db: Session, ins: Installment, company_id: int, employee_id: Optional[int] = None) -> Optional[LedgerEvent]:
+    debt_kind, debt_id = (DEBT_LOAN, ins.loan_id) if ins.loan_id else (DEBT_PURCHASE, ins.purchase_id)
+    payload = {"installment_id": ins.id, "amount_c": to_cents(ins.amount), "due_date": _iso(ins.due_date)}
+    return record_event(db, debt_kind, debt_id, company_id, INSTALLMENT_AMENDED, payload, employee_id=employee_id)
+
+
+# =========================
+#   BACKFILL / AUDITORÍA
+# =========================
+def backfill_debt(db: Session, debt_kind: str, debt_id: int) -> int:
+    """
+    Arma o completa el diario de una deuda desde las tablas: el cronograma si
+    falta y los pagos / anulaciones / cancelación que no estén (ej. una deuda
+    vieja que recibió un pago antes de correr el backfill). Idempotente; toma el
+    lock de la deuda y no commitea. Devuelve cuántos eventos agregó.
+    """
+    if not JOURNAL_ENABLED:
+        return 0
+    db.flush()  # el cambio en curso (si lo hay) tiene que verse en las tablas
+    debt = lock_debt(db, debt_kind, debt_id)
+    if debt is None:
+        return 0
+
+    journal = db.execute(
+        select(LedgerEvent.event_type, LedgerEvent.payload)
+        .where(LedgerEvent.debt_kind == debt_kind, LedgerEvent.debt_id == debt_id)
+    ).all()
+    types = {ev.event_type for ev in journal}
+    posted = {ev.payload.get("payment_id") for ev in journal if ev.event_type == PAYMENT_POSTED}
+    voided = {ev.payload.get("payment_id") for ev in journal if ev.event_type == PAYMENT_VOIDED}
+
+    n = 0
+
+    def _add(event_type, payload, occurred_at, employee_id=None):
+        nonlocal n
+        _append(db, debt_kind, debt_id, debt.company_id, event_type, payload, occurred_at, employee_id)
+        n += 1
+
+    if SCHEDULE_CREATED not in types:
+        _add(SCHEDULE_CREATED, _current_schedule(db, debt_kind, debt_id), debt.start_date)
+    _, pay_fk = _fks(debt_kind)
+    payments = db.query(Payment).filter(pay_fk == debt_id).order_by(Payment.payment_date, Payment.id).all()
+    for p in payments:
+        if p.id not in posted:
+            _add(PAYMENT_POSTED, payment_payload(p.id, p.amount, p.payment_date), p.payment_date, p.collector_id)
+    for p in payments:
+        if p.is_voided and p.id not in voided:
+            # anulaciones viejas sin voided_at: la fecha del pago (nunca contó)
+            _add(PAYMENT_VOIDED, {"payment_id": p.id, "reason": p.void_reason},
+                 p.voided_at or p.payment_date, p.voided_by_employee_id)
+    status = NORMALIZE_LOAN_STATUS.get((debt.status or "").strip().lower())
+    if status in (LoanStatus.CANCELED, LoanStatus.REFINANCED):
+        event_type = DEBT_REFINANCED if status == LoanStatus.REFINANCED else DEBT_CANCELED
+        if event_type not in types:
+            _add(event_type, {"reason": debt.status_reason}, debt.status_changed_at)
+    return n
+
+
+def verify_debt(db: Session, debt_kind: str, debt_id: int) -> list[str]:
+    """Diferencias entre el diario y las columnas paid_amount de las cuotas (vacío = cuadra)."""
+    state = ledger_state(db, debt_kind, debt_id)
+    inst_fk, _ = _fks(debt_kind)
+    table = {
+        r.id: (r.number, to_cents(r.amount), to_cents(r.paid_amount))
+        for r in db.execute(
+            select(Installment.id, Installment.number, Installment.amount, Installment.paid_amount).where(inst_fk == debt_id)
+        )
+    }
+    problems = []
+    journal_ids = set()
+    for ins in state["installments"]:
+        journal_ids.add(ins["id"])
+        row = table.get(ins["id"])
+        if row is None:
+            problems.append(f"cuota {ins['id']} (#{ins['number']}) está en el diario y no en installments")
+            continue
+        if row[1] != to_cents(ins["amount"]) or row[2] != to_cents(ins["paid"]):
+            problems.append(
+                f"cuota {ins['id']} (#{row[0]}): tabla monto={from_cents(row[1])} pagado={from_cents(row[2])}, "
+                f"diario monto={ins['amount']} pagado={ins['paid']}"
+            )
+    for missing in sorted(set(table) - journal_ids):
+        problems.append(f"cuota {missing} (#{table[missing][0]}) no está en el diario")
+    return problems
@@ -0,0 +1,225 @@
+# app/services/loan_archive.py
+"""
+Archivado de préstamos cerrados (pagados / cancelados / refinanciados).
+
+Los préstamos cerrados hace más de LOAN_ARCHIVE_AFTER_MONTHS meses mudan sus
+cuotas, pagos e imputaciones a archived_installments / archived_payments /
+archived_payment_allocations (mismos ids y columnas). La fila de `loans` queda
+como stub (listados del cliente, cadena de refinanciación, daily_rollups) y en
+`loan_archives` quedan los totales (cuotas, pagos, cobrado, anulado, fechas).
+
+- Por lotes de LOAN_ARCHIVE_BATCH préstamos, un commit por lote (copiar + borrar
+  en la misma transacción: nunca queda a medias).
+- "Cerrado desde" = status_changed_at, o el último pago, o start_date.
+- Los endpoints de historial (cuotas / pagos del préstamo, pagos del cliente)
+  suman lo archivado con `include_archived=true`.
+- Un pago archivado ya no se puede anular ni editar.
+- Los agregados por período (dashboard, summaries de pagos y cuotas, rebuild de
+  daily_rollups) leen `payment_history()` / `installment_history()` /
+  `allocation_history()`: tabla caliente UNION ALL archivo, con los mismos
+  nombres de columna que el modelo. Los filtros por fecha llegan a las dos ramas
+  (índices por fecha también en archived_*).
+"""
+from __future__ import annotations
+
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import DateTime, case, delete, func, insert, literal, or_, select, union_all
+from sqlalchemy.orm import Session, aliased
+
+from app.constants import NORMALIZE_LOAN_STATUS, LoanStatus
+from app.models.models import (
+    ArchivedInstallment,
+    ArchivedPayment,
+    ArchivedPaymentAllocation,
+    Installment,
+    Loan,
+    LoanArchive,
+    Payment,
+    PaymentAllocation,
+)
+from app.services.partitions import add_months, month_start
+from app.utils.response_cache import bump_company_version
+
+logger = logging.getLogger("uvicorn.error")
+
+ARCHIVE_AFTER_MONTHS = int(os.getenv("LOAN_ARCHIVE_AFTER_MONTHS", "12"))
+ARCHIVE_BATCH = int(os.getenv("LOAN_ARCHIVE_BATCH", "200"))
+
+CLOSED_LOAN_STATUSES = sorted(
+    k for k, v in NORMALIZE_LOAN_STATUS.items()
+    if v in (LoanStatus.PAID, LoanStatus.CANCELED, LoanStatus.REFINANCED)
+)
+
+
+def _with_archived(model, archived_model):
+    cols = [c.name for c in model.__table__.columns]
+    rows = union_all(
+        select(*[model.__table__.c[c] for c in cols]),
+        select(*[archived_model.__table__.c[c] for c in cols]),
+    ).subquery(f"{model.__tablename__}_history")
+    return aliased(model, rows, adapt_on_names=True)
+
+
+def payment_history():
+    """Payment + ArchivedPayment como una sola entidad (mismos atributos que Payment)."""
+    return _with_archived(Payment, ArchivedPayment)
+
+
+def installment_history():
+    return _with_archived(Installment, ArchivedInstallment)
+
+
+def allocation_history():
+    return _with_archived(PaymentAllocation, ArchivedPaymentAllocation)
+
+
+def archive_cutoff(now: datetime, months: int) -> datetime:
+    """Mismo día/hora de hace `months` meses (clamp al último día del mes)."""
+    target = add_months(month_start(now), -months)
+    nxt = add_months(target, 1)
+    last_day = (datetime(nxt.year, nxt.month, 1) - datetime(target.year, target.month, 1)).days
+    return now.replace(year=target.year, month=target.month, day=min(now.day, last_day))
+
+
+def _closed_at_expr():
+    last_payment = (
+        select(func.max(Payment.payment_date))
+        .where(Payment.loan_id == Loan.id)
+        .correlate(Loan)
+        .scalar_subquery()
+    )
+    return func.coalesce(Loan.status_changed_at, last_payment, Loan.start_date)
+
+
+def find_archivable_loans(db: Session, cutoff: datetime, limit: int, company_id: Optional[int] = None) -> list:
+    closed_at = _closed_at_expr()
+    q = (
+        select(Loan.id, Loan.company_id, Loan.customer_id, Loan.status, closed_at.label("closed_at"))
+        .outerjoin(LoanArchive, LoanArchive.loan_id == Loan.id)
+        .where(
+            LoanArchive.loan_id.is_(None),
+            func.lower(func.coalesce(Loan.status, "")).in_(CLOSED_LOAN_STATUSES),
+            closed_at < cutoff,
+        )
+        .order_by(Loan.id)
+        .limit(limit)
+    )
+    if company_id is not None:
+        q = q.where(Loan.company_id == company_id)
+    if db.get_bind().dialect.name == "postgresql":
+        q = q.with_for_update(of=Loan, skip_locked=True)
+    return db.execute(q).all()
+
+
+def _copy(db: Session, src, dst, where, now: datetime) -> None:
+    cols = [c.name for c in src.__table__.columns]
+    db.execute(
+        insert(dst.__table__).from_select(
+            cols + ["archived_at"],
+            select(*[src.__table__.c[c] for c in cols], literal(now, DateTime(timezone=True))).where(where),
+        )
+    )
+
+
+def _archive_batch(db: Session, loans: list, now: datetime) -> None:
+    loan_ids = [l.id for l in loans]
+
+    pay_totals = {
+        r.loan_id: r
+        for r in db.execute(
+            select(
+                Payment.loan_id,
+                func.count(Payment.id).label("n"),
+                func.coalesce(func.sum(case((Payment.is_voided.is_(True), 0), else_=Payment.amount)), 0).label("paid"),
+                func.coalesce(func.sum(case((Payment.is_voided.is_(True), Payment.amount), else_=0)), 0).label("voided"),
+                func.min(Payment.payment_date).label("first"),
+                func.max(Payment.payment_date).label("last"),
+            )
+            .where(Payment.loan_id.in_(loan_ids))
+            .group_by(Payment.loan_id)
+        )
+    }
+    inst_counts = dict(
+        db.execute(
+            select(Installment.loan_id, func.count(Installment.id))
+            .where(Installment.loan_id.in_(loan_ids))
+            .group_by(Installment.loan_id)
+        ).all()
+    )
+    alloc_counts = dict(
+        db.execute(
+            select(Payment.loan_id, func.count(PaymentAllocation.id))
+            .join(Payment, Payment.id == PaymentAllocation.payment_id)
+            .where(Payment.loan_id.in_(loan_ids))
+            .group_by(Payment.loan_id)
+        ).all()
+    )
+
+    payment_ids = select(Payment.id).where(Payment.loan_id.in_(loan_ids))
+    installment_ids = select(Installment.id).where(Installment.loan_id.in_(loan_ids))
+    alloc_where = or_(
+        PaymentAllocation.payment_id.in_(payment_ids),
+        PaymentAllocation.installment_id.in_(installment_ids),
+    )
+
+    _copy(db, PaymentAllocation, ArchivedPaymentAllocation, alloc_where, now)
+    _copy(db, Payment, ArchivedPayment, Payment.loan_id.in_(loan_ids), now)
+    _copy(db, Installment, ArchivedInstallment, Installment.loan_id.in_(loan_ids), now)
+
+    db.execute(delete(PaymentAllocation).where(alloc_where).execution_options(synchronize_session=False))
+    db.execute(delete(Payment).where(Payment.loan_id.in_(loan_ids)).execution_options(synchronize_session=False))
+    db.execute(delete(Installment).where(Installment.loan_id.in_(loan_ids)).execution_options(synchronize_session=False))
+
+    for l in loans:
+        t = pay_totals.get(l.id)
+        db.add(LoanArchive(
+            loan_id=l.id,
+            company_id=l.company_id,
+            customer_id=l.customer_id,
+            status=l.status,
+            closed_at=l.closed_at,
+            archived_at=now,
+            installments_count=int(inst_counts.get(l.id, 0)),
+            payments_count=int(t.n) if t else 0,
+            allocations_count=int(alloc_counts.get(l.id, 0)),
+            paid_total=float(t.paid) if t else 0.0,
+            voided_total=float(t.voided) if t else 0.0,
+            first_payment_date=t.first if t else None,
+            last_payment_date=t.last if t else None,
+        ))
+
+
+def archive_closed_loans(
+    db: Session,
+    older_than_months: int = ARCHIVE_AFTER_MONTHS,
+    batch_size: int = ARCHIVE_BATCH,
+    company_id: Optional[int] = None,
+    now: Optional[datetime] = None,
+    max_batches: Optional[int] = None,
+) -> int:
+    """Archiva préstamos cerrados hace más de `older_than_months`. Devuelve cuántos archivó."""
+    now = now or datetime.now(timezone.utc)
+    cutoff = archive_cutoff(now, older_than_months)
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        loans = find_archivable_loans(db, cutoff, batch_size, company_id)
+        if not loans:
+            break
+        try:
+            _archive_batch(db, loans, now)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        for cid in {l.company_id for l in loans}:
+            bump_company_version(cid)
+        total += len(loans)
+        batches += 1
+        logger.info("🗄️ Archivados %s préstamos (lote %s)", len(loans), batches)
+    return total
+
@@ -0,0 +1,788 @@
+# app/services/onboarding_import_commit.py
+"""
+Onboarding import: staging + commit por chunks.
+
+- validate: las filas normalizadas se insertan en onboarding_staging_* (por chunks)
+  en vez de guardarse como un JSON gigante en la sesión.
+- commit: por fases (customers -> loans + cuotas -> payments + allocations ->
+  saldos), de a chunks por keyset (rownum). Cada chunk se commitea junto con su
+  checkpoint (onboarding_commit_checkpoints, uno por grupo de clientes), así un
+  corte a mitad de camino se reanuda con /resume sin re-subir el Excel. Los grupos
+  son independientes y pueden correr en procesos separados.
+  Empleados precargados en un dict, imputación calculada en memoria e
+  INSERT ... RETURNING por tabla y chunk (sin round trips por fila).
+- diario del ledger: cada chunk escribe también sus ledger_events en bloque
+  (schedule_created por préstamo, payment_posted por pago) en la misma transacción.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import case, func, insert, update
+from sqlalchemy.orm import Session
+
+from app.constants import InstallmentStatus, LoanStatus
+from app.models.models import (
+    Customer,
+    Employee,
+    Installment,
+    Loan,
+    OnboardingCommitCheckpoint,
+    OnboardingImportSession,
+    OnboardingStagingCustomer,
+    OnboardingStagingLoan,
+    OnboardingStagingPayment,
+    Payment,
+    PaymentAllocation,
+)
+from app.schemas.superadmin_onboarding import OnboardingCommitCounts
+from app.services.ledger_journal import (
+    PAYMENT_POSTED,
+    SCHEDULE_CREATED,
+    payment_payload,
+    record_events_bulk,
+    schedule_payload,
+)
+from app.utils.ledger import DEBT_LOAN
+from app.utils.money import from_cents, to_cents
+from app.utils.search import customer_search_fields
+from app.utils.time_windows import AR_TZ
+
+logger = logging.getLogger(__name__)
+
+STAGING_CHUNK = 1000     # filas por INSERT al staging (validate)
+CUSTOMERS_CHUNK = 1000   # customers por transacción (commit)
+LOANS_CHUNK = 500        # loans por transacción, en cada fase (commit)
+
+# Grupos de clientes independientes: group_no = crc32(customer_ref) % COMMIT_GROUPS.
+# Fijo al validar (el staging ya queda particionado); los workers se reparten los grupos.
+COMMIT_GROUPS = 16
+COMMIT_WORKERS = int(os.getenv("ONBOARDING_COMMIT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_STAGING_MODELS = {
+    "customers": OnboardingStagingCustomer,
+    "loans": OnboardingStagingLoan,
+    "payments": OnboardingStagingPayment,
+}
+
+
+def _parse_iso_dt(s: Any) -> Optional[datetime]:
+    if not s:
+        return None
+    if isinstance(s, datetime):
+        dt = s
+    else:
+        try:
+            dt = datetime.fromisoformat(str(s))
+        except Exception:
+            return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def customer_group(customer_ref: Optional[str]) -> int:
+    return zlib.crc32((customer_ref or "").strip().encode("utf-8")) % COMMIT_GROUPS
+
+
+# =========================
+# Staging (validate)
+# =========================
+class StagingWriter:
+    """Sink para validate_onboarding_xlsx: inserta cada chunk en la tabla de staging."""
+
+    def __init__(self, db: Session, session_id):
+        self.db = db
+        self.session_id = session_id
+
+    def __call__(self, kind: str, rows: List[Dict[str, Any]]) -> None:
+        model = _STAGING_MODELS[kind]
+        mappings = []
+        for r in rows:
+            m = dict(r)
+            m["session_id"] = self.session_id
+            if kind in ("customers", "loans"):
+                m["group_no"] = customer_group(m.get("customer_ref"))
+            if kind == "loans":
+                m["start_date"] = _parse_iso_dt(m.get("start_date"))
+            elif kind == "payments":
+                m["payment_date"] = _parse_iso_dt(m.get("payment_date"))
+            mappings.append(m)
+        self.db.bulk_insert_mappings(model, mappings)
+
+
+def clear_staging(db: Session, session_id) -> None:
+    for model in _STAGING_MODELS.values():
+        db.query(model).filter(model.session_id == session_id).delete(synchronize_session=False)
+
+
+def purge_expired_staging(db: Session, company_id: int) -> None:
+    """Libera el staging de sesiones vencidas que nunca se commitearon (las "failed" se pueden reanudar)."""
+    now = datetime.now(timezone.utc)
+    expired_ids = [
+        sid
+        for (sid,) in db.query(OnboardingImportSession.id)
+        .filter(OnboardingImportSession.company_id == company_id)
+        .filter(OnboardingImportSession.expires_at < now)
+        .filter(OnboardingImportSession.status.in_(("validating", "validated")))
+        .all()
+    ]
+    if not expired_ids:
+        return
+    for model in _STAGING_MODELS.values():
+        db.query(model).filter(model.session_id.in_(expired_ids)).delete(synchronize_session=False)
+
+
+def _insert_returning_ids(db: Session, model, rows: List[Dict[str, Any]]) -> List[int]:
+    """INSERT multi-fila con RETURNING id (en el orden de `rows`): 1 statement por chunk."""
+    if not rows:
+        return []
+    result = db.execute(insert(model).returning(model.id, sort_by_parameter_order=True), rows)
+    return [r[0] for r in result]
+
+
+def _payment_overflow_error(pref: str, lref: str, amount: float, excess_c: int) -> HTTPException:
+    excess = from_cents(excess_c)
+    applied_total = amount - excess
+    return HTTPException(
+        status_code=400,
+        detail=(
+            f"Pago excede la deuda del préstamo: "
+            f"payment_ref={pref}, loan_ref={lref}. "
+            f"Monto pago={amount:.2f}, aplicado={applied_total:.2f}, excedente={excess:.2f}. "
+            f"Corregí el Excel y reintentá."
+        ),
+    )
+
+
+def _apply_to_installment(inst: Dict[str, Any], amount: int) -> int:
+    """Igual que Installment.register_payment pero sobre el dict (sin ORM), en centavos."""
+    if amount <= 0:
+        return 0
+
+    remaining_amount = amount
+    amount_needed = inst["amount"] - inst["paid_amount"]
+
+    if remaining_amount >= amount_needed:
+        # Pago completo
+        inst["paid_amount"] = inst["amount"]
+        inst["is_paid"] = True
+        inst["status"] = InstallmentStatus.PAID.value
+        remaining_amount -= amount_needed
+    else:
+        # Pago parcial
+        inst["paid_amount"] += remaining_amount
+        inst["status"] = InstallmentStatus.PARTIAL.value
+        remaining_amount = 0
+
+    return remaining_amount
+
+
+def _employee_ids_by_email(db: Session, company_id: int) -> Dict[str, int]:
+    """email (lower) -> employee_id, precargado una vez por commit."""
+    out: Dict[str, int] = {}
+    rows = (
+        db.query(Employee.id, Employee.email)
+        .filter(Employee.company_id == company_id)
+        .order_by(Employee.id.asc())
+        .all()
+    )
+    for emp_id, email in rows:
+        if email:
+            out.setdefault(email.strip().lower(), emp_id)
+    return out
+
+
+# =========================
+# Commit (fases + checkpoints por grupo)
+# =========================
+PHASES = ("customers", "loans", "payments", "balances", "done")
+
+
+class _CommitContext:
+    """Datos compartidos por todas las fases de un grupo (se cargan una vez)."""
+
+    def __init__(self, db: Session, session_id, company_id: int):
+        self.db = db
+        self.session_id = session_id
+        self.company_id = company_id
+        self.now = datetime.now(timezone.utc)
+        self.today_local = datetime.now(AR_TZ).date()
+
+        # Owner “default” para Customer.employee_id (por consistencia con tu modelo/índices)
+        default_owner = (
+            db.query(Employee.id)
+            .filter(Employee.company_id == company_id)
+            .order_by(Employee.id.asc())
+            .first()
+        )
+        if not default_owner:
+            raise HTTPException(status_code=400, detail="La empresa no tiene empleados; creá al menos 1 empleado antes")
+        self.default_owner_id = default_owner[0]
+        self.employee_by_email = _employee_ids_by_email(db, company_id)
+
+    def employee_id_by_email(self, email: str | None) -> int | None:
+        if not email:
+            return None
+        return self.employee_by_email.get(email.strip().lower())
+
+
+def _next_chunk(ctx: _CommitContext, model, group_no: int, after: int, size: int) -> list:
+    """Siguiente chunk del grupo por keyset (rownum): tuplas, no entidades."""
+    return (
+        ctx.db.query(*model.__table__.c)
+        .filter(model.session_id == ctx.session_id)
+        .filter(model.group_no == group_no)
+        .filter(model.rownum > after)
+        .order_by(model.rownum.asc())
+        .limit(size)
+        .all()
+    )
+
+
+def _set_created_ids(db: Session, model, staging_ids: List[int], created_ids: List[int]) -> None:
+    db.execute(
+        update(model),
+        [{"id": sid, "created_id": cid} for sid, cid in zip(staging_ids, created_ids)],
+    )
+
+
+def _phase_customers(ctx: _CommitContext, cp: OnboardingCommitCheckpoint) -> Optional[int]:
+    chunk = _next_chunk(ctx, OnboardingStagingCustomer, cp.group_no, cp.last_rownum, CUSTOMERS_CHUNK)
+    if not chunk:
+        return None
+
+    rows: list[dict] = []
+    for c in chunk:
+        cref = (c.customer_ref or "").strip()
+        if not cref:
+            raise HTTPException(status_code=400, detail="Customers: customer_ref vacío")
+
+        row = dict(
+            company_id=ctx.company_id,
+            employee_id=ctx.default_owner_id,
+            first_name=(c.first_name or "").strip(),
+            last_name=(c.last_name or "").strip(),
+            dni=(c.dni or None),
+            phone=(c.phone or None),
+            email=(c.email or None),
+            address=(c.address or None),
+            province=(c.province or None),
+            created_at=ctx.now,
+        )
+        # insert en bloque: no pasa por los eventos del ORM
+        row.update(customer_search_fields(**row))
+        rows.append(row)
+
+    ids = _insert_returning_ids(ctx.db, Customer, rows)
+    _set_created_ids(ctx.db, OnboardingStagingCustomer, [c.id for c in chunk], ids)
+    cp.customers_created += len(rows)
+    return chunk[-1].rownum
+
+
+def _phase_loans(ctx: _CommitContext, cp: OnboardingCommitCheckpoint) -> Optional[int]:
+    chunk = _next_chunk(ctx, OnboardingStagingLoan, cp.group_no, cp.last_rownum, LOANS_CHUNK)
+    if not chunk:
+        return None
+
+    crefs = {(l.customer_ref or "").strip() for l in chunk}
+    customer_ref_to_id = dict(
+        ctx.db.query(OnboardingStagingCustomer.customer_ref, OnboardingStagingCustomer.created_id)
+        .filter(OnboardingStagingCustomer.session_id == ctx.session_id)
+        .filter(OnboardingStagingCustomer.customer_ref.in_(list(crefs)))
+        .filter(OnboardingStagingCustomer.created_id.isnot(None))
+        .all()
+    )
+
+    loan_rows: list[dict] = []
+    for l in chunk:
+        lref = (l.loan_ref or "").strip()
+        cref = (l.customer_ref or "").strip()
+        if not lref or not cref:
+            raise HTTPException(status_code=400, detail="Loans: loan_ref/customer_ref vacío")
+
+        customer_id = customer_ref_to_id.get(cref)
+        if not customer_id:
+            raise HTTPException(status_code=400, detail=f"Loans: customer_ref no resuelto: {cref}")
+
+        interval_days = int(l.installment_interval_days or 0)
+        if interval_days < 1:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Loans: installment_interval_days inválido en loan_ref={lref} (>=1 requerido)",
+            )
+
+        # total_due/status definitivos se calculan en la fase "balances"
+        loan_rows.append(dict(
+            company_id=ctx.company_id,
+            customer_id=customer_id,
+            employee_id=ctx.employee_id_by_email(l.employee_email) or ctx.default_owner_id,
+            amount=float(l.amount or 0),
+            total_due=float(l.total_due or 0),
+            installments_count=int(l.installments_count or 0),
+            installment_amount=float(l.installment_amount or 0),
+
+            # ✅ frequency deprecado; lo guardamos null y usamos interval_days
+            frequency=None,
+            installment_interval_days=interval_days,
+
+            start_date=_parse_iso_dt(l.start_date) or ctx.now,
+            status=(l.status or LoanStatus.ACTIVE.value),
+            description=l.description,
+            collection_day=l.collection_day,
+        ))
+
+    loan_ids = _insert_returning_ids(ctx.db, Loan, loan_rows)
+    _set_created_ids(ctx.db, OnboardingStagingLoan, [l.id for l in chunk], loan_ids)
+
+    # ✅ Generación de cuotas (MISMA lógica que create_loan actual):
+    # - start_dt está en UTC (tz-aware)
+    # - trabajamos en local AR_TZ
+    # - due_date = medianoche local convertida a UTC
+    inst_rows: list[dict] = []
+    for loan_id, loan in zip(loan_ids, loan_rows):
+        start_local = loan["start_date"].astimezone(AR_TZ)
+        for i in range(loan["installments_count"]):
+            due_local = start_local + timedelta(days=loan["installment_interval_days"] * (i + 1))
+
+            local_midnight = due_local.replace(hour=0, minute=0, second=0, microsecond=0)
+            due_utc = local_midnight.astimezone(timezone.utc)
+
+            is_overdue = (local_midnight.date() < ctx.today_local)
+
+            inst_rows.append(dict(
+                loan_id=loan_id,
+                number=i + 1,
+                due_date=due_utc,
+                amount=loan["installment_amount"],
+                paid_amount=0.0,
+                is_paid=False,
+                is_overdue=is_overdue,
+                status=InstallmentStatus.OVERDUE.value if is_overdue else InstallmentStatus.PENDING.value,
+            ))
+
+    inst_ids = _insert_returning_ids(ctx.db, Installment, inst_rows)
+
+    # 📒 diario: cronograma de cada préstamo
+    schedules: dict[int, list[tuple]] = {}
+    for inst_id, inst in zip(inst_ids, inst_rows):
+        schedules.setdefault(inst["loan_id"], []).append((inst_id, inst["number"], inst["due_date"], inst["amount"]))
+    record_events_bulk(ctx.db, ctx.company_id, [
+        dict(
+            debt_kind=DEBT_LOAN, debt_id=loan_id, event_type=SCHEDULE_CREATED,
+            payload=schedule_payload(schedules.get(loan_id, [])), occurred_at=loan["start_date"],
+        )
+        for loan_id, loan in zip(loan_ids, loan_rows)
+    ])
+
+    cp.loans_created += len(loan_rows)
+    cp.installments_created += len(inst_rows)
+    return chunk[-1].rownum
+
+
+def _phase_payments(ctx: _CommitContext, cp: OnboardingCommitCheckpoint) -> Optional[int]:
+    chunk = _next_chunk(ctx, OnboardingStagingLoan, cp.group_no, cp.last_rownum, LOANS_CHUNK)
+    if not chunk:
+        return None
+
+    loan_id_by_ref = {(l.loan_ref or "").strip(): l.created_id for l in chunk}
+    loan_ids = list(loan_id_by_ref.values())
+    loan_employee = dict(ctx.db.query(Loan.id, Loan.employee_id).filter(Loan.id.in_(loan_ids)).all())
+
+    # cuotas del chunk en orden de vencimiento (imputación en memoria)
+    insts_by_loan: dict[int, list[dict]] = {}
+    for r in (
+        ctx.db.query(
+            Installment.id, Installment.loan_id, Installment.amount, Installment.paid_amount, Installment.is_overdue
+        )
+        .filter(Installment.loan_id.in_(loan_ids))
+        .order_by(Installment.loan_id, Installment.due_date, Installment.number)
+        .all()
+    ):
+        insts_by_loan.setdefault(r.loan_id, []).append({
+            "id": r.id, "amount": to_cents(r.amount), "paid_amount": to_cents(r.paid_amount),
+            "is_overdue": bool(r.is_overdue), "touched": False,
+        })
+
+    # pagos del chunk (en orden de planilla)
+    staged_payments = (
+        ctx.db.query(*OnboardingStagingPayment.__table__.c)
+        .filter(OnboardingStagingPayment.session_id == ctx.session_id)
+        .filter(OnboardingStagingPayment.loan_ref.in_(list(loan_id_by_ref.keys())))
+        .order_by(OnboardingStagingPayment.rownum.asc())
+        .all()
+    )
+
+    pay_rows: list[dict] = []
+    alloc_plan: list[tuple[int, int, int]] = []  # (pay idx, installment_id, aplicado en centavos)
+    for p in staged_payments:
+        pref = (p.payment_ref or "").strip()
+        lref = (p.loan_ref or "").strip()
+        if not pref or not lref:
+            raise HTTPException(status_code=400, detail="Payments: payment_ref/loan_ref vacío")
+
+        loan_id = loan_id_by_ref[lref]
+        amount = float(p.amount or 0)
+        if amount <= 0:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Payments: amount inválido (<=0) en payment_ref={pref}",
+            )
+
+        pi = len(pay_rows)
+        pay_rows.append(dict(
+            loan_id=loan_id,
+            amount=amount,
+            payment_date=_parse_iso_dt(p.payment_date) or ctx.now,
+            payment_type=p.payment_type,
+            description=p.description,
+            collector_id=(
+                ctx.employee_id_by_email(p.collector_email)
+                or loan_employee.get(loan_id)
+                or ctx.default_owner_id
+            ),
+            is_voided=False,
+        ))
+
+        installments = insts_by_loan.get(loan_id, [])
+        if not installments:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Payments: el préstamo loan_ref={lref} no tiene cuotas generadas",
+            )
+
+        # Distribuir sobre cuotas en orden (centavos enteros)
+        remaining = to_cents(amount)
+        for inst in installments:
+            if remaining <= 0:
+                break
+
+            before = inst["paid_amount"]
+            remaining = _apply_to_installment(inst, remaining)
+            applied = inst["paid_amount"] - before
+
+            if applied > 0:
+                inst["touched"] = True
+                alloc_plan.append((pi, inst["id"], applied))
+
+        # Bloqueo si sobra plata (ya lo chequea _check_payment_overflow antes de la primera fase)
+        if remaining > 0:
+            raise _payment_overflow_error(pref, lref, amount, remaining)
+
+    pay_ids = _insert_returning_ids(ctx.db, Payment, pay_rows)
+    record_events_bulk(ctx.db, ctx.company_id, [
+        dict(
+            debt_kind=DEBT_LOAN, debt_id=row["loan_id"], event_type=PAYMENT_POSTED,
+            payload=payment_payload(pay_id, row["amount"], row["payment_date"]),
+            occurred_at=row["payment_date"], employee_id=row["collector_id"],
+        )
+        for pay_id, row in zip(pay_ids, pay_rows)
+    ])
+
+    alloc_rows = [
+        dict(
+            payment_id=pay_ids[pi],
+            installment_id=inst_id,
+            amount_applied=from_cents(applied),
+            created_at=ctx.now,
+        )
+        for pi, inst_id, applied in alloc_plan
+    ]
+    if alloc_rows:
+        ctx.db.execute(insert(PaymentAllocation), alloc_rows)
+
+    # una cuota saldada deja de estar vencida (la parcial sigue vencida si ya lo estaba)
+    inst_updates = [
+        {
+            "id": i["id"], "paid_amount": from_cents(i["paid_amount"]), "is_paid": i.get("is_paid", False),
+            "status": i["status"], "is_overdue": i["is_overdue"] and not i.get("is_paid", False),
+        }
+        for insts in insts_by_loan.values()
+        for i in insts
+        if i["touched"]
+    ]
+    if inst_updates:
+        ctx.db.execute(update(Installment), inst_updates)
+
+    cp.payments_created += len(pay_rows)
+    cp.payment_allocations_created += len(alloc_rows)
+    return chunk[-1].rownum
+
+
+def _phase_balances(ctx: _CommitContext, cp: OnboardingCommitCheckpoint) -> Optional[int]:
+    chunk = _next_chunk(ctx, OnboardingStagingLoan, cp.group_no, cp.last_rownum, LOANS_CHUNK)
+    if not chunk:
+        return None
+
+    loan_ids = [l.created_id for l in chunk]
+    pending = case(
+        (Installment.amount > Installment.paid_amount, Installment.amount - Installment.paid_amount),
+        else_=0.0,
+    )
+    remaining_by_loan = dict(
+        ctx.db.query(Installment.loan_id, func.coalesce(func.sum(pending), 0.0))
+        .filter(Installment.loan_id.in_(loan_ids))
+        .group_by(Installment.loan_id)
+        .all()
+    )
+
+    updates = []
+    for loan_id, status in ctx.db.query(Loan.id, Loan.status).filter(Loan.id.in_(loan_ids)).all():
+        remaining_due = from_cents(max(to_cents(remaining_by_loan.get(loan_id)), 0))
+
+        # Status según saldo (misma convención que venís usando)
+        if remaining_due == 0.0:
+            status = LoanStatus.PAID.value
+        elif (status or "") == LoanStatus.PAID.value:
+            # Si el excel puso "paid" pero queda saldo, lo corregimos
+            status = LoanStatus.ACTIVE.value
+
+        updates.append({"id": loan_id, "total_due": remaining_due, "status": status})
+
+    if updates:
+        ctx.db.execute(update(Loan), updates)
+    return chunk[-1].rownum
+
+
+_PHASE_HANDLERS = {
+    "customers": _phase_customers,
+    "loans": _phase_loans,
+    "payments": _phase_payments,
+    "balances": _phase_balances,
+}
+
+
+def run_commit_group(db: Session, session_id, company_id: int, group_no: int) -> None:
+    """
+    Corre todas las fases pendientes de un grupo. Cada chunk = 1 transacción que
+    incluye el avance del checkpoint (lockeado con FOR UPDATE), así que cortar en
+    cualquier punto y volver a llamar continúa sin duplicar nada.
+    """
+    ctx = _CommitContext(db, session_id, company_id)
+    while True:
+        cp = (
+            db.query(OnboardingCommitCheckpoint)
+            .filter(OnboardingCommitCheckpoint.session_id == session_id)
+            .filter(OnboardingCommitCheckpoint.group_no == group_no)
+            .with_for_update()
+            .one()
+        )
+        if cp.phase == "done":
+            db.commit()
+            return
+
+        last = _PHASE_HANDLERS[cp.phase](ctx, cp)
+        if last is None:
+            cp.phase = PHASES[PHASES.index(cp.phase) + 1]
+            cp.last_rownum = 0
+        else:
+            cp.last_rownum = last
+        cp.updated_at = datetime.now(timezone.utc)
+        db.commit()
+
+
+def _run_commit_group_worker(session_id, company_id: int, group_no: int) -> Optional[tuple[int, str]]:
+    """Entry point del proceso worker: sesión propia; devuelve (status, detail) si falla."""
+    from app.database.db import SessionLocal
+
+    db = SessionLocal()
+    try:
+        run_commit_group(db, session_id, company_id, group_no)
+        return None
+    except HTTPException as e:
+        db.rollback()
+        return e.status_code, str(e.detail)
+    except Exception as e:
+        db.rollback()
+        logger.exception("onboarding commit: falló el grupo %s de la sesión %s", group_no, session_id)
+        return 500, f"Error al importar: {str(e)}"
+    finally:
+        db.close()
+
+
+def default_commit_workers(db: Session) -> int:
+    if db.get_bind().dialect.name == "sqlite":
+        return 1  # SQLite: un solo escritor
+    return max(1, min(COMMIT_WORKERS, COMMIT_GROUPS))
+
+
+def _check_orphan_payments(db: Session, session_id) -> None:
+    # Pagos huérfanos: se chequean antes de insertar nada (los pagos se procesan por loan)
+    loan_refs_q = db.query(OnboardingStagingLoan.loan_ref).filter(OnboardingStagingLoan.session_id == session_id)
+    orphan = (
+        db.query(OnboardingStagingPayment.loan_ref)
+        .filter(OnboardingStagingPayment.session_id == session_id)
+        .filter(
+            (OnboardingStagingPayment.loan_ref.is_(None))
+            | (~OnboardingStagingPayment.loan_ref.in_(loan_refs_q))
+        )
+        .first()
+    )
+    if orphan is not None:
+        if not (orphan[0] or "").strip():
+            raise HTTPException(status_code=400, detail="Payments: payment_ref/loan_ref vacío")
+        raise HTTPException(status_code=400, detail=f"Payments: loan_ref no resuelto: {orphan[0]}")
+
+
+def _check_payment_overflow(db: Session, session_id) -> None:
+    """
+    Pagos que exceden la deuda: se chequean antes de la primera fase. En la fase
+    "payments" ya sería tarde (clientes y préstamos de otros chunks/grupos quedan
+    commiteados). Deuda del préstamo = installments_count × installment_amount,
+    igual que las cuotas que genera la fase "loans".
+    """
+    SL, SP = OnboardingStagingLoan, OnboardingStagingPayment
+    paid = (
+        db.query(
+            SP.loan_ref.label("loan_ref"),
+            func.sum(SP.amount).label("paid"),
+            func.min(SP.rownum).label("first_rownum"),
+        )
+        .filter(SP.session_id == session_id)
+        .group_by(SP.loan_ref)
+        .subquery()
+    )
+    due = func.coalesce(SL.installments_count, 0) * func.coalesce(SL.installment_amount, 0)
+    candidates = (
+        db.query(SL.loan_ref, SL.installments_count, SL.installment_amount, paid.c.paid)
+        .join(paid, paid.c.loan_ref == SL.loan_ref)
+        .filter(SL.session_id == session_id)
+        .filter(paid.c.paid > due + 0.005)  # pre-filtro en SQL; el chequeo exacto va en centavos
+        .order_by(paid.c.first_rownum)
+        .all()
+    )
+    for lref, count, inst_amount, total in candidates:
+        if int(count or 0) <= 0:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Payments: el préstamo loan_ref={(lref or '').strip()} no tiene cuotas generadas",
+            )
+        due_c = int(count) * to_cents(inst_amount)
+        if to_cents(total) <= due_c:
+            continue
+
+        # primer pago (en orden de planilla) que se pasa: mismo mensaje que la fase "payments"
+        running = 0
+        for pref, amount in (
+            db.query(SP.payment_ref, SP.amount)
+            .filter(SP.session_id == session_id, SP.loan_ref == lref)
+            .order_by(SP.rownum.asc())
+        ):
+            running += to_cents(amount)
+            if running > due_c:
+                amount = float(amount or 0)
+                excess_c = min(running - due_c, to_cents(amount))
+                raise _payment_overflow_error((pref or "").strip(), (lref or "").strip(), amount, excess_c)
+
+
+def commit_onboarding_session(
+    db: Session,
+    session: OnboardingImportSession,
+    company_id: int,
+    workers: Optional[int] = None,
+) -> OnboardingCommitCounts:
+    """
+    Materializa el staging de la sesión por fases y chunks (customers -> loans+cuotas
+    -> payments+allocations -> saldos), con checkpoint por grupo de clientes.
+
+    - Primer llamado (status "validated"): valida refs huérfanas y pagos que exceden
+      la deuda (antes de insertar nada) y crea los checkpoints.
+    - Reanudar (status "committing"/"failed"): sigue desde el último checkpoint.
+    - workers > 1: los grupos se reparten entre procesos (cada uno con su conexión).
+
+    Si un grupo falla, la sesión queda "failed" con commit_error y se relanza
+    HTTPException; lo ya commiteado queda y /resume continúa desde ahí.
+    """
+    session_id = session.id
+
+    if session.status == "validated":
+        _check_orphan_payments(db, session_id)
+        _check_payment_overflow(db, session_id)
+        _CommitContext(db, session_id, company_id)  # falla antes de empezar si no hay empleados
+        for g in range(COMMIT_GROUPS):
+            db.add(OnboardingCommitCheckpoint(session_id=session_id, group_no=g, phase="customers", last_rownum=0))
+        session.commit_started_at = datetime.now(timezone.utc)
+
+    session.status = "committing"
+    session.commit_error = None
+    db.commit()
+
+    pending = [
+        g
+        for (g,) in db.query(OnboardingCommitCheckpoint.group_no)
+        .filter(OnboardingCommitCheckpoint.session_id == session_id)
+        .filter(OnboardingCommitCheckpoint.phase != "done")
+        .order_by(OnboardingCommitCheckpoint.group_no)
+        .all()
+    ]
+
+    if workers is None:
+        workers = default_commit_workers(db)
+    workers = min(workers, len(pending))
+
+    failures: list[tuple[int, str]] = []
+    if workers <= 1:
+        for g in pending:
+            try:
+                run_commit_group(db, session_id, company_id, g)
+            except HTTPException as e:
+                db.rollback()
+                failures.append((e.status_code, str(e.detail)))
+                break
+            except Exception as e:
+                db.rollback()
+                logger.exception("onboarding commit: falló el grupo %s de la sesión %s", g, session_id)
+                failures.append((500, f"Error al importar: {str(e)}"))
+                break
+    else:
+        # spawn: cada worker arranca limpio (sin heredar el pool de conexiones del padre)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+            futures = [pool.submit(_run_commit_group_worker, session_id, company_id, g) for g in pending]
+            for fut in futures:
+                err = fut.result()
+                if err:
+                    failures.append(err)
+
+    session = db.get(OnboardingImportSession, session_id)
+    if failures:
+        status_code, detail = failures[0]
+        session.status = "failed"
+        session.commit_error = detail
+        db.commit()
+        raise HTTPException(status_code=status_code, detail=detail)
+
+    counts = onboarding_commit_counts(db, session_id)
+
+    session.status = "committed"
+    session.commit_finished_at = datetime.now(timezone.utc)
+    clear_staging(db, session_id)
+    return counts
+
+
+def onboarding_commit_counts(db: Session, session_id) -> OnboardingCommitCounts:
+    cp = OnboardingCommitCheckpoint
+    row = (
+        db.query(
+            func.coalesce(func.sum(cp.customers_created), 0),
+            func.coalesce(func.sum(cp.loans_created), 0),
+            func.coalesce(func.sum(cp.installments_created), 0),
+            func.coalesce(func.sum(cp.payments_created), 0),
+            func.coalesce(func.sum(cp.payment_allocations_created), 0),
+        )
+        .filter(cp.session_id == session_id)
+        .one()
+    )
+    return OnboardingCommitCounts(
+        customers_created=int(row[0]),
+        loans_created=int(row[1]),
+        installments_created=int(row[2]),
+        payments_created=int(row[3]),
+        payment_allocations_created=int(row[4]),
+    )
@@ -1,12 +1,10 @@
 # app/services/onboarding_import_validate.py
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Any, Dict, List, Tuple, Optional
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Union
 from datetime import datetime, timedelta, timezone
 import io
 
-from openpyxl import load_workbook
-
 REQUIRED_SHEETS = ["Customers", "Loans", "Payments"]
 
 CUSTOMERS_REQUIRED = ["customer_ref", "first_name", "last_name"]
@@ -79,29 +77,30 @@ def _as_date(v: Any) -> Optional[datetime]:
     except Exception:
         return None
 
-def _read_sheet_rows(wb, sheet_name: str) -> Tuple[List[Dict[str, Any]], List[RowIssue]]:
-    issues: List[RowIssue] = []
-    if sheet_name not in wb.sheetnames:
-        issues.append(RowIssue(sheet_name, 0, "", "MISSING_SHEET", f"Falta la hoja {sheet_name}"))
-        return [], issues
+def _open_source(source: Union[bytes, BinaryIO]) -> BinaryIO:
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return source
+
 
+def _read_header(wb, sheet_name: str) -> Optional[Dict[str, int]]:
+    """Devuelve {columna: índice} o None si la hoja está vacía (sin header)."""
+    ws = wb[sheet_name]
+    for header_row in ws.iter_rows(min_row=1, max_row=1, values_only=True):
+        header_map: Dict[str, int] = {}
+        for idx, h in enumerate(header_row):
+            h = _norm_header(h)
+            if h:
+                header_map[h] = idx
+        return header_map
+    return None
+
+
+def _iter_sheet_rows(wb, sheet_name: str, header_map: Dict[str, int]) -> Iterator[Dict[str, Any]]:
+    """Itera filas de datos (streaming, read_only) como dicts {columna: valor, "__rownum__": n}."""
     ws = wb[sheet_name]
-    rows_iter = ws.iter_rows(values_only=True)
-    try:
-        header_row = next(rows_iter)
-    except StopIteration:
-        issues.append(RowIssue(sheet_name, 0, "", "EMPTY_SHEET", "Hoja vacía"))
-        return [], issues
-
-    headers = [_norm_header(h) for h in header_row]
-    header_map: Dict[str, int] = {}
-    for idx, h in enumerate(headers):
-        if h:
-            header_map[h] = idx
-
-    data: List[Dict[str, Any]] = []
     excel_row_index = 1  # header is 1
-    for r in rows_iter:
+    for r in ws.iter_rows(min_row=2, values_only=True):
         excel_row_index += 1
         if r is None:
             continue
@@ -114,15 +113,57 @@ def _read_sheet_rows(wb, sheet_name: str) -> Tuple[List[Dict[str, Any]], List[Ro
         for h, idx in header_map.items():
             row_obj[h] = r[idx] if idx < len(r) else None
         row_obj["__rownum__"] = excel_row_index
-        data.append(row_obj)
+        yield row_obj
+
+
+class _ListSink:
+    """Sink por defecto: junta las filas normalizadas en memoria (compat: result["payload"])."""
+
+    def __init__(self):
+        self.payload: Dict[str, List[Dict[str, Any]]] = {"customers": [], "loans": [], "payments": []}
+
+    def __call__(self, kind: str, rows: List[Dict[str, Any]]) -> None:
+        self.payload[kind].extend(rows)
+
+
+def validate_onboarding_xlsx(
+    source: Union[bytes, BinaryIO],
+    sink: Optional[Callable[[str, List[Dict[str, Any]]], None]] = None,
+    chunk_size: int = 1000,
+) -> Dict[str, Any]:
+    """
+    Valida el Excel de onboarding leyendo en streaming (openpyxl read_only).
+
+    Las filas normalizadas NO se acumulan: se entregan a `sink(kind, rows)` de a
+    `chunk_size` (kind = "customers" | "loans" | "payments"), por ejemplo para
+    insertarlas en las tablas onboarding_staging_*. Sin sink se juntan en
+    memoria y se devuelven en result["payload"] (comportamiento anterior).
+
+    En memoria sólo quedan los sets de refs (para validar referencias cruzadas)
+    y los contadores del resumen.
+    """
+    list_sink = None
+    if sink is None:
+        list_sink = _ListSink()
+        sink = list_sink
+
+    from openpyxl import load_workbook  # lazy: sólo lo usa el onboarding (arranque más rápido)
+
+    wb = load_workbook(filename=_open_source(source), read_only=True, data_only=True)
+    try:
+        result = _validate_workbook(wb, sink, chunk_size)
+    finally:
+        wb.close()
 
-    return data, issues
+    if list_sink is not None:
+        result["payload"] = list_sink.payload
+    return result
 
-def validate_onboarding_xlsx(file_bytes: bytes) -> Dict[str, Any]:
-    wb = load_workbook(filename=io.BytesIO(file_bytes), data_only=True)
 
+def _validate_workbook(wb, sink, chunk_size: int) -> Dict[str, Any]:
     errors: List[RowIssue] = []
     warnings: List[RowIssue] = []
+    acc = _SummaryAccumulator()
 
     # check sheets
     for s in REQUIRED_SHEETS:
@@ -130,21 +171,21 @@ def validate_onboarding_xlsx(file_bytes: bytes) -> Dict[str, Any]:
             errors.append(RowIssue(s, 0, "", "MISSING_SHEET", f"Falta la hoja obligatoria: {s}"))
 
     if errors:
-        return _build_result([], [], [], errors, warnings)
-
-    customers, iss = _read_sheet_rows(wb, "Customers")
-    errors.extend(iss)
-    loans, iss = _read_sheet_rows(wb, "Loans")
-    errors.extend(iss)
-    payments, iss = _read_sheet_rows(wb, "Payments")
-    errors.extend(iss)
-
-    # required columns presence (by checking first row keys)
-    def _ensure_required(sheet: str, rows: List[Dict[str, Any]], required: List[str]):
-        if not rows:
-            errors.append(RowIssue(sheet, 0, "", "EMPTY_SHEET", "No hay filas de datos"))
-            return
-        cols = set([k for k in rows[0].keys() if not k.startswith("__")])
+        return _build_result(acc, errors, warnings)
+
+    # required columns presence (header de cada hoja)
+    headers: Dict[str, Dict[str, int]] = {}
+    for sheet, required in (
+        ("Customers", CUSTOMERS_REQUIRED),
+        ("Loans", LOANS_REQUIRED),
+        ("Payments", PAYMENTS_REQUIRED),
+    ):
+        header_map = _read_header(wb, sheet)
+        if header_map is None:
+            errors.append(RowIssue(sheet, 0, "", "EMPTY_SHEET", "Hoja vacía"))
+            continue
+        headers[sheet] = header_map
+        cols = set(header_map.keys())
         for c in required:
             if c not in cols:
                 errors.append(RowIssue(sheet, 1, c, "MISSING_COLUMN", f"Falta columna obligatoria: {c}"))
@@ -161,28 +202,39 @@ def validate_onboarding_xlsx(file_bytes: bytes) -> Dict[str, Any]:
                 )
             )
 
-    _ensure_required("Customers", customers, CUSTOMERS_REQUIRED)
-    _ensure_required("Loans", loans, LOANS_REQUIRED)
-    _ensure_required("Payments", payments, PAYMENTS_REQUIRED)
-
     if errors:
-        return _build_result(customers, loans, payments, errors, warnings)
+        return _build_result(acc, errors, warnings)
+
+    def _stream(sheet: str, kind: str, check_row: Callable[[Dict[str, Any]], None], normalize) -> None:
+        buf: List[Dict[str, Any]] = []
+        n = 0
+        for row in _iter_sheet_rows(wb, sheet, headers[sheet]):
+            n += 1
+            check_row(row)
+            norm = normalize(row)
+            acc.add(kind, norm)
+            buf.append(norm)
+            if len(buf) >= chunk_size:
+                sink(kind, buf)
+                buf = []
+        if buf:
+            sink(kind, buf)
+        if n == 0:
+            errors.append(RowIssue(sheet, 0, "", "EMPTY_SHEET", "No hay filas de datos"))
 
     # build lookups
     customer_refs = set()
-    customer_ref_to_row = {}
 
-    for c in customers:
+    def _check_customer(c: Dict[str, Any]) -> None:
         rn = int(c["__rownum__"])
         cref = _as_str(c.get("customer_ref"))
         if not cref:
             errors.append(RowIssue("Customers", rn, "customer_ref", "REQUIRED", "customer_ref es obligatorio"))
-            continue
+            return
         if cref in customer_refs:
             errors.append(RowIssue("Customers", rn, "customer_ref", "DUPLICATE_REF", f"customer_ref duplicado: {cref}"))
-            continue
+            return
         customer_refs.add(cref)
-        customer_ref_to_row[cref] = rn
 
         fn = _as_str(c.get("first_name"))
         ln = _as_str(c.get("last_name"))
@@ -196,15 +248,16 @@ def validate_onboarding_xlsx(file_bytes: bytes) -> Dict[str, Any]:
             warnings.append(RowIssue("Customers", rn, "dni", "MISSING", "DNI vacío; dedupe por DNI no será posible"))
 
     loan_refs = set()
-    for l in loans:
+
+    def _check_loan(l: Dict[str, Any]) -> None:
         rn = int(l["__rownum__"])
         lref = _as_str(l.get("loan_ref"))
         if not lref:
             errors.append(RowIssue("Loans", rn, "loan_ref", "REQUIRED", "loan_ref es obligatorio"))
-            continue
+            return
         if lref in loan_refs:
             errors.append(RowIssue("Loans", rn, "loan_ref", "DUPLICATE_REF", f"loan_ref duplicado: {lref}"))
-            continue
+            return
         loan_refs.add(lref)
 
         cref = _as_str(l.get("customer_ref"))
@@ -253,15 +306,16 @@ def validate_onboarding_xlsx(file_bytes: bytes) -> Dict[str, Any]:
             errors.append(RowIssue("Loans", rn, "start_date", "INVALID", "start_date inválida (ISO o fecha Excel)"))
 
     payment_refs = set()
-    for p in payments:
+
+    def _check_payment(p: Dict[str, Any]) -> None:
         rn = int(p["__rownum__"])
         pref = _as_str(p.get("payment_ref"))
         if not pref:
             errors.append(RowIssue("Payments", rn, "payment_ref", "REQUIRED", "payment_ref es obligatorio"))
-            continue
+            return
         if pref in payment_refs:
             errors.append(RowIssue("Payments", rn, "payment_ref", "DUPLICATE_REF", f"payment_ref duplicado: {pref}"))
-            continue
+            return
         payment_refs.add(pref)
 
         lref = _as_str(p.get("loan_ref"))
@@ -282,261 +336,263 @@ def validate_onboarding_xlsx(file_bytes: bytes) -> Dict[str, Any]:
         if pt and pt not in ALLOWED_PAYMENT_TYPE:
             errors.append(RowIssue("Payments", rn, "payment_type", "INVALID", "payment_type debe ser cash/transfer/other"))
 
-    return _build_result(customers, loans, payments, errors, warnings)
+    _stream("Customers", "customers", _check_customer, _normalize_customer)
+    _stream("Loans", "loans", _check_loan, _normalize_loan)
+    _stream("Payments", "payments", _check_payment, _normalize_payment)
+
+    return _build_result(acc, errors, warnings)
 
-def _build_result(customers, loans, payments, errors: List[RowIssue], warnings: List[RowIssue]) -> Dict[str, Any]:
+def _build_result(acc: "_SummaryAccumulator", errors: List[RowIssue], warnings: List[RowIssue]) -> Dict[str, Any]:
     def issue_to_dict(i: RowIssue) -> Dict[str, Any]:
         return {"sheet": i.sheet, "row": i.row, "field": i.field, "code": i.code, "message": i.message}
 
-    payload = {
-        "customers": _normalize_customers(customers),
-        "loans": _normalize_loans(loans),
-        "payments": _normalize_payments(payments),
-    }
-
     errors_list = [issue_to_dict(e) for e in errors]
     warnings_list = [issue_to_dict(w) for w in warnings]
 
-    summary = _build_productive_summary(payload, errors_list, warnings_list)
+    summary = acc.build(errors_list, warnings_list)
 
     return {
-        "payload": payload,
         "summary": summary,
         "errors": errors_list,
         "warnings": warnings_list,
     }
 
-def _build_productive_summary(payload: Dict[str, Any], errors: list[dict], warnings: list[dict]) -> Dict[str, Any]:
-    customers = payload.get("customers", [])
-    loans = payload.get("loans", [])
-    payments = payload.get("payments", [])
-
-    # -------------------------
-    # QUALITY
-    # -------------------------
-    def _count_by_sheet(items: list[dict], sheet: str) -> int:
-        return sum(1 for x in items if x.get("sheet") == sheet)
-
-    quality = {
-        "blocking_errors": len(errors) > 0,
-        "errors_total": len(errors),
-        "warnings_total": len(warnings),
-        "by_sheet": {
-            "Customers": {
-                "rows": len(customers),
-                "errors": _count_by_sheet(errors, "Customers"),
-                "warnings": _count_by_sheet(warnings, "Customers"),
-            },
-            "Loans": {
-                "rows": len(loans),
-                "errors": _count_by_sheet(errors, "Loans"),
-                "warnings": _count_by_sheet(warnings, "Loans"),
-            },
-            "Payments": {
-                "rows": len(payments),
-                "errors": _count_by_sheet(errors, "Payments"),
-                "warnings": _count_by_sheet(warnings, "Payments"),
-            },
-        },
-    }
+def _has(v) -> bool:
+    return v is not None and str(v).strip() != ""
 
-    # -------------------------
-    # COVERAGE
-    # -------------------------
-    def _has(v) -> bool:
-        return v is not None and str(v).strip() != ""
-
-    coverage = {
-        "customers": {
-            "with_dni": sum(1 for c in customers if _has(c.get("dni"))),
-            "with_phone": sum(1 for c in customers if _has(c.get("phone"))),
-            "with_email": sum(1 for c in customers if _has(c.get("email"))),
-            "with_address": sum(1 for c in customers if _has(c.get("address"))),
-            "with_province": sum(1 for c in customers if _has(c.get("province"))),
-        },
-        "loans": {
-            "with_employee_email": sum(1 for l in loans if _has(l.get("employee_email"))),
-            "missing_employee_email": sum(1 for l in loans if not _has(l.get("employee_email"))),
-            "with_start_date": sum(1 for l in loans if _has(l.get("start_date"))),
-            "missing_start_date": sum(1 for l in loans if not _has(l.get("start_date"))),
-        },
-        "payments": {
-            "with_collector_email": sum(1 for p in payments if _has(p.get("collector_email"))),
-            "missing_collector_email": sum(1 for p in payments if not _has(p.get("collector_email"))),
-            "with_payment_type": sum(1 for p in payments if _has(p.get("payment_type"))),
-            "missing_payment_type": sum(1 for p in payments if not _has(p.get("payment_type"))),
-            "with_payment_date": sum(1 for p in payments if _has(p.get("payment_date"))),
-            "missing_payment_date": sum(1 for p in payments if not _has(p.get("payment_date"))),
-        },
-    }
 
-    # -------------------------
-    # CONSISTENCY (cross refs, duplicates, mismatches)
-    # -------------------------
-    customer_refs = [c.get("customer_ref") for c in customers if _has(c.get("customer_ref"))]
-    loan_refs = [l.get("loan_ref") for l in loans if _has(l.get("loan_ref"))]
-    payment_refs = [p.get("payment_ref") for p in payments if _has(p.get("payment_ref"))]
-
-    def _count_dupes(refs: list[str]) -> int:
-        seen = set()
-        dupes = 0
-        for r in refs:
-            if r in seen:
-                dupes += 1
-            else:
-                seen.add(r)
-        return dupes
-
-    # Dangling refs: lo detectamos en payload también (sin depender de errors)
-    customer_ref_set = set(customer_refs)
-    loan_ref_set = set(loan_refs)
-
-    loans_missing_customer = sum(
-        1 for l in loans
-        if _has(l.get("customer_ref")) and l.get("customer_ref") not in customer_ref_set
-    )
-    payments_missing_loan = sum(
-        1 for p in payments
-        if _has(p.get("loan_ref")) and p.get("loan_ref") not in loan_ref_set
-    )
+class _SummaryAccumulator:
+    """
+    Resumen productivo (quality/coverage/consistency/impact/risks) calculado fila a fila,
+    sin necesitar el payload completo en memoria. Misma estructura que antes.
+    """
 
     # Mismatch: installments_count * installment_amount vs total_due (tolerancia)
     tolerance = 1.0  # pesos / unidad monetaria
-    mismatch_count = 0
-    for l in loans:
-        ic = l.get("installments_count")
-        ia = l.get("installment_amount")
-        td = l.get("total_due")
-        if isinstance(ic, int) and isinstance(ia, (int, float)) and isinstance(td, (int, float)):
-            expected = ic * float(ia)
-            if abs(expected - float(td)) > tolerance:
-                mismatch_count += 1
-
-    consistency = {
-        "duplicate_refs": {
-            "customer_ref": _count_dupes(customer_refs),
-            "loan_ref": _count_dupes(loan_refs),
-            "payment_ref": _count_dupes(payment_refs),
-        },
-        "dangling_refs": {
-            "loans_missing_customer": loans_missing_customer,
-            "payments_missing_loan": payments_missing_loan,
-        },
-        "loan_amount_mismatches": {
-            "count": mismatch_count,
-            "tolerance": tolerance,
-        },
-    }
 
-    # -------------------------
-    # IMPACT (volumen y montos)
-    # -------------------------
-    installments_to_generate_total = sum(
-        int(l.get("installments_count") or 0) for l in loans
-        if isinstance(l.get("installments_count"), int)
-    )
-
-    loans_total_due_sum = sum(
-        float(l.get("total_due") or 0) for l in loans
-        if isinstance(l.get("total_due"), (int, float))
-    )
-
-    payments_total_amount = sum(
-        float(p.get("amount") or 0) for p in payments
-        if isinstance(p.get("amount"), (int, float))
-    )
-
-    estimated_paid_ratio = 0.0
-    if loans_total_due_sum > 0:
-        estimated_paid_ratio = payments_total_amount / loans_total_due_sum
-
-    impact = {
-        "customers_total": len(customers),
-        "loans_total": len(loans),
-        "payments_total": len(payments),
-        "installments_to_generate_total": installments_to_generate_total,
-        "loans_total_due_sum": round(loans_total_due_sum, 2),
-        "payments_total_amount": round(payments_total_amount, 2),
-        "estimated_paid_ratio": round(estimated_paid_ratio, 4),
-    }
+    def __init__(self):
+        self.rows = {"customers": 0, "loans": 0, "payments": 0}
+        self.cov_customers = {"with_dni": 0, "with_phone": 0, "with_email": 0, "with_address": 0, "with_province": 0}
+        self.cov_loans = {"with_employee_email": 0, "with_start_date": 0}
+        self.cov_payments = {"with_collector_email": 0, "with_payment_type": 0, "with_payment_date": 0}
 
-    # -------------------------
-    # RISKS (banderas rojas operativas)
-    # -------------------------
-    customers_without_identifiers = sum(
-        1 for c in customers
-        if not _has(c.get("dni")) and not _has(c.get("phone")) and not _has(c.get("email"))
-    )
-
-    risks = {
-        "customers_without_identifiers": customers_without_identifiers,
-        "loans_without_start_date": coverage["loans"]["missing_start_date"],
-        "payments_without_payment_date": coverage["payments"]["missing_payment_date"],
-        "loans_without_employee_email": coverage["loans"]["missing_employee_email"],
-        "payments_without_collector_email": coverage["payments"]["missing_collector_email"],
-    }
+        self._seen = {"customer_ref": set(), "loan_ref": set(), "payment_ref": set()}
+        self.dupes = {"customer_ref": 0, "loan_ref": 0, "payment_ref": 0}
+
+        self.loans_missing_customer = 0
+        self.payments_missing_loan = 0
+        self.mismatch_count = 0
+
+        self.installments_to_generate_total = 0
+        self.loans_total_due_sum = 0.0
+        self.payments_total_amount = 0.0
+        self.customers_without_identifiers = 0
 
+    def _ref(self, field: str, v) -> None:
+        if not _has(v):
+            return
+        seen = self._seen[field]
+        if v in seen:
+            self.dupes[field] += 1
+        else:
+            seen.add(v)
+
+    def add(self, kind: str, r: Dict[str, Any]) -> None:
+        self.rows[kind] += 1
+        if kind == "customers":
+            self._ref("customer_ref", r.get("customer_ref"))
+            for f in ("dni", "phone", "email", "address", "province"):
+                if _has(r.get(f)):
+                    self.cov_customers[f"with_{f}"] += 1
+            if not _has(r.get("dni")) and not _has(r.get("phone")) and not _has(r.get("email")):
+                self.customers_without_identifiers += 1
+
+        elif kind == "loans":
+            self._ref("loan_ref", r.get("loan_ref"))
+            if _has(r.get("employee_email")):
+                self.cov_loans["with_employee_email"] += 1
+            if _has(r.get("start_date")):
+                self.cov_loans["with_start_date"] += 1
+
+            # Dangling refs: los customers ya se leyeron completos (se procesan antes)
+            if _has(r.get("customer_ref")) and r.get("customer_ref") not in self._seen["customer_ref"]:
+                self.loans_missing_customer += 1
+
+            ic = r.get("installments_count")
+            ia = r.get("installment_amount")
+            td = r.get("total_due")
+            if isinstance(ic, int) and isinstance(ia, (int, float)) and isinstance(td, (int, float)):
+                expected = ic * float(ia)
+                if abs(expected - float(td)) > self.tolerance:
+                    self.mismatch_count += 1
+            if isinstance(ic, int):
+                self.installments_to_generate_total += int(ic or 0)
+            if isinstance(td, (int, float)):
+                self.loans_total_due_sum += float(td or 0)
+
+        elif kind == "payments":
+            self._ref("payment_ref", r.get("payment_ref"))
+            for f in ("collector_email", "payment_type", "payment_date"):
+                if _has(r.get(f)):
+                    self.cov_payments[f"with_{f}"] += 1
+            if _has(r.get("loan_ref")) and r.get("loan_ref") not in self._seen["loan_ref"]:
+                self.payments_missing_loan += 1
+            amt = r.get("amount")
+            if isinstance(amt, (int, float)):
+                self.payments_total_amount += float(amt or 0)
+
+    def build(self, errors: list[dict], warnings: list[dict]) -> Dict[str, Any]:
+        n_customers = self.rows["customers"]
+        n_loans = self.rows["loans"]
+        n_payments = self.rows["payments"]
+
+        # -------------------------
+        # QUALITY
+        # -------------------------
+        def _count_by_sheet(items: list[dict], sheet: str) -> int:
+            return sum(1 for x in items if x.get("sheet") == sheet)
+
+        quality = {
+            "blocking_errors": len(errors) > 0,
+            "errors_total": len(errors),
+            "warnings_total": len(warnings),
+            "by_sheet": {
+                "Customers": {
+                    "rows": n_customers,
+                    "errors": _count_by_sheet(errors, "Customers"),
+                    "warnings": _count_by_sheet(warnings, "Customers"),
+                },
+                "Loans": {
+                    "rows": n_loans,
+                    "errors": _count_by_sheet(errors, "Loans"),
+                    "warnings": _count_by_sheet(warnings, "Loans"),
+                },
+                "Payments": {
+                    "rows": n_payments,
+                    "errors": _count_by_sheet(errors, "Payments"),
+                    "warnings": _count_by_sheet(warnings, "Payments"),
+                },
+            },
+        }
+
+        # -------------------------
+        # COVERAGE
+        # -------------------------
+        cl = self.cov_loans
+        cp = self.cov_payments
+        coverage = {
+            "customers": dict(self.cov_customers),
+            "loans": {
+                "with_employee_email": cl["with_employee_email"],
+                "missing_employee_email": n_loans - cl["with_employee_email"],
+                "with_start_date": cl["with_start_date"],
+                "missing_start_date": n_loans - cl["with_start_date"],
+            },
+            "payments": {
+                "with_collector_email": cp["with_collector_email"],
+                "missing_collector_email": n_payments - cp["with_collector_email"],
+                "with_payment_type": cp["with_payment_type"],
+                "missing_payment_type": n_payments - cp["with_payment_type"],
+                "with_payment_date": cp["with_payment_date"],
+                "missing_payment_date": n_payments - cp["with_payment_date"],
+            },
+        }
+
+        # -------------------------
+        # CONSISTENCY (cross refs, duplicates, mismatches)
+        # -------------------------
+        consistency = {
+            "duplicate_refs": dict(self.dupes),
+            "dangling_refs": {
+                "loans_missing_customer": self.loans_missing_customer,
+                "payments_missing_loan": self.payments_missing_loan,
+            },
+            "loan_amount_mismatches": {
+                "count": self.mismatch_count,
+                "tolerance": self.tolerance,
+            },
+        }
+
+        # -------------------------
+        # IMPACT (volumen y montos)
+        # -------------------------
+        estimated_paid_ratio = 0.0
+        if self.loans_total_due_sum > 0:
+            estimated_paid_ratio = self.payments_total_amount / self.loans_total_due_sum
+
+        impact = {
+            "customers_total": n_customers,
+            "loans_total": n_loans,
+            "payments_total": n_payments,
+            "installments_to_generate_total": self.installments_to_generate_total,
+            "loans_total_due_sum": round(self.loans_total_due_sum, 2),
+            "payments_total_amount": round(self.payments_total_amount, 2),
+            "estimated_paid_ratio": round(estimated_paid_ratio, 4),
+        }
+
+        # -------------------------
+        # RISKS (banderas rojas operativas)
+        # -------------------------
+        risks = {
+            "customers_without_identifiers": self.customers_without_identifiers,
+            "loans_without_start_date": coverage["loans"]["missing_start_date"],
+            "payments_without_payment_date": coverage["payments"]["missing_payment_date"],
+            "loans_without_employee_email": coverage["loans"]["missing_employee_email"],
+            "payments_without_collector_email": coverage["payments"]["missing_collector_email"],
+        }
+
+        return {
+            "quality": quality,
+            "coverage": coverage,
+            "consistency": consistency,
+            "impact": impact,
+            "risks": risks,
+        }
+
+
+def _normalize_customer(r: Dict[str, Any]) -> Dict[str, Any]:
     return {
-        "quality": quality,
-        "coverage": coverage,
-        "consistency": consistency,
-        "impact": impact,
-        "risks": risks,
+        "rownum": int(r["__rownum__"]),
+        "customer_ref": _as_str(r.get("customer_ref")),
+        "first_name": _as_str(r.get("first_name")),
+        "last_name": _as_str(r.get("last_name")),
+        "dni": _as_str(r.get("dni")),
+        "phone": _as_str(r.get("phone")),
+        "email": _as_str(r.get("email")),
+        "address": _as_str(r.get("address")),
+        "province": _as_str(r.get("province")),
     }
 
+def _normalize_loan(r: Dict[str, Any]) -> Dict[str, Any]:
+    sd = _as_date(r.get("start_date"))
+    return {
+        "rownum": int(r["__rownum__"]),
+        "loan_ref": _as_str(r.get("loan_ref")),
+        "customer_ref": _as_str(r.get("customer_ref")),
+        "employee_email": _as_str(r.get("employee_email")),
+        "amount": _as_float(r.get("amount")),
+        "total_due": _as_float(r.get("total_due")),
+        "installments_count": _as_int(r.get("installments_count")),
+        "installment_amount": _as_float(r.get("installment_amount")),
+
+        # ✅ CAMBIO: frequency eliminado; ahora interval days
+        "installment_interval_days": _as_int(r.get("installment_interval_days")),
+
+        "start_date": sd.isoformat() if sd else None,
+        "status": _as_str(r.get("status")) or "active",
+        "description": _as_str(r.get("description")),
+        "collection_day": _as_int(r.get("collection_day")),
+    }
 
-def _normalize_customers(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    out = []
-    for r in rows:
-        out.append({
-            "rownum": int(r["__rownum__"]),
-            "customer_ref": _as_str(r.get("customer_ref")),
-            "first_name": _as_str(r.get("first_name")),
-            "last_name": _as_str(r.get("last_name")),
-            "dni": _as_str(r.get("dni")),
-            "phone": _as_str(r.get("phone")),
-            "email": _as_str(r.get("email")),
-            "address": _as_str(r.get("address")),
-            "province": _as_str(r.get("province")),
-        })
-    return out
-
-def _normalize_loans(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    out = []
-    for r in rows:
-        sd = _as_date(r.get("start_date"))
-        out.append({
-            "rownum": int(r["__rownum__"]),
-            "loan_ref": _as_str(r.get("loan_ref")),
-            "customer_ref": _as_str(r.get("customer_ref")),
-            "employee_email": _as_str(r.get("employee_email")),
-            "amount": _as_float(r.get("amount")),
-            "total_due": _as_float(r.get("total_due")),
-            "installments_count": _as_int(r.get("installments_count")),
-            "installment_amount": _as_float(r.get("installment_amount")),
-
-            # ✅ CAMBIO: frequency eliminado; ahora interval days
-            "installment_interval_days": _as_int(r.get("installment_interval_days")),
-
-            "start_date": sd.isoformat() if sd else None,
-            "status": _as_str(r.get("status")) or "active",
-            "description": _as_str(r.get("description")),
-            "collection_day": _as_int(r.get("collection_day")),
-        })
-    return out
-
-def _normalize_payments(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    out = []
-    for r in rows:
-        pd = _as_date(r.get("payment_date"))
-        out.append({
-            "rownum": int(r["__rownum__"]),
-            "payment_ref": _as_str(r.get("payment_ref")),
-            "loan_ref": _as_str(r.get("loan_ref")),
-            "amount": _as_float(r.get("amount")),
-            "payment_date": pd.isoformat() if pd else None,
-            "payment_type": _as_str(r.get("payment_type")),
-            "description": _as_str(r.get("description")),
-            "collector_email": _as_str(r.get("collector_email")),
-        })
-    return out
+def _normalize_payment(r: Dict[str, Any]) -> Dict[str, Any]:
+    pd = _as_date(r.get("payment_date"))
+    return {
+        "rownum": int(r["__rownum__"]),
+        "payment_ref": _as_str(r.get("payment_ref")),
+        "loan_ref": _as_str(r.get("loan_ref")),
+        "amount": _as_float(r.get("amount")),
+        "payment_date": pd.isoformat() if pd else None,
+        "payment_type": _as_str(r.get("payment_type")),
+        "description": _as_str(r.get("description")),
+        "collector_email": _as_str(r.get("collector_email")),
+    }
@@ -0,0 +1,188 @@
+# app/services/partitions.py
+"""
+Particionado mensual (Postgres, RANGE) de `payments` por payment_date e
+`installments` por due_date.
+
+La migración 4e1b7c9a0f25 convierte las tablas; desde ahí:
+
+- Cada mes (UTC) es una partición `{tabla}_pAAAA_MM`. Las consultas con ventana
+  sobre la columna cruda (dashboard, summaries: `local_dates_to_utc_window`)
+  sólo tocan las particiones del rango. Ojo: `func.date(columna)` no poda.
+- `{tabla}_default` recibe lo que cae fuera de las particiones creadas (ej.
+  cuotas de un plan largo que vencen más allá del horizonte). Al crear el mes,
+  esas filas se mueven a su partición (`create_month_partition`) sin perder
+  sus payment_allocations.
+- El scheduler corre `ensure_partitions` todos los días (app/jobs/partitions.py):
+  mes actual + PARTITION_MONTHS_AHEAD, más los meses que hayan caído en default.
+- Datos viejos: `detach_partitions_before()` los saca de la tabla sin reescribir
+  nada (la partición queda como tabla suelta para archivar o dropear).
+
+La PK pasa a ser (id, columna de partición) y payment_allocations ya no tiene FK
+a payments/installments (Postgres no permite FK a un id que no es único por sí
+solo); el ON DELETE CASCADE lo mantienen triggers. En SQLite / sin migrar todo
+esto es no-op.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from datetime import date, datetime, timezone
+from typing import Iterable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger("uvicorn.error")
+
+PARTITIONED_TABLES = {
+    "payments": "payment_date",
+    "installments": "due_date",
+}
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+
+
+def month_start(d: date | datetime) -> date:
+    return date(d.year, d.month, 1)
+
+
+def add_months(month: date, n: int) -> date:
+    idx = month.year * 12 + (month.month - 1) + n
+    return date(idx // 12, idx % 12 + 1, 1)
+
+
+def iter_months(first: date, last: date) -> Iterable[date]:
+    month = month_start(first)
+    last = month_start(last)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+
+def month_bounds(month: date) -> tuple[str, str]:
+    """Límites [desde, hasta) en UTC como literales para FOR VALUES."""
+    start = datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+    nxt = add_months(month, 1)
+    end = datetime(nxt.year, nxt.month, 1, tzinfo=timezone.utc)
+    return start.isoformat(sep=" "), end.isoformat(sep=" ")
+
+
+def _is_postgres(conn: Connection) -> bool:
+    return conn.dialect.name == "postgresql"
+
+
+def is_partitioned(conn: Connection, table: str) -> bool:
+    if not _is_postgres(conn):
+        return False
+    relkind = conn.execute(
+        text("SELECT c.relkind FROM pg_class c WHERE c.oid = to_regclass(:t)"), {"t": table}
+    ).scalar()
+    return relkind == "p"
+
+
+def existing_partitions(conn: Connection, table: str) -> set[str]:
+    rows = conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:t)"
+        ),
+        {"t": table},
+    )
+    return {r[0] for r in rows}
+
+
+def create_default_partition(conn: Connection, table: str) -> None:
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {default_partition_name(table)} PARTITION OF {table} DEFAULT"
+    ))
+
+
+def create_month_partition(conn: Connection, table: str, month: date, existing: Optional[set[str]] = None) -> bool:
+    """Crea la partición del mes si falta. Devuelve True si la creó."""
+    column = PARTITIONED_TABLES[table]
+    name = partition_name(table, month)
+    existing = existing if existing is not None else existing_partitions(conn, table)
+    if name in existing:
+        return False
+
+    start, end = month_bounds(month)
+    default = default_partition_name(table)
+    in_default = default in existing and conn.execute(
+        text(f"SELECT 1 FROM {default} WHERE {column} >= :s AND {column} < :e LIMIT 1"),
+        {"s": start, "e": end},
+    ).first() is not None
+
+    # no se puede crear un rango que ya tiene filas en default. Se saca default,
+    # se crea el mes y las filas vuelven a entrar por la tabla particionada: cuando
+    # corre trg_{table}_delete_allocations (fin del statement) la fila ya está en
+    # {table} y sus payment_allocations no se tocan.
+    if in_default:
+        conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+    conn.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM ('{start}') TO ('{end}')"
+    ))
+    if in_default:
+        conn.execute(
+            text(
+                f"WITH moved AS (DELETE FROM {default} WHERE {column} >= :s AND {column} < :e RETURNING *) "
+                f"INSERT INTO {table} SELECT * FROM moved"
+            ),
+            {"s": start, "e": end},
+        )
+        conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+
+    existing.add(name)
+    return True
+
+
+def _months_in_default(conn: Connection, table: str) -> list[date]:
+    column = PARTITIONED_TABLES[table]
+    rows = conn.execute(text(
+        f"SELECT DISTINCT date_trunc('month', {column} AT TIME ZONE 'UTC')::date "
+        f"FROM {default_partition_name(table)}"
+    ))
+    return [r[0] for r in rows]
+
+
+def ensure_partitions(
+    conn: Connection,
+    today: Optional[date] = None,
+    months_ahead: int = PARTITION_MONTHS_AHEAD,
+) -> list[str]:
+    """Crea las particiones que falten (idempotente). Devuelve los nombres creados."""
+    created: list[str] = []
+    today = today or datetime.now(timezone.utc).date()
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(conn, table):
+            continue
+        existing = existing_partitions(conn, table)
+        months = set(iter_months(today, add_months(month_start(today), months_ahead)))
+        if default_partition_name(table) in existing:
+            months.update(_months_in_default(conn, table))
+        for month in sorted(months):
+            if create_month_partition(conn, table, month, existing):
+                created.append(partition_name(table, month))
+    return created
+
+
+def detach_partitions_before(conn: Connection, table: str, before: date) -> list[str]:
+    """Saca de `table` las particiones mensuales anteriores a `before` (quedan como tablas sueltas)."""
+    if not is_partitioned(conn, table):
+        return []
+    limit = partition_name(table, month_start(before))
+    prefix = f"{table}_p"
+    detached: list[str] = []
+    for name in sorted(existing_partitions(conn, table)):
+        # los nombres _pAAAA_MM ordenan igual que las fechas
+        if name.startswith(prefix) and name < limit:
+            conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            detached.append(name)
+    return detached
@@ -0,0 +1,422 @@
+# app/services/payment_receipts.py
+"""
+Recibo de un pago: PDF (ticket 80 mm) y ESC/POS para impresoras térmicas.
+
+- Los datos salen de UNA consulta: pago + préstamo/compra + cliente + empresa +
+  cobrador + mini resumen de cuotas agregado en SQL (sin traer las cuotas).
+- Los bytes renderizados se guardan en un LRU en memoria con clave
+  (tipo, payment_id, is_voided, versión de datos de la empresa, día local):
+  una reimpresión desde la app del cobrador no vuelve a consultar ni dibujar.
+  Cualquier escritura de la empresa (bump_company_version) o la anulación del
+  pago cambian la clave, así que nunca se sirve un recibo viejo.
+"""
+from __future__ import annotations
+
+import os
+import unicodedata
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from io import BytesIO
+from typing import Optional
+
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.orm import Session, aliased
+
+from app.models.models import Company, Customer, Employee, Installment, Loan, Payment, Purchase
+from app.utils.response_cache import InMemoryCacheStore, get_company_version
+from app.utils.time_windows import AR_TZ, today_start_utc
+
+
+RECEIPT_CACHE_MAX_ENTRIES = int(os.getenv("RECEIPT_CACHE_MAX_ENTRIES", "512"))
+RECEIPT_CACHE_TTL_SECONDS = int(os.getenv("RECEIPT_CACHE_TTL_SECONDS", "900"))
+
+PAYMENT_TYPE_LABELS = {
+    "cash": "Efectivo",
+    "transfer": "Transferencia",
+    "card": "Tarjeta",
+    "other": "Otro",
+}
+
+_cache = InMemoryCacheStore(max_entries=RECEIPT_CACHE_MAX_ENTRIES)
+
+
+@dataclass
+class ReceiptData:
+    payment_id: int
+    amount: float
+    payment_date: Optional[datetime]
+    payment_type: Optional[str]
+    description: Optional[str]
+    loan_id: Optional[int]
+    purchase_id: Optional[int]
+
+    is_voided: bool
+    voided_at: Optional[datetime]
+    void_reason: Optional[str]
+
+    company_name: Optional[str]
+    customer_name: Optional[str]
+    customer_doc: Optional[str]
+    customer_phone: Optional[str]
+    customer_province: Optional[str]
+    collector_name: Optional[str]
+    reference: str
+
+    # Mini resumen del préstamo (sólo si el pago es de un préstamo)
+    loan_total_amount: Optional[float] = None
+    loan_total_due: Optional[float] = None
+    installments_paid: Optional[int] = None
+    installments_overdue: Optional[int] = None
+    installments_pending: Optional[int] = None
+
+
+# =========================
+#          DATOS
+# =========================
+def receipt_scope(db: Session, payment_id: int) -> Optional[tuple[bool, Optional[int]]]:
+    """
+    Consulta mínima por PK: (is_voided, company_id) del pago, o None si no existe.
+    company_id es None para pagos sin préstamo ni compra.
+    """
+    row = db.execute(
+        select(
+            Payment.is_voided,
+            func.coalesce(Loan.company_id, Purchase.company_id),
+        )
+        .select_from(Payment)
+        .outerjoin(Loan, Loan.id == Payment.loan_id)
+        .outerjoin(Purchase, Purchase.id == Payment.purchase_id)
+        .where(Payment.id == payment_id)
+    ).first()
+    if row is None:
+        return None
+    return bool(row[0]), row[1]
+
+
+def load_receipt_data(db: Session, payment_id: int, company_id: int) -> Optional[ReceiptData]:
+    """
+    Arma los datos del recibo en una sola consulta. Devuelve None si el pago no
+    existe o pertenece a otra empresa.
+    """
+    collector = aliased(Employee)
+    # NUMERIC(14,2): comparación exacta, sin tolerancia
+    paid_cond = func.coalesce(Installment.paid_amount, 0) >= func.coalesce(Installment.amount, 0)
+
+    # Agregado de cuotas del préstamo del pago (filtrado por ese loan_id, no toda la tabla)
+    loan_of_payment = select(Payment.loan_id).where(Payment.id == payment_id).scalar_subquery()
+    inst = (
+        select(
+            Installment.loan_id.label("loan_id"),
+            func.sum(func.coalesce(Installment.amount, 0)).label("total_amount"),
+            func.sum(
+                case(
+                    (~paid_cond, func.coalesce(Installment.amount, 0) - func.coalesce(Installment.paid_amount, 0)),
+                    else_=0,
+                )
+            ).label("total_due"),
+            func.sum(case((paid_cond, 1), else_=0)).label("paid"),
+            func.sum(case((and_(~paid_cond, Installment.due_date < today_start_utc(AR_TZ)), 1), else_=0)).label("overdue"),
+            func.count(Installment.id).label("count"),
+        )
+        .where(Installment.loan_id == loan_of_payment)
+        .group_by(Installment.loan_id)
+        .subquery()
+    )
+
+    row = db.execute(
+        select(
+            Payment.id,
+            Payment.amount,
+            Payment.payment_date,
+            Payment.payment_type,
+            Payment.description,
+            Payment.loan_id,
+            Payment.purchase_id,
+            Payment.is_voided,
+            Payment.voided_at,
+            Payment.void_reason,
+            func.coalesce(Loan.company_id, Purchase.company_id).label("company_id"),
+            Company.name.label("company_name"),
+            Customer.first_name,
+            Customer.last_name,
+            Customer.dni,
+            Customer.phone,
+            Customer.province,
+            collector.name.label("collector_name"),
+            inst.c.total_amount,
+            inst.c.total_due,
+            inst.c.paid,
+            inst.c.overdue,
+            inst.c.count,
+        )
+        .select_from(Payment)
+        .outerjoin(Loan, Loan.id == Payment.loan_id)
+        .outerjoin(Purchase, Purchase.id == Payment.purchase_id)
+        .outerjoin(Customer, Customer.id == func.coalesce(Loan.customer_id, Purchase.customer_id))
+        .outerjoin(Company, Company.id == func.coalesce(Loan.company_id, Purchase.company_id, company_id))
+        .outerjoin(collector, collector.id == Payment.collector_id)
+        .outerjoin(inst, inst.c.loan_id == Payment.loan_id)
+        .where(Payment.id == payment_id)
+    ).mappings().first()
+
+    if row is None:
+        return None
+    # Pagos sueltos (sin préstamo/compra) se validan contra la empresa del usuario
+    if row["company_id"] is not None and row["company_id"] != company_id:
+        return None
+
+    full_name = f"{(row['first_name'] or '').strip()} {(row['last_name'] or '').strip()}".strip()
+    if row["loan_id"]:
+        reference = f"Préstamo #{row['loan_id']}"
+    elif row["purchase_id"]:
+        reference = f"Compra #{row['purchase_id']}"
+    else:
+        reference = "Pago"
+
+    data = ReceiptData(
+        payment_id=row["id"],
+        amount=float(row["amount"] or 0),
+        payment_date=row["payment_date"],
+        payment_type=row["payment_type"],
+        description=row["description"],
+        loan_id=row["loan_id"],
+        purchase_id=row["purchase_id"],
+        is_voided=bool(row["is_voided"]),
+        voided_at=row["voided_at"],
+        void_reason=row["void_reason"],
+        company_name=row["company_name"],
+        customer_name=full_name or None,
+        customer_doc=row["dni"],
+        customer_phone=row["phone"],
+        customer_province=row["province"],
+        collector_name=row["collector_name"],
+        reference=reference,
+    )
+    if row["loan_id"] and row["count"]:
+        paid = int(row["paid"] or 0)
+        overdue = int(row["overdue"] or 0)
+        data.loan_total_amount = float(row["total_amount"] or 0)
+        data.loan_total_due = float(row["total_due"] or 0)
+        data.installments_paid = paid
+        data.installments_overdue = overdue
+        data.installments_pending = int(row["count"]) - paid - overdue
+    return data
+
+
+# =========================
+#        FORMATO
+# =========================
+def _money(v: float) -> str:
+    s = f"{float(v or 0):,.2f}"
+    # 1,234.50 → 1.234,50
+    return "$ " + s.replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def _local_dt(dt: Optional[datetime]) -> str:
+    if dt is None:
+        return "-"
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(AR_TZ).strftime("%d/%m/%Y %H:%M")
+
+
+def _receipt_lines(d: ReceiptData) -> list[tuple[str, str]]:
+    """Pares (etiqueta, valor) comunes a PDF y ESC/POS."""
+    lines = [
+        ("Fecha", _local_dt(d.payment_date)),
+        ("Cliente", d.customer_name or "-"),
+    ]
+    if d.customer_doc:
+        lines.append(("DNI", d.customer_doc))
+    lines.append(("Referencia", d.reference))
+    if d.collector_name:
+        lines.append(("Cobrador", d.collector_name))
+    lines.append(("Medio", PAYMENT_TYPE_LABELS.get(d.payment_type or "", d.payment_type or "-")))
+    if d.description:
+        lines.append(("Nota", d.description))
+    return lines
+
+
+def _summary_lines(d: ReceiptData) -> list[tuple[str, str]]:
+    if d.loan_total_amount is None:
+        return []
+    return [
+        ("Total préstamo", _money(d.loan_total_amount)),
+        ("Saldo", _money(d.loan_total_due or 0)),
+        ("Cuotas pagadas", str(d.installments_paid or 0)),
+        ("Cuotas vencidas", str(d.installments_overdue or 0)),
+        ("Cuotas pendientes", str(d.installments_pending or 0)),
+    ]
+
+
+# =========================
+#          PDF
+# =========================
+def render_receipt_pdf(d: ReceiptData) -> bytes:
+    """Ticket de 80 mm de ancho; el alto se ajusta al contenido."""
+    from reportlab.lib import colors
+    from reportlab.lib.units import mm
+    from reportlab.pdfgen import canvas
+
+    lines = _receipt_lines(d)
+    summary = _summary_lines(d)
+    void_rows = 2 if d.is_voided else 0
+
+    W = 80 * mm
+    MX = 5 * mm
+    LH = 4.6 * mm
+    H = (34 + (len(lines) + len(summary) + void_rows) * 4.6 + (8 if summary else 0) + 14) * mm
+
+    buf = BytesIO()
+    c = canvas.Canvas(buf, pagesize=(W, H))
+    c.setTitle(f"Recibo {d.payment_id}")
+
+    y = H - 8 * mm
+    c.setFont("Helvetica-Bold", 11)
+    c.drawCentredString(W / 2, y, (d.company_name or "").strip() or "Recibo")
+    y -= 5 * mm
+    c.setFont("Helvetica", 8)
+    c.drawCentredString(W / 2, y, f"RECIBO DE PAGO N° {d.payment_id}")
+    y -= 4 * mm
+    c.setStrokeColor(colors.grey)
+    c.line(MX, y, W - MX, y)
+    y -= LH
+
+    def row(label: str, value: str, bold: bool = False):
+        nonlocal y
+        c.setFont("Helvetica", 8)
+        c.drawString(MX, y, label)
+        c.setFont("Helvetica-Bold" if bold else "Helvetica", 8)
+        c.drawRightString(W - MX, y, value[:48])
+        y -= LH
+
+    for label, value in lines:
+        row(label, value)
+
+    y -= 1 * mm
+    c.setFont("Helvetica-Bold", 14)
+    c.drawCentredString(W / 2, y - 2 * mm, _money(d.amount))
+    y -= 9 * mm
+
+    if summary:
+        c.line(MX, y + 2 * mm, W - MX, y + 2 * mm)
+        y -= 1 * mm
+        for label, value in summary:
+            row(label, value, bold=label == "Saldo")
+
+    if d.is_voided:
+        y -= 2 * mm
+        c.setFillColor(colors.red)
+        c.setFont("Helvetica-Bold", 12)
+        c.drawCentredString(W / 2, y, "ANULADO")
+        y -= LH
+        c.setFont("Helvetica", 7)
+        detail = _local_dt(d.voided_at) + (f" · {d.void_reason}" if d.void_reason else "")
+        c.drawCentredString(W / 2, y, detail[:60])
+        c.setFillColor(colors.black)
+
+    c.showPage()
+    c.save()
+    return buf.getvalue()
+
+
+# =========================
+#        ESC/POS
+# =========================
+ESC = b"\x1b"
+GS = b"\x1d"
+
+_INIT = ESC + b"@"
+_CODEPAGE_1252 = ESC + b"t" + bytes([16])
+_ALIGN_LEFT = ESC + b"a\x00"
+_ALIGN_CENTER = ESC + b"a\x01"
+_BOLD_ON = ESC + b"E\x01"
+_BOLD_OFF = ESC + b"E\x00"
+_DOUBLE_ON = GS + b"!\x11"
+_DOUBLE_OFF = GS + b"!\x00"
+_CUT = GS + b"V\x42\x03"  # feed 3 líneas + corte parcial
+
+
+def _enc(text: str) -> bytes:
+    """cp1252 (ñ, acentos); lo que no entra se translitera sin tildes."""
+    try:
+        return text.encode("cp1252")
+    except UnicodeEncodeError:
+        plain = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+        return plain.encode("cp1252")
+
+
+def _pair(label: str, value: str, cols: int) -> bytes:
+    value = value[: max(0, cols - len(label) - 1)]
+    gap = max(1, cols - len(label) - len(value))
+    return _enc(label + " " * gap + value) + b"\n"
+
+
+def render_receipt_escpos(d: ReceiptData, cols: int = 32) -> bytes:
+    """Bytes listos para mandar a la impresora (32 columnas = 58 mm, 48 = 80 mm)."""
+    sep = b"-" * cols + b"\n"
+    out = bytearray()
+    out += _INIT + _CODEPAGE_1252 + _ALIGN_CENTER
+    out += _BOLD_ON + _enc(((d.company_name or "").strip() or "Recibo")[:cols]) + b"\n" + _BOLD_OFF
+    out += _enc(f"RECIBO DE PAGO N° {d.payment_id}") + b"\n"
+    out += _ALIGN_LEFT + sep
+
+    for label, value in _receipt_lines(d):
+        out += _pair(label, value, cols)
+
+    out += _ALIGN_CENTER + b"\n" + _DOUBLE_ON + _BOLD_ON
+    out += _enc(_money(d.amount)) + b"\n"
+    out += _DOUBLE_OFF + _BOLD_OFF + b"\n" + _ALIGN_LEFT
+
+    summary = _summary_lines(d)
+    if summary:
+        out += sep
+        for label, value in summary:
+            out += _pair(label, value, cols)
+
+    if d.is_voided:
+        out += sep + _ALIGN_CENTER + _BOLD_ON + _DOUBLE_ON + b"ANULADO\n" + _DOUBLE_OFF + _BOLD_OFF
+        out += _enc(_local_dt(d.voided_at)) + b"\n"
+        if d.void_reason:
+            out += _enc(d.void_reason[:cols]) + b"\n"
+        out += _ALIGN_LEFT
+
+    out += _CUT
+    return bytes(out)
+
+
+# =========================
+#          CACHE
+# =========================
+def get_receipt_bytes(
+    db: Session,
+    payment_id: int,
+    company_id: int,
+    kind: str,
+    cols: int = 32,
+) -> Optional[bytes]:
+    """
+    kind: "pdf" | "escpos". Devuelve None si el pago no existe o no es de la empresa.
+    Hit de cache = una consulta por PK; miss = consulta agregada + render.
+    """
+    scope = receipt_scope(db, payment_id)
+    if scope is None:
+        return None
+    is_voided, pay_company = scope
+    if pay_company is not None and pay_company != company_id:
+        return None
+
+    today_local = datetime.now(AR_TZ).date().isoformat()
+    version = get_company_version(company_id)
+    key = f"{kind}:{payment_id}:{int(is_voided)}:{version}:{today_local}:{cols if kind == 'escpos' else 0}"
+
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    data = load_receipt_data(db, payment_id, company_id)
+    if data is None:
+        return None
+    body = render_receipt_pdf(data) if kind == "pdf" else render_receipt_escpos(data, cols=cols)
+    _cache.set(key, body, RECEIPT_CACHE_TTL_SECONDS)
+    return body
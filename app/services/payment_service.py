@@ -0,0 +1,134 @@
+# app/services/payment_service.py
+"""
+Alta de pagos (préstamos y ventas) en UNA transacción:
+
+    lock de la deuda → INSERT payment → imputación (una pasada) → estado/total_due
+    → evento payment_posted (ledger_events) → daily_rollups → commit
+
+Lo usan /installments/{id}/pay, /loans/{id}/pay y /payments/. Las validaciones
+propias de cada ruta (tope por cuota, tope por saldo) van entre `lock()` y
+`apply()`, así leen el estado ya bloqueado.
+
+Después del commit los objetos NO se expiran: pago, deuda y cuotas tocadas
+quedan con el estado escrito y se devuelven sin volver a leer la base.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional, Union
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app.models.models import Loan, Payment, Purchase
+from app.services.daily_rollups import capture_rollups, sync_rollups
+from app.services.ledger_journal import record_payment_posted
+from app.utils.ledger import DEBT_LOAN, DEBT_PURCHASE, apply_payment_to_ledger, lock_debt
+from app.utils.money import to_cents
+from app.utils.response_cache import bump_company_version
+from app.utils.status import refresh_debt_status
+
+
+@dataclass
+class PaymentResult:
+    payment: Payment
+    debt: Union[Loan, Purchase]
+    allocations: list[dict] = field(default_factory=list)
+
+    @property
+    def applied_amount(self) -> float:
+        return sum(to_cents(a["amount_applied"]) for a in self.allocations) / 100
+
+    @property
+    def installments_affected(self) -> int:
+        return len({a["installment_id"] for a in self.allocations})
+
+
+class PaymentService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def lock(self, debt_kind: str, debt_id: int) -> Union[Loan, Purchase]:
+        """Bloquea la deuda (hasta el commit de apply) y la devuelve releída; 404 si no existe."""
+        debt = lock_debt(self.db, debt_kind, debt_id)
+        if debt is None:
+            detail = "Préstamo no encontrado" if debt_kind == DEBT_LOAN else "Compra no encontrada"
+            raise HTTPException(status_code=404, detail=detail)
+        return debt
+
+    def apply(
+        self,
+        debt_kind: str,
+        debt_id: int,
+        *,
+        amount: float,
+        collector_id: int,
+        company_id: int,
+        payment_type: Optional[str] = None,
+        description: Optional[str] = None,
+        payment_date: Optional[datetime] = None,
+        require_applied: bool = False,
+    ) -> PaymentResult:
+        """
+        Registra e imputa el pago. Toma el lock si la ruta no lo tomó antes.
+        require_applied: si el pago no cae en ninguna cuota, rollback + 400.
+        """
+        db = self.db
+        debt = self.lock(debt_kind, debt_id)
+        rollups_before = capture_rollups(db, company_id, debt_kind, [debt_id])
+
+        if payment_date is None:
+            payment_dt_utc = datetime.now(timezone.utc)
+        else:
+            # naive → asumimos UTC
+            if payment_date.tzinfo is None:
+                payment_date = payment_date.replace(tzinfo=timezone.utc)
+            payment_dt_utc = payment_date.astimezone(timezone.utc)
+
+        payment = Payment(
+            amount=float(amount),
+            loan_id=debt_id if debt_kind == DEBT_LOAN else None,
+            purchase_id=debt_id if debt_kind == DEBT_PURCHASE else None,
+            payment_date=payment_dt_utc,
+            payment_type=payment_type,
+            description=description,
+            collector_id=collector_id,
+            is_voided=False,
+        )
+
+        try:
+            db.add(payment)
+            db.flush()
+
+            allocations = apply_payment_to_ledger(db, payment)
+            if require_applied and not allocations:
+                db.rollback()
+                raise HTTPException(status_code=400, detail="No se aplicó ningún pago")
+
+            refresh_debt_status(
+                db,
+                loan_id=payment.loan_id,
+                purchase_id=payment.purchase_id,
+            )
+            db.flush()
+            record_payment_posted(db, payment, company_id)
+            sync_rollups(db, company_id, debt_kind, [debt_id], rollups_before)
+            self._commit_keeping_state()
+        except HTTPException:
+            raise
+        except Exception:
+            db.rollback()
+            raise
+
+        bump_company_version(company_id)
+        return PaymentResult(payment=payment, debt=debt, allocations=allocations)
+
+    # ---------- internos ----------
+    def _commit_keeping_state(self) -> None:
+        prev = self.db.expire_on_commit
+        self.db.expire_on_commit = False
+        try:
+            self.db.commit()
+        finally:
+            self.db.expire_on_commit = prev
@@ -0,0 +1,241 @@
+# app/services/portfolio.py
+"""
+Cartera al día X: saldo, vencido y aging de préstamos y ventas tal como estaban
+al cierre de un día local, sin depender de paid_amount / total_due (que sólo
+tienen el estado actual).
+
+Una consulta por tipo de deuda, todo en SQL:
+
+    pagado(deuda)  = Σ pagos con payment_date < X y no anulados antes de X
+                     (anulado sin voided_at = nunca contó)
+    antes(cuota)   = Σ montos de las cuotas anteriores (ventana por deuda, orden de número)
+    pagado(cuota)  = clamp(pagado(deuda) - antes(cuota), 0, monto)
+
+Es la misma imputación que el ledger (pagos vivos sobre cuotas por número),
+así que no hace falta leer payment_allocations (que se borran al anular y se
+rehacen en cada replay). Se usan los montos actuales de las cuotas.
+
+Entran todas las deudas con start_date < X que no estaban canceladas/refinanciadas
+antes de X, también las ya pagadas (suman a `paid`): el costo crece con la
+historia de la empresa. Lo único que acota el recorrido es el archivo de
+préstamos (app/services/loan_archive.py): los archivados se leen desde
+archived_* sólo si cerraron en X o después. Las ventas no se archivan y se leen
+siempre. El filtro payment_date < X poda particiones de pagos (Postgres).
+"""
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import and_, case, func, or_, select
+from sqlalchemy.orm import Session
+
+from app.constants import NORMALIZE_LOAN_STATUS, LoanStatus
+from app.models.models import (
+    ArchivedInstallment,
+    ArchivedPayment,
+    Employee,
+    Installment,
+    Loan,
+    LoanArchive,
+    Payment,
+    Purchase,
+)
+from app.utils.money import from_cents, to_cents
+from app.utils.time_windows import AR_TZ, local_dates_to_utc_window
+
+AGING_BUCKETS = (
+    # (clave, días de atraso desde, hasta) — ambos inclusive; None = sin tope
+    ("d1_30", 1, 30),
+    ("d31_60", 31, 60),
+    ("d61_90", 61, 90),
+    ("d91_plus", 91, None),
+)
+
+# cerradas sin cobrar: a partir de status_changed_at dejan de ser cartera
+_WRITTEN_OFF_STATUSES = sorted(
+    k for k, v in NORMALIZE_LOAN_STATUS.items() if v in (LoanStatus.CANCELED, LoanStatus.REFINANCED)
+)
+
+_AMOUNT_FIELDS = ("outstanding", "not_due", "overdue", "paid") + tuple(k for k, _, _ in AGING_BUCKETS)
+_COUNT_FIELDS = ("debts_count", "overdue_installments_count")
+
+
+def _day_start(day: date, zone: ZoneInfo):
+    return local_dates_to_utc_window(day, day, zone)[0]
+
+
+def _debt_rows(
+    db: Session,
+    parent,
+    inst,
+    pay,
+    fk: str,
+    company_id: int,
+    as_of_utc,
+    day_start_utc,
+    zone: ZoneInfo,
+    as_of_day: date,
+    employee_id: Optional[int],
+    archived: bool = False,
+) -> list:
+    inst_fk = getattr(inst, fk)
+    pay_fk = getattr(pay, fk)
+
+    debts = select(parent.id).where(
+        parent.company_id == company_id,
+        parent.start_date < as_of_utc,
+        ~and_(
+            func.lower(func.coalesce(parent.status, "")).in_(_WRITTEN_OFF_STATUSES),
+            func.coalesce(parent.status_changed_at, parent.start_date) < as_of_utc,
+        ),
+    )
+    if employee_id is not None:
+        debts = debts.where(parent.employee_id == employee_id)
+    if archived:
+        debts = debts.join(LoanArchive, LoanArchive.loan_id == parent.id).where(
+            or_(LoanArchive.closed_at.is_(None), LoanArchive.closed_at >= as_of_utc)
+        )
+    elif parent is Loan:
+        # los archivados ya no tienen filas en las tablas calientes
+        debts = debts.outerjoin(LoanArchive, LoanArchive.loan_id == parent.id).where(LoanArchive.loan_id.is_(None))
+    debts = debts.scalar_subquery()
+
+    paid = (
+        select(pay_fk.label("debt_id"), func.sum(pay.amount).label("paid"))
+        .where(
+            pay_fk.in_(debts),
+            pay.payment_date < as_of_utc,
+            or_(
+                pay.is_voided.is_(False),
+                pay.is_voided.is_(None),
+                pay.voided_at >= as_of_utc,
+            ),
+        )
+        .group_by(pay_fk)
+        .subquery()
+    )
+
+    sched = (
+        select(
+            inst_fk.label("debt_id"),
+            parent.employee_id.label("collector_id"),
+            inst.due_date.label("due_date"),
+            inst.amount.label("amount"),
+            (
+                func.sum(inst.amount).over(partition_by=inst_fk, order_by=(inst.number, inst.id))
+                - inst.amount
+            ).label("before"),
+        )
+        .join(parent, parent.id == inst_fk)
+        .where(inst_fk.in_(debts))
+        .subquery()
+    )
+
+    paid_total = func.coalesce(paid.c.paid, 0)
+    paid_i = case(
+        (paid_total >= sched.c.before + sched.c.amount, sched.c.amount),
+        (paid_total > sched.c.before, paid_total - sched.c.before),
+        else_=0,
+    )
+    alloc = (
+        select(
+            sched.c.debt_id,
+            sched.c.collector_id,
+            sched.c.due_date,
+            paid_i.label("paid"),
+            (sched.c.amount - paid_i).label("balance"),
+        )
+        .select_from(sched.outerjoin(paid, paid.c.debt_id == sched.c.debt_id))
+        .subquery()
+    )
+
+    open_ = alloc.c.balance > 0.005
+    overdue = alloc.c.due_date < day_start_utc
+
+    def _sum_if(cond):
+        return func.coalesce(func.sum(case((cond, alloc.c.balance), else_=0)), 0)
+
+    aging = []
+    for key, lo, hi in AGING_BUCKETS:
+        conds = [alloc.c.due_date < _day_start(as_of_day - timedelta(days=lo - 1), zone)]
+        if hi is not None:
+            conds.append(alloc.c.due_date >= _day_start(as_of_day - timedelta(days=hi), zone))
+        aging.append(_sum_if(and_(*conds)).label(key))
+
+    q = (
+        select(
+            alloc.c.collector_id,
+            func.coalesce(func.sum(alloc.c.balance), 0).label("outstanding"),
+            _sum_if(~overdue).label("not_due"),
+            _sum_if(overdue).label("overdue"),
+            func.coalesce(func.sum(alloc.c.paid), 0).label("paid"),
+            *aging,
+            func.count(func.distinct(case((open_, alloc.c.debt_id)))).label("debts_count"),
+            func.coalesce(func.sum(case((and_(open_, overdue), 1), else_=0)), 0).label("overdue_installments_count"),
+        )
+        .group_by(alloc.c.collector_id)
+    )
+    return db.execute(q).all()
+
+
+def _empty() -> dict:
+    out = {k: 0 for k in _AMOUNT_FIELDS}
+    out.update({k: 0 for k in _COUNT_FIELDS})
+    return out
+
+
+def _add(acc: dict, row) -> None:
+    for k in _AMOUNT_FIELDS:
+        acc[k] += to_cents(getattr(row, k))
+    for k in _COUNT_FIELDS:
+        acc[k] += int(getattr(row, k) or 0)
+
+
+def _render(acc: dict) -> dict:
+    out = {k: from_cents(acc[k]) for k in ("outstanding", "not_due", "overdue", "paid")}
+    out["aging"] = {k: from_cents(acc[k]) for k, _, _ in AGING_BUCKETS}
+    out.update({k: acc[k] for k in _COUNT_FIELDS})
+    return out
+
+
+def portfolio_as_of(
+    db: Session,
+    company_id: int,
+    as_of_day: date,
+    zone: ZoneInfo = AR_TZ,
+    employee_id: Optional[int] = None,
+    include_archived: bool = True,
+) -> dict:
+    """Cartera de la empresa (o de un cobrador) al cierre del día local `as_of_day`."""
+    day_start_utc, as_of_utc = local_dates_to_utc_window(as_of_day, as_of_day, zone)
+    common = dict(
+        company_id=company_id, as_of_utc=as_of_utc, day_start_utc=day_start_utc,
+        zone=zone, as_of_day=as_of_day, employee_id=employee_id,
+    )
+
+    rows = _debt_rows(db, Loan, Installment, Payment, "loan_id", **common)
+    if include_archived:
+        rows += _debt_rows(db, Loan, ArchivedInstallment, ArchivedPayment, "loan_id", archived=True, **common)
+    rows += _debt_rows(db, Purchase, Installment, Payment, "purchase_id", **common)
+
+    total = _empty()
+    by_collector: dict[int, dict] = {}
+    for r in rows:
+        _add(total, r)
+        _add(by_collector.setdefault(r.collector_id or 0, _empty()), r)
+
+    names = dict(
+        db.query(Employee.id, Employee.name).filter(Employee.id.in_([c for c in by_collector if c])).all()
+    ) if by_collector else {}
+
+    return {
+        "as_of": as_of_day,
+        "employee_id": employee_id,
+        **_render(total),
+        "by_collector": [
+            {"collector_id": cid, "collector_name": names.get(cid), **_render(acc)}
+            for cid, acc in sorted(by_collector.items(), key=lambda kv: -kv[1]["outstanding"])
+        ],
+    }
@@ -1,4 +1,5 @@
 # app/tests/conftest.py
+import itertools
 import os
 import pytest
 from sqlalchemy import create_engine
@@ -9,6 +10,7 @@ from app.main import app
 from app.database.db import Base, get_db
 from app.models.models import Company, Employee
 from app.utils.auth import hash_password, create_access_token
+from app.utils.response_cache import DatabaseVersionStore, get_cache_store, set_cache_store
 
 # Usá SQLite en archivo para evitar problemas de conexión en memoria
 TEST_DB_URL = os.getenv("TEST_DATABASE_URL", "sqlite:///./test_unit.db")
@@ -22,7 +24,11 @@ def engine():
     eng = create_engine(TEST_DB_URL, future=True, echo=False)
     # Creamos una vez al inicio para garantizar que exista el archivo si es SQLite
     Base.metadata.create_all(eng)
+    # versiones de datos (ETags) en la base de tests, no en la de DATABASE_URL
+    previous = get_cache_store()
+    set_cache_store(DatabaseVersionStore(sessionmaker(bind=eng, future=True)))
     yield eng
+    set_cache_store(previous)
     # Limpieza final
     Base.metadata.drop_all(eng)
 
@@ -35,6 +41,8 @@ def db(engine):
     """
     Base.metadata.drop_all(engine)
     Base.metadata.create_all(engine)
+    # company_data_versions vuelve a cero con las tablas: payloads cacheados también
+    set_cache_store(DatabaseVersionStore(sessionmaker(bind=engine, future=True)))
 
     SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
     session = SessionLocal()
@@ -91,3 +99,42 @@ def auth_headers(seeded_admin):
     _, admin = seeded_admin
     access = create_access_token(admin)  # tu utilidad recibe el Employee
     return {"Authorization": f"Bearer {access}"}
+
+# ---------- Factory: Customer + Loan (vía API) ----------
+@pytest.fixture
+def create_loan(client, auth_headers, seeded_admin):
+    """
+    create_loan(amount=200.0, installments_count=2, customer=None, **loan) -> loan_id
+
+    Cada llamada da de alta un cliente nuevo (dni/teléfono únicos en el test;
+    `customer` pisa campos, ej. nombre) y un préstamo semanal del admin.
+    """
+    company, admin = seeded_admin
+    counter = itertools.count(1)
+
+    def _create(amount=200.0, installments_count=2, customer=None, **loan):
+        n = next(counter)
+        r = client.post("/customers/", json={
+            "first_name": "Ana",
+            "last_name": f"Prestamo{n}",
+            "dni": f"390{n:05d}",
+            "address": "Calle 50",
+            "phone": f"3810390{n:03d}",
+            "province": "Tucumán",
+            "email": None,
+            **(customer or {}),
+        }, headers=auth_headers)
+        assert r.status_code == 201, r.text
+        r = client.post("/loans/createLoan/", json={
+            "customer_id": r.json()["id"],
+            "employee_id": admin.id,
+            "company_id": company.id,
+            "amount": amount,
+            "installments_count": installments_count,
+            "installment_interval_days": 7,
+            **loan,
+        }, headers=auth_headers)
+        assert r.status_code == 201, r.text
+        return r.json()["id"]
+
+    return _create
@@ -0,0 +1,97 @@
+# app/tests/test_admission_control.py
+import asyncio
+
+import pytest
+
+from app.utils import admission
+from app.utils.admission import (
+    ROUTE_HEAVY,
+    ROUTE_INTERACTIVE,
+    AdmissionController,
+    AdmissionRejected,
+    GateLimits,
+)
+
+
+def test_company_gates_queue_reject_and_isolate_route_classes():
+    ctl = AdmissionController(
+        company_limits={
+            ROUTE_HEAVY: GateLimits(concurrency=1, queue=1, wait_seconds=0.2),
+            ROUTE_INTERACTIVE: GateLimits(concurrency=2, queue=0, wait_seconds=0.2),
+        },
+        global_heavy_limits=GateLimits(concurrency=2, queue=0, wait_seconds=0.2),
+    )
+
+    async def scenario():
+        first = await ctl.admit(1, ROUTE_HEAVY)
+
+        # el segundo reporte de la empresa 1 espera en la cola; el tercero se rechaza con 429
+        queued = asyncio.create_task(ctl.admit(1, ROUTE_HEAVY))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as e:
+            await ctl.admit(1, ROUTE_HEAVY)
+        assert e.value.status_code == 429 and e.value.retry_after >= 1
+
+        # los cobradores de la empresa 1 y los reportes de otra empresa no se enteran
+        interactive = await ctl.admit(1, ROUTE_INTERACTIVE)
+        other = await ctl.admit(2, ROUTE_HEAVY)
+
+        # global de reportes lleno (empresa 1 + empresa 2) → 503
+        with pytest.raises(AdmissionRejected) as e:
+            await ctl.admit(3, ROUTE_HEAVY)
+        assert e.value.status_code == 503
+
+        # al liberar, el lugar pasa al que estaba en cola (FIFO)
+        ctl.release(first)
+        second = await asyncio.wait_for(queued, 1)
+
+        # si nadie libera, la espera vence → 503
+        waiting = asyncio.create_task(ctl.admit(1, ROUTE_HEAVY))
+        with pytest.raises(AdmissionRejected) as e:
+            await waiting
+        assert e.value.code == "ADMISSION_TIMEOUT" and e.value.status_code == 503
+
+        for gates in (second, interactive, other):
+            ctl.release(gates)
+
+    asyncio.run(scenario())
+
+    snap = ctl.snapshot()
+    heavy = snap["companies"]["1"][ROUTE_HEAVY]
+    assert heavy["admitted"] == 2
+    assert heavy["rejected_queue_full"] == 1
+    assert heavy["rejected_timeout"] == 1
+    assert heavy["active"] == 0 and heavy["queued"] == 0
+    assert snap["companies"]["1"][ROUTE_INTERACTIVE]["active"] == 0
+    assert snap["global_heavy"]["active"] == 0
+
+
+def test_heavy_routes_shed_while_interactive_keeps_working(client, auth_headers, seeded_admin, monkeypatch):
+    company, _ = seeded_admin
+    ctl = AdmissionController(
+        company_limits={
+            ROUTE_HEAVY: GateLimits(concurrency=1, queue=0, wait_seconds=1),
+            ROUTE_INTERACTIVE: GateLimits(concurrency=8, queue=8, wait_seconds=1),
+        },
+    )
+    monkeypatch.setattr(admission, "controller", ctl)
+
+    # un reporte de la empresa ya está corriendo
+    ctl.gate(company.id, ROUTE_HEAVY).active = 1
+
+    r = client.get("/loans/summary", headers=auth_headers)
+    assert r.status_code == 429, r.text
+    assert r.headers["retry-after"] == "1"
+    assert r.json()["detail"]["code"] == "ADMISSION_QUEUE_FULL"
+
+    r = client.get("/customers/", headers=auth_headers)
+    assert r.status_code == 200, r.text
+
+    ctl.gate(company.id, ROUTE_HEAVY).active = 0
+    r = client.get("/loans/summary", headers=auth_headers)
+    assert r.status_code == 200, r.text
+
+    snap = ctl.snapshot()["companies"][str(company.id)]
+    assert snap[ROUTE_HEAVY]["rejected_queue_full"] == 1
+    assert snap[ROUTE_HEAVY]["admitted"] == 1 and snap[ROUTE_HEAVY]["active"] == 0
+    assert snap[ROUTE_INTERACTIVE]["admitted"] == 1 and snap[ROUTE_INTERACTIVE]["active"] == 0
@@ -0,0 +1,94 @@
+# app/tests/test_batch_endpoints.py
+from app.models.models import Company, Customer, Installment
+
+
+def _create_customer(client, headers, first, dni, phone):
+    r = client.post("/customers/", json={
+        "first_name": first,
+        "last_name": "Lote",
+        "dni": dni,
+        "address": "Calle 41",
+        "phone": phone,
+        "province": "Tucumán",
+        "email": None
+    }, headers=headers)
+    assert r.status_code == 201, r.text
+    return r.json()["id"]
+
+
+def _ids(r):
+    assert r.status_code == 200, r.text
+    return [x["id"] for x in r.json()]
+
+
+def test_batch_endpoints_scope_order_and_shape(client, auth_headers, seeded_admin, db):
+    company, admin = seeded_admin
+    c1 = _create_customer(client, auth_headers, "Uno", "41000001", "3810041001")
+    c2 = _create_customer(client, auth_headers, "Dos", "41000002", "3810041002")
+
+    # cliente de otra empresa: nunca vuelve
+    other = Company(name="Otra 41")
+    db.add(other)
+    db.flush()
+    foreign = Customer(first_name="Ajeno", last_name="X", address="-", phone="3819999999", company_id=other.id)
+    db.add(foreign)
+    db.commit()
+
+    r = client.get("/customers/batch", params={"ids": f"{c2},{foreign.id},{c1},{c2}"}, headers=auth_headers)
+    assert _ids(r) == [c2, c1]
+    assert r.json()[1]["first_name"] == "Uno"
+
+    # ?ids= repetido también vale
+    r = client.get(f"/customers/batch?ids={c1}&ids={c2}", headers=auth_headers)
+    assert _ids(r) == [c1, c2]
+
+    r = client.post("/loans/createLoan/", json={
+        "customer_id": c1,
+        "employee_id": admin.id,
+        "company_id": company.id,
+        "amount": 200.0,
+        "installments_count": 2,
+        "installment_interval_days": 7,
+    }, headers=auth_headers)
+    assert r.status_code == 201, r.text
+    loan_id = r.json()["id"]
+
+    r = client.post("/payments/", json={"loan_id": loan_id, "amount": 50.0}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+    payment_id = r.json()["id"]
+
+    r = client.get("/loans/batch", params={"ids": f"{loan_id},999999"}, headers=auth_headers)
+    assert _ids(r) == [loan_id]
+    single = client.get(f"/loans/{loan_id}", headers=auth_headers).json()
+    (loan,) = r.json()
+    for key in ("customer_name", "collector_name", "payments_count", "total_paid", "total_due", "status"):
+        assert loan[key] == single[key], key
+
+    r = client.get("/payments/batch", params={"ids": str(payment_id)}, headers=auth_headers)
+    assert _ids(r) == [payment_id]
+    assert r.json()[0]["customer_id"] == c1
+    assert r.json()[0]["amount"] == 50.0
+
+    inst_ids = [
+        i for (i,) in db.query(Installment.id)
+        .filter(Installment.loan_id == loan_id)
+        .order_by(Installment.number.desc())
+    ]
+    r = client.get("/installments/batch", params={"ids": ",".join(map(str, inst_ids))}, headers=auth_headers)
+    assert _ids(r) == inst_ids
+    assert [i["number"] for i in r.json()] == [2, 1]
+    assert r.json()[1]["paid_amount"] == 50.0
+    assert r.json()[1]["customer_id"] == c1
+
+    # EmployeeOut valida el email (el del fixture usa un dominio reservado)
+    admin.email = "admin41@example.com"
+    db.commit()
+    r = client.get("/employees/batch", params={"ids": str(admin.id)}, headers=auth_headers)
+    assert _ids(r) == [admin.id]
+    assert "password" not in r.json()[0]
+
+
+def test_batch_rejects_bad_ids(client, auth_headers):
+    assert client.get("/customers/batch", params={"ids": "1,abc"}, headers=auth_headers).status_code == 400
+    assert client.get("/customers/batch", params={"ids": ","}, headers=auth_headers).status_code == 400
+    assert client.get("/customers/batch", headers=auth_headers).status_code == 422
@@ -0,0 +1,25 @@
+# app/tests/test_boot_time.py
+import os
+
+from app.utils.boot_profile import format_report, imported_lazy_modules, profile_imports, total_ms
+
+# presupuesto generoso (CI compartido); el reporte queda en la salida de pytest (-s / -rP)
+BOOT_BUDGET_MS = float(os.getenv("BOOT_IMPORT_BUDGET_MS", "4000"))
+
+
+def test_cold_import_stays_lazy_and_within_budget():
+    rows = profile_imports("app.main")
+    print(format_report(rows, top=15))
+
+    # ReportLab / openpyxl / APScheduler sólo se cargan en el endpoint/job que los usa
+    assert imported_lazy_modules(rows) == []
+    assert total_ms(rows) < BOOT_BUDGET_MS
+
+
+def test_importing_db_does_not_touch_the_database(tmp_path, monkeypatch):
+    # sin create_all al importar: un archivo SQLite nuevo no se crea
+    target = tmp_path / "boot.db"
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{target}")
+    monkeypatch.setenv("ENV", "dev")
+    profile_imports("app.database.db")
+    assert not target.exists()
@@ -0,0 +1,58 @@
+# app/tests/test_coupons_v5.py
+from datetime import date
+
+from reportlab import rl_config
+
+from app.services.coupons_v5 import CouponV5Data, build_coupons_v5_pdf
+
+
+def _items(n: int) -> list[CouponV5Data]:
+    return [
+        CouponV5Data(
+            company_name="Créditos Test",
+            company_cuit="30-11111111-1",
+            customer_name=f"Cliente {i}",
+            customer_address="Calle 1",
+            customer_province="Tucumán",
+            collector_name="Juan" if i % 2 else None,
+            description="Préstamo" if i % 3 == 0 else None,
+            loan_id=i,
+            installment_number=1,
+            installments_count=4,
+            due_date=date(2026, 3, 1),
+            installment_amount=1500.0,
+            installment_balance=900.0,
+            total_paid=600.0,
+            remaining=5100.0,
+            overdue_count=i % 2,
+            overdue_amount=900.0 * (i % 2),
+            is_overdue=bool(i % 2),
+            days_overdue=3 * (i % 2),
+        )
+        for i in range(n)
+    ]
+
+
+def test_coupons_pdf_parallel_matches_serial(monkeypatch):
+    # invariant => sin fecha/ID aleatorio: se puede comparar byte a byte
+    monkeypatch.setattr(rl_config, "invariant", 1)
+    items = _items(10)  # 4 páginas, la última incompleta
+
+    serial = build_coupons_v5_pdf(items, workers=1)
+    parallel = build_coupons_v5_pdf(items, workers=2)
+
+    assert serial.startswith(b"%PDF")
+    assert parallel == serial
+
+
+def test_coupons_pdf_static_skeleton_drawn_once(monkeypatch):
+    monkeypatch.setattr(rl_config, "invariant", 1)
+    monkeypatch.setattr(rl_config, "pageCompression", 0)
+    items = [it for it in _items(9) if it.description is None]  # una sola variante de layout
+
+    pdf = build_coupons_v5_pdf(items, workers=1)
+
+    # el esqueleto va en un form XObject: textos fijos una vez por documento (2 mitades)
+    assert b"/FormXob.cpn5_" in pdf
+    assert pdf.count(b"(Monto pagado:)") == 2
+    assert pdf.count(b"(Cliente ") == 2 * len(items)
@@ -0,0 +1,118 @@
+# app/tests/test_customer_search.py
+from app.utils.search import SearchQuery, customer_search_fields, trigram_similarity
+
+
+def _create_customer(client, headers, first, last, dni, phone, province="Tucumán"):
+    r = client.post("/customers/", json={
+        "first_name": first,
+        "last_name": last,
+        "dni": dni,
+        "address": "Calle 39",
+        "phone": phone,
+        "province": province,
+        "email": None
+    }, headers=headers)
+    assert r.status_code == 201, r.text
+    return r.json()["id"]
+
+
+def _search(client, headers, q):
+    r = client.get("/customers/", params={"q": q}, headers=headers)
+    assert r.status_code == 200, r.text
+    return [c["id"] for c in r.json()]
+
+
+def test_search_fields_are_normalized():
+    f = customer_search_fields(
+        first_name="José", last_name="Peña", phone="+54 381 555-1234", dni="30123456", province="Tucumán",
+    )
+    assert f["phone_norm"] == "3815551234"
+    assert f["dni_norm"] == "30123456"
+    assert f["search_text"] == "jose pena tucuman 3815551234 30123456"
+
+    assert SearchQuery("0381 555-1234").tokens == ["3815551234"]
+    assert SearchQuery("  José   PEÑA ").tokens == ["jose", "pena"]
+    assert trigram_similarity("ana gomez", "ana") > trigram_similarity("mariana diaz", "ana")
+
+
+def test_customer_search_accents_tokens_phone_dni_and_rank(client, auth_headers):
+    jose = _create_customer(client, auth_headers, "José", "Peña", "30123456", "0381-555 1234")
+    ana = _create_customer(client, auth_headers, "Ana", "Gómez", "31000001", "3815550001", province="Salta")
+    mariana = _create_customer(client, auth_headers, "Mariana", "Díaz", "31000002", "3815550002")
+
+    assert _search(client, auth_headers, "pena") == [jose]
+    assert _search(client, auth_headers, "jose peña") == [jose]
+    assert _search(client, auth_headers, "+54 381 5551234") == [jose]
+    assert _search(client, auth_headers, "30123456") == [jose]
+    assert _search(client, auth_headers, "salta") == [ana]
+
+    # "ana" matchea a las dos; el nombre que empieza con la búsqueda va primero
+    assert _search(client, auth_headers, "ana") == [ana, mariana]
+
+    # editar el cliente actualiza el índice
+    r = client.put(f"/customers/{mariana}", json={"first_name": "Mariela"}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+    assert _search(client, auth_headers, "ana") == [ana]
+    assert _search(client, auth_headers, "mariela") == [mariana]
+
+
+def test_loan_list_uses_customer_search(client, auth_headers, seeded_admin):
+    company, admin = seeded_admin
+    cid = _create_customer(client, auth_headers, "Lucía", "Núñez", "32000001", "3815559999")
+    r = client.post("/loans/createLoan/", json={
+        "customer_id": cid,
+        "employee_id": admin.id,
+        "company_id": company.id,
+        "amount": 100.0,
+        "installments_count": 1,
+        "installment_interval_days": 7,
+    }, headers=auth_headers)
+    assert r.status_code == 201, r.text
+    loan_id = r.json()["id"]
+
+    for q in ("nunez", "lucia nunez", "381 555 9999"):
+        r = client.get("/loans/all", params={"q": q}, headers=auth_headers)
+        assert r.status_code == 200, r.text
+        assert [l["id"] for l in r.json()] == [loan_id], q
+
+    r = client.get("/loans/all", params={"q": "perez"}, headers=auth_headers)
+    assert r.json() == []
+
+
+def _typeahead(client, headers, q, **params):
+    r = client.get("/customers/search", params={"q": q, **params}, headers=headers)
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def test_typeahead_prefix_index_and_invalidation(client, auth_headers, seeded_admin, db):
+    from app.services.customer_typeahead import get_customer_index
+
+    company, _ = seeded_admin
+    rosa = _create_customer(client, auth_headers, "Rosa", "Páez", "33000001", "3815554001")
+    roque = _create_customer(client, auth_headers, "Roque", "Aráoz", "33000002", "3815554002", province="Salta")
+
+    hits = _typeahead(client, auth_headers, "ro")
+    assert [h["id"] for h in hits] == [roque, rosa]  # apellido/nombre
+    assert hits[1] == {"id": rosa, "name": "Rosa Páez", "phone": "3815554001", "province": "Tucumán"}
+
+    assert [h["id"] for h in _typeahead(client, auth_headers, "paez ros")] == [rosa]
+    assert [h["id"] for h in _typeahead(client, auth_headers, "sal")] == [roque]
+    assert [h["id"] for h in _typeahead(client, auth_headers, "0381 555-4002")] == [roque]
+    assert [h["id"] for h in _typeahead(client, auth_headers, "33000001")] == [rosa]
+    assert [h["id"] for h in _typeahead(client, auth_headers, "ro", limit=1)] == [roque]
+    assert _typeahead(client, auth_headers, "rox") == []
+
+    # el índice queda caliente entre búsquedas...
+    index = get_customer_index(db, company.id)
+    assert get_customer_index(db, company.id) is index
+
+    # ...y se invalida con las escrituras de clientes
+    r = client.put(f"/customers/{rosa}", json={"first_name": "Ramona"}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+    assert [h["id"] for h in _typeahead(client, auth_headers, "ro")] == [roque]
+    assert [h["id"] for h in _typeahead(client, auth_headers, "ram")] == [rosa]
+
+    rolo = _create_customer(client, auth_headers, "Rolo", "Zárate", "33000003", "3815554003")
+    assert [h["id"] for h in _typeahead(client, auth_headers, "ro")] == [roque, rolo]
+    assert get_customer_index(db, company.id) is not index
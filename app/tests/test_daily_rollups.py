@@ -0,0 +1,155 @@
+# app/tests/test_daily_rollups.py
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+from app.database.db import get_db
+from app.main import app
+from app.models.models import DailyRollup, Installment, Loan, Payment
+from app.services import daily_rollups
+from app.services.daily_rollups import _METRICS, backfill_company
+
+
+def _rollups(db, company_id) -> dict:
+    """daily_rollups sin las filas que los deltas dejaron en cero."""
+    db.expire_all()
+    out = {}
+    for r in db.query(DailyRollup).filter(DailyRollup.company_id == company_id):
+        values = tuple(getattr(r, m) for m in _METRICS)
+        if any(values):
+            out[(r.local_day, r.collector_id)] = values
+    return out
+
+
+def test_incremental_rollups_match_a_full_rebuild(client, auth_headers, seeded_admin, db, monkeypatch, create_loan):
+    monkeypatch.setattr(daily_rollups, "ROLLUPS_ENABLED", True)
+    company, _ = seeded_admin
+    a = create_loan()
+    b = create_loan(amount=300.0, installments_count=3)
+
+    r = client.post(f"/loans/{a}/pay", json={"amount_paid": 50.0}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+    r = client.post("/payments/", json={"loan_id": b, "amount": 120.0}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+    voided = r.json()["id"]
+    r = client.post("/payments/bulk-apply", json={"items": [
+        {"loan_id": a, "amount": 30.0}, {"loan_id": b, "amount": 70.0},
+    ]}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+
+    # anulación: el replay mueve la imputación de los otros pagos de b
+    r = client.post(f"/payments/void/{voided}", json={"reason": "error"}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+    last = db.query(Installment.id).filter(Installment.loan_id == a, Installment.number == 2).scalar()
+    r = client.put(f"/installments/{last}", json={"amount": 150.0}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+    r = client.post(f"/loans/{b}/cancel", json={"reason": "baja"}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+
+    incremental = _rollups(db, company.id)
+    assert sum(v[_METRICS.index("collected_amount")] for v in incremental.values()) == 150.0
+    assert sum(v[_METRICS.index("voided_amount")] for v in incremental.values()) == 120.0
+    assert sum(v[_METRICS.index("loans_effective_count")] for v in incremental.values()) == 1
+
+    backfill_company(db, company.id)
+    assert _rollups(db, company.id) == incremental
+
+
+def test_disabled_rollups_are_not_maintained(client, auth_headers, db, monkeypatch, create_loan):
+    monkeypatch.setattr(daily_rollups, "ROLLUPS_ENABLED", False)
+    calls = []
+    real = daily_rollups._aggregate
+    monkeypatch.setattr(daily_rollups, "_aggregate", lambda *a, **kw: calls.append(1) or real(*a, **kw))
+
+    loan_id = create_loan()
+    r = client.post(f"/loans/{loan_id}/pay", json={"amount_paid": 60.0}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+    r = client.post(f"/payments/void/{r.json()['payment_id']}", headers=auth_headers)
+    assert r.status_code == 200, r.text
+
+    assert calls == []
+    assert db.query(DailyRollup).count() == 0
+
+
+def test_rollup_failure_rolls_back_the_payment(client, auth_headers, db, monkeypatch, create_loan):
+    monkeypatch.setattr(daily_rollups, "ROLLUPS_ENABLED", True)
+    loan_id = create_loan()
+
+    real = daily_rollups._aggregate
+    calls = []
+
+    def _aggregate(*a, **kw):
+        calls.append(1)
+        if len(calls) == 2:  # el "después" del pago
+            raise RuntimeError("rollups caídos")
+        return real(*a, **kw)
+
+    monkeypatch.setattr(daily_rollups, "_aggregate", _aggregate)
+    with pytest.raises(RuntimeError):
+        client.post(f"/loans/{loan_id}/pay", json={"amount_paid": 60.0}, headers=auth_headers)
+
+    db.rollback()
+    assert db.query(Payment).filter(Payment.loan_id == loan_id).count() == 0
+
+
+
+def test_rollup_failure_rolls_back_the_void(client, auth_headers, db, monkeypatch, create_loan):
+    monkeypatch.setattr(daily_rollups, "ROLLUPS_ENABLED", True)
+    loan_id = create_loan()
+    r = client.post(f"/loans/{loan_id}/pay", json={"amount_paid": 200.0}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+    payment_id = r.json()["payment_id"]
+
+    real = daily_rollups._aggregate
+    calls = []
+
+    def _aggregate(*a, **kw):
+        calls.append(1)
+        if len(calls) == 2:  # el "después" de la anulación
+            raise RuntimeError("rollups caídos")
+        return real(*a, **kw)
+
+    monkeypatch.setattr(daily_rollups, "_aggregate", _aggregate)
+    with pytest.raises(RuntimeError):
+        client.post(f"/payments/void/{payment_id}", headers=auth_headers)
+
+    # ni la anulación ni el estado del préstamo quedaron commiteados
+    db.rollback()
+    db.expire_all()
+    assert db.get(Payment, payment_id).is_voided is False
+    assert db.get(Loan, loan_id).status == "paid"
+
+def test_concurrent_payments_on_the_same_day_add_up(client, auth_headers, seeded_admin, engine, db, monkeypatch, create_loan):
+    if engine.dialect.name != "postgresql":
+        pytest.skip("escrituras concurrentes sobre préstamos distintos: Postgres")
+    monkeypatch.setattr(daily_rollups, "ROLLUPS_ENABLED", True)
+    company, _ = seeded_admin
+    loan_ids = [create_loan(amount=600.0, installments_count=6) for _ in range(6)]
+
+    # cada request con su propia sesión: mismas filas (día, cobrador) desde transacciones distintas
+    SessionT = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+
+    def _get_db():
+        s = SessionT()
+        try:
+            yield s
+        finally:
+            s.close()
+
+    app.dependency_overrides[get_db] = _get_db
+
+    def pay(loan_id):
+        return TestClient(app).post(f"/loans/{loan_id}/pay", json={"amount_paid": 25.0}, headers=auth_headers)
+
+    with ThreadPoolExecutor(max_workers=12) as pool:
+        responses = list(pool.map(pay, loan_ids * 4))
+    assert all(r.status_code == 200 for r in responses), [r.text for r in responses if r.status_code != 200]
+
+    incremental = _rollups(db, company.id)
+    assert sum(v[_METRICS.index("collected_count")] for v in incremental.values()) == 24
+    assert sum(v[_METRICS.index("collected_amount")] for v in incremental.values()) == 600.0
+
+    backfill_company(db, company.id)
+    assert _rollups(db, company.id) == incremental
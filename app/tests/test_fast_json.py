@@ -0,0 +1,61 @@
+# app/tests/test_fast_json.py
+from datetime import datetime, timezone
+
+from app.utils import fast_json
+
+
+def _seed(client, headers, company, admin):
+    r = client.post("/customers/", json={
+        "first_name": "Rápida",
+        "last_name": "Serialización",
+        "dni": "42000001",
+        "address": "Calle 42",
+        "phone": "3810042001",
+        "province": "Tucumán",
+        "email": None
+    }, headers=headers)
+    assert r.status_code == 201, r.text
+    r = client.post("/loans/createLoan/", json={
+        "customer_id": r.json()["id"],
+        "employee_id": admin.id,
+        "company_id": company.id,
+        "amount": 300.0,
+        "installments_count": 3,
+        "installment_interval_days": 7,
+    }, headers=headers)
+    assert r.status_code == 201, r.text
+    loan_id = r.json()["id"]
+    for amount in (40.0, 60.5):
+        r = client.post("/payments/", json={"loan_id": loan_id, "amount": amount}, headers=headers)
+        assert r.status_code == 200, r.text
+
+
+def test_dumps_matches_pydantic_formats():
+    payload = {"at": datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc), "amount": 10.0, "n": None}
+    assert fast_json.dumps(payload) == b'{"at":"2026-01-02T03:04:05Z","amount":10.0,"n":null}'
+
+
+def test_fast_path_returns_same_body_as_validated_path(client, auth_headers, seeded_admin, monkeypatch):
+    company, admin = seeded_admin
+    _seed(client, auth_headers, company, admin)
+
+    urls = ["/loans/all", "/payments/all?include_voided=true"]
+    fast = {}
+    for url in urls:
+        r = client.get(url, headers=auth_headers)
+        assert r.status_code == 200, r.text
+        assert r.headers["content-type"] == "application/json"
+        fast[url] = r.json()
+
+    # camino "normal": dicts validados por response_model
+    monkeypatch.setattr(fast_json, "FAST_JSON_ENABLED", False)
+    for url in urls:
+        r = client.get(url, headers=auth_headers)
+        assert r.status_code == 200, r.text
+        assert r.json() == fast[url], url
+
+    (loan,) = fast["/loans/all"]
+    assert loan["remaining_due"] == 199.5
+    assert loan["customer_name"] == "Rápida Serialización"
+    assert [p["amount"] for p in fast["/payments/all?include_voided=true"]["data"]] == [60.5, 40.0]
+    assert fast["/payments/all?include_voided=true"]["data"][0]["customer_name"] == "Serialización Rápida"
@@ -0,0 +1,107 @@
+# app/tests/test_http_caching.py
+import gzip
+
+from app.utils.compression import choose_encoding
+
+
+def _create_customer(client, headers, i):
+    r = client.post("/customers/", json={
+        "first_name": f"Cliente{i:02d}",
+        "last_name": "Comprimido",
+        "dni": f"430000{i:02d}",
+        "address": "Avenida Siempre Viva 742",
+        "phone": f"38100430{i:02d}",
+        "province": "Tucumán",
+        "email": None
+    }, headers=headers)
+    assert r.status_code == 201, r.text
+
+
+def test_choose_encoding():
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, deflate") is None
+    assert choose_encoding("identity") is None
+    assert choose_encoding("*") in ("br", "gzip")
+
+
+def test_list_is_compressed_and_revalidated_with_etag(client, auth_headers):
+    for i in range(12):
+        _create_customer(client, auth_headers, i)
+
+    gz = {**auth_headers, "Accept-Encoding": "gzip"}
+    r = client.get("/customers/", headers=gz)
+    assert r.status_code == 200, r.text
+    assert r.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in r.headers["vary"]
+    assert len(r.json()) == 12
+    etag = r.headers["etag"]
+    assert etag.endswith('-gzip"') and not etag.startswith("W/")
+
+    # sin compresión: mismo recurso, otro ETag fuerte (otra representación)
+    r_plain = client.get("/customers/", headers={**auth_headers, "Accept-Encoding": "identity"})
+    assert "content-encoding" not in r_plain.headers
+    assert r_plain.headers["etag"] != etag
+    assert gzip.compress(r_plain.content)  # cuerpo original intacto
+    assert r_plain.json() == r.json()
+
+    # sin cambios → 304 sin cuerpo (vale con cualquiera de las dos representaciones)
+    for tag in (etag, r_plain.headers["etag"]):
+        r304 = client.get("/customers/", headers={**gz, "If-None-Match": tag})
+        assert r304.status_code == 304
+        assert r304.content == b""
+        assert r304.headers["etag"] == tag
+
+    # otra query → otro ETag
+    r_q = client.get("/customers/", params={"q": "cliente01"}, headers={**gz, "If-None-Match": etag})
+    assert r_q.status_code == 200
+
+    # una escritura de la empresa invalida el ETag
+    _create_customer(client, auth_headers, 12)
+    r = client.get("/customers/", headers={**gz, "If-None-Match": etag})
+    assert r.status_code == 200
+    assert len(r.json()) == 13
+    assert r.headers["etag"] != etag
+
+
+def test_small_responses_are_not_compressed(client):
+    r = client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert "content-encoding" not in r.headers
+
+
+def test_payment_update_invalidates_list_etag(client, auth_headers, seeded_admin):
+    company, admin = seeded_admin
+    r = client.post("/customers/", json={
+        "first_name": "Ana",
+        "last_name": "Editada",
+        "dni": "43009901",
+        "address": "Calle 43",
+        "phone": "3810043901",
+        "province": "Tucumán",
+        "email": None
+    }, headers=auth_headers)
+    assert r.status_code == 201, r.text
+    r = client.post("/loans/createLoan/", json={
+        "customer_id": r.json()["id"],
+        "employee_id": admin.id,
+        "company_id": company.id,
+        "amount": 100.0,
+        "installments_count": 1,
+        "installment_interval_days": 7,
+    }, headers=auth_headers)
+    assert r.status_code == 201, r.text
+    r = client.post(f"/loans/{r.json()['id']}/pay", json={"amount_paid": 40.0}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+
+    r = client.get("/payments/", headers=auth_headers)
+    assert r.status_code == 200, r.text
+    etag = r.headers["etag"]
+    payment_id = r.json()[0]["id"]
+
+    # sólo cambia la descripción, pero el listado la devuelve
+    r = client.put(f"/payments/{payment_id}", json={"description": "corregido"}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+
+    r = client.get("/payments/", headers={**auth_headers, "If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.json()[0]["description"] == "corregido"
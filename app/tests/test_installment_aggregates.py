@@ -0,0 +1,37 @@
+# app/tests/test_installment_aggregates.py
+from datetime import datetime, timedelta, timezone
+
+
+def test_status_aggregates_by_local_day(client, auth_headers, seeded_admin, create_loan):
+    _, admin = seeded_admin
+    # 6 cuotas semanales: vencen hace 23, 16, 9 y 2 días; en 5 y 12 días
+    start = datetime.now(timezone.utc) - timedelta(days=30)
+    loan_id = create_loan(amount=600.0, installments_count=6, start_date=start.isoformat())
+
+    # cuota 1 paga, cuota 2 parcial
+    r = client.post("/payments/", json={"loan_id": loan_id, "amount": 150.0}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+    payment_id = r.json()["id"]
+
+    r = client.get("/installments/summary", headers=auth_headers)
+    assert r.status_code == 200, r.text
+    s = r.json()
+    assert s["paid_count"] == 1
+    assert s["pending_count"] == 5
+    assert s["overdue_count"] == 3
+    assert s["total_amount"] == 600.0
+    assert s["pending_amount"] == 500.0
+
+    r = client.get(f"/payments/{payment_id}", headers=auth_headers)
+    assert r.status_code == 200, r.text
+    d = r.json()
+    assert d["loan_total_amount"] == 600.0
+    assert d["loan_total_due"] == 450.0
+    assert (d["installments_paid"], d["installments_overdue"], d["installments_pending"]) == (1, 3, 2)
+    assert d["reference"] == f"Préstamo #{loan_id}"
+
+    r = client.get(f"/loans/by-employee?employee_id={admin.id}", headers=auth_headers)
+    assert r.status_code == 200, r.text
+    (loan,) = r.json()
+    assert [i["number"] for i in loan["installments"]] == [1, 2, 3, 4, 5, 6]
+    assert [i["is_overdue"] for i in loan["installments"]] == [False, True, True, True, False, False]
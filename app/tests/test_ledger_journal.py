@@ -0,0 +1,157 @@
+# app/tests/test_ledger_journal.py
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import event
+
+from app.models.models import Installment, LedgerEvent, LedgerSnapshot, Loan
+from app.services import ledger_journal
+from app.services.ledger_journal import (
+    PAYMENT_POSTED,
+    PAYMENT_VOIDED,
+    SCHEDULE_CREATED,
+    apply_event,
+    backfill_debt,
+    derive,
+    empty_state,
+    ledger_state,
+    verify_debt,
+)
+from app.utils.ledger import DEBT_LOAN
+
+
+def test_backdated_payment_and_void_fold_by_business_date():
+    state = empty_state()
+    apply_event(state, SCHEDULE_CREATED, {"installments": [
+        {"id": 2, "number": 2, "due_date": None, "amount_c": 10000},
+        {"id": 1, "number": 1, "due_date": None, "amount_c": 10000},
+    ]}, "2026-01-01T00:00:00+00:00")
+    apply_event(state, PAYMENT_POSTED, {"payment_id": 10, "amount_c": 6000,
+                                        "payment_date": "2026-01-10T12:00:00+00:00"}, "2026-01-10T12:00:00+00:00")
+    # cargado después pero con fecha anterior: se imputa primero
+    apply_event(state, PAYMENT_POSTED, {"payment_id": 11, "amount_c": 12000,
+                                        "payment_date": "2026-01-05T12:00:00+00:00"}, "2026-01-05T12:00:00+00:00")
+    apply_event(state, PAYMENT_VOIDED, {"payment_id": 10}, "2026-01-20T12:00:00+00:00")
+
+    before = derive(state, as_of=datetime(2026, 1, 8, tzinfo=timezone.utc))
+    assert before["paid"] == 120.0
+    assert [i["paid"] for i in before["installments"]] == [100.0, 20.0]
+
+    mid = derive(state, as_of=datetime(2026, 1, 15, tzinfo=timezone.utc))
+    assert mid["paid"] == 180.0 and mid["payments_count"] == 2
+
+    now = derive(state)
+    assert now["paid"] == 120.0 and now["outstanding"] == 80.0 and now["status"] == "active"
+
+
+def test_journal_tracks_payments_voids_and_snapshots(client, auth_headers, db, monkeypatch, create_loan):
+    monkeypatch.setattr(ledger_journal, "SNAPSHOT_EVERY", 2)
+    loan_id = create_loan()
+
+    for amount in (50.0, 120.0):
+        r = client.post(f"/loans/{loan_id}/pay", json={"amount_paid": amount}, headers=auth_headers)
+        assert r.status_code == 200, r.text
+
+    db.expire_all()
+    events = db.query(LedgerEvent).filter(LedgerEvent.debt_id == loan_id).order_by(LedgerEvent.seq).all()
+    assert [e.event_type for e in events] == [SCHEDULE_CREATED, PAYMENT_POSTED, PAYMENT_POSTED]
+    assert db.query(LedgerSnapshot).filter(LedgerSnapshot.debt_id == loan_id).count() == 1
+
+    state = ledger_state(db, DEBT_LOAN, loan_id)
+    assert state["seq"] == 3 and state["paid"] == 170.0
+    assert [i["balance"] for i in state["installments"]] == [0.0, 30.0]
+    assert verify_debt(db, DEBT_LOAN, loan_id) == []
+
+    second = events[2].payload["payment_id"]
+    r = client.post(f"/payments/void/{second}", json={"reason": "error"}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+
+    db.expire_all()
+    assert verify_debt(db, DEBT_LOAN, loan_id) == []
+
+    r = client.get(f"/loans/{loan_id}/ledger", params={"include_events": True}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["paid"] == 50.0 and body["outstanding"] == 150.0
+    assert body["events"][-1]["event_type"] == PAYMENT_VOIDED
+
+    yesterday = (date.today() - timedelta(days=2)).isoformat()
+    r = client.get(f"/loans/{loan_id}/ledger", params={"as_of": yesterday}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+    assert r.json()["paid"] == 0.0
+
+
+def test_backfill_rebuilds_journal_from_tables(client, auth_headers, db, create_loan):
+    loan_id = create_loan()
+    r = client.post(f"/loans/{loan_id}/pay", json={"amount_paid": 130.0}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+
+    db.query(LedgerEvent).delete()
+    db.query(LedgerSnapshot).delete()
+    db.commit()
+    assert verify_debt(db, DEBT_LOAN, loan_id) != []
+
+    assert backfill_debt(db, DEBT_LOAN, loan_id) == 2
+    db.commit()
+    assert backfill_debt(db, DEBT_LOAN, loan_id) == 0  # ya tiene diario
+    assert verify_debt(db, DEBT_LOAN, loan_id) == []
+    assert ledger_state(db, DEBT_LOAN, loan_id)["paid"] == 130.0
+
+
+def test_payment_on_unjournaled_debt_backfills_first(client, auth_headers, db, create_loan):
+    loan_id = create_loan()
+    r = client.post(f"/loans/{loan_id}/pay", json={"amount_paid": 60.0}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+
+    # deuda anterior al diario: sin eventos hasta que alguien la toque
+    db.query(LedgerEvent).delete()
+    db.query(LedgerSnapshot).delete()
+    db.commit()
+
+    r = client.post(f"/loans/{loan_id}/pay", json={"amount_paid": 70.0}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+
+    db.expire_all()
+    events = db.query(LedgerEvent).filter(LedgerEvent.debt_id == loan_id).order_by(LedgerEvent.seq).all()
+    assert [e.event_type for e in events] == [SCHEDULE_CREATED, PAYMENT_POSTED, PAYMENT_POSTED]
+    assert verify_debt(db, DEBT_LOAN, loan_id) == []
+    assert ledger_state(db, DEBT_LOAN, loan_id)["paid"] == 130.0
+
+
+def test_backfill_completes_partial_journal(client, auth_headers, db, create_loan):
+    loan_id = create_loan()
+    r = client.post(f"/loans/{loan_id}/pay", json={"amount_paid": 130.0}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+
+    # sólo quedó el pago: falta el cronograma
+    db.query(LedgerEvent).filter(LedgerEvent.event_type == SCHEDULE_CREATED).delete()
+    db.query(LedgerSnapshot).delete()
+    db.commit()
+
+    assert backfill_debt(db, DEBT_LOAN, loan_id) == 1
+    db.commit()
+    assert backfill_debt(db, DEBT_LOAN, loan_id) == 0
+    assert verify_debt(db, DEBT_LOAN, loan_id) == []
+    assert ledger_state(db, DEBT_LOAN, loan_id)["paid"] == 130.0
+
+
+def test_installment_amendment_commits_with_debt_totals(client, auth_headers, db, create_loan):
+    loan_id = create_loan()
+    r = client.post(f"/loans/{loan_id}/pay", json={"amount_paid": 100.0}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+
+    commits = []
+
+    def _count(session):
+        commits.append(1)
+
+    second = db.query(Installment.id).filter(Installment.loan_id == loan_id, Installment.number == 2).scalar()
+    event.listen(db, "after_commit", _count)
+    r = client.put(f"/installments/{second}", json={"amount": 150.0}, headers=auth_headers)
+    event.remove(db, "after_commit", _count)
+    assert r.status_code == 200, r.text
+
+    # cuota, diario y saldo del préstamo en un solo commit (con el lock tomado)
+    assert commits == [1]
+    db.expire_all()
+    assert float(db.get(Loan, loan_id).total_due) == 150.0
+    assert verify_debt(db, DEBT_LOAN, loan_id) == []
@@ -0,0 +1,143 @@
+# app/tests/test_loan_archive.py
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import func
+
+from app.models.models import (
+    ArchivedInstallment,
+    ArchivedPayment,
+    ArchivedPaymentAllocation,
+    DailyRollup,
+    Installment,
+    Loan,
+    LoanArchive,
+    Payment,
+    PaymentAllocation,
+)
+from app.services import daily_rollups
+from app.services.daily_rollups import backfill_company
+from app.services.loan_archive import archive_closed_loans, archive_cutoff
+from app.utils.time_windows import AR_TZ
+
+
+def test_archive_cutoff_clamps_month_end():
+    now = datetime(2026, 3, 31, 12, tzinfo=timezone.utc)
+    assert archive_cutoff(now, 1) == datetime(2026, 2, 28, 12, tzinfo=timezone.utc)
+    assert archive_cutoff(now, 12) == datetime(2025, 3, 31, 12, tzinfo=timezone.utc)
+
+
+def test_closed_loans_move_to_archive_and_history_unions_them(client, auth_headers, seeded_admin, db, create_loan):
+    company, _ = seeded_admin
+    paid_id = create_loan()
+    open_id = create_loan()
+    customer_id = db.get(Loan, paid_id).customer_id
+
+    r = client.post(f"/loans/{paid_id}/pay", json={"amount_paid": 200.0}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+    r = client.post(f"/loans/{open_id}/pay", json={"amount_paid": 50.0}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+
+    db.expire_all()
+    assert db.get(Loan, paid_id).status == "paid"
+    hot_payments = db.query(Payment).filter(Payment.loan_id == paid_id).count()
+    hot_allocs = db.query(PaymentAllocation).join(Payment).filter(Payment.loan_id == paid_id).count()
+    assert hot_payments == 1 and hot_allocs == 2
+
+    # recién cerrado: todavía no
+    assert archive_closed_loans(db, older_than_months=12) == 0
+
+    later = datetime.now(timezone.utc) + timedelta(days=400)
+    assert archive_closed_loans(db, older_than_months=12, now=later) == 1
+    assert archive_closed_loans(db, older_than_months=12, now=later) == 0  # idempotente
+
+    db.expire_all()
+    # hot: sólo queda el stub del préstamo
+    assert db.get(Loan, paid_id) is not None
+    assert db.query(Installment).filter(Installment.loan_id == paid_id).count() == 0
+    assert db.query(Payment).filter(Payment.loan_id == paid_id).count() == 0
+    assert db.query(PaymentAllocation).count() == 1  # la del préstamo abierto
+    # el préstamo abierto no se toca
+    assert db.query(Installment).filter(Installment.loan_id == open_id).count() == 2
+
+    assert db.query(ArchivedInstallment).filter(ArchivedInstallment.loan_id == paid_id).count() == 2
+    assert db.query(ArchivedPayment).filter(ArchivedPayment.loan_id == paid_id).count() == 1
+    assert db.query(ArchivedPaymentAllocation).count() == 2
+
+    summary = db.get(LoanArchive, paid_id)
+    assert summary.company_id == company.id and summary.customer_id == customer_id
+    assert summary.installments_count == 2 and summary.payments_count == 1 and summary.allocations_count == 2
+    assert summary.paid_total == 200.0 and summary.voided_total == 0.0
+
+    # historial: sin include_archived no está, con include_archived vuelve igual
+    r = client.get(f"/loans/{paid_id}/installments", headers=auth_headers)
+    assert r.status_code == 404
+    r = client.get(f"/loans/{paid_id}/installments?include_archived=true", headers=auth_headers)
+    assert r.status_code == 200, r.text
+    assert [i["number"] for i in r.json()] == [1, 2]
+    assert all(i["is_paid"] for i in r.json())
+
+    r = client.get(f"/loans/{paid_id}/payments?include_archived=true", headers=auth_headers)
+    assert [p["amount"] for p in r.json()] == [200.0]
+
+    r = client.get(f"/payments/by-customer/{customer_id}", headers=auth_headers)
+    assert r.json() == []
+    r = client.get(f"/payments/by-customer/{customer_id}?include_archived=true", headers=auth_headers)
+    assert r.status_code == 200, r.text
+    assert [(p["loan_id"], p["amount"], p["collector_name"]) for p in r.json()] == [(paid_id, 200.0, "Admin")]
+
+
+def _collected(db, company_id) -> float:
+    db.expire_all()
+    return float(
+        db.query(func.coalesce(func.sum(DailyRollup.collected_amount), 0.0))
+        .filter(DailyRollup.company_id == company_id)
+        .scalar()
+    )
+
+
+def _archive_paid_loan(client, auth_headers, db, create_loan):
+    paid_id = create_loan()
+    r = client.post(f"/loans/{paid_id}/pay", json={"amount_paid": 200.0}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+    return lambda: archive_closed_loans(db, older_than_months=12, now=datetime.now(timezone.utc) + timedelta(days=400))
+
+
+def test_installments_summary_and_rollup_backfill_keep_archived_history(client, auth_headers, seeded_admin, db, monkeypatch, create_loan):
+    monkeypatch.setattr(daily_rollups, "ROLLUPS_ENABLED", True)
+    company, _ = seeded_admin
+    archive = _archive_paid_loan(client, auth_headers, db, create_loan)
+
+    before = client.get("/installments/summary", headers=auth_headers).json()
+    assert before["paid_count"] == 2 and before["total_amount"] == 200.0
+    backfill_company(db, company.id)
+    rollups_before = _collected(db, company.id)
+    assert rollups_before == 200.0
+
+    assert archive() == 1
+    db.expire_all()
+    assert db.query(Payment).count() == 0
+
+    assert client.get("/installments/summary", headers=auth_headers).json() == before
+    # rebuild de días viejos: el archivo sigue sumando
+    backfill_company(db, company.id)
+    assert _collected(db, company.id) == rollups_before
+
+
+def test_period_summaries_keep_archived_history(client, auth_headers, engine, db, create_loan):
+    if engine.dialect.name != "postgresql":
+        pytest.skip("serie por día local con timezone(): Postgres")
+    archive = _archive_paid_loan(client, auth_headers, db, create_loan)
+    today = datetime.now(AR_TZ).date()
+    period = {"start_date": (today - timedelta(days=1)).isoformat(), "end_date": (today + timedelta(days=30)).isoformat()}
+
+    pay_before = client.get("/payments/summary", params=period, headers=auth_headers).json()
+    dash_before = client.get("/dashboard/summary", params=period, headers=auth_headers).json()
+    assert pay_before["total_amount"] == 200.0
+
+    assert archive() == 1
+
+    assert client.get("/payments/summary", params=period, headers=auth_headers).json() == pay_before
+    dash_after = client.get("/dashboard/summary", params=period, headers=auth_headers).json()
+    for key in ("kpis", "by_day", "collectors"):
+        assert dash_after[key] == dash_before[key]
@@ -0,0 +1,20 @@
+# app/tests/test_money.py
+from decimal import Decimal
+
+from app.utils.money import from_cents, to_cents
+
+
+def test_to_cents_rounds_half_up_like_postgres_numeric():
+    # round(x::numeric, 2) en Postgres: mitad lejos del cero
+    assert to_cents(0.125) == 13
+    assert to_cents(2.675) == 268
+    assert to_cents(1.005) == 101
+    assert to_cents(-0.125) == -13
+    assert to_cents(0.124) == 12
+
+    assert to_cents(99.99999997) == 10000
+    assert to_cents(Decimal("10.50")) == 1050
+    assert to_cents("7.345") == 735
+    assert to_cents(None) == 0
+    assert to_cents(3) == 300
+    assert from_cents(to_cents(0.1 + 0.2)) == 0.3
@@ -0,0 +1,238 @@
+# app/tests/test_onboarding_import.py
+import io
+import uuid
+from concurrent.futures import Future
+from datetime import date, timedelta
+
+import pytest
+from fastapi import HTTPException
+from openpyxl import Workbook
+from sqlalchemy.orm import sessionmaker
+
+from app.models.models import (
+    Customer,
+    Employee,
+    Installment,
+    Loan,
+    OnboardingCommitCheckpoint,
+    OnboardingImportSession,
+    OnboardingStagingLoan,
+    Payment,
+)
+from app.services import onboarding_import_commit
+from app.services.ledger_journal import verify_debt
+from app.utils.auth import create_access_token, hash_password
+from app.utils.ledger import DEBT_LOAN
+
+CUSTOMERS = [("c1", "Ana", "Uno"), ("c2", "Beto", "Dos"), ("c3", "Caro", "Tres")]
+LOANS = [
+    # loan_ref, customer_ref, amount, total_due, installments_count, installment_amount, installment_interval_days
+    ("l1", "c1", 100, 120, 2, 60, 7),
+    ("l2", "c2", 200, 240, 3, 80, 7),
+    ("l3", "c3", 50, 60, 1, 60, 30),
+]
+PAYMENTS = [("p1", "l1", 60), ("p2", "l2", 100), ("p3", "l2", 40), ("p4", "l3", 60)]
+
+
+def _xlsx(payments=PAYMENTS, start_date=None) -> bytes:
+    loan_header = ["loan_ref", "customer_ref", "amount", "total_due", "installments_count",
+                   "installment_amount", "installment_interval_days"]
+    loans = LOANS
+    if start_date is not None:
+        loan_header = loan_header + ["start_date"]
+        loans = [l + (start_date,) for l in LOANS]
+    wb = Workbook()
+    wb.remove(wb.active)
+    for title, header, rows in (
+        ("Customers", ["customer_ref", "first_name", "last_name"], CUSTOMERS),
+        ("Loans", loan_header, loans),
+        ("Payments", ["payment_ref", "loan_ref", "amount"], payments),
+    ):
+        ws = wb.create_sheet(title)
+        ws.append(header)
+        for r in rows:
+            ws.append(list(r))
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+@pytest.fixture
+def superadmin(client, seeded_admin, db):
+    company, _ = seeded_admin
+    sa = Employee(
+        name="Root", role="superadmin", phone="3819999999", email="root@test.local",
+        password=hash_password("123456"), company_id=company.id,
+    )
+    db.add(sa)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(sa)}"}
+
+    def _validate(payments=PAYMENTS, start_date=None) -> str:
+        r = client.post(
+            f"/superadmin/companies/{company.id}/onboarding-import/validate",
+            files={"file": ("cartera.xlsx", _xlsx(payments, start_date))},
+            headers=headers,
+        )
+        assert r.status_code == 200, r.text
+        assert r.json()["errors"] == []
+        return r.json()["batch_token"]
+
+    def _post(action: str, token: str):
+        return client.post(
+            f"/superadmin/companies/{company.id}/onboarding-import/{action}",
+            json={"batch_token": token}, headers=headers,
+        )
+
+    return company, _validate, _post
+
+
+def test_validate_commit_creates_balances_and_journal(superadmin, db, monkeypatch):
+    monkeypatch.setattr(onboarding_import_commit, "LOANS_CHUNK", 1)
+    company, validate, post = superadmin
+    token = validate()
+
+    r = post("commit", token)
+    assert r.status_code == 200, r.text
+    assert r.json()["created_counts"] == {
+        "customers_created": 3, "loans_created": 3, "payments_created": 4,
+        "installments_created": 6, "payment_allocations_created": 5,
+    }
+
+    db.expire_all()
+    loans = db.query(Loan).filter(Loan.company_id == company.id).all()
+    assert sorted(float(l.total_due) for l in loans) == [0.0, 60.0, 100.0]
+    assert sorted(l.status for l in loans) == ["active", "active", "paid"]
+    for loan in loans:
+        assert verify_debt(db, DEBT_LOAN, loan.id) == []  # diario escrito en bloque por el commit
+
+    session = db.get(OnboardingImportSession, uuid.UUID(token))
+    assert session.status == "committed"
+    assert {cp.phase for cp in session.checkpoints} == {"done"}
+    assert db.query(OnboardingStagingLoan).count() == 0
+
+    r = post("resume", token)
+    assert r.status_code == 400
+
+
+def test_paid_imported_installments_are_no_longer_overdue(superadmin, db):
+    company, validate, post = superadmin
+    # todas las cuotas ya vencidas al importar
+    token = validate(start_date=(date.today() - timedelta(days=90)).isoformat())
+
+    r = post("commit", token)
+    assert r.status_code == 200, r.text
+
+    db.expire_all()
+    rows = (
+        db.query(Installment.status, Installment.is_paid, Installment.is_overdue)
+        .join(Loan, Installment.loan_id == Loan.id)
+        .filter(Loan.company_id == company.id)
+        .all()
+    )
+    assert {(s, o) for s, paid, o in rows if paid} == {("paid", False)}
+    # impagas: l1 cuota 2, l2 cuota 2 (parcial, sigue vencida) y cuota 3
+    assert sorted((s, o) for s, paid, o in rows if not paid) == [("overdue", True), ("overdue", True), ("partial", True)]
+
+
+def test_overflowing_payment_is_rejected_before_any_phase(superadmin, db):
+    company, validate, post = superadmin
+    # l2 debe 240: p2 + p3 + p5 = 250
+    token = validate(PAYMENTS + [("p5", "l2", 110)])
+
+    r = post("commit", token)
+    assert r.status_code == 400
+    assert "Pago excede la deuda" in r.json()["detail"]
+    assert "payment_ref=p5" in r.json()["detail"] and "excedente=10.00" in r.json()["detail"]
+
+    db.expire_all()
+    assert db.query(Customer).filter(Customer.company_id == company.id).count() == 0
+    assert db.query(OnboardingCommitCheckpoint).count() == 0
+    assert db.query(OnboardingImportSession).one().status == "validated"
+
+
+def test_resume_continues_from_checkpoints_without_duplicates(superadmin, db, monkeypatch):
+    monkeypatch.setattr(onboarding_import_commit, "LOANS_CHUNK", 1)
+    company, validate, post = superadmin
+    token = validate()
+
+    def _boom(ctx, cp):
+        raise HTTPException(status_code=500, detail="corte simulado")
+
+    monkeypatch.setitem(onboarding_import_commit._PHASE_HANDLERS, "payments", _boom)
+    r = post("commit", token)
+    assert r.status_code == 500 and r.json()["detail"] == "corte simulado"
+
+    db.expire_all()
+    session = db.query(OnboardingImportSession).one()
+    assert session.status == "failed" and session.commit_error == "corte simulado"
+    # el grupo que falló quedó en "payments", con clientes y préstamos ya commiteados
+    assert "payments" in {cp.phase for cp in session.checkpoints}
+    assert db.query(Payment).count() == 0
+
+    r = post("commit", token)
+    assert r.status_code == 400  # ya no está "validated": se reanuda con /resume
+
+    monkeypatch.undo()
+    r = post("resume", token)
+    assert r.status_code == 200, r.text
+
+    db.expire_all()
+    assert db.query(Customer).filter(Customer.company_id == company.id).count() == 3
+    assert db.query(Loan).filter(Loan.company_id == company.id).count() == 3
+    assert db.query(Payment).count() == 4
+    assert db.query(OnboardingImportSession).one().status == "committed"
+
+
+class _InlineExecutor:
+    """ProcessPoolExecutor en el mismo proceso: el worker igual abre su propia sesión."""
+
+    def __init__(self, max_workers, mp_context=None):
+        self.max_workers = max_workers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fn, *args):
+        fut = Future()
+        fut.set_result(fn(*args))
+        return fut
+
+
+def test_worker_path_reports_failures_and_resumes(superadmin, db, engine, monkeypatch):
+    company, validate, post = superadmin
+    token = validate()
+
+    monkeypatch.setattr("app.database.db.SessionLocal", sessionmaker(bind=engine, future=True))
+    monkeypatch.setattr(onboarding_import_commit, "ProcessPoolExecutor", _InlineExecutor)
+    monkeypatch.setattr(onboarding_import_commit, "default_commit_workers", lambda db: 4)
+
+    failing_group = onboarding_import_commit.customer_group("c2")
+    real_loans = onboarding_import_commit._PHASE_HANDLERS["loans"]
+
+    def _loans(ctx, cp):
+        if cp.group_no == failing_group:
+            raise HTTPException(status_code=400, detail="Loans: grupo roto")
+        return real_loans(ctx, cp)
+
+    monkeypatch.setitem(onboarding_import_commit._PHASE_HANDLERS, "loans", _loans)
+    r = post("commit", token)
+    assert r.status_code == 400 and r.json()["detail"] == "Loans: grupo roto"
+
+    # los demás grupos terminaron en sus propios workers
+    db.expire_all()
+    assert db.query(Loan).filter(Loan.company_id == company.id).count() == 2
+    phases = {cp.group_no: cp.phase for cp in db.query(OnboardingCommitCheckpoint)}
+    assert phases[failing_group] == "loans"
+    assert {p for g, p in phases.items() if g != failing_group} == {"done"}
+
+    monkeypatch.setitem(onboarding_import_commit._PHASE_HANDLERS, "loans", real_loans)
+    r = post("resume", token)
+    assert r.status_code == 200, r.text
+
+    db.expire_all()
+    assert db.query(Loan).filter(Loan.company_id == company.id).count() == 3
+    assert db.query(Payment).count() == 4
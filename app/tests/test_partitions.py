@@ -0,0 +1,107 @@
+# app/tests/test_partitions.py
+import importlib.util
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+import pytest
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from sqlalchemy import text
+
+from app.models.models import Installment, PaymentAllocation
+from app.services.partitions import (
+    add_months,
+    detach_partitions_before,
+    ensure_partitions,
+    iter_months,
+    month_bounds,
+    month_start,
+    partition_name,
+)
+
+
+def test_month_helpers_cover_year_boundaries():
+    assert month_start(datetime(2025, 12, 31, 23, 59, tzinfo=timezone.utc)) == date(2025, 12, 1)
+    assert add_months(date(2025, 11, 1), 3) == date(2026, 2, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+    assert list(iter_months(date(2025, 11, 20), date(2026, 2, 3))) == [
+        date(2025, 11, 1), date(2025, 12, 1), date(2026, 1, 1), date(2026, 2, 1),
+    ]
+    assert month_bounds(date(2025, 12, 1)) == ("2025-12-01 00:00:00+00:00", "2026-01-01 00:00:00+00:00")
+
+    # los nombres ordenan como las fechas (detach_partitions_before compara strings)
+    names = [partition_name("payments", m) for m in iter_months(date(2025, 9, 1), date(2026, 1, 1))]
+    assert names == sorted(names) and names[0] == "payments_p2025_09"
+
+
+def test_partition_maintenance_is_noop_without_postgres(engine):
+    with engine.begin() as conn:
+        assert ensure_partitions(conn, today=date(2026, 3, 16)) == []
+        assert detach_partitions_before(conn, "payments", date(2025, 1, 1)) == []
+
+
+def _partition_tables(engine) -> None:
+    """Corre la migración de particionado sobre la base de tests (create_all deja tablas comunes)."""
+    versions = Path(__file__).resolve().parents[2] / "alembic" / "versions"
+    path = next(versions.glob("4e1b7c9a0f25_*.py"))
+    spec = importlib.util.spec_from_file_location("migration_4e1b7c9a0f25", path)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    with engine.begin() as conn, Operations.context(MigrationContext.configure(conn)):
+        migration.upgrade()
+
+
+def test_allocations_survive_moving_rows_out_of_default(client, auth_headers, seeded_admin, engine, db):
+    if engine.dialect.name != "postgresql":
+        pytest.skip("particionado sólo en Postgres")
+    company, admin = seeded_admin
+    db.commit()  # la migración toma locks exclusivos (también sobre employees/loans)
+    _partition_tables(engine)
+
+    r = client.post("/customers/", json={
+        "first_name": "Ana",
+        "last_name": "Particion",
+        "dni": "38047001",
+        "address": "Calle 47",
+        "phone": "3810047001",
+        "province": "Tucumán",
+        "email": None
+    }, headers=auth_headers)
+    assert r.status_code == 201, r.text
+    r = client.post("/loans/createLoan/", json={
+        "customer_id": r.json()["id"],
+        "employee_id": admin.id,
+        "company_id": company.id,
+        "amount": 200.0,
+        "installments_count": 2,
+        "installment_interval_days": 7,
+    }, headers=auth_headers)
+    assert r.status_code == 201, r.text
+    loan_id = r.json()["id"]
+    r = client.post(f"/loans/{loan_id}/pay", json={"amount_paid": 150.0}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+
+    # la cuota 2 pasa a vencer fuera del horizonte: cae en installments_default
+    inst = db.query(Installment).filter(Installment.loan_id == loan_id, Installment.number == 2).one()
+    inst.due_date = datetime(2027, 12, 15, 12, tzinfo=timezone.utc)
+    db.commit()
+    inst_id = inst.id
+
+    def _allocations():
+        return db.query(PaymentAllocation).filter(PaymentAllocation.installment_id == inst_id).count()
+
+    def _partition_of():
+        return db.execute(
+            text("SELECT tableoid::regclass::text FROM installments WHERE id = :id"), {"id": inst_id}
+        ).scalar()
+
+    assert _partition_of() == "installments_default"
+    assert _allocations() == 1
+    db.commit()
+
+    with engine.begin() as conn:
+        created = ensure_partitions(conn, today=date(2027, 11, 20), months_ahead=1)
+    assert "installments_p2027_12" in created
+
+    assert _partition_of() == "installments_p2027_12"
+    assert _allocations() == 1
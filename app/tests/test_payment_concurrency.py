@@ -0,0 +1,171 @@
+# app/tests/test_payment_concurrency.py
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, func
+from sqlalchemy.orm import sessionmaker
+
+from app.database.db import get_db
+from app.main import app
+from app.models.models import Company, Customer, Installment, Loan, Payment, PaymentAllocation
+from app.routes import payments as payments_routes
+from app.utils.money import to_cents
+
+
+def _assert_ledger_invariants(session, loan_id):
+    session.expire_all()
+    loan = session.get(Loan, loan_id)
+    installments = session.query(Installment).filter(Installment.loan_id == loan_id).all()
+    payments = session.query(Payment).filter(Payment.loan_id == loan_id).all()
+
+    live_c = sum(to_cents(p.amount) for p in payments if not p.is_voided)
+    total_c = sum(to_cents(i.amount) for i in installments)
+    paid_c = sum(to_cents(i.paid_amount) for i in installments)
+
+    # nunca se imputa de más y todo lo cobrado está imputado
+    assert live_c <= total_c
+    assert paid_c == live_c
+
+    for ins in installments:
+        applied_c = to_cents(
+            session.query(func.coalesce(func.sum(PaymentAllocation.amount_applied), 0))
+            .filter(PaymentAllocation.installment_id == ins.id)
+            .scalar()
+        )
+        assert applied_c == to_cents(ins.paid_amount)
+        assert to_cents(ins.paid_amount) <= to_cents(ins.amount)
+        assert ins.is_paid == (to_cents(ins.paid_amount) >= to_cents(ins.amount))
+
+    # anulados sin allocations; cada pago vivo imputado completo
+    for p in payments:
+        applied_c = to_cents(
+            session.query(func.coalesce(func.sum(PaymentAllocation.amount_applied), 0))
+            .filter(PaymentAllocation.payment_id == p.id)
+            .scalar()
+        )
+        assert applied_c == (0 if p.is_voided else to_cents(p.amount))
+
+    assert to_cents(loan.total_due) == total_c - paid_c
+    return live_c
+
+
+def test_concurrent_payments_keep_ledger_consistent(client, auth_headers, engine, create_loan):
+    loan_id = create_loan(amount=1000.0, installments_count=10)
+
+    # cada request con su propia sesión, como en producción
+    SessionT = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+
+    def _get_db():
+        s = SessionT()
+        try:
+            yield s
+        finally:
+            s.close()
+
+    app.dependency_overrides[get_db] = _get_db
+
+    def pay_loan(amount):
+        return TestClient(app).post(f"/loans/{loan_id}/pay", json={"amount_paid": amount, "payment_type": "cash"}, headers=auth_headers)
+
+    def pay_generic(amount):
+        return TestClient(app).post("/payments/", json={"loan_id": loan_id, "amount": amount, "payment_type": "cash"}, headers=auth_headers)
+
+    def void(payment_id):
+        return TestClient(app).post(f"/payments/void/{payment_id}", headers=auth_headers)
+
+    # 1) 24 pagos simultáneos (900 de 1000): todos entran y nada se pisa
+    with ThreadPoolExecutor(max_workers=12) as pool:
+        futures = [pool.submit(pay_loan, 50.0) for _ in range(12)]
+        futures += [pool.submit(pay_generic, 25.0) for _ in range(12)]
+        responses = [f.result() for f in futures]
+    assert all(r.status_code == 200 for r in responses), [r.text for r in responses if r.status_code != 200]
+
+    session = SessionT()
+    try:
+        assert _assert_ledger_invariants(session, loan_id) == to_cents(900)
+
+        # 2) anulaciones + pagos que compiten por el saldo restante
+        generic_ids = [r.json()["id"] for r in responses if "id" in r.json()][:6]
+        with ThreadPoolExecutor(max_workers=12) as pool:
+            voids = [pool.submit(void, pid) for pid in generic_ids]
+            pays = [pool.submit(pay_loan, 50.0) for _ in range(10)]
+            void_responses = [f.result() for f in voids]
+            pay_responses = [f.result() for f in pays]
+
+        assert all(r.status_code == 200 for r in void_responses)
+        assert all(r.status_code in (200, 400) for r in pay_responses)
+        accepted = sum(1 for r in pay_responses if r.status_code == 200)
+
+        live_c = _assert_ledger_invariants(session, loan_id)
+        assert live_c == to_cents(900 - 6 * 25 + accepted * 50)
+    finally:
+        session.close()
+
+
+def test_bulk_apply_never_locks_other_companies_loans(client, auth_headers, db, monkeypatch, create_loan):
+    loan_id = create_loan(amount=1000.0, installments_count=10)
+
+    other = Company(name="Otra 36")
+    db.add(other)
+    db.flush()
+    foreign = Customer(first_name="Ajeno", last_name="X", address="-", phone="3819999036", company_id=other.id)
+    db.add(foreign)
+    db.flush()
+    foreign_loan = Loan(
+        customer_id=foreign.id, company_id=other.id, amount=100.0, total_due=100.0,
+        installments_count=1, installment_amount=100.0,
+    )
+    db.add(foreign_loan)
+    db.commit()
+
+    locked = []
+    real_lock = payments_routes.lock_debt
+
+    def _spy(session, debt_kind, debt_id):
+        locked.append(debt_id)
+        return real_lock(session, debt_kind, debt_id)
+
+    monkeypatch.setattr(payments_routes, "lock_debt", _spy)
+
+    r = client.post("/payments/bulk-apply", json={"items": [
+        {"loan_id": foreign_loan.id, "amount": 10.0},
+        {"loan_id": loan_id, "amount": 10.0},
+    ]}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["ok"] == 1 and body["failed"] == 1
+    assert locked == [loan_id]
+
+
+def test_bulk_apply_all_or_nothing_rolls_back_every_loan(client, auth_headers, db, monkeypatch, create_loan):
+    first = create_loan()
+    second = create_loan()
+
+    real_recompute = payments_routes.recompute_ledger_for_loan
+
+    def _recompute(session, loan_id):
+        if loan_id == second:
+            raise RuntimeError("ledger roto")
+        return real_recompute(session, loan_id)
+
+    commits = []
+
+    def _count(session):
+        commits.append(1)
+
+    event.listen(db, "after_commit", _count)
+    monkeypatch.setattr(payments_routes, "recompute_ledger_for_loan", _recompute)
+
+    # el primer préstamo queda saldado: antes su commit de estado soltaba los locks
+    r = client.post("/payments/bulk-apply", json={"all_or_nothing": True, "items": [
+        {"loan_id": first, "amount": 200.0},
+        {"loan_id": second, "amount": 50.0},
+    ]}, headers=auth_headers)
+    assert r.status_code == 500
+    event.remove(db, "after_commit", _count)
+
+    assert commits == []
+    db.expire_all()
+    assert db.query(Payment).count() == 0
+    assert db.get(Loan, first).status != "paid"
+    assert float(db.get(Loan, first).total_due) == 200.0
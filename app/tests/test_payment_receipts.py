@@ -0,0 +1,55 @@
+# app/tests/test_payment_receipts.py
+from datetime import datetime, timezone
+
+from app.models.models import Payment
+
+
+def test_receipt_pdf_and_escpos(client, auth_headers, create_loan):
+    loan_id = create_loan(
+        amount=300.0, installments_count=3, customer={"first_name": "Rosa", "last_name": "Peña"},
+    )
+
+    r = client.post("/payments/", json={
+        "loan_id": loan_id,
+        "amount": 100.0,
+        "payment_type": "cash",
+        "description": "recibo"
+    }, headers=auth_headers)
+    assert r.status_code in (200, 201), r.text
+    payment_id = r.json()["id"]
+
+    r_pdf = client.get(f"/payments/{payment_id}/receipt.pdf", headers=auth_headers)
+    assert r_pdf.status_code == 200, r_pdf.text
+    assert r_pdf.headers["content-type"] == "application/pdf"
+    assert r_pdf.content.startswith(b"%PDF")
+
+    r_pos = client.get(f"/payments/{payment_id}/receipt.escpos", headers=auth_headers)
+    assert r_pos.status_code == 200, r_pos.text
+    assert r_pos.content.startswith(b"\x1b@")
+    assert b"ANULADO" not in r_pos.content
+
+    # la anulación cambia la clave del cache: el recibo nuevo sale marcado
+    r = client.post(f"/payments/void/{payment_id}", headers=auth_headers)
+    assert r.status_code == 200, r.text
+    r_pos2 = client.get(f"/payments/{payment_id}/receipt.escpos", headers=auth_headers)
+    assert r_pos2.status_code == 200
+    assert b"ANULADO" in r_pos2.content
+
+    r404 = client.get("/payments/999999/receipt.escpos", headers=auth_headers)
+    assert r404.status_code == 404
+
+
+def test_loose_payment_falls_back_to_the_callers_company(client, auth_headers, seeded_admin, db):
+    _, admin = seeded_admin
+    # pago suelto (sin préstamo ni compra): como antes, se valida y arma con la empresa del usuario
+    pay = Payment(amount=10.0, payment_date=datetime.now(timezone.utc), collector_id=admin.id)
+    db.add(pay)
+    db.commit()
+
+    r = client.get(f"/payments/{pay.id}", headers=auth_headers)
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert (body["company_name"], body["reference"], body["collector_name"]) == ("Test Co", "Pago", "Admin")
+
+    r = client.get(f"/payments/{pay.id}/receipt.escpos", headers=auth_headers)
+    assert r.status_code == 200, r.text
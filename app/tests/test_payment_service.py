@@ -0,0 +1,68 @@
+# app/tests/test_payment_service.py
+from sqlalchemy import event, func
+
+from app.models.models import DailyRollup, Installment
+from app.services import daily_rollups
+from app.utils import response_cache
+
+
+class _CommitCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn):
+        self.count += 1
+
+
+def test_payment_paths_commit_once_and_return_fresh_state(
+    client, auth_headers, seeded_admin, db, engine, monkeypatch, create_loan,
+):
+    # el bump de versión de datos (company_data_versions) es otra transacción: acá se cuentan sólo las del pago
+    monkeypatch.setattr(response_cache, "_store", response_cache.InMemoryCacheStore())
+    monkeypatch.setattr(daily_rollups, "ROLLUPS_ENABLED", True)
+    company, _ = seeded_admin
+    loan_id = create_loan(amount=300.0, installments_count=3)
+
+    commits = _CommitCounter()
+    event.listen(engine, "commit", commits)
+    try:
+        # /installments/{id}/pay: la cuota vuelve con el estado post-imputación
+        first_id = (
+            db.query(Installment.id)
+            .filter(Installment.loan_id == loan_id, Installment.number == 1)
+            .scalar()
+        )
+        r = client.post(f"/installments/{first_id}/pay", json={"amount": 40.0}, headers=auth_headers)
+        assert r.status_code == 200, r.text
+        body = r.json()
+        assert body["installment"]["paid_amount"] == 40.0
+        assert body["installment"]["status"] == "partial"
+        assert commits.count == 1
+
+        # /loans/{id}/pay: una sola pasada, imputa cuotas más viejas primero
+        r = client.post(f"/loans/{loan_id}/pay", json={"amount_paid": 100.0}, headers=auth_headers)
+        assert r.status_code == 200, r.text
+        body = r.json()
+        assert body["monto_pagado"] == 100.0
+        assert body["cuotas_afectadas"] == 2
+        assert body["saldo_pendiente"] == 160.0
+        assert commits.count == 2
+
+        # /payments/
+        r = client.post("/payments/", json={"loan_id": loan_id, "amount": 160.0}, headers=auth_headers)
+        assert r.status_code == 200, r.text
+        assert r.json()["amount"] == 160.0
+        assert commits.count == 3
+    finally:
+        event.remove(engine, "commit", commits)
+
+    # daily_rollups se actualizó dentro de la misma transacción
+    collected = db.query(func.sum(DailyRollup.collected_amount)).filter(DailyRollup.company_id == company.id).scalar()
+    assert collected == 300.0
+
+    r = client.get(f"/loans/{loan_id}", headers=auth_headers)
+    assert r.json()["total_due"] == 0
+    assert r.json()["status"] == "paid"
+
+    r = client.post(f"/loans/{loan_id}/pay", json={"amount_paid": 1.0}, headers=auth_headers)
+    assert r.status_code == 400
@@ -0,0 +1,56 @@
+# app/tests/test_portfolio_as_of.py
+from datetime import datetime, timedelta, timezone
+
+from app.models.models import Payment
+from app.services.portfolio import portfolio_as_of
+from app.utils.time_windows import AR_TZ
+
+
+def test_portfolio_as_of_past_and_future_dates(client, auth_headers, seeded_admin, db, create_loan):
+    company, admin = seeded_admin
+    loan_id = create_loan()
+    canceled_id = create_loan(amount=100.0)
+
+    r = client.post(f"/loans/{loan_id}/pay", json={"amount_paid": 150.0}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+    r = client.post(f"/loans/{canceled_id}/cancel", json={"reason": "baja"}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+
+    today = datetime.now(AR_TZ).date()
+
+    # antes del alta: no hay cartera
+    before = portfolio_as_of(db, company.id, today - timedelta(days=1))
+    assert before["outstanding"] == 0.0 and before["by_collector"] == []
+
+    now = portfolio_as_of(db, company.id, today)
+    assert now["outstanding"] == 50.0 and now["not_due"] == 50.0 and now["overdue"] == 0.0
+    assert now["paid"] == 150.0 and now["debts_count"] == 1
+
+    # 20 días después: cuotas vencidas hace 13 y 6 días, la 1 pagada, la 2 a medias
+    later = portfolio_as_of(db, company.id, today + timedelta(days=20))
+    assert later["overdue"] == 50.0 and later["aging"]["d1_30"] == 50.0
+    assert later["overdue_installments_count"] == 1
+    assert later["by_collector"][0]["collector_id"] == admin.id
+
+    # anulación con fecha: antes cuenta el pago, después no
+    pay = db.query(Payment).filter(Payment.loan_id == loan_id).one()
+    pay.is_voided = True
+    pay.voided_at = datetime.now(timezone.utc) + timedelta(days=10)
+    db.commit()
+
+    assert portfolio_as_of(db, company.id, today + timedelta(days=5))["paid"] == 150.0
+    voided = portfolio_as_of(db, company.id, today + timedelta(days=60))
+    assert voided["paid"] == 0.0 and voided["overdue"] == 200.0
+    assert voided["aging"]["d31_60"] == 200.0
+
+
+def test_portfolio_endpoint(client, auth_headers, create_loan):
+    loan_id = create_loan()
+    r = client.post(f"/loans/{loan_id}/pay", json={"amount_paid": 120.0}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+
+    r = client.get("/dashboard/portfolio", params={"as_of": datetime.now(AR_TZ).date().isoformat()}, headers=auth_headers)
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["outstanding"] == 80.0
+    assert body["by_collector"][0]["outstanding"] == 80.0
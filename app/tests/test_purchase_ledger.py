@@ -0,0 +1,51 @@
+# app/tests/test_purchase_ledger.py
+
+def _create_purchase(client, headers):
+    r = client.post("/customers/", json={
+        "first_name": "Luis",
+        "last_name": "Sosa",
+        "dni": "32034001",
+        "address": "Calle 34",
+        "phone": "3810034001",
+        "province": "Tucumán",
+        "email": None
+    }, headers=headers)
+    assert r.status_code == 201, r.text
+    r = client.post("/purchases/", json={
+        "customer_id": r.json()["id"],
+        "product_name": "Heladera",
+        "amount": 300.0,
+        "installments_count": 3,
+        "installment_interval_days": 30,
+    }, headers=headers)
+    assert r.status_code == 201, r.text
+    return r.json()["id"]
+
+
+def test_purchase_payment_allocations_and_void(client, auth_headers, seeded_admin):
+    purchase_id = _create_purchase(client, auth_headers)
+
+    r = client.post("/payments/", json={
+        "purchase_id": purchase_id,
+        "amount": 150.0,
+        "payment_type": "cash",
+    }, headers=auth_headers)
+    assert r.status_code in (200, 201), r.text
+    payment_id = r.json()["id"]
+
+    # el pago se imputa a las cuotas más viejas, igual que en préstamos
+    r = client.get(f"/payments/{payment_id}/allocations", headers=auth_headers)
+    assert r.status_code == 200, r.text
+    applied = [round(a["applied"], 2) for a in r.json()]
+    assert applied == [100.0, 50.0]
+
+    r = client.get(f"/purchases/{purchase_id}", headers=auth_headers)
+    assert abs(r.json()["total_due"] - 150.0) < 0.01
+
+    # anular un pago de venta revierte cuotas y saldo
+    r = client.post(f"/payments/void/{payment_id}", headers=auth_headers)
+    assert r.status_code == 200, r.text
+    assert abs(r.json()["purchase_total_due"] - 300.0) < 0.01
+
+    r = client.get(f"/payments/{payment_id}/allocations", headers=auth_headers)
+    assert r.json() == []
@@ -0,0 +1,41 @@
+# app/tests/test_scheduler_leader.py
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import sessionmaker
+
+from app.jobs.leader import LeaderElector
+from app.models.models import SchedulerLease
+
+
+def test_only_one_worker_runs_scheduled_jobs(engine, db):
+    factory = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    workers = [LeaderElector("test-jobs", ttl_seconds=60, session_factory=factory, holder=f"w{i}") for i in range(4)]
+
+    runs = []
+    jobs = [w.leader_only(lambda name=w.holder: runs.append(name)) for w in workers]
+
+    # todos los workers disparan el mismo cron: corre uno solo
+    for job in jobs:
+        job()
+    assert runs == ["w0"]
+    assert [w.is_leader for w in workers] == [True, False, False, False]
+
+    # el líder renueva y sigue siendo el único
+    runs.clear()
+    workers[0].heartbeat()
+    for job in reversed(jobs):
+        job()
+    assert runs == ["w0"]
+
+    # el líder se cae sin liberar: cuando vence el lease lo toma otro
+    later = datetime.now(timezone.utc) + timedelta(seconds=120)
+    assert workers[1].try_acquire(now=later) is True
+    assert workers[2].try_acquire(now=later) is False
+    assert workers[0].try_acquire(now=later) is False
+
+    # apagado ordenado: release deja el lease libre para el siguiente
+    workers[1].release()
+    assert workers[1].is_leader is False
+    assert workers[3].try_acquire() is True
+    db.expire_all()
+    assert db.get(SchedulerLease, "test-jobs").holder == "w3"
@@ -0,0 +1,67 @@
+# app/tests/test_summary_cache.py
+from sqlalchemy.orm import sessionmaker
+
+from app.utils.response_cache import DatabaseVersionStore, get_cache_store
+
+
+def test_summary_etag_304_and_invalidation(client, auth_headers, seeded_admin):
+    company, admin = seeded_admin
+
+    r1 = client.get("/loans/summary", headers=auth_headers)
+    assert r1.status_code == 200, r1.text
+    etag = r1.headers.get("etag")
+    assert etag
+
+    # mismo ETag => 304 sin cuerpo
+    r2 = client.get("/loans/summary", headers={**auth_headers, "If-None-Match": etag})
+    assert r2.status_code == 304
+
+    # una escritura de la empresa invalida el ETag
+    r = client.post("/customers/", json={
+        "first_name": "Ana",
+        "last_name": "Paz",
+        "dni": "32009001",
+        "address": "Calle 1",
+        "phone": "3810009001",
+        "province": "Tucumán",
+        "email": None
+    }, headers=auth_headers)
+    assert r.status_code == 201, r.text
+    r = client.post("/loans/createLoan/", json={
+        "customer_id": r.json()["id"],
+        "employee_id": admin.id,
+        "company_id": company.id,
+        "amount": 100.0,
+        "installments_count": 1,
+        "installment_interval_days": 7,
+    }, headers=auth_headers)
+    assert r.status_code == 201, r.text
+
+    r3 = client.get("/loans/summary", headers={**auth_headers, "If-None-Match": etag})
+    assert r3.status_code == 200
+    assert r3.headers.get("etag") != etag
+
+
+def test_version_is_shared_between_workers(client, auth_headers, seeded_admin, engine):
+    company, _ = seeded_admin
+    # otro worker: su propio store (y su propia memoria), misma base
+    other_worker = DatabaseVersionStore(sessionmaker(bind=engine, future=True))
+
+    r1 = client.get("/loans/summary", headers=auth_headers)
+    assert r1.status_code == 200, r1.text
+    etag = r1.headers["etag"]
+    assert client.get("/loans/summary", headers={**auth_headers, "If-None-Match": etag}).status_code == 304
+
+    before = other_worker.get_version(company.id)
+    other_worker.bump_version(company.id)
+    assert get_cache_store().get_version(company.id) == before + 1
+
+    r2 = client.get("/loans/summary", headers={**auth_headers, "If-None-Match": etag})
+    assert r2.status_code == 200
+    assert r2.headers["etag"] != etag
+
+    # el job de vencidas (sólo en el líder) invalida a todas las empresas
+    etag = r2.headers["etag"]
+    other_worker.bump_all()
+    r3 = client.get("/loans/summary", headers={**auth_headers, "If-None-Match": etag})
+    assert r3.status_code == 200
@@ -0,0 +1,248 @@
+# app/utils/admission.py
+"""
+Control de admisión por empresa (load shedding).
+
+Un PDF de 10k cupones o un dashboard de un rango enorme de UNA empresa puede
+ocupar el threadpool y el pool de conexiones de todas las demás. Cada request
+autenticado pasa por `admission_control` (va en las dependencies del router,
+al lado de `ensure_company_active`) y tiene que conseguir un lugar en el
+"gate" de (company_id, clase de ruta):
+
+- interactive (default): lo que usan los cobradores en la calle (cobrar, ver
+  cuotas, buscar clientes). Límite alto, sólo frena abusos.
+- heavy: reportes, PDFs masivos, listados completos, summaries. Límite bajo por
+  empresa y además un gate global (ADMISSION_GLOBAL_HEAVY_LIMIT) para que la
+  suma de reportes de todas las empresas no se coma el threadpool.
+
+Si no hay lugar el request espera en una cola FIFO acotada (en el event loop,
+sin ocupar un hilo). Cola llena de la empresa → 429; cola global llena o
+espera mayor a *_WAIT_SECONDS → 503. Ambos con Retry-After.
+
+Las rutas se marcan como pesadas con `@heavy_route` (debajo de @router.get).
+Métricas por (empresa, clase): GET /superadmin/admission-metrics.
+
+Los límites son por proceso (con gunicorn, por worker).
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from fastapi import Depends, HTTPException, Request
+
+from app.models.models import Employee
+from app.utils.auth import get_current_user
+
+logger = logging.getLogger("uvicorn.error")
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+
+ROUTE_INTERACTIVE = "interactive"
+ROUTE_HEAVY = "heavy"
+
+
+@dataclass(frozen=True)
+class GateLimits:
+    concurrency: int
+    queue: int
+    wait_seconds: float
+
+
+def _limits(prefix: str, concurrency: int, queue: int, wait_seconds: float) -> GateLimits:
+    return GateLimits(
+        concurrency=int(os.getenv(f"{prefix}_LIMIT", str(concurrency))),
+        queue=int(os.getenv(f"{prefix}_QUEUE", str(queue))),
+        wait_seconds=float(os.getenv(f"{prefix}_WAIT_SECONDS", str(wait_seconds))),
+    )
+
+
+COMPANY_LIMITS = {
+    ROUTE_INTERACTIVE: _limits("ADMISSION_INTERACTIVE", 16, 32, 5),
+    ROUTE_HEAVY: _limits("ADMISSION_HEAVY", 2, 4, 10),
+}
+GLOBAL_HEAVY_LIMITS = _limits("ADMISSION_GLOBAL_HEAVY", 6, 24, 15)
+
+
+def heavy_route(endpoint: Callable) -> Callable:
+    """Marca un endpoint como pesado (reportes / PDFs / listados completos)."""
+    endpoint.admission_class = ROUTE_HEAVY
+    return endpoint
+
+
+def route_class_for(endpoint: Optional[Callable]) -> str:
+    return getattr(endpoint, "admission_class", ROUTE_INTERACTIVE)
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, code: str, retry_after: int):
+        super().__init__(code)
+        self.status_code = status_code
+        self.code = code
+        self.retry_after = retry_after
+
+
+class Gate:
+    """Semáforo FIFO con cola acotada y métricas. Se usa sólo desde el event loop."""
+
+    def __init__(self, limits: GateLimits, full_status: int):
+        self.limits = limits
+        self.full_status = full_status
+        self.active = 0
+        self.waiters: deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.max_wait_ms = 0.0
+        self.peak_active = 0
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self.limits.wait_seconds))
+
+    def _admit(self, waited_ms: float) -> None:
+        self.admitted += 1
+        self.max_wait_ms = max(self.max_wait_ms, waited_ms)
+        self.peak_active = max(self.peak_active, self.active)
+
+    async def acquire(self) -> None:
+        if self.active < self.limits.concurrency and not self.waiters:
+            self.active += 1
+            self._admit(0.0)
+            return
+
+        if len(self.waiters) >= self.limits.queue:
+            self.rejected_queue_full += 1
+            raise AdmissionRejected(self.full_status, "ADMISSION_QUEUE_FULL", self._retry_after())
+
+        started = time.perf_counter()
+        fut = asyncio.get_running_loop().create_future()
+        self.waiters.append(fut)
+        try:
+            await asyncio.wait_for(fut, timeout=self.limits.wait_seconds)
+        except asyncio.TimeoutError:
+            if fut.done() and not fut.cancelled():
+                # el lugar llegó justo al vencer: lo tomamos
+                self._admit((time.perf_counter() - started) * 1000)
+                return
+            self._discard(fut)
+            self.rejected_timeout += 1
+            raise AdmissionRejected(503, "ADMISSION_TIMEOUT", self._retry_after())
+        except asyncio.CancelledError:
+            # el cliente se fue mientras esperaba: si ya le habían pasado el lugar, lo devolvemos
+            if fut.done() and not fut.cancelled():
+                self.release()
+            else:
+                self._discard(fut)
+            raise
+        self._admit((time.perf_counter() - started) * 1000)
+
+    def _discard(self, fut: asyncio.Future) -> None:
+        try:
+            self.waiters.remove(fut)
+        except ValueError:
+            pass
+
+    def release(self) -> None:
+        # el lugar pasa directo al primero de la cola (active no cambia)
+        while self.waiters:
+            fut = self.waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.active -= 1
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": self.limits.concurrency,
+            "queue_limit": self.limits.queue,
+            "active": self.active,
+            "queued": len(self.waiters),
+            "peak_active": self.peak_active,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "max_wait_ms": round(self.max_wait_ms, 1),
+        }
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        company_limits: Optional[dict[str, GateLimits]] = None,
+        global_heavy_limits: Optional[GateLimits] = GLOBAL_HEAVY_LIMITS,
+    ):
+        self.company_limits = company_limits or COMPANY_LIMITS
+        self.gates: dict[tuple[int, str], Gate] = {}
+        # cola global llena = el servidor está saturado (no es culpa de la empresa) → 503
+        self.global_heavy = Gate(global_heavy_limits, full_status=503) if global_heavy_limits else None
+
+    def gate(self, company_id: int, route_class: str) -> Gate:
+        key = (company_id, route_class)
+        gate = self.gates.get(key)
+        if gate is None:
+            gate = self.gates[key] = Gate(self.company_limits[route_class], full_status=429)
+        return gate
+
+    async def admit(self, company_id: int, route_class: str) -> list[Gate]:
+        gate = self.gate(company_id, route_class)
+        await gate.acquire()
+        if route_class != ROUTE_HEAVY or self.global_heavy is None:
+            return [gate]
+        try:
+            await self.global_heavy.acquire()
+        except BaseException:
+            gate.release()
+            raise
+        return [self.global_heavy, gate]
+
+    @staticmethod
+    def release(gates: list[Gate]) -> None:
+        for gate in gates:
+            gate.release()
+
+    def snapshot(self) -> dict:
+        companies: dict[str, dict] = {}
+        for (company_id, route_class), gate in list(self.gates.items()):
+            companies.setdefault(str(company_id), {})[route_class] = gate.snapshot()
+        return {
+            "enabled": ADMISSION_ENABLED,
+            "global_heavy": self.global_heavy.snapshot() if self.global_heavy else None,
+            "companies": companies,
+        }
+
+
+controller = AdmissionController()
+
+
+async def admission_control(
+    request: Request,
+    current: Employee = Depends(get_current_user),
+):
+    """Dependency: ocupa un lugar de (empresa, clase de ruta) mientras corre el endpoint."""
+    if not ADMISSION_ENABLED:
+        yield
+        return
+
+    route_class = route_class_for(request.scope.get("endpoint"))
+    try:
+        gates = await controller.admit(current.company_id, route_class)
+    except AdmissionRejected as e:
+        logger.warning(
+            "🚦 Rechazado %s %s (empresa=%s, clase=%s): %s",
+            request.method, request.url.path, current.company_id, route_class, e.code,
+        )
+        raise HTTPException(
+            status_code=e.status_code,
+            detail={"code": e.code, "route_class": route_class, "retry_after": e.retry_after},
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    try:
+        yield
+    finally:
+        controller.release(gates)
@@ -3,8 +3,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import asc
 
 from app.models.models import Installment, Payment, PaymentAllocation
-
-EPS = 1e-6
+from app.utils.money import from_cents, to_cents
 
 def allocate_payment_for_loan(db: Session, loan_id: int, payment: Payment) -> None:
     """
@@ -29,29 +28,26 @@ def allocate_payment_for_loan(db: Session, loan_id: int, payment: Payment) -> No
         .all()
     )
 
-    remaining = float(payment.amount or 0.0)
-    if remaining <= EPS:
+    remaining = to_cents(payment.amount)
+    if remaining <= 0:
         return
 
     # Vamos a simular "aplicar" pero SIN mutar cuotas, midiendo tope de cada una
     for ins in installments:
-        if remaining <= EPS:
+        if remaining <= 0:
             break
 
-        amount = float(ins.amount or 0.0)
-        paid   = float(ins.paid_amount or 0.0)
-        pending = max(amount - paid, 0.0)
-
-        if pending <= EPS:
+        pending = to_cents(ins.amount) - to_cents(ins.paid_amount)
+        if pending <= 0:
             continue
 
         take = min(pending, remaining)
-        if take > EPS:
+        if take > 0:
             # Registramos la allocation
             alloc = PaymentAllocation(
                 payment_id=payment.id,
                 installment_id=ins.id,
-                amount_applied=take,
+                amount_applied=from_cents(take),
                 created_at=datetime.utcnow(),
             )
             db.add(alloc)
@@ -0,0 +1,53 @@
+# app/utils/batch.py
+"""
+Lecturas por lote: GET /{recurso}/batch?ids=1,2,3 (o ?ids=1&ids=2).
+
+El getMany del portal admin pedía un GET /{recurso}/{id} por cada id; con esto
+es un solo request (un solo JWT/licencia/sesión) y una sola consulta `IN`.
+Los ids repetidos se ignoran, los que no existen o son de otra empresa no
+vuelven (sin 404) y el resultado respeta el orden pedido.
+"""
+from __future__ import annotations
+
+import os
+from typing import Any, Iterable, List
+
+from fastapi import HTTPException, Query
+
+
+BATCH_MAX_IDS = int(os.getenv("BATCH_MAX_IDS", "500"))
+
+
+def batch_ids(
+    ids: List[str] = Query(..., description="IDs separados por coma (o el parámetro repetido)"),
+) -> list[int]:
+    """Dependency: parsea y deduplica `ids` (mantiene el orden)."""
+    out: list[int] = []
+    seen: set[int] = set()
+    for chunk in ids:
+        for part in chunk.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            if not part.isdigit():
+                raise HTTPException(status_code=400, detail=f"ID inválido: {part}")
+            value = int(part)
+            if value not in seen:
+                seen.add(value)
+                out.append(value)
+
+    if not out:
+        raise HTTPException(status_code=400, detail="Debe indicar al menos un ID")
+    if len(out) > BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"Máximo {BATCH_MAX_IDS} IDs por consulta")
+    return out
+
+
+def in_request_order(rows: Iterable[dict], ids: list[int], key: str = "id") -> list[dict]:
+    by_id = {r[key]: r for r in rows}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def row_dicts(rows: Iterable[Any]) -> list[dict]:
+    """Rows de una consulta por columnas (sin hidratar objetos ORM) → dicts."""
+    return [dict(r._mapping) for r in rows]
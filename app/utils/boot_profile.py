@@ -0,0 +1,96 @@
+# app/utils/boot_profile.py
+"""
+Reporte de tiempo de arranque (cold start) del proceso de la API.
+
+Corre `python -X importtime -c "import app.main"` en un proceso limpio y
+resume qué módulos pesan más. Lo usa el test de presupuesto de arranque
+(app/tests/test_boot_time.py) y se puede correr a mano:
+
+    python -m app.utils.boot_profile            # top 25
+    python -m app.utils.boot_profile --top 50
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+
+# dependencias pesadas que NO deben cargarse al arrancar (se importan en el endpoint/job)
+LAZY_MODULES = ("reportlab", "openpyxl", "apscheduler")
+
+_LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+_REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+@dataclass
+class ImportRow:
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def profile_imports(target: str = "app.main") -> list[ImportRow]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        capture_output=True,
+        text=True,
+        cwd=_REPO_ROOT,
+        env=os.environ.copy(),
+        timeout=300,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {target} falló:\n{proc.stderr[-4000:]}")
+
+    rows: list[ImportRow] = []
+    for line in proc.stderr.splitlines():
+        m = _LINE_RE.match(line)
+        if m:
+            self_us, cum_us, indent, module = m.groups()
+            rows.append(ImportRow(module, int(self_us), int(cum_us), len(indent) // 2))
+    return rows
+
+
+def total_ms(rows: list[ImportRow], target: str = "app.main") -> float:
+    for r in rows:
+        if r.module == target:
+            return r.cumulative_us / 1000
+    return sum(r.self_us for r in rows) / 1000
+
+
+def imported_lazy_modules(rows: list[ImportRow]) -> list[str]:
+    roots = {r.module.split(".", 1)[0] for r in rows}
+    return [m for m in LAZY_MODULES if m in roots]
+
+
+def format_report(rows: list[ImportRow], top: int = 25, target: str = "app.main") -> str:
+    app_rows = sorted((r for r in rows if r.module.startswith("app.")), key=lambda r: -r.cumulative_us)
+    # terceros: tiempo propio sumado por paquete raíz (sin stdlib)
+    by_pkg: dict[str, int] = {}
+    for r in rows:
+        root = r.module.split(".", 1)[0]
+        if root != "app" and root not in sys.stdlib_module_names and not root.startswith("_"):
+            by_pkg[root] = by_pkg.get(root, 0) + r.self_us
+    third = sorted(by_pkg.items(), key=lambda kv: -kv[1])
+
+    lines = [f"⏱️  import {target}: {total_ms(rows, target):.0f} ms ({len(rows)} módulos)", "", "App (acumulado):"]
+    lines += [f"  {r.cumulative_us / 1000:8.1f} ms  {r.module}" for r in app_rows[:top]]
+    lines += ["", "Terceros (por paquete):"]
+    lines += [f"  {us / 1000:8.1f} ms  {pkg}" for pkg, us in third[:top]]
+    lazy = imported_lazy_modules(rows)
+    if lazy:
+        lines += ["", f"⚠️  importados al arrancar (deberían ser lazy): {', '.join(lazy)}"]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reporte de tiempo de import del arranque")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--target", default="app.main")
+    args = parser.parse_args()
+    print(format_report(profile_imports(args.target), top=args.top, target=args.target))
@@ -0,0 +1,157 @@
+# app/utils/compression.py
+"""
+Compresión de respuestas (gzip / brotli) para los JSON grandes y los PDFs que
+bajan los cobradores con datos móviles.
+
+- Sólo content-types de la allowlist y cuerpos >= COMPRESSION_MIN_SIZE bytes.
+- brotli si el cliente lo acepta y el paquete `brotli` está instalado; si no, gzip.
+- Respuestas con Content-Encoding propio, 204/304 o HEAD pasan tal cual.
+- Si la respuesta trae ETag fuerte, se le agrega el encoding ("abc" → "abc-gzip"):
+  cada representación tiene su propio ETag fuerte. `strip_encoding_suffix()`
+  lo revierte para comparar If-None-Match.
+"""
+from __future__ import annotations
+
+import gzip
+import os
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli es opcional
+    brotli = None
+
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))  # respuestas dinámicas: rápido > máximo
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/pdf",
+    "text/",
+    "application/javascript",
+    "application/xml",
+)
+
+_ETAG_SUFFIXES = ("-br", "-gzip")
+
+
+def strip_encoding_suffix(etag: str) -> str:
+    for suffix in _ETAG_SUFFIXES:
+        if etag.endswith(suffix + '"'):
+            return etag[: -len(suffix) - 1] + '"'
+    return etag
+
+
+def _is_compressible(content_type: str) -> bool:
+    ct = content_type.split(";", 1)[0].strip().lower()
+    return any(ct.startswith(t) for t in COMPRESSIBLE_TYPES)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Elige "br" / "gzip" según Accept-Encoding (respeta q=0)."""
+    accepted: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[token] = q
+
+    def _q(enc: str) -> float:
+        return accepted.get(enc, accepted.get("*", 0.0))
+
+    if brotli is not None and _q("br") > 0:
+        return "br"
+    if _q("gzip") > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """Middleware ASGI: bufferiza las respuestas comprimibles y las comprime al final."""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED or scope.get("method") == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        accept = ""
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept) if accept else None
+
+        start_message = None
+        chunks: list[bytes] = []
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+
+            if message["type"] == "http.response.start":
+                headers = {k.lower(): v for k, v in message.get("headers", [])}
+                ctype = headers.get(b"content-type", b"").decode("latin-1")
+                if (
+                    message["status"] in (204, 304)
+                    or b"content-encoding" in headers
+                    or not _is_compressible(ctype)
+                ):
+                    passthrough = True
+                    await send(message)
+                    return
+                start_message = message
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(chunks)
+            headers = [
+                (k, v) for k, v in start_message.get("headers", [])
+                if k.lower() not in (b"content-length", b"vary", b"etag")
+            ]
+            raw = {k.lower(): v for k, v in start_message.get("headers", [])}
+            vary = raw.get(b"vary", b"").decode("latin-1")
+            vary = f"{vary}, Accept-Encoding" if vary and "accept-encoding" not in vary.lower() else (vary or "Accept-Encoding")
+            headers.append((b"vary", vary.encode("latin-1")))
+
+            etag = raw.get(b"etag")
+            if encoding is not None and len(body) >= self.minimum_size:
+                body = compress(body, encoding)
+                headers.append((b"content-encoding", encoding.encode("latin-1")))
+                if etag is not None and etag.endswith(b'"') and not etag.startswith(b"W/"):
+                    etag = etag[:-1] + f"-{encoding}".encode("latin-1") + b'"'
+            if etag is not None:
+                headers.append((b"etag", etag))
+            headers.append((b"content-length", str(len(body)).encode("latin-1")))
+
+            await send({**start_message, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
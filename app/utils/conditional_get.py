@@ -0,0 +1,97 @@
+# app/utils/conditional_get.py
+"""
+GET condicional (If-None-Match → 304) para listados, sin volver a consultar.
+
+ETag fuerte = hash(ruta + query + usuario + día local + versión de datos de la
+empresa). La versión es la de response_cache (tabla company_data_versions,
+compartida entre workers): cualquier escritura que cambie lo que devuelve un
+listado llama `bump_company_version()` y todos los ETags de la empresa cambian,
+en todos los procesos.
+
+Uso: agregar `dependencies=[Depends(conditional_list)]` al endpoint. Si el
+cliente ya tiene la versión vigente se corta con 304 ANTES de ejecutar el
+endpoint; si no, el ETag queda en el request y `ETagMiddleware` lo agrega a la
+respuesta 200 (funciona también con StreamingResponse / fast_response, que no
+pasan por el `response` inyectado).
+"""
+from __future__ import annotations
+
+import os
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Request
+
+from app.models.models import Employee
+from app.utils.auth import get_current_user
+from app.utils.compression import strip_encoding_suffix
+from app.utils.response_cache import _etag_for, get_company_version, make_cache_key
+
+
+ETAGS_ENABLED = os.getenv("LIST_ETAGS_ENABLED", "true").lower() == "true"
+
+_STATE_KEY = "list_etag"
+_CACHE_CONTROL = "private, no-cache"
+
+
+def _matching_candidate(if_none_match: Optional[str], etag: str) -> Optional[str]:
+    """Devuelve el ETag que mandó el cliente si coincide (con o sin sufijo de encoding)."""
+    if not if_none_match:
+        return None
+    for candidate in (c.strip() for c in if_none_match.split(",")):
+        if candidate == "*" or strip_encoding_suffix(candidate) == etag:
+            return candidate
+    return None
+
+
+def conditional_list(request: Request, current: Employee = Depends(get_current_user)) -> None:
+    if not ETAGS_ENABLED or request.method != "GET":
+        return
+
+    params: dict[str, list[str]] = {}
+    for k, v in request.query_params.multi_items():
+        params.setdefault(k, []).append(v)
+
+    # el usuario entra en la clave: un cobrador ve sólo lo suyo con la misma URL
+    key = make_cache_key(
+        current.company_id,
+        f"{request.url.path}#{current.id}",
+        {k: sorted(v) for k, v in params.items()},
+        request.query_params.get("tz"),
+    )
+    etag = _etag_for(key, get_company_version(current.company_id))
+
+    matched = _matching_candidate(request.headers.get("if-none-match"), etag)
+    if matched is not None:
+        raise HTTPException(status_code=304, headers={"ETag": matched, "Cache-Control": _CACHE_CONTROL})
+
+    request.state.list_etag = etag
+
+
+class ETagMiddleware:
+    """Agrega el ETag calculado por `conditional_list` a las respuestas 200."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # request.state escribe en este mismo dict
+        state = scope.setdefault("state", {})
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                etag = state.get(_STATE_KEY)
+                if etag:
+                    headers = [
+                        (k, v) for k, v in message.get("headers", [])
+                        if k.lower() not in (b"etag", b"cache-control")
+                    ]
+                    headers.append((b"etag", etag.encode("latin-1")))
+                    headers.append((b"cache-control", _CACHE_CONTROL.encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,51 @@
+# app/utils/fast_json.py
+"""
+Serialización rápida para listados grandes (/loans/all, /installments/,
+/payments/all).
+
+El camino normal arma un modelo Pydantic por fila, FastAPI lo vuelve a validar
+contra `response_model` y lo codifica con json de la stdlib. En páginas grandes
+eso cuesta más CPU que la consulta. Los endpoints que optan por este camino
+arman dicts directo desde las tuplas del SQL (mismas claves y orden que el
+schema) y devuelven `fast_response(...)`: se serializa una sola vez con orjson
+(o con el serializador Rust de pydantic_core si orjson no está instalado).
+
+`response_model` se deja en el endpoint para OpenAPI; con
+FAST_JSON_RESPONSES=false se devuelven los dicts y FastAPI valida como antes.
+"""
+from __future__ import annotations
+
+import os
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic_core import to_json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None
+
+
+FAST_JSON_ENABLED = os.getenv("FAST_JSON_RESPONSES", "true").lower() == "true"
+
+# OPT_UTC_Z: "...Z" para UTC, igual que Pydantic (el front no ve diferencia)
+_ORJSON_OPTIONS = (orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS) if orjson is not None else 0
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=_ORJSON_OPTIONS)
+    return to_json(content)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def fast_response(content: Any) -> Any:
+    """Dicts/listas ya armados → respuesta serializada sin pasar por response_model."""
+    if not FAST_JSON_ENABLED:
+        return content
+    return FastJSONResponse(content)
@@ -1,149 +1,386 @@
+import threading
 from datetime import datetime, date
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, asc
+from typing import Optional
 
-from app.models.models import Loan, Installment, Payment, PaymentAllocation
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import and_, event, or_, asc, func, insert, inspect, select, update
 
-EPS = 1e-6
+from app.models.models import Loan, Purchase, Installment, Payment, PaymentAllocation
+from app.utils.money import from_cents, to_cents
+from app.utils.time_windows import AR_TZ
 
 from zoneinfo import ZoneInfo
 
-AR_TZ = ZoneInfo("America/Argentina/Tucuman")  # o importá tu AR_TZ real
+# =========================
+#   DEUDAS (debt_kind, debt_id)
+# =========================
+# El motor de imputación es el mismo para préstamos y ventas: cambia sólo la FK
+# con la que cuotas y pagos apuntan al "padre".
+DEBT_LOAN = "loan"
+DEBT_PURCHASE = "purchase"
 
-EPS = 1e-6
+_DEBT_FKS = {
+    DEBT_LOAN: (Installment.loan_id, Payment.loan_id),
+    DEBT_PURCHASE: (Installment.purchase_id, Payment.purchase_id),
+}
 
-def _set_status_from_amounts(ins: Installment, zone: ZoneInfo = AR_TZ) -> None:
-    amt = float(ins.amount or 0.0)
-    paid = float(ins.paid_amount or 0.0)
-    bal = max(amt - paid, 0.0)
-    fully_paid = bal <= EPS
+DEBT_MODELS = {
+    DEBT_LOAN: Loan,
+    DEBT_PURCHASE: Purchase,
+}
+
+
+def debt_of(payment: Payment) -> Optional[tuple[str, int]]:
+    """(debt_kind, debt_id) del pago, o None si no está asociado a nada."""
+    if payment.loan_id:
+        return DEBT_LOAN, payment.loan_id
+    if payment.purchase_id:
+        return DEBT_PURCHASE, payment.purchase_id
+    return None
+
+
+def _fks(debt_kind: str):
+    try:
+        return _DEBT_FKS[debt_kind]
+    except KeyError:
+        raise ValueError(f"debt_kind inválido: {debt_kind!r}")
+
+
+# =========================
+#   LOCK POR DEUDA
+# =========================
+# Toda escritura que toque cuotas/pagos/saldo de una deuda (pagar, anular,
+# refinanciar, cancelar, editar) toma primero este lock, así dos cobradores
+# sobre el mismo préstamo se serializan en vez de pisarse.
+#   - Postgres: SELECT ... FOR UPDATE sobre la fila del préstamo/venta.
+#   - SQLite (dev/tests): no tiene FOR UPDATE → lock en memoria por (kind, id).
+# En ambos casos el lock vive hasta el commit/rollback de la sesión.
+_local_locks: dict[tuple[str, int], threading.Lock] = {}
+_local_locks_guard = threading.Lock()
+_HELD_KEY = "ledger_debt_locks"
+
+
+def _local_lock_for(key: tuple[str, int]) -> threading.Lock:
+    with _local_locks_guard:
+        lock = _local_locks.get(key)
+        if lock is None:
+            lock = _local_locks[key] = threading.Lock()
+        return lock
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _release_local_locks(session: Session, transaction) -> None:
+    # sólo al cerrar la transacción raíz (commit, rollback o close)
+    if transaction.parent is not None:
+        return
+    held = session.info.pop(_HELD_KEY, None)
+    if not held:
+        return
+    for key in held:
+        _local_lock_for(key).release()
+
+
+def lock_debt(db: Session, debt_kind: str, debt_id: int):
+    """
+    Bloquea la deuda hasta el fin de la transacción y devuelve la fila del
+    préstamo/venta recargada (post-lock), o None si no existe.
+    Reentrante dentro de la misma sesión.
+    """
+    model = DEBT_MODELS.get(debt_kind)
+    if model is None:
+        raise ValueError(f"debt_kind inválido: {debt_kind!r}")
+    if not debt_id:
+        return None
 
-    # helpers
-    status = (getattr(ins, "status", None) or "").lower()
+    if db.get_bind().dialect.name == "sqlite":
+        key = (debt_kind, int(debt_id))
+        held = db.info.setdefault(_HELD_KEY, set())
+        if key not in held:
+            _local_lock_for(key).acquire()
+            held.add(key)
+        return db.query(model).populate_existing().filter(model.id == debt_id).one_or_none()
 
-    # calcular due_day local (si hay due_date)
-    due_dt = getattr(ins, "due_date", None)
-    due_local_day = None
+    return (
+        db.query(model)
+        .populate_existing()
+        .filter(model.id == debt_id)
+        .with_for_update()
+        .one_or_none()
+    )
+
+
+def lock_loan(db: Session, loan_id: int) -> Optional[Loan]:
+    return lock_debt(db, DEBT_LOAN, loan_id)
+
+
+def lock_purchase(db: Session, purchase_id: int) -> Optional[Purchase]:
+    return lock_debt(db, DEBT_PURCHASE, purchase_id)
+
+
+# =========================
+#   ESTADO DE CUOTA
+# =========================
+def _due_local_day(due_dt, zone: ZoneInfo) -> Optional[date]:
     if isinstance(due_dt, datetime):
         try:
-            due_local_day = due_dt.astimezone(zone).date()
+            return due_dt.astimezone(zone).date()
         except Exception:
-            due_local_day = due_dt.date()
-    elif isinstance(due_dt, date):
-        due_local_day = due_dt
+            return due_dt.date()
+    if isinstance(due_dt, date):
+        return due_dt
+    return None
 
-    today_local = datetime.now(zone).date()
 
-    # --- status / is_paid ---
-    if fully_paid:
-        ins.status = "paid"
-        ins.is_paid = True
-        # ✅ si está paga, nunca overdue
-        if hasattr(ins, "is_overdue"):
-            ins.is_overdue = False
-        return
+def _derive_state(
+    amount_c: int,
+    paid_c: int,
+    status: Optional[str],
+    due_dt,
+    today_local: date,
+    zone: ZoneInfo = AR_TZ,
+) -> tuple[Optional[str], bool, bool]:
+    """
+    (status, is_paid, is_overdue) derivados de montos (en centavos) + vencimiento.
+    Misma regla para el replay completo y para la imputación incremental.
+    """
+    # ✅ si está paga, nunca overdue
+    if paid_c >= amount_c:
+        return "paid", True, False
 
-    ins.is_paid = False
+    # si está cancelada/refinanciada, no overdue y status se mantiene
+    if (status or "").lower() in {"cancelled", "canceled", "refinanced"}:
+        return status, False, False
 
-    # si está cancelada/refinanciada, no overdue y status se mantiene (o lo seteo)
-    if status in {"cancelled", "canceled", "refinanced"}:
-        if hasattr(ins, "is_overdue"):
-            ins.is_overdue = False
-        return
+    due_local_day = _due_local_day(due_dt, zone)
+    is_late = bool(due_local_day and due_local_day < today_local)
 
-    # --- status derivado ---
-    if paid > EPS:
-        ins.status = "partial"
+    if paid_c > 0:
+        new_status = "partial"
+    elif is_late:
+        new_status = "overdue"
     else:
-        if due_local_day and due_local_day < today_local:
-            ins.status = "overdue"
-        else:
-            ins.status = "pending"
+        new_status = "pending"
 
     # ✅ is_overdue derivado por saldo + vencimiento
+    return new_status, False, is_late
+
+
+def _set_status_from_amounts(ins: Installment, zone: ZoneInfo = AR_TZ) -> None:
+    status, is_paid, is_overdue = _derive_state(
+        to_cents(ins.amount),
+        to_cents(ins.paid_amount),
+        getattr(ins, "status", None),
+        getattr(ins, "due_date", None),
+        datetime.now(zone).date(),
+        zone,
+    )
+    ins.status = status
+    ins.is_paid = is_paid
     if hasattr(ins, "is_overdue"):
-        ins.is_overdue = bool(due_local_day and due_local_day < today_local and bal > EPS)
+        ins.is_overdue = is_overdue
 
 
+# =========================
+#   MOTOR DE IMPUTACIÓN
+# =========================
+def _load_installments(db: Session, inst_fk, debt_id: int, only_open: bool = False) -> list[dict]:
+    q = db.query(
+        Installment.id,
+        Installment.amount,
+        Installment.paid_amount,
+        Installment.status,
+        Installment.is_paid,
+        Installment.is_overdue,
+        Installment.due_date,
+    ).filter(inst_fk == debt_id)
+    if only_open:
+        q = q.filter(func.coalesce(Installment.paid_amount, 0) < func.coalesce(Installment.amount, 0))
+    rows = q.order_by(Installment.number.asc(), Installment.id.asc()).all()
+    return [
+        {
+            "id": r.id,
+            "amount_c": to_cents(r.amount),
+            "paid_c": to_cents(r.paid_amount),
+            "status": r.status,
+            "is_paid": bool(r.is_paid),
+            "is_overdue": bool(r.is_overdue),
+            "due_date": r.due_date,
+            "_orig": (r.paid_amount, r.status, r.is_paid, r.is_overdue),
+        }
+        for r in rows
+    ]
 
 
-def recompute_ledger_for_loan(db: Session, loan_id: int) -> None:
+def _allocate(installments: list[dict], payments) -> list[dict]:
     """
-    Recalcula TODO el estado de cuotas del préstamo:
-      - Resetea paid_amount/status de cada cuota.
-      - Borra allocations previas del préstamo.
-      - Aplica pagos NO anulados por fecha y crea PaymentAllocation por cada imputación.
+    Imputa pagos (id, amount) en orden sobre las cuotas en orden de número.
+    Las cuotas se llenan de a una, así que alcanza con un cursor: O(pagos + cuotas).
+    Todo en centavos enteros. Muta paid_c de cada cuota y devuelve las filas
+    de PaymentAllocation.
     """
-    if not loan_id:
-        return
+    allocations = []
+    i = 0
+    n = len(installments)
+    for payment_id, amount in payments:
+        remaining = to_cents(amount)
+        while remaining > 0 and i < n:
+            ins = installments[i]
+            pending = ins["amount_c"] - ins["paid_c"]
+            if pending <= 0:
+                i += 1
+                continue
+            take = pending if pending < remaining else remaining
+            ins["paid_c"] += take
+            allocations.append({
+                "payment_id": payment_id,
+                "installment_id": ins["id"],
+                "amount_applied": from_cents(take),
+            })
+            remaining -= take
+    return allocations
 
-    # 1) Traer préstamo y cuotas
-    loan = db.query(Loan).get(loan_id)
-    if not loan:
+
+def _write_installments(db: Session, installments: list[dict], zone: ZoneInfo = AR_TZ) -> list[dict]:
+    """UPDATE en bloque (por PK) sólo de las cuotas que cambiaron. Devuelve esas filas."""
+    today_local = datetime.now(zone).date()
+    changed = []
+    for ins in installments:
+        status, is_paid, is_overdue = _derive_state(
+            ins["amount_c"], ins["paid_c"], ins["status"], ins["due_date"], today_local, zone
+        )
+        old_paid, old_status, old_is_paid, old_is_overdue = ins["_orig"]
+        if (
+            old_paid is None
+            or to_cents(old_paid) != ins["paid_c"]
+            or old_status != status
+            or bool(old_is_paid) != is_paid
+            or bool(old_is_overdue) != is_overdue
+        ):
+            changed.append({
+                "id": ins["id"],
+                "paid_amount": from_cents(ins["paid_c"]),
+                "status": status,
+                "is_paid": is_paid,
+                "is_overdue": is_overdue,
+            })
+    if changed:
+        db.execute(update(Installment), changed)
+    return changed
+
+
+def _sync_loaded_installments(db: Session, changed: list[dict]) -> None:
+    """
+    Las escrituras en bloque no pasan por el identity map: copiamos el estado
+    escrito a las cuotas ya cargadas, así quien las devuelva no tiene que releerlas.
+    """
+    if not changed:
         return
+    by_id = {c["id"]: c for c in changed}
+    for obj in list(db.identity_map.values()):
+        if isinstance(obj, Installment):
+            key = inspect(obj).identity
+            row = by_id.get(key[0]) if key else None
+            if row is None:
+                continue
+            for attr, value in row.items():
+                if attr != "id":
+                    set_committed_value(obj, attr, value)
 
-    installments = (
-        db.query(Installment)
-        .filter(Installment.loan_id == loan_id)
-        .order_by(Installment.number.asc())
-        .all()
-    )
 
-    # 2) Reset de cuotas (paid_amount y status)
-    for ins in installments:
-        ins.paid_amount = 0.0
-        _set_status_from_amounts(ins)
-    db.flush()
+def recompute_ledger(db: Session, debt_kind: str, debt_id: int) -> list[dict]:
+    """
+    Recalcula TODO el estado de cuotas de un préstamo o venta:
+      - Reimputa los pagos NO anulados por fecha/id sobre las cuotas en orden.
+      - Reemplaza las allocations de las cuotas de la deuda.
+      - Escribe en bloque sólo las cuotas que cambiaron.
+    No commitea. Devuelve las allocations escritas.
+    """
+    if not debt_id:
+        return []
+    inst_fk, pay_fk = _fks(debt_kind)
 
-    # 3) Borrar allocations previas del PRÉSTAMO (no sólo de un pago)
-    db.query(PaymentAllocation).filter(
-        PaymentAllocation.payment_id.in_(
-            db.query(Payment.id).filter(
-                Payment.loan_id == loan_id,
-                Payment.is_voided.is_(False)
-            )
-        )
-    ).delete(synchronize_session=False)
+    # pagos/cuotas pendientes de flush tienen que entrar al replay
     db.flush()
 
-    # 4) Listar pagos NO anulados por fecha/id (orden estable)
+    installments = _load_installments(db, inst_fk, debt_id)
+    for ins in installments:
+        ins["paid_c"] = 0
+
     payments = (
-        db.query(Payment)
-        .filter(Payment.loan_id == loan_id, Payment.is_voided.is_(False))
+        db.query(Payment.id, Payment.amount)
+        .filter(pay_fk == debt_id, Payment.is_voided.is_(False))
         .order_by(asc(Payment.payment_date), asc(Payment.id))
         .all()
     )
+    allocations = _allocate(installments, payments)
 
-    # 5) Aplicar pagos generando allocations
-    for pay in payments:
-        remaining = float(pay.amount or 0.0)
-        if remaining <= EPS:
-            continue
+    db.query(PaymentAllocation).filter(
+        PaymentAllocation.installment_id.in_(select(Installment.id).where(inst_fk == debt_id))
+    ).delete(synchronize_session=False)
+    if allocations:
+        db.execute(insert(PaymentAllocation), allocations)
 
-        for ins in installments:
-            if remaining <= EPS:
-                break
+    changed = _write_installments(db, installments)
+    db.flush()
+    _sync_loaded_installments(db, changed)
+    return allocations
 
-            amt = float(ins.amount or 0.0)
-            paid = float(ins.paid_amount or 0.0)
-            pending = max(amt - paid, 0.0)
-            if pending <= EPS:
-                continue
 
-            take = min(pending, remaining)
-            if take > EPS:
-                # subir imputación
-                ins.paid_amount = float(paid + take)
-                db.add(PaymentAllocation(
-                    payment_id=pay.id,
-                    installment_id=ins.id,
-                    amount_applied=take,
-                ))
-                remaining -= take
-                # refrescar status de la cuota
-                _set_status_from_amounts(ins, zone=AR_TZ)
-
-    # 6) (Opcional) actualizar algo en Loan si tenés campos agregados
-    # Ej.: loan.status global, etc. Si ya lo resolvés con otra utilidad, omití esto.
+def apply_payment_to_ledger(db: Session, payment: Payment) -> list[dict]:
+    """
+    Imputa un pago recién registrado.
+
+    Caso normal (es el último pago de la deuda y el ledger está al día): sólo
+    recorre las cuotas abiertas y agrega las allocations de ESTE pago.
+    Si el pago tiene fecha anterior a otros, ya tiene allocations o el ledger no
+    cuadra (ej. ventas cobradas antes de tener allocations): replay completo.
+    No commitea. Devuelve las allocations de este pago.
+    """
+    debt = debt_of(payment)
+    if debt is None or payment.is_voided:
+        return []
+    debt_kind, debt_id = debt
+    inst_fk, pay_fk = _fks(debt_kind)
 
     db.flush()
+
+    later = and_(
+        pay_fk == debt_id,
+        Payment.is_voided.is_(False),
+        or_(
+            Payment.payment_date > payment.payment_date,
+            and_(Payment.payment_date == payment.payment_date, Payment.id > payment.id),
+        ),
+    )
+    paid_sum, prior_sum, later_count, own_allocs = db.execute(
+        select(
+            select(func.coalesce(func.sum(Installment.paid_amount), 0.0)).where(inst_fk == debt_id).scalar_subquery(),
+            select(func.coalesce(func.sum(Payment.amount), 0.0))
+            .where(pay_fk == debt_id, Payment.is_voided.is_(False), Payment.id != payment.id)
+            .scalar_subquery(),
+            select(func.count(Payment.id)).where(later).scalar_subquery(),
+            select(func.count(PaymentAllocation.id)).where(PaymentAllocation.payment_id == payment.id).scalar_subquery(),
+        )
+    ).one()
+
+    if later_count or own_allocs or to_cents(paid_sum) != to_cents(prior_sum):
+        allocations = recompute_ledger(db, debt_kind, debt_id)
+        return [a for a in allocations if a["payment_id"] == payment.id]
+
+    installments = _load_installments(db, inst_fk, debt_id, only_open=True)
+    allocations = _allocate(installments, [(payment.id, payment.amount)])
+    if allocations:
+        db.execute(insert(PaymentAllocation), allocations)
+    changed = _write_installments(db, installments)
+    db.flush()
+    _sync_loaded_installments(db, changed)
+    return allocations
+
+
+def recompute_ledger_for_loan(db: Session, loan_id: int) -> None:
+    recompute_ledger(db, DEBT_LOAN, loan_id)
+
+
+def recompute_ledger_for_purchase(db: Session, purchase_id: int) -> None:
+    recompute_ledger(db, DEBT_PURCHASE, purchase_id)
@@ -0,0 +1,53 @@
+# app/utils/money.py
+"""
+Dinero: NUMERIC(14,2) en la base y centavos enteros en los loops.
+
+- `Money` es el tipo de columna para montos. En Postgres es NUMERIC(14,2)
+  (sumas exactas, sin 99.99999997); hacia Python sigue devolviendo float para
+  no cambiar contratos de API ni la aritmética existente en las rutas.
+- El ledger y los agregados trabajan en centavos `int` (to_cents/from_cents):
+  comparaciones exactas, sin EPS. `to_cents` redondea mitad hacia arriba
+  (lejos del cero) sobre la representación decimal, igual que
+  `round(numeric, 2)` de Postgres en la migración 5d7a1e9c0b34.
+"""
+from __future__ import annotations
+
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, Optional
+
+from sqlalchemy import Numeric
+from sqlalchemy.types import TypeDecorator
+
+
+MONEY_PRECISION = 14
+MONEY_SCALE = 2
+_CENT = Decimal("0.01")
+
+
+class Money(TypeDecorator):
+    """NUMERIC(14,2) ↔ float. Redondea a centavos al escribir (también en SQLite)."""
+
+    impl = Numeric(MONEY_PRECISION, MONEY_SCALE, asdecimal=False)
+    cache_ok = True
+
+    def process_bind_param(self, value: Any, dialect) -> Optional[float]:
+        if value is None:
+            return None
+        return from_cents(to_cents(value))
+
+    def process_result_value(self, value: Any, dialect) -> Optional[float]:
+        if value is None:
+            return None
+        return float(value)
+
+
+def to_cents(value: Any) -> int:
+    """Monto (float/Decimal/str/None) → centavos enteros; 0.125 → 13 (no 12 como round())."""
+    if value is None:
+        return 0
+    # str(): 2.675 es 2.67499999... en binario, pero se escribe "2.675"
+    return int(Decimal(str(value)).quantize(_CENT, rounding=ROUND_HALF_UP) * 100)
+
+
+def from_cents(cents: int) -> float:
+    return cents / 100
@@ -0,0 +1,294 @@
+# app/utils/response_cache.py
+"""
+Cache de respuestas para los endpoints de resumen (dashboard / summaries).
+
+- Clave: (company_id, endpoint, params normalizados, tz, día local).
+- Cada empresa tiene un contador de versión de datos que se incrementa en cada
+  escritura relevante (pagos, anulaciones, alta/cancelación/refinanciación de
+  préstamos...). Una entrada cacheada sólo se usa si fue calculada con la
+  versión vigente, así que no hace falta invalidar clave por clave.
+- ETag = hash(clave + versión). Si el cliente manda If-None-Match igual,
+  respondemos 304 sin correr la consulta.
+
+La versión vive en la tabla `company_data_versions` (DatabaseVersionStore):
+con varios workers / máquinas todos leen el mismo contador, así que una
+escritura en un worker invalida los ETags y las entradas de todos. Leerla es
+un SELECT por PK; el bump es un UPDATE corto después del commit. Los payloads
+cacheados sí son por proceso (TTL + LRU), pero van etiquetados con la versión:
+nunca se sirve uno de una versión vieja.
+
+`InMemoryCacheStore` (versiones en memoria) queda para un solo proceso / tests;
+`set_cache_store()` permite registrar otro store (ej. Redis) con la misma interfaz.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Optional, Protocol
+from zoneinfo import ZoneInfo
+
+from fastapi import Request, Response
+
+from app.utils.time_windows import AR_TZ
+
+logger = logging.getLogger("uvicorn.error")
+
+CACHE_TTL_SECONDS = int(os.getenv("SUMMARY_CACHE_TTL_SECONDS", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "2048"))
+CACHE_ENABLED = os.getenv("SUMMARY_CACHE_ENABLED", "true").lower() == "true"
+
+
+# =========================
+#        STORES
+# =========================
+class CacheStore(Protocol):
+    def get(self, key: str) -> Any: ...
+    def set(self, key: str, value: Any, ttl: int) -> None: ...
+    def get_version(self, company_id: int) -> int: ...
+    def bump_version(self, company_id: int) -> int: ...
+    def bump_all(self) -> None: ...
+
+
+class InMemoryCacheStore:
+    """LRU con TTL por entrada + contadores de versión por empresa (thread-safe)."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._versions: dict[int, int] = {}
+        # Piso de versión: arranca en µs desde epoch para que un reinicio del
+        # proceso nunca repita una versión (y un ETag) ya entregado.
+        self._floor = time.time_ns() // 1000
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                self._data.pop(key, None)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def get_version(self, company_id: int) -> int:
+        with self._lock:
+            return self._versions.get(company_id, self._floor)
+
+    def bump_version(self, company_id: int) -> int:
+        with self._lock:
+            v = self._versions.get(company_id, self._floor) + 1
+            self._versions[company_id] = v
+            return v
+
+    def bump_all(self) -> None:
+        with self._lock:
+            self._floor = max([self._floor, *self._versions.values()]) + 1
+            self._versions.clear()
+            self._data.clear()
+
+
+class DatabaseVersionStore(InMemoryCacheStore):
+    """
+    Payloads en memoria del proceso; versiones por empresa en la tabla
+    `company_data_versions` (compartidas entre workers y reinicios).
+    Mismo patrón que el lease del scheduler: UPDATE atómico y, si la fila no
+    existe, INSERT (si otro la insertó primero, se reintenta el UPDATE).
+    """
+
+    def __init__(self, session_factory=None, max_entries: int = CACHE_MAX_ENTRIES):
+        super().__init__(max_entries=max_entries)
+        self._session_factory = session_factory
+
+    def _session(self):
+        if self._session_factory is None:
+            from app.database.db import SessionLocal  # import diferido: sin DB al importar rutas
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    def get_version(self, company_id: int) -> int:
+        from app.models.models import CompanyDataVersion
+
+        with self._session() as db:
+            v = db.query(CompanyDataVersion.version).filter(CompanyDataVersion.company_id == company_id).scalar()
+        return int(v or 0)
+
+    def bump_version(self, company_id: int) -> int:
+        from sqlalchemy.exc import IntegrityError
+        from app.models.models import CompanyDataVersion
+
+        with self._session() as db:
+            for _ in range(2):
+                updated = (
+                    db.query(CompanyDataVersion)
+                    .filter(CompanyDataVersion.company_id == company_id)
+                    .update({CompanyDataVersion.version: CompanyDataVersion.version + 1}, synchronize_session=False)
+                )
+                if not updated:
+                    db.add(CompanyDataVersion(company_id=company_id, version=1))
+                try:
+                    db.commit()
+                    break
+                except IntegrityError:
+                    db.rollback()  # otro worker insertó la fila: reintentar el UPDATE
+            v = db.query(CompanyDataVersion.version).filter(CompanyDataVersion.company_id == company_id).scalar()
+        return int(v or 0)
+
+    def bump_all(self) -> None:
+        from app.models.models import Company, CompanyDataVersion
+
+        with self._session() as db:
+            db.query(CompanyDataVersion).update(
+                {CompanyDataVersion.version: CompanyDataVersion.version + 1}, synchronize_session=False
+            )
+            missing = (
+                db.query(Company.id)
+                .outerjoin(CompanyDataVersion, CompanyDataVersion.company_id == Company.id)
+                .filter(CompanyDataVersion.company_id.is_(None))
+                .all()
+            )
+            db.add_all(CompanyDataVersion(company_id=cid, version=1) for (cid,) in missing)
+            db.commit()
+        with self._lock:
+            self._data.clear()
+
+
+_store: CacheStore = DatabaseVersionStore()
+
+
+def get_cache_store() -> CacheStore:
+    return _store
+
+
+def set_cache_store(store: CacheStore) -> None:
+    global _store
+    _store = store
+
+
+# =========================
+#   VERSIÓN POR EMPRESA
+# =========================
+def get_company_version(company_id: int) -> int:
+    return _store.get_version(int(company_id))
+
+
+def bump_company_version(company_id: Optional[int]) -> None:
+    """Llamar DESPUÉS del commit de cualquier escritura que cambie los resúmenes."""
+    if company_id is None:
+        return
+    try:
+        _store.bump_version(int(company_id))
+    except Exception:
+        # la escritura ya está commiteada: no la convertimos en un 500
+        logger.exception("❌ No se pudo incrementar la versión de datos de la empresa %s", company_id)
+
+
+def bump_all_company_versions() -> None:
+    """Para jobs que tocan todas las empresas (ej. marcar vencidas)."""
+    _store.bump_all()
+
+
+# =========================
+#        HELPERS
+# =========================
+def _norm_value(v: Any) -> Any:
+    if isinstance(v, (date, datetime)):
+        return v.isoformat()
+    if isinstance(v, str):
+        return v.strip()
+    return v
+
+
+def make_cache_key(company_id: int, endpoint: str, params: dict, tz: Optional[str]) -> str:
+    # Parámetros vacíos se descartan: ?province= y sin province son la misma consulta
+    clean = {k: _norm_value(v) for k, v in sorted(params.items()) if v is not None and v != ""}
+    zone = ZoneInfo(tz) if tz else AR_TZ
+    # El "hoy" local entra en la clave: vencidas/pendientes cambian al pasar la medianoche
+    today_local = datetime.now(zone).date().isoformat()
+    raw = json.dumps([company_id, endpoint, clean, zone.key, today_local], sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _etag_for(key: str, version: int) -> str:
+    return '"' + hashlib.sha1(f"{key}:{version}".encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
+
+
+class SummaryCache:
+    """
+    Uso en un endpoint:
+
+        cache = SummaryCache(request, response, current.company_id, "payments.summary", params, tz)
+        hit = cache.lookup()
+        if hit is not None:
+            return hit
+        ... calcular ...
+        return cache.store(resultado)
+    """
+
+    def __init__(
+        self,
+        request: Request,
+        response: Response,
+        company_id: int,
+        endpoint: str,
+        params: dict,
+        tz: Optional[str] = None,
+    ):
+        self.request = request
+        self.response = response
+        self.company_id = int(company_id)
+        self.key = make_cache_key(self.company_id, endpoint, params, tz)
+        self.version = get_company_version(self.company_id)
+        self.etag = _etag_for(self.key, self.version)
+
+    def _set_headers(self, resp: Response) -> None:
+        resp.headers["ETag"] = self.etag
+        # private: la respuesta depende del token; no-cache: siempre revalidar
+        resp.headers["Cache-Control"] = "private, no-cache"
+
+    def lookup(self) -> Any:
+        if not CACHE_ENABLED:
+            return None
+
+        if _etag_matches(self.request.headers.get("if-none-match"), self.etag):
+            not_modified = Response(status_code=304)
+            self._set_headers(not_modified)
+            return not_modified
+
+        cached = _store.get(self.key)
+        if cached is None:
+            return None
+        version, payload = cached
+        if version != self.version:
+            return None
+        self._set_headers(self.response)
+        return payload
+
+    def store(self, payload: Any) -> Any:
+        if CACHE_ENABLED:
+            _store.set(self.key, (self.version, payload), CACHE_TTL_SECONDS)
+            self._set_headers(self.response)
+        return payload
+
@@ -0,0 +1,219 @@
+# app/utils/search.py
+"""
+Búsqueda de clientes (y de todo lo que se busca "por cliente": préstamos,
+pagos, cuotas).
+
+Cada Customer guarda columnas desnormalizadas que mantiene el ORM (ver
+`customer_search_fields`):
+  - search_text: nombre + apellido + dirección + provincia + teléfono + DNI,
+    en minúsculas, sin acentos y con espacios colapsados.
+  - phone_norm / dni_norm: sólo dígitos (teléfono sin 0 / 54 inicial).
+
+En Postgres `search_text` tiene un índice GIN pg_trgm, así que los
+`LIKE '%term%'` por token usan índice, y el ranking es `similarity()` de pg_trgm.
+En SQLite (tests/dev) registramos una `similarity()` en Python con el mismo
+algoritmo de trigramas: el SQL es el mismo en ambos motores.
+
+Si el Postgres no tiene la extensión pg_trgm (ver `trigram_available`, se
+chequea al arrancar y una vez por engine) el ranking queda en exacto > prefijo,
+sin similitud: los LIKE siguen funcionando, sólo que sin índice.
+"""
+from __future__ import annotations
+
+import logging
+import re
+import sqlite3
+import unicodedata
+import weakref
+from typing import Any, Optional
+
+from sqlalchemy import and_, case, event, func, literal, text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("uvicorn.error")
+
+
+_WS_RE = re.compile(r"\s+")
+_NON_DIGIT_RE = re.compile(r"\D")
+_PHONE_LIKE_RE = re.compile(r"^[\d\s()+\-.]+$")
+_WORD_RE = re.compile(r"[^\W_]+")
+
+# mínimo de dígitos para tratar la búsqueda como teléfono/DNI completo
+_MIN_EXACT_DIGITS = 6
+
+
+# =========================
+#     NORMALIZACIÓN
+# =========================
+def normalize_text(value: Optional[str]) -> str:
+    """minúsculas, sin acentos (Peña → pena), espacios colapsados."""
+    if not value:
+        return ""
+    s = unicodedata.normalize("NFKD", str(value))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return _WS_RE.sub(" ", s).strip().lower()
+
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    """Sólo dígitos, sin 0 inicial ni prefijo país 54."""
+    if not phone:
+        return None
+    digits = _NON_DIGIT_RE.sub("", phone)
+    if digits.startswith("0"):
+        digits = digits[1:]
+    if digits.startswith("54") and len(digits) > 10:
+        digits = digits[2:]
+    return digits
+
+
+def normalize_dni(dni: Optional[str]) -> Optional[str]:
+    """DNI sin puntos/espacios (30.123.456 → 30123456)."""
+    if not dni:
+        return None
+    digits = _NON_DIGIT_RE.sub("", str(dni))
+    return digits or None
+
+
+def customer_search_fields(
+    first_name: Optional[str] = None,
+    last_name: Optional[str] = None,
+    phone: Optional[str] = None,
+    dni: Optional[str] = None,
+    address: Optional[str] = None,
+    province: Optional[str] = None,
+    **_ignored: Any,
+) -> dict:
+    """Columnas desnormalizadas de búsqueda para un cliente (insert/update/backfill)."""
+    phone_norm = normalize_phone(phone) or None
+    dni_norm = normalize_dni(dni)
+    parts = [first_name, last_name, address, province, phone_norm, dni_norm]
+    return {
+        "search_text": normalize_text(" ".join(p for p in parts if p)) or None,
+        "phone_norm": phone_norm,
+        "dni_norm": dni_norm,
+    }
+
+
+# =========================
+#   TRIGRAMAS (fallback)
+# =========================
+def trigrams(value: Optional[str]) -> set[str]:
+    """Mismo criterio que pg_trgm: por palabra, con 2 espacios adelante y 1 atrás."""
+    out: set[str] = set()
+    for word in _WORD_RE.findall(normalize_text(value)):
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            out.add(padded[i:i + 3])
+    return out
+
+
+def trigram_similarity(a: Optional[str], b: Optional[str]) -> float:
+    ta, tb = trigrams(a), trigrams(b)
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+@event.listens_for(Engine, "connect")
+def _register_sqlite_similarity(dbapi_conn, _record) -> None:
+    if isinstance(dbapi_conn, sqlite3.Connection):
+        dbapi_conn.create_function("similarity", 2, trigram_similarity, deterministic=True)
+
+
+_trigram_support: "weakref.WeakKeyDictionary[Engine, bool]" = weakref.WeakKeyDictionary()
+
+
+def trigram_available(bind) -> bool:
+    """
+    ¿Se puede usar `similarity()`? En SQLite siempre (la registramos arriba); en
+    Postgres sólo si está instalada pg_trgm. Se consulta una vez por engine.
+    """
+    engine = getattr(bind, "engine", bind)
+    if engine.dialect.name != "postgresql":
+        return True
+    cached = _trigram_support.get(engine)
+    if cached is None:
+        with engine.connect() as conn:
+            cached = conn.execute(
+                text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            ).first() is not None
+        _trigram_support[engine] = cached
+        if not cached:
+            logger.warning("⚠️ pg_trgm no está instalada: búsqueda de clientes sin ranking por similitud")
+    return cached
+
+
+# =========================
+#       CONSULTA
+# =========================
+class SearchQuery:
+    """Texto de búsqueda ya normalizado: tokens para filtrar + forma exacta de teléfono/DNI."""
+
+    def __init__(self, raw: Optional[str]):
+        self.raw = (raw or "").strip()
+        self.text = normalize_text(self.raw)
+        self.exact_digits: Optional[str] = None
+
+        if self.raw and _PHONE_LIKE_RE.match(self.raw):
+            digits = _NON_DIGIT_RE.sub("", self.raw)
+            if len(digits) >= _MIN_EXACT_DIGITS:
+                # "0381 555-1234" y "+54 381 5551234" → un único token de dígitos
+                self.exact_digits = digits
+                self.tokens = [normalize_phone(digits) or digits]
+                return
+        self.tokens = [t for t in self.text.split(" ") if t]
+
+    def __bool__(self) -> bool:
+        return bool(self.tokens)
+
+    @property
+    def id_value(self) -> Optional[int]:
+        """Si la búsqueda es un número corto, puede ser un ID (préstamo/pago)."""
+        return int(self.raw) if self.raw.isdigit() and len(self.raw) < 10 else None
+
+
+def _like_escape(token: str) -> str:
+    return token.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def match_clause(search: SearchQuery, customer):
+    """
+    Todos los tokens deben aparecer en search_text del cliente (`customer` puede
+    ser Customer o un aliased(Customer)). Teléfono/DNI exactos matchean siempre.
+    """
+    conds = [
+        customer.search_text.like(f"%{_like_escape(tok)}%", escape="\\")
+        for tok in search.tokens
+    ]
+    clause = and_(*conds)
+    if search.exact_digits:
+        phone = normalize_phone(search.exact_digits)
+        clause = clause | (customer.phone_norm == phone) | (customer.dni_norm == search.exact_digits)
+    return clause
+
+
+def rank_expr(search: SearchQuery, customer, trigram: bool = True):
+    """
+    Ranking (mayor = mejor): teléfono/DNI exacto > nombre que empieza con la
+    búsqueda > similitud por trigramas (sólo con `trigram`, ver `trigram_available`).
+    """
+    if trigram:
+        sim = func.coalesce(func.similarity(customer.search_text, literal(search.text)), 0.0)
+    else:
+        sim = literal(0.0)
+    boosts = []
+    if search.exact_digits:
+        phone = normalize_phone(search.exact_digits)
+        boosts.append(
+            case(
+                ((customer.phone_norm == phone) | (customer.dni_norm == search.exact_digits), 2.0),
+                else_=0.0,
+            )
+        )
+    boosts.append(
+        case((customer.search_text.like(f"{_like_escape(search.text)}%", escape="\\"), 1.0), else_=0.0)
+    )
+    expr = sim
+    for b in boosts:
+        expr = expr + b
+    return expr
@@ -6,8 +6,7 @@ from sqlalchemy import func, case
 
 from app.models.models import Loan, Purchase, Installment
 from app.constants import InstallmentStatus, LoanStatus
-
-EPS = 1e-6
+from app.utils.money import from_cents, to_cents
 
 
 def _aggregates_for(
@@ -83,7 +82,7 @@ def _derive_loan_status_from_counts(
       - Si hay al menos una overdue (y no todo pagado) -> DEFAULTED
       - En otro caso -> ACTIVE
     """
-    all_cleared = (total_amount - total_paid) <= EPS and (cnt_pending + cnt_partial + cnt_overdue) == 0
+    all_cleared = to_cents(total_paid) >= to_cents(total_amount) and (cnt_pending + cnt_partial + cnt_overdue) == 0
     if all_cleared:
         return LoanStatus.PAID.value
 
@@ -94,8 +93,15 @@ def _derive_loan_status_from_counts(
 
 
 def update_status_if_fully_paid(db: Session, loan_id: int | None, purchase_id: int | None):
+    """Igual que refresh_debt_status, y commitea."""
+    refresh_debt_status(db, loan_id=loan_id, purchase_id=purchase_id)
+    db.commit()
+
+
+def refresh_debt_status(db: Session, loan_id: int | None = None, purchase_id: int | None = None):
     """
     Recalcula estado y total_due para Loan y/o Purchase usando agregados de cuotas.
+    No commitea.
 
     Importante:
       - Nunca sobreescribe estados terminales manuales en Loan/Purchase:
@@ -123,7 +129,7 @@ def update_status_if_fully_paid(db: Session, loan_id: int | None, purchase_id: i
                 )
                 loan.status = derived
 
-            loan.total_due = max(total - paid, 0.0)
+            loan.total_due = from_cents(max(to_cents(total) - to_cents(paid), 0))
             db.add(loan)
 
     # ---------- Purchase ----------
@@ -143,11 +149,9 @@ def update_status_if_fully_paid(db: Session, loan_id: int | None, purchase_id: i
                 )
                 purchase.status = derived
 
-            purchase.total_due = max(total - paid, 0.0)
+            purchase.total_due = from_cents(max(to_cents(total) - to_cents(paid), 0))
             db.add(purchase)
 
-    db.commit()
-
 
 def normalize_loan_status_filter(raw: str | None) -> str | None:
     """
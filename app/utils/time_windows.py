@@ -13,6 +13,15 @@ def local_dates_to_utc_window(dfrom: date, dto: date, tz: ZoneInfo = AR_TZ):
 
     return start_local.astimezone(timezone.utc), end_local_excl.astimezone(timezone.utc)
 
+def today_start_utc(tz: ZoneInfo = AR_TZ) -> datetime:
+    """
+    00:00 de HOY (día local en `tz`) expresado en UTC.
+    due_date < today_start_utc(tz)  ⇔  vencida por día local (comparable en SQL).
+    """
+    today_local = datetime.now(tz).date()
+    start_utc, _ = local_dates_to_utc_window(today_local, today_local, tz)
+    return start_utc
+
 def parse_iso_aware_utc(s: str | None) -> datetime | None:
     """
     Parsea ISO-8601 (admite 'Z') y devuelve datetime aware en UTC.
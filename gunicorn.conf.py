@@ -0,0 +1,41 @@
+# gunicorn.conf.py — entrypoint de producción (varios workers uvicorn)
+#
+#   gunicorn app.main:app -c gunicorn.conf.py
+#
+# Todo se ajusta por variables de entorno. Conexiones a la DB por worker:
+# DB_POOL_SIZE + DB_MAX_OVERFLOW (ver app/database/db.py); en total
+# WEB_CONCURRENCY * (pool + overflow) tiene que entrar en max_connections.
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+
+# workers async: uno por CPU alcanza (el trabajo sync va al threadpool, THREADPOOL_SIZE)
+workers = int(os.getenv("WEB_CONCURRENCY", str(max(2, multiprocessing.cpu_count()))))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# carga la app una vez en el master y forkea (menos RAM, arranque más rápido).
+# db.py no abre conexiones al importar; igual se descarta el pool heredado en post_fork.
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# keep-alive mayor que el idle timeout del proxy/LB (si no, el LB reusa sockets ya cerrados → 502)
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "75"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))  # PDFs / export pesados
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+
+# reciclar workers de a poco (fragmentación de memoria); jitter para que no reinicien juntos
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+
+# detrás de un proxy (X-Forwarded-*)
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+accesslog = os.getenv("GUNICORN_ACCESSLOG", "-")
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOGLEVEL", "info")
+
+
+def post_fork(server, worker):
+    # conexiones abiertas por el master (si hubo) no se comparten entre procesos
+    from app.database.db import engine
+    engine.dispose(close=False)